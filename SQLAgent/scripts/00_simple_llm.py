@@ -21,6 +21,8 @@ Key Concepts:
 # Load environment variables first (including GOOGLE_API_KEY)
 from dotenv import load_dotenv; load_dotenv()
 
+import functools  # Build the LLM and agent once, on first use
+
 # Import LangChain components for agent creation
 from langchain_google_genai import ChatGoogleGenerativeAI  # Google Gemini language model integration
 from langchain.agents import initialize_agent, AgentType  # Agent framework
@@ -71,17 +73,13 @@ class DummyTool(BaseTool):
         """Async version - not implemented."""
         raise NotImplementedError
 
-def main():
+@functools.cache
+def get_llm():
     """
-    Main function demonstrating simple agent usage without tools.
-
-    This function shows how to create and use a LangChain agent without any tools:
-    1. Initialize the LLM
-    2. Create an agent with zero tools
-    3. Configure the agent with a system message
-    4. Demonstrate agent invocation vs direct LLM usage
+    Create the Gemini client on first call; later calls return the same client.
 
-    Key difference: Agent framework structure without tool complexity.
+    Returns:
+        ChatGoogleGenerativeAI: Deterministic Gemini chat model
     """
 
     # Initialize the Language Model
@@ -90,11 +88,20 @@ def main():
     #   - model: Specify which Gemini model to use (gemini-pro is the main model)
     #   - temperature: Controls response randomness (0 = deterministic)
     print("🤖 Initializing language model for agent...")
-    llm = ChatGoogleGenerativeAI(
+    return ChatGoogleGenerativeAI(
         model="gemini-1.5-flash",    # Google's efficient Gemini model
         temperature=0              # Deterministic responses for consistency
     )
 
+@functools.cache
+def get_agent():
+    """
+    Create the conversational agent on first call; later calls return the same agent.
+
+    Returns:
+        AgentExecutor: Agent with only the dummy tool
+    """
+
     # Define System Message for Agent
     # This sets the agent's personality and behavior
     system_message = SystemMessage(
@@ -116,9 +123,9 @@ def main():
     #   - verbose: Show execution steps for educational purposes
     #   - agent_kwargs: Additional configuration including system message
     print("🎯 Creating agent with dummy tool (conversational focus)...")
-    agent = initialize_agent(
+    return initialize_agent(
         tools=[dummy_tool],          # Dummy tool to satisfy framework requirements
-        llm=llm,                     # Language model for conversation
+        llm=get_llm(),               # Language model for conversation
         agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,  # Simple reasoning agent type
         verbose=True,                # Show agent reasoning process
         agent_kwargs={
@@ -126,6 +133,23 @@ def main():
         }
     )
 
+def main():
+    """
+    Main function demonstrating simple agent usage without tools.
+
+    This function shows how to create and use a LangChain agent without any tools:
+    1. Initialize the LLM
+    2. Create an agent with zero tools
+    3. Configure the agent with a system message
+    4. Demonstrate agent invocation vs direct LLM usage
+
+    Key difference: Agent framework structure without tool complexity.
+    The LLM and agent are built on the first run only (get_llm/get_agent), so
+    running the demo again in the same process starts straight at the questions.
+    """
+    llm = get_llm()
+    agent = get_agent()
+
     # Agent Invocation - Method 1: Simple question
     # This shows how to use the agent framework for basic conversation
     print("\n💬 Agent conversation (dummy tool available but focus on chat):")
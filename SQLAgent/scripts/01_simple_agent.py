@@ -13,53 +13,80 @@ Key Components:
 
 Safety Note: This agent has NO restrictions and can execute any SQL including
 DELETE, DROP, INSERT, etc. It's meant for demonstration purposes only.
+
+Importing this module builds nothing: get_agent() creates the model, database
+and agent on first use and returns the same agent afterwards, and main() runs
+the demo (the CLI runs it in-process through script_runner).
 """
 
+import functools  # Build the agent once, on first use
+import pathlib  # Database path independent of the working directory
+
 # Import necessary LangChain components for SQL agent functionality
 from langchain_google_genai import ChatGoogleGenerativeAI  # Google Gemini chat model integration
 from langchain_community.utilities import SQLDatabase  # Database connection wrapper
 from langchain.agents.agent_toolkits import SQLDatabaseToolkit, create_sql_agent  # SQL agent tools
 from dotenv import load_dotenv; load_dotenv()  # Load environment variables from .env file
 
-# Initialize the Language Model
-# ChatGoogleGenerativeAI: Creates a Google Gemini model instance for the agent
-# Parameters:
-#   - model: Specifies which Gemini model to use (gemini-pro is the main model)
-#   - temperature: Controls randomness (0 = deterministic, 1 = more creative)
-llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0)
+# Database Configuration
+# DB_URI: The class database next to the scripts folder (not relative to the cwd,
+# so the demo works from the project root, the SQLAgent folder or inside the CLI)
+DB_URI = f"sqlite:///{pathlib.Path(__file__).resolve().parents[1] / 'sql_agent_class.db'}"
+
+@functools.cache
+def get_agent():
+    """
+    Build the simple SQL agent on first call; later calls return the same agent.
+
+    Returns:
+        AgentExecutor: Unrestricted SQL agent over the class database
+    """
+
+    # Initialize the Language Model
+    # ChatGoogleGenerativeAI: Creates a Google Gemini model instance for the agent
+    # Parameters:
+    #   - model: Specifies which Gemini model to use (gemini-pro is the main model)
+    #   - temperature: Controls randomness (0 = deterministic, 1 = more creative)
+    llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0)
+
+    # Create Database Connection
+    # SQLDatabase.from_uri: Creates a database wrapper from a connection string
+    # Parameters:
+    #   - uri: SQLite database file path (creates file if it doesn't exist)
+    # Returns: SQLDatabase object that handles connection management and query execution
+    db = SQLDatabase.from_uri(DB_URI)
+
+    # Create SQL Agent
+    # create_sql_agent: Factory function that creates a complete SQL-capable agent
+    # Parameters:
+    #   - llm: The language model instance to use for reasoning
+    #   - toolkit: SQLDatabaseToolkit provides pre-built tools for SQL operations
+    #     - db: Database connection object
+    #     - llm: Language model for query generation and result interpretation
+    #   - agent_type: Specifies the agent architecture ("zero-shot-react-description" for general use)
+    #   - verbose: If True, prints detailed execution steps for debugging
+    # Returns: AgentExecutor that can process natural language requests and execute SQL
+    return create_sql_agent(
+        llm=llm,
+        toolkit=SQLDatabaseToolkit(db=db, llm=llm),
+        agent_type="zero-shot-react-description",
+        verbose=True
+    )
 
-# Create Database Connection
-# SQLDatabase.from_uri: Creates a database wrapper from a connection string
-# Parameters:
-#   - uri: SQLite database file path (creates file if it doesn't exist)
-# Returns: SQLDatabase object that handles connection management and query execution
-db = SQLDatabase.from_uri("sqlite:///sql_agent_class.db")
+def main():
+    """Run the demo question through the (cached) agent."""
 
-# Create SQL Agent
-# create_sql_agent: Factory function that creates a complete SQL-capable agent
-# Parameters:
-#   - llm: The language model instance to use for reasoning
-#   - toolkit: SQLDatabaseToolkit provides pre-built tools for SQL operations
-#     - db: Database connection object
-#     - llm: Language model for query generation and result interpretation
-#   - agent_type: Specifies the agent architecture ("zero-shot-react-description" for general use)
-#   - verbose: If True, prints detailed execution steps for debugging
-# Returns: AgentExecutor that can process natural language requests and execute SQL
-agent = create_sql_agent(
-    llm=llm,
-    toolkit=SQLDatabaseToolkit(db=db, llm=llm),
-    agent_type="zero-shot-react-description",
-    verbose=True
-)
+    # Execute a Sample Query
+    # agent.invoke: Executes the agent with a natural language input
+    # Parameters:
+    #   - input dict: Contains the natural language request
+    # Returns: Dict with "output" key containing the agent's response
+    # Process:
+    #   1. Agent analyzes the natural language request
+    #   2. Determines what SQL query to execute
+    #   3. Executes the query against the database
+    #   4. Formats and returns the results in natural language
+    print(get_agent().invoke({"input": "Show me the first 5 customers with their regions."})["output"])
 
-# Execute a Sample Query
-# agent.invoke: Executes the agent with a natural language input
-# Parameters:
-#   - input dict: Contains the natural language request
-# Returns: Dict with "output" key containing the agent's response
-# Process:
-#   1. Agent analyzes the natural language request
-#   2. Determines what SQL query to execute
-#   3. Executes the query against the database
-#   4. Formats and returns the results in natural language
-print(agent.invoke({"input": "Show me the first 5 customers with their regions."})["output"])
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -15,9 +15,14 @@ Key Security Issues Demonstrated:
 
 Educational Purpose: Shows the difference between unrestricted and safe SQL agents.
 NEVER use this pattern in production environments!
+
+Importing this module builds nothing and deletes nothing: get_engine() and
+get_agent() create their objects on first use, and main() runs the DELETE demo.
 """
 
 # ⚠️ DEMO ONLY — allows arbitrary SQL including DELETE
+import functools  # Build the engine and agent once, on first use
+import pathlib  # Database path independent of the working directory
 import sqlalchemy  # SQL database engine and connection management
 from langchain_google_genai import ChatGoogleGenerativeAI  # Google Gemini language model integration
 from langchain.agents import initialize_agent, AgentType  # Agent creation and types
@@ -32,15 +37,25 @@ load_dotenv()
 
 # Database Configuration
 # DB_URL: SQLite database connection string
-# Note: This points to a local SQLite file in the current directory
-DB_URL = "sqlite:///SQLAgent/sql_agent_class.db"
+# Note: This points to the class database next to the scripts folder (resolved from this
+# file, so it is the same database from the project root, the SQLAgent folder or the CLI)
+DB_URL = f"sqlite:///{pathlib.Path(__file__).resolve().parents[1] / 'sql_agent_class.db'}"
+
+@functools.cache
+def get_engine():
+    """
+    Create the database engine on first call; later calls return the same engine.
+
+    Returns:
+        Engine: SQLAlchemy engine for DB_URL
+    """
 
-# Create Database Engine
-# sqlalchemy.create_engine: Creates a database engine for connection management
-# Parameters:
-#   - DB_URL: Connection string for the database
-# Returns: Engine object that manages database connections and transactions
-engine = sqlalchemy.create_engine(DB_URL)
+    # Create Database Engine
+    # sqlalchemy.create_engine: Creates a database engine for connection management
+    # Parameters:
+    #   - DB_URL: Connection string for the database
+    # Returns: Engine object that manages database connections and transactions
+    return sqlalchemy.create_engine(DB_URL)
 
 class SQLInput(BaseModel):
     """
@@ -98,14 +113,14 @@ class ExecuteAnySQLTool(BaseTool):
             str: For non-SELECT queries - "OK (no result set)" or error message
 
         Process:
-        1. Opens database connection using engine.connect()
+        1. Opens database connection using get_engine().connect()
         2. Executes SQL using conn.exec_driver_sql() - DANGEROUS, no validation
         3. Commits transaction automatically - makes changes permanent
         4. Attempts to fetch results for SELECT queries
         5. Returns formatted results or success message
         6. Catches and returns any SQL errors
         """
-        with engine.connect() as conn:  # Create database connection with auto-cleanup
+        with get_engine().connect() as conn:  # Create database connection with auto-cleanup
             try:
                 # Execute the SQL statement directly - NO VALIDATION OR SANITIZATION
                 result = conn.exec_driver_sql(sql)
@@ -143,40 +158,55 @@ class ExecuteAnySQLTool(BaseTool):
 # WARNING: This message explicitly allows dangerous operations
 system = """You are a database assistant. You are allowed to execute ANY SQL the user requests. (DEMO ONLY)"""
 
-# Initialize Language Model
-# ChatGoogleGenerativeAI: Creates connection to Google's Gemini models
-# Parameters:
-#   - model: Which Gemini model to use (gemini-pro is the main model)
-#   - temperature: Randomness control (0 = deterministic responses)
-llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0)
-
-# Create Tool Instance
-# Instantiate our dangerous SQL execution tool
-tool = ExecuteAnySQLTool()
-
-# Create Agent with Dangerous Tool
-# initialize_agent: Creates an agent executor with specified tools and configuration
-# Parameters:
-#   - tools: List of tools the agent can use [our dangerous SQL tool]
-#   - llm: Language model for reasoning and tool selection
-#   - agent: Agent type (OPENAI_FUNCTIONS uses function calling for tool selection)
-#   - verbose: If True, shows detailed execution steps for debugging
-#   - agent_kwargs: Additional configuration including system message
-# Returns: AgentExecutor that can process requests and use tools
-agent = initialize_agent(
-    tools=[tool],  # Provide the dangerous SQL tool
-    llm=llm,  # Language model for decision making
-    agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,  # Use ReAct pattern for tool selection
-    verbose=True,  # Show execution steps for educational purposes
-    agent_kwargs={"system_message": SystemMessage(content=system)}  # Set dangerous permissions
-)
-
-# DANGEROUS OPERATION: Execute DELETE command
-# This will actually delete data from the database!
-# agent.invoke: Processes natural language input and executes appropriate tools
-# The agent will:
-# 1. Analyze the request "Delete all orders"
-# 2. Generate a DELETE SQL statement
-# 3. Execute it using our dangerous tool
-# 4. Return confirmation of the deletion
-print(agent.invoke({"input": "Delete all orders"})["output"])
+@functools.cache
+def get_agent():
+    """
+    Build the unrestricted agent on first call; later calls return the same agent.
+
+    Returns:
+        AgentExecutor: Agent whose only tool executes ANY SQL
+    """
+
+    # Initialize Language Model
+    # ChatGoogleGenerativeAI: Creates connection to Google's Gemini models
+    # Parameters:
+    #   - model: Which Gemini model to use (gemini-pro is the main model)
+    #   - temperature: Randomness control (0 = deterministic responses)
+    llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0)
+
+    # Create Tool Instance
+    # Instantiate our dangerous SQL execution tool
+    tool = ExecuteAnySQLTool()
+
+    # Create Agent with Dangerous Tool
+    # initialize_agent: Creates an agent executor with specified tools and configuration
+    # Parameters:
+    #   - tools: List of tools the agent can use [our dangerous SQL tool]
+    #   - llm: Language model for reasoning and tool selection
+    #   - agent: Agent type (OPENAI_FUNCTIONS uses function calling for tool selection)
+    #   - verbose: If True, shows detailed execution steps for debugging
+    #   - agent_kwargs: Additional configuration including system message
+    # Returns: AgentExecutor that can process requests and use tools
+    return initialize_agent(
+        tools=[tool],  # Provide the dangerous SQL tool
+        llm=llm,  # Language model for decision making
+        agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,  # Use ReAct pattern for tool selection
+        verbose=True,  # Show execution steps for educational purposes
+        agent_kwargs={"system_message": SystemMessage(content=system)}  # Set dangerous permissions
+    )
+
+def main():
+    """Run the DELETE demo (this really deletes the orders)."""
+
+    # DANGEROUS OPERATION: Execute DELETE command
+    # This will actually delete data from the database!
+    # agent.invoke: Processes natural language input and executes appropriate tools
+    # The agent will:
+    # 1. Analyze the request "Delete all orders"
+    # 2. Generate a DELETE SQL statement
+    # 3. Execute it using our dangerous tool
+    # 4. Return confirmation of the deletion
+    print(get_agent().invoke({"input": "Delete all orders"})["output"])
+
+if __name__ == "__main__":
+    main()
@@ -7,37 +7,67 @@ read-only SELECT operations and implements multiple layers of security controls.
 This is the SAFE alternative to the dangerous agent in script 02.
 
 Security Features Implemented:
-✅ Input validation using regex patterns
+✅ Input validation using a single-pass SQL tokenizer
 ✅ Whitelist approach - only SELECT statements allowed
 ✅ Automatic LIMIT injection to prevent large result sets
-✅ SQL injection protection through pattern matching
+✅ SQL injection protection (string literals and comments can't hide keywords)
 ✅ Multiple statement prevention
 ✅ Error handling for SQL execution failures
 ✅ Read-only operations only - no data modification possible
 
 Educational Purpose: Shows best practices for SQL agent security.
 This pattern should be used as a baseline for production implementations.
+
+Importing this module only defines the tool and looks up the shared pool and
+caches: get_agent() reflects the schema and builds the agent on first use,
+and main() runs the demo questions.
 """
 
-import re  # Regular expressions for SQL pattern matching and validation
-import sqlalchemy  # Database engine and connection management
 from pydantic import BaseModel, Field  # Data validation and serialization
 from langchain.tools import BaseTool  # Base class for creating custom tools
-from langchain_google_genai import ChatGoogleGenerativeAI  # Google Gemini language model integration
 from langchain.agents import initialize_agent, AgentType  # Agent creation and configuration
-from langchain_community.utilities import SQLDatabase  # Database schema inspection utilities
 from langchain.schema import SystemMessage  # System message formatting for agents
 from typing import Type  # Type hinting for better code documentation
+import functools  # Build the schema context and agent once, on first use
 from dotenv import load_dotenv; load_dotenv()  # Environment variable loading
+from sql_executor import DEFAULT_DB_PATH, get_pool  # Shared read-only pool
+from result_cache import get_result_cache  # LRU cache of SELECT results
+from async_executor import get_async_executor, run_guarded  # The guarded SELECT path, sync and async
+from query_log import get_query_log  # Executed-SQL workload for the index advisor
+from query_budget import DEFAULT_BUDGET  # VM-step, wall-clock and memory limits per query
+from observation_encoder import encode_observation  # Compact, token-budgeted observations for the LLM
+from schema_cache import cached_database  # SQLDatabase with version-keyed schema caching
+from agent_registry import get_agent_registry  # Shared (and, in the CLI, already warm) Gemini client
 
 # Database Configuration
-# DB_URL: SQLite database connection string for local development
-DB_URL = "sqlite:///sql_agent_class.db"
-
-# Create Database Engine
-# sqlalchemy.create_engine: Creates a database engine for connection management
-# Used for direct SQL execution with our custom safety checks
-engine = sqlalchemy.create_engine(DB_URL)
+# DB_PATH: SQLite database file (resolved relative to the SQLAgent folder, not the cwd)
+DB_PATH = DEFAULT_DB_PATH
+
+# Get the Shared Connection Pool
+# get_pool: Returns the process-wide pool of pre-warmed, read-only connections
+# Used for direct SQL execution with our custom safety checks (no per-call connect)
+# With SQL_AGENT_REPLICA=1 its connections read an in-memory replica of the file (replica.py)
+pool = get_pool(DB_PATH)
+
+# Result Cache
+# get_result_cache: Shared LRU cache of SELECT results, invalidated when the data changes
+result_cache = get_result_cache(pool)
+
+# Async Executor
+# get_async_executor: Runs guarded SELECTs for ainvoke() on a few worker threads
+# (at most pool-size queries at once); cancelling a question interrupts its SQL
+async_executor = get_async_executor(pool)
+
+# Query Log
+# get_query_log: Counts and times every statement that reaches the database
+# (read by index_advisor.py to propose indexes for the real workload)
+query_log = get_query_log(pool)
+
+# Query Budget
+# DEFAULT_BUDGET: Limits enforced inside SQLite while a statement runs - VM steps,
+# wall-clock seconds, heap and string size - plus an EXPLAIN QUERY PLAN pre-check that
+# rejects joins without a join condition over large tables. The LIMIT only bounds rows returned
+budget = DEFAULT_BUDGET
 
 class QueryInput(BaseModel):
     """
@@ -59,7 +89,7 @@ class SafeSQLTool(BaseTool):
     It serves as a safe alternative to unrestricted SQL execution tools.
 
     Security Layers:
-    1. Pattern-based validation using regex
+    1. Single-pass tokenizer validation (sql_guard)
     2. Whitelist approach (only SELECT allowed)
     3. Automatic LIMIT injection for result set control
     4. SQL injection pattern detection
@@ -94,125 +124,136 @@ class SafeSQLTool(BaseTool):
 
         Returns:
             dict: For successful SELECT queries - {"columns": [...], "rows": [...]}
+                  (plus "truncated" and "note" when a row/byte budget cut it short)
             str: For validation errors or SQL execution errors
 
         Security Validation Process:
-        1. Clean and normalize the input SQL
-        2. Check for dangerous SQL operations (INSERT, DELETE, etc.)
-        3. Prevent multiple statement execution
-        4. Ensure only SELECT statements are allowed
-        5. Add automatic LIMIT for result set control
-        6. Execute with error handling
-        7. Return structured results or error messages
+        1. Tokenize the SQL once and build a verdict
+        2. Reject write operations, multiple statements and non-SELECT statements
+        3. Add automatic LIMIT for result set control
+        4. Serve repeated queries from the result cache
+        5. Execute with error handling
+        6. Return structured results or error messages
         """
 
-        # Step 1: Clean and Normalize Input
-        # Remove leading/trailing whitespace and trailing semicolons
-        s = sql.strip().rstrip(";")
-
-        # Step 2: Dangerous Operation Detection
-        # Search for write operations using case-insensitive regex
-        # This prevents data modification, schema changes, and database destruction
-        if re.search(r"\b(INSERT|UPDATE|DELETE|DROP|TRUNCATE|ALTER|CREATE|REPLACE)\b", s, re.I):
-            return "ERROR: write operations are not allowed."
-
-        # Step 3: Multiple Statement Prevention
-        # Prevent SQL injection through statement chaining
-        # Even after removing trailing semicolon, no internal semicolons allowed
-        if ";" in s:
-            return "ERROR: multiple statements are not allowed."
-
-        # Step 4: Whitelist Validation
-        # Ensure the statement starts with SELECT (case-insensitive)
-        # (?is) enables case-insensitive and dot-matches-newline modes
-        if not re.match(r"(?is)^\s*select\b", s):
-            return "ERROR: only SELECT statements are allowed."
-
-        # Step 5: Automatic LIMIT Injection
-        # Prevent accidentally large result sets that could overwhelm the system
-        # Skip LIMIT injection for aggregate queries (COUNT, SUM, etc.) or existing LIMIT
-        if not re.search(r"\blimit\s+\d+\b", s, re.I) and not re.search(r"\bcount\(|\bgroup\s+by\b|\bsum\(|\bavg\(|\bmax\(|\bmin\(", s, re.I):
-            s += " LIMIT 200"  # Default limit of 200 rows
-
-        # Step 6: Safe SQL Execution
-        try:
-            with engine.connect() as conn:  # Automatic connection cleanup
-                # Execute the validated SQL statement
-                result = conn.exec_driver_sql(s)
-
-                # Fetch all results (safe because of LIMIT)
-                rows = result.fetchall()
-
-                # Extract column names from result metadata
-                # Use result.keys() which is more reliable than rows[0].keys()
-                cols = list(result.keys()) if result.keys() else []
-
-                # Return structured data for agent processing
-                return {"columns": cols, "rows": [list(r) for r in rows]}
-
-        except Exception as e:
-            # Step 7: Error Handling
-            # Catch and return any SQL execution errors (syntax, missing tables, etc.)
-            return f"ERROR: {e}"
-
-    def _arun(self, *args, **kwargs):
+        # These steps run in run_guarded, the guarded path shared with script 04, the batch
+        # tool, the async executor and plan-cache replays:
+        # - inspect_sql tokenizes the statement once: string literals and comments are
+        #   single tokens, so 'please delete' or replace(...) can't trigger false alarms
+        # - Write operations (INSERT, DELETE, DROP, ...), statement chaining through
+        #   internal semicolons, and anything that isn't a SELECT are rejected
+        # - LIMIT 200 is added unless the query aggregates or has its own LIMIT
+        # - Identical SQL (after LIMIT injection) is answered from the result cache
+        # - Otherwise it runs on a warm read-only connection under the query budget (a runaway
+        #   query stops with "budget exceeded (...)"), rows are streamed with a row/byte budget,
+        #   and the statement is logged for the index advisor
+        # - Errors (syntax, missing tables, budget exceeded, ...) come back as "ERROR: ..."
+        # encode_observation keeps the dict but makes str() - what the agent reads - a compact
+        # tab-separated table with repeated values dictionary-encoded, within a token budget
+        return encode_observation(run_guarded(sql, pool, result_cache, query_log, budget))
+
+    async def _arun(self, sql: str) -> str | dict:
         """
-        Async version of _run method - not implemented.
+        Async version of _run, used when the agent is driven with ainvoke().
+
+        Same validation, LIMIT injection and result cache as _run, but the query
+        runs on the async executor's worker threads so the event loop stays free
+        for LLM calls and other questions. Cancelling the agent task interrupts
+        the running SQLite statement.
 
-        LangChain requires this method definition for potential async operations.
-        Since we don't need async functionality, we raise NotImplementedError.
+        Args:
+            sql (str): The SQL statement to validate and execute
+
+        Returns:
+            dict | str: Same results and error messages as _run
         """
-        raise NotImplementedError
-
-# Database Schema Inspection
-# SQLDatabase.from_uri: Creates a LangChain database utility for schema inspection
-# Parameters:
-#   - DB_URL: Database connection string
-#   - include_tables: Explicitly list allowed tables for additional security
-# Returns: SQLDatabase object with schema inspection capabilities
-db = SQLDatabase.from_uri(DB_URL, include_tables=["customers","orders","order_items","products","refunds","payments"])
-
-# Extract Database Schema Information
-# get_table_info(): Returns formatted string containing table schemas
-# This provides the agent with knowledge of available tables and columns
-schema_context = db.get_table_info()
-
-# System Message Configuration
-# This message defines the agent's role and provides database schema context
-# The f-string formatting includes the actual table schemas in the message
-system = f"You are a careful analytics engineer for SQLite. Use only these tables.\n\n{{schema_context}}"
-
-# Initialize Language Model
-# ChatGoogleGenerativeAI: Creates connection to Google's Gemini models
-# Parameters:
-#   - model: Gemini model selection (gemini-pro is the main model)
-#   - temperature: Controls response randomness (0 = deterministic)
-llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0)
-
-# Create Safe Tool Instance
-# Instantiate our secure SQL execution tool
-safe_tool = SafeSQLTool()
-
-# Create Secure Agent
-# initialize_agent: Creates an agent executor with safe tools and configuration
-# Parameters:
-#   - tools: List containing only our safe SQL tool
-#   - llm: Language model for reasoning and decision making
-#   - agent: Agent type using OpenAI function calling for tool selection
-#   - verbose: Show execution steps for educational/debugging purposes
-#   - agent_kwargs: Additional configuration including system message with schema
-agent = initialize_agent(
-    tools=[safe_tool],  # Only provide the safe SQL tool
-    llm=llm,  # Language model for decision making
-    agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,  # Use ReAct pattern for tool selection
-    verbose=True,  # Show detailed execution for learning
-    agent_kwargs={"system_message": SystemMessage(content=system)}  # Include database schema
-)
-
-# Test Safe Operations
-# First test: Valid read operation that should succeed
-print(agent.invoke({"input": "Show 5 customers with their sign-up dates and regions."})["output"])
-
-# Second test: Dangerous operation that should be blocked by security guardrails
-# This demonstrates how the agent refuses to execute DELETE operations
-print(agent.invoke({"input": "Delete all orders older than July 1, 2025."})["output"])
\ No newline at end of file
+        return encode_observation(await async_executor.run(sql))
+
+@functools.cache
+def get_agent():
+    """
+    Build the secure agent on first call; later calls return the same agent.
+
+    Returns:
+        AgentExecutor: Agent whose only tool is SafeSQLTool, with the schema in its system message
+    """
+    return build_agent()
+
+def build_agent(verbose: bool = True, **executor_options):
+    """
+    Build a new secure agent (get_agent() keeps one for the demo).
+
+    The query service uses this for /ask, non-verbose and time-boxed, so LLM-written
+    SQL gets the same guardrail, LIMIT and query budget as in the demo.
+
+    Args:
+        verbose (bool): Print the agent's reasoning steps
+        **executor_options: AgentExecutor options (max_iterations, max_execution_time,
+            return_intermediate_steps, handle_parsing_errors, ...)
+
+    Returns:
+        AgentExecutor: Agent whose only tool is SafeSQLTool, with the schema in its system message
+    """
+
+    # Database Schema Inspection
+    # cached_database: Creates a LangChain SQLDatabase on the shared pool whose schema text
+    # is cached (memory + disk) until PRAGMA schema_version changes
+    # Parameters:
+    #   - pool: Shared pool the engine borrows connections from
+    #   - include_tables: Explicitly list allowed tables for additional security
+    # Returns: SQLDatabase object with schema inspection capabilities
+    db = cached_database(pool, include_tables=["customers","orders","order_items","products","refunds","payments"])
+
+    # Extract Database Schema Information
+    # get_table_info(): Returns formatted string containing table schemas
+    # (a cache lookup after the first run - no reflection or sample-row queries)
+    # This provides the agent with knowledge of available tables and columns
+    schema_context = db.get_table_info()
+
+    # System Message Configuration
+    # This message defines the agent's role and provides database schema context
+    # The f-string formatting includes the actual table schemas in the message
+    system = f"You are a careful analytics engineer for SQLite. Use only these tables.\n\n{schema_context}"
+
+    # Initialize Language Model
+    # get_agent_registry(...).llm(): The shared ChatGoogleGenerativeAI client (gemini-1.5-flash)
+    # Parameters:
+    #   - temperature: Controls response randomness (0 = deterministic)
+    # Inside the CLI this is the client its chat modes already warmed up
+    llm = get_agent_registry(pool).llm(temperature=0)
+
+    # Create Safe Tool Instance
+    # Instantiate our secure SQL execution tool
+    safe_tool = SafeSQLTool()
+
+    # Create Secure Agent
+    # initialize_agent: Creates an agent executor with safe tools and configuration
+    # Parameters:
+    #   - tools: List containing only our safe SQL tool
+    #   - llm: Language model for reasoning and decision making
+    #   - agent: Agent type using OpenAI function calling for tool selection
+    #   - verbose: Show execution steps for educational/debugging purposes
+    #   - agent_kwargs: Additional configuration including system message with schema
+    return initialize_agent(
+        tools=[safe_tool],  # Only provide the safe SQL tool
+        llm=llm,  # Language model for decision making
+        agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,  # Use ReAct pattern for tool selection
+        verbose=verbose,  # Show detailed execution for learning
+        agent_kwargs={"system_message": SystemMessage(content=system)},  # Include database schema
+        **executor_options,
+    )
+
+def main():
+    """Run the safe and the blocked demo requests through the (cached) agent."""
+    agent = get_agent()
+
+    # Test Safe Operations
+    # First test: Valid read operation that should succeed
+    print(agent.invoke({"input": "Show 5 customers with their sign-up dates and regions."})["output"])
+
+    # Second test: Dangerous operation that should be blocked by security guardrails
+    # This demonstrates how the agent refuses to execute DELETE operations
+    print(agent.invoke({"input": "Delete all orders older than July 1, 2025."})["output"])
+
+if __name__ == "__main__":
+    main()
@@ -22,34 +22,97 @@ Use Cases Demonstrated:
 
 Educational Purpose: Shows how to build production-ready analytics agents that combine
 security with sophisticated business intelligence capabilities.
+
+Importing this module only defines the tool and the ask() helpers and looks up
+the shared pool and caches. The schema, schema linker, LLM client and agent are
+built on first use by cached getters (get_database, get_linker, get_agent, keyed
+on the installed rollups), and main() runs the demo questions - so running the
+demo twice in one process (the CLI runs it in-process) builds them once.
 """
 
 # Load environment variables first (including OPENAI_API_KEY)
 from dotenv import load_dotenv; load_dotenv()
 
 # Core LangChain imports for agent functionality
-from langchain_google_genai import ChatGoogleGenerativeAI  # Google Gemini language model integration
 from langchain.agents import initialize_agent, AgentType  # Agent creation and configuration
 from langchain.schema import SystemMessage  # System message formatting for agents
-from langchain_community.utilities import SQLDatabase  # Database schema inspection utilities
 
 # Data validation and tool creation imports
 from pydantic import BaseModel, Field  # Data validation and serialization
 from langchain.tools import BaseTool  # Base class for creating custom tools
 from typing import Type  # Type hinting for better code documentation
+import asyncio  # Concurrent questions on the async agent path
+import functools  # Build the schema, linker and agent once (per set of installed rollups)
+import importlib.util  # Offer Parquet export only when pyarrow is installed
+import os  # SQL_AGENT_SHARDS
+import time  # Query timing for the workload log
 
 # Database and utility imports
-import sqlalchemy  # Database engine and connection management
-import re  # Regular expressions for SQL pattern matching and validation
+from sql_executor import DEFAULT_DB_PATH, get_pool  # Shared read-only pool
+from result_cache import get_result_cache  # LRU cache of SELECT results
+from sql_guard import inspect_sql  # Single-pass SQL guardrail engine
+from async_executor import get_async_executor, run_guarded  # The guarded SELECT path, sync and async
+from query_log import get_query_log  # Executed-SQL workload for the index advisor
+from query_budget import DEFAULT_BUDGET  # VM-step, wall-clock and memory limits per query
+from observation_encoder import encode_observation  # Compact, token-budgeted observations for the LLM
+from schema_cache import cached_database  # SQLDatabase with version-keyed schema caching
+from plan_cache import get_plan_cache, render_result  # Question-to-SQL plans that skip the LLM
+from schema_linker import get_schema_linker  # Question-relevant schema pruning
+from rollups import installed_rollups  # Trigger-maintained revenue rollups
+from analytics_context import agent_context  # Shared system message, tables and business vocabulary
+from result_export import export_query  # Streaming CSV/JSONL/Parquet export of full results
+from result_profile import profile_cursor  # One-pass per-column statistics of large results
+from agent_registry import get_agent_registry  # Shared (and, in the CLI, already warm) Gemini client
+from sharding import get_shard_set  # Customer-partitioned shards queried as one database
 
 # Database Configuration
-# DB_URL: SQLite database connection string for analytics database
-DB_URL = "sqlite:///sql_agent_class.db"
-
-# Create Database Engine
-# sqlalchemy.create_engine: Creates a database engine specifically for analytics queries
-# This engine will be used by our secure SQL tool for controlled query execution
-engine = sqlalchemy.create_engine(DB_URL)
+# DB_PATH: SQLite database file for the analytics database
+DB_PATH = DEFAULT_DB_PATH
+
+# Get the Shared Connection Pool
+# get_pool: Returns the process-wide pool of pre-warmed, read-only connections
+# This pool will be used by our secure SQL tool for controlled query execution
+# With SQL_AGENT_REPLICA=1 its connections read an in-memory replica of the file (replica.py)
+pool = get_pool(DB_PATH)
+
+# Result Cache
+# get_result_cache: Shared LRU cache so repeated analytics queries skip the database
+result_cache = get_result_cache(pool)
+
+# Async Executor
+# get_async_executor: Runs guarded SELECTs for ainvoke() on a few worker threads
+# (at most pool-size queries at once); cancelling a question interrupts its SQL
+async_executor = get_async_executor(pool)
+
+# Query Log
+# get_query_log: Counts and times every statement that reaches the database
+# (read by index_advisor.py to propose indexes for the real workload)
+query_log = get_query_log(pool)
+
+# Query Budget
+# DEFAULT_BUDGET: Limits enforced inside SQLite while a statement runs - VM steps,
+# wall-clock seconds, heap and string size - plus an EXPLAIN QUERY PLAN pre-check that
+# rejects joins without a join condition over large tables. The LIMIT only bounds rows returned
+budget = DEFAULT_BUDGET
+
+# Plan Cache
+# get_plan_cache: Remembers the final SQL the agent ran for each question, so repeat
+# questions are answered by re-running that SQL on current data without calling the LLM
+plan_cache = get_plan_cache(pool)
+
+# Export Folder
+# export_dir: Where ExportSQLTool writes full results when the agent asks for an export
+# (file names are generated by the tool, never taken from the model)
+# EXPORT_FORMATS: What the agent may ask for (Arrow is left to the CLI's .export, and
+# Parquet is offered only when the optional pyarrow is installed)
+export_dir = DB_PATH.parent / "exports"
+EXPORT_FORMATS = ("csv", "jsonl") + (("parquet",) if importlib.util.find_spec("pyarrow") else ())
+
+# Shards
+# SQL_AGENT_SHARDS: shards.json written by `python scripts/sharding.py build`. When set, guarded
+# SELECTs fan out to every shard in parallel and the partial results (sums, counts, top-k rows)
+# are merged here; the agent still sees the one logical schema of DB_PATH
+shards = get_shard_set(os.environ["SQL_AGENT_SHARDS"]) if os.environ.get("SQL_AGENT_SHARDS") else None
 
 class QueryInput(BaseModel):
     """
@@ -66,7 +129,36 @@ class QueryInput(BaseModel):
     """
     sql: str = Field(description="A single read-only SELECT statement, bounded with LIMIT when returning many rows.")
 
-class SafeSQLTool(BaseTool):
+class AnalyticsTool(BaseTool):
+    """
+    Base of the analytics tools: the pool and caches they run on.
+
+    Summaries and exports are tools of their own rather than options on
+    execute_sql, because the ReAct agent only supports single-input tools.
+
+    Each defaults to this module's shared instance. A harness passes its own as
+    keyword arguments (bench_agent.py uses an in-memory query log and a temporary
+    export folder) instead of patching the module's globals.
+
+    Attributes:
+        pool: ReadOnlyPool the SQL runs on
+        result_cache: ResultCache for repeated SELECTs
+        async_executor: AsyncSQLExecutor that _arun uses
+        query_log: QueryLog the executed statements are recorded in
+        budget: QueryBudget the statements run under (async_executor applies its own)
+        export_dir: Folder ExportSQLTool writes to
+        shards: ShardSet the SQL fans out to, or None for the single database
+    """
+
+    pool: object = Field(default_factory=lambda: pool)
+    result_cache: object = Field(default_factory=lambda: result_cache)
+    async_executor: object = Field(default_factory=lambda: async_executor)
+    query_log: object = Field(default_factory=lambda: query_log)
+    budget: object = Field(default_factory=lambda: budget)
+    export_dir: object = Field(default_factory=lambda: export_dir)
+    shards: object = Field(default_factory=lambda: shards)
+
+class SafeSQLTool(AnalyticsTool):
     """
     Advanced Analytics SQL Tool - Secure Complex Query Execution
 
@@ -82,9 +174,9 @@ class SafeSQLTool(BaseTool):
     ✅ Performance optimization through automatic LIMIT injection
 
     Security Features (inherited):
-    🔒 Input validation using regex patterns
+    🔒 Input validation using a single-pass SQL tokenizer
     🔒 Whitelist approach - only SELECT statements allowed
-    🔒 SQL injection protection through pattern matching
+    🔒 SQL injection protection (literals and comments can't hide keywords)
     🔒 Multiple statement prevention
     🔒 Comprehensive error handling
     🔒 Read-only operations only
@@ -119,148 +211,422 @@ class SafeSQLTool(BaseTool):
 
         Returns:
             dict: For successful queries - {"columns": [...], "rows": [...]}
+                  (plus "truncated" and "note" when a row/byte budget cut it short)
             str: For validation errors or SQL execution errors
 
         Analytics Query Processing:
-        1. Input normalization and cleaning
+        1. Single-pass tokenization into a verdict
         2. Security validation (same as basic agent)
         3. Performance optimization (automatic LIMIT for large result sets)
-        4. Advanced error handling with helpful messages
-        5. Structured result formatting for agent interpretation
+        4. Result cache lookup for repeated queries
+        5. Advanced error handling with helpful messages
+        6. Structured result formatting for agent interpretation
         """
 
-        # Step 1: Input Normalization
-        # Clean whitespace and remove trailing semicolons for consistent processing
-        s = sql.strip().rstrip(";")
+        # These steps run in run_guarded, the guarded path shared with script 03, the batch
+        # tool, the async executor and plan-cache replays:
+        # - One walk over the SQL yields the statement type, tables, LIMIT and aggregate flags;
+        #   writes, chained statements and non-SELECTs are rejected (WITH ... SELECT is allowed)
+        # - LIMIT 200 is added unless the query aggregates or has its own LIMIT
+        # - The same COUNTs and joins come up turn after turn; they are served from the result
+        #   cache (not on shards: the cache is invalidated by changes to DB_PATH alone)
+        # - Otherwise the query runs under the query budget on a warm read-only connection, or,
+        #   sharded, on every shard in parallel with the partial aggregates / top-k rows merged
+        #   into one bounded result (shapes that can't be merged come back as an ERROR with a
+        #   rewrite hint); rows stream under a row/byte budget, so a truncated aggregate carries
+        #   a note like "200 rows shown of at least 264"
+        # - The statement and its run time are logged for the index advisor
+        # - Errors come back as "ERROR: ..." ("budget exceeded (...)" names the limit hit and
+        #   how to rewrite the query)
+        # encode_observation keeps the dict but makes str() - what the agent reads - a compact
+        # tab-separated table within a token budget
+        return encode_observation(run_guarded(
+            sql, self.pool, self.result_cache if self.shards is None else None, self.query_log, self.budget,
+            shards=self.shards))
+
+    async def _arun(self, sql: str) -> str | dict:
+        """
+        Async version of _run, used when the agent is driven with ainvoke().
+
+        Same validation, LIMIT injection and result cache as _run, but the query
+        runs on the async executor's worker threads so the event loop stays free
+        for LLM calls and other questions. Cancelling the agent task interrupts
+        the running SQLite statement.
 
-        # Step 2: Security Validation Layer
-        # Dangerous Operation Detection - prevent any write operations
-        if re.search(r"\b(INSERT|UPDATE|DELETE|DROP|TRUNCATE|ALTER|CREATE|REPLACE)\b", s, re.I):
-            return "ERROR: write operations are not allowed."
+        Args:
+            sql (str): The SQL statement to validate and execute
 
-        # Multiple Statement Prevention - prevent SQL injection via chaining
-        if ";" in s:
-            return "ERROR: multiple statements are not allowed."
+        Returns:
+            dict | str: Same results and error messages as _run
+        """
+        if self.shards is not None:  # Shards fan out on their own threads
+            return await asyncio.to_thread(self._run, sql)
+        return encode_observation(await self.async_executor.run(sql))
 
-        # Whitelist Validation - ensure only SELECT statements are allowed
-        if not re.match(r"(?is)^\s*select\b", s):
-            return "ERROR: only SELECT statements are allowed."
+class SummarizeSQLTool(AnalyticsTool):
+    """
+    Summary Tool - Per-Column Statistics of a Full SELECT Result
 
-        # Step 3: Performance Optimization
-        # Automatic LIMIT injection for result set control
-        # Skip for aggregate/analytical queries that naturally limit results
-        # Pattern matches: LIMIT clauses, COUNT functions, GROUP BY, aggregate functions
-        if not re.search(r"\blimit\s+\d+\b", s, re.I) and not re.search(r"\bcount\(|\bgroup\s+by\b|\bsum\(|\bavg\(|\bmax\(|\bmin\(", s, re.I):
-            s += " LIMIT 200"  # Conservative limit for analytics queries
+    Thousands of rows don't fit in a prompt, and a 200-row slice misleads. This
+    tool profiles every row locally in one streaming pass instead (count, nulls,
+    min/max, mean, quantiles, top values, date ranges), so the agent reads a few
+    lines per column however large the result.
 
-        # Step 4: Secure Query Execution
-        try:
-            with engine.connect() as conn:  # Automatic connection management
-                # Execute the validated analytics query
-                result = conn.exec_driver_sql(s)
+    Attributes:
+        name (str): Tool identifier for agent tool selection
+        description (str): When to use it instead of execute_sql
+        args_schema (Type[BaseModel]): QueryInput, the SELECT to profile
+    """
 
-                # Fetch all results (safe due to LIMIT controls)
-                rows = result.fetchall()
+    name: str = "summarize_sql"
+    description: str = "For large results: per-column statistics of all rows of one SELECT instead of the rows."
+    args_schema: Type[BaseModel] = QueryInput
 
-                # Extract column metadata for structured response
-                cols = list(result.keys()) if result.keys() else []
+    def _run(self, sql: str) -> str | dict:
+        """
+        Validate one SELECT and profile its whole result (no LIMIT).
 
-                # Return structured data optimized for analytics interpretation
-                return {"columns": cols, "rows": [list(r) for r in rows]}
+        Args:
+            sql (str): The SELECT to profile
 
+        Returns:
+            dict: {"profile": True, "row_count": N, "columns": [per-column statistics]}
+            str: For validation errors or SQL execution errors
+        """
+        # Same guardrail as execute_sql
+        verdict = inspect_sql(sql)
+        if not verdict.allowed:
+            return verdict.error
+
+        # Summaries stream one database's cursor; on shards only rows are merged
+        if self.shards is not None:
+            return "ERROR: summarize is not available on a sharded database; query the rows instead."
+
+        key = f"PROFILE {sql}"  # Cached apart from the row results of the same SQL
+        cached = self.result_cache.get(key)
+        if cached is not None:
+            return encode_observation(cached)
+        try:
+            started = time.perf_counter()
+            with self.pool.connection() as conn:
+                with self.budget.limit(conn, sql):
+                    profile = profile_cursor(conn.execute(sql))
+            self.query_log.record(sql, time.perf_counter() - started)
+            self.result_cache.put(key, profile)
+            return encode_observation(profile)
         except Exception as e:
-            # Step 5: Enhanced Error Handling
-            # Provide detailed error information for analytics troubleshooting
             return f"ERROR: {e}"
 
-    def _arun(self, *args, **kwargs):
+    async def _arun(self, sql: str) -> str | dict:
+        """Async version of _run: the profiling pass runs on a worker thread."""
+        return await asyncio.to_thread(self._run, sql)
+
+class ExportInput(BaseModel):
+    """
+    Input of the export tool, kept to one string so the ReAct agent can call it.
+
+    Attributes:
+        request (str): One of EXPORT_FORMATS, a space, then one read-only SELECT
+    """
+    request: str = Field(description='Format then SELECT, e.g. "csv SELECT * FROM orders".')
+
+class ExportSQLTool(AnalyticsTool):
+    """
+    Export Tool - Streams a Full SELECT Result to a File
+
+    Attributes:
+        name (str): Tool identifier for agent tool selection
+        description (str): When to use it and the input format
+        args_schema (Type[BaseModel]): ExportInput, a single string
+    """
+
+    name: str = "export_sql"
+    description: str = ('Only when asked to export: save the full result of one SELECT to a file. '
+                        f'Input: "{"|".join(EXPORT_FORMATS)} SELECT ...".')
+    args_schema: Type[BaseModel] = ExportInput
+
+    def _run(self, request: str) -> str | dict:
         """
-        Async version of _run method - not implemented.
+        Validate and export one SELECT.
+
+        The whole result (no LIMIT) is streamed to a file under exports/ in fixed-size
+        batches; the agent gets the file name, row count and throughput instead of rows.
 
-        Analytics queries are typically synchronous operations.
-        Async functionality can be added if needed for long-running reports.
+        Args:
+            request (str): Format, a space, then the SELECT
+
+        Returns:
+            dict: {"exported": path, "rows": ..., "rows_per_s": ..., "mb_per_s": ...}
+            str: For a bad format, a rejected statement or an export error
         """
-        raise NotImplementedError
-
-# Advanced Database Schema Configuration
-# SQLDatabase.from_uri: Creates enhanced database utility for analytics
-# Parameters:
-#   - DB_URL: Database connection string
-#   - include_tables: Explicit table whitelist for security and performance
-# Tables include: customers, orders, order_items, products, refunds, payments
-db = SQLDatabase.from_uri(DB_URL, include_tables=["customers","orders","order_items","products","refunds","payments"])
-
-# Extract Comprehensive Schema Information
-# get_table_info(): Returns detailed table schemas including:
-# - Table structures and relationships
-# - Column names, types, and constraints
-# - Primary keys and indexes
-# This provides the agent with complete database knowledge for analytics
-schema_context = db.get_table_info()
-
-# Advanced System Message with Business Logic
-# This system message includes:
-# 1. Role definition (analytics engineer)
-# 2. Available tables and their purposes
-# 3. Business logic for revenue calculations
-# 4. Schema information for query construction
-system = f"""You are a careful analytics engineer for SQLite.
-Use only listed tables. Revenue = sum(quantity*unit_price_cents) - refunds.amount_cents.
-\n\nSchema:\n{{schema_context}}"""
-
-# Initialize Advanced Language Model
-# ChatGoogleGenerativeAI: Creates connection optimized for analytical reasoning
-# Parameters:
-#   - model: gemini-pro provides good analytics capabilities
-#   - temperature: 0 ensures consistent, deterministic analytical outputs
-llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0)
-
-# Create Analytics Tool Instance
-# Instantiate our secure analytics SQL execution tool
-tool = SafeSQLTool()
-
-# Create Advanced Analytics Agent
-# initialize_agent: Creates an agent executor optimized for business intelligence
-# Parameters:
-#   - tools: List containing our secure analytics SQL tool
-#   - llm: Language model optimized for analytical reasoning
-#   - agent: OPENAI_FUNCTIONS type for precise tool selection and execution
-#   - verbose: Detailed execution logging for analytics transparency
-#   - agent_kwargs: System message with business context and schema information
-agent = initialize_agent(
-    tools=[tool],  # Secure analytics tool
-    llm=llm,  # Analytical reasoning model
-    agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,  # ReAct pattern for tool usage
-    verbose=True,  # Transparent execution for analytics validation
-    agent_kwargs={"system_message": SystemMessage(content=system)}  # Business context
-)
-
-# Complex Analytics Query Demonstrations
-# These examples showcase the agent's ability to handle sophisticated business intelligence queries
-
-# Query 1: Product Revenue Analysis
-# Demonstrates: Multi-table JOINs, aggregation, ranking, business metric calculation
-print(agent.invoke({"input": "Top 5 products by gross revenue (before refunds). Include product name and total_cents."})["output"])
-
-# Query 2: Time-Series Revenue Analysis
-# Demonstrates: Date functions, window operations, trend analysis, recent data filtering
-print(agent.invoke({"input": "Weekly net revenue for the last 6 weeks. Return week_start, net_cents."})["output"])
-
-# Query 3: Customer Lifecycle Analysis
-# Demonstrates: Customer segmentation, date aggregation, multi-metric analysis
-print(agent.invoke({"input": "For each customer, show their first_order_month, total_orders, last_order_date. Return 10 rows."})["output"])
-
-# Query 4: Customer Lifetime Value Ranking
-# Demonstrates: Complex revenue calculations, customer ranking, net value computation
-print(agent.invoke({"input": "Rank customers by lifetime net revenue (sum of items minus refunds). Show rank, customer, net_cents. Top 10."})["output"])
-
-# Multi-Turn Conversation Demonstrations
-# These examples show the agent's ability to maintain context across multiple queries
-# for iterative business intelligence analysis
-
-# Turn 1: High-level category analysis
-print(agent.invoke({"input": "What categories drive the most revenue?"})["output"])
-
-# Turn 2: Drill-down analysis building on previous context
-# Demonstrates: Context retention, iterative analysis, detailed breakdowns
-print(agent.invoke({"input": "Break the top category down by product with totals."})["output"])
\ No newline at end of file
+        fmt, _, sql = request.strip().partition(" ")
+        if fmt.lower() not in EXPORT_FORMATS:
+            return (f'ERROR: start the input with {" or ".join(EXPORT_FORMATS)}, then the SELECT, '
+                    f'e.g. "csv SELECT * FROM orders".')
+
+        # Same guardrail as execute_sql
+        verdict = inspect_sql(sql)
+        if not verdict.allowed:
+            return verdict.error
+
+        # Exports stream one database's cursor; on shards only rows are merged
+        if self.shards is not None:
+            return "ERROR: export is not available on a sharded database; query the rows instead."
+
+        try:
+            return export_query(self.pool, sql, fmt.lower(), self.export_dir).to_dict()
+        except Exception as e:
+            return f"ERROR: {e}"
+
+    async def _arun(self, request: str) -> str | dict:
+        """Async version of _run: the export runs on a worker thread."""
+        return await asyncio.to_thread(self._run, request)
+
+def analytics_tools(**state) -> list:
+    """
+    The agent's tools: execute_sql, summarize_sql and export_sql.
+
+    Args:
+        **state: AnalyticsTool fields to use instead of this module's shared
+            pool and caches (pool, result_cache, async_executor, query_log, export_dir, shards)
+
+    Returns:
+        list: [SafeSQLTool, SummarizeSQLTool, ExportSQLTool]
+    """
+    return [SafeSQLTool(**state), SummarizeSQLTool(**state), ExportSQLTool(**state)]
+
+def get_rollups() -> tuple:
+    """
+    Revenue rollup tables the agent may use, re-checked whenever the schema changes.
+
+    Returns:
+        tuple: Installed rollup table names, or () when they are missing or stale
+    """
+
+    # Revenue Rollups
+    # installed_rollups: The precomputed revenue tables (daily by product/category/region,
+    # lifetime per customer) when `python scripts/rollups.py install` has been run and all
+    # of their maintaining triggers are present; empty otherwise, so stale rollups are never offered
+    # (and never on shards, which don't carry the rollup tables)
+    # Installing, dropping or losing a trigger bumps PRAGMA schema_version, so the check
+    # is cached per version: a rollups.py drop or reset_db.py takes effect on the next question
+    if shards is not None:
+        return ()
+    with pool.connection() as conn:
+        version = conn.execute("PRAGMA schema_version").fetchone()[0]
+    return _rollups_at(version)
+
+@functools.cache
+def _rollups_at(schema_version: int) -> tuple:
+    """installed_rollups() for one schema version (see get_rollups)."""
+    return tuple(installed_rollups(pool))
+
+@functools.cache
+def get_database(rollups: tuple):
+    """
+    Analytics SQLDatabase on the shared pool, built once per set of rollups.
+
+    Args:
+        rollups (tuple): get_rollups()
+
+    Returns:
+        SQLDatabase: The whitelisted tables (plus rollups) with cached schema text
+    """
+
+    # Advanced Database Schema Configuration
+    # cached_database: Creates enhanced database utility for analytics on the shared pool,
+    # with the rendered schema cached until PRAGMA schema_version changes
+    # Parameters:
+    #   - pool: Shared pool the engine borrows connections from
+    #   - include_tables: Explicit table whitelist for security and performance
+    # Tables include: customers, orders, order_items, products, refunds, payments (+ rollups),
+    # the whitelist shared with the batch runner (analytics_context.py)
+    _, tables, _ = agent_context(rollups)
+    return cached_database(pool, include_tables=tables)
+
+@functools.cache
+def get_linker(rollups: tuple):
+    """
+    Question-relevant schema linker with the business vocabulary, built once per set of rollups.
+
+    Args:
+        rollups (tuple): get_rollups()
+
+    Returns:
+        SchemaLinker: The shared linker for this database
+    """
+
+    # Question-Relevant Schema Linking
+    # get_schema_linker: Scores tables and columns against each question (name matches,
+    # column values such as 'Electronics' or 'APAC', FK join paths) so each prompt carries
+    # only the relevant part of the schema instead of all six tables
+    # synonyms: Business vocabulary that doesn't appear in table or column names
+    # (with the rollups installed, revenue words also point at the small rollup tables)
+    _, _, synonyms = agent_context(rollups)
+    return get_schema_linker(pool, synonyms=synonyms)
+
+@functools.cache
+def get_agent(rollups: tuple):
+    """
+    Build the analytics agent on first call for a set of rollups; later calls return the same agent.
+
+    Args:
+        rollups (tuple): get_rollups()
+
+    Returns:
+        AgentExecutor: ReAct agent over SafeSQLTool that returns its intermediate steps
+    """
+
+    # Advanced System Message with Business Logic
+    # This system message includes:
+    # 1. Role definition (analytics engineer)
+    # 2. Business logic for revenue calculations
+    # 3. When installed, a pointer to the revenue rollups
+    # The schema itself is attached to each question by ask(), pruned to the relevant tables
+    # (the same rules drive batch_questions.py and bench_agent.py: see analytics_context.py)
+    system, _, _ = agent_context(rollups)
+
+    # Initialize Advanced Language Model
+    # get_agent_registry(...).llm(): The shared ChatGoogleGenerativeAI client (gemini-1.5-flash)
+    # Parameters:
+    #   - temperature: 0 ensures consistent, deterministic analytical outputs
+    # Inside the CLI this is the client its chat modes already warmed up
+    llm = get_agent_registry(pool).llm(temperature=0)
+
+    # Create Analytics Tool Instances
+    # Instantiate our secure analytics SQL execution tool, plus the summary and export tools
+    # (each takes one string, as the ReAct agent type requires)
+    tools = analytics_tools()
+
+    # Create Advanced Analytics Agent
+    # initialize_agent: Creates an agent executor optimized for business intelligence
+    # Parameters:
+    #   - tools: Our secure analytics SQL tool and the summary and export tools
+    #   - llm: Language model optimized for analytical reasoning
+    #   - agent: OPENAI_FUNCTIONS type for precise tool selection and execution
+    #   - verbose: Detailed execution logging for analytics transparency
+    #   - agent_kwargs: System message with business context and schema information
+    #   - return_intermediate_steps: Expose the tool calls so the plan cache can learn the final SQL
+    return initialize_agent(
+        tools=tools,  # Secure analytics tools
+        llm=llm,  # Analytical reasoning model
+        agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,  # ReAct pattern for tool usage
+        verbose=True,  # Transparent execution for analytics validation
+        agent_kwargs={"system_message": SystemMessage(content=system)},  # Business context
+        return_intermediate_steps=True  # Tool calls for the plan cache
+    )
+
+def ask(question: str) -> str:
+    """
+    Answer a question, skipping the LLM when a cached plan exists.
+
+    A repeat question re-runs the SQL the agent used last time through the
+    guarded SafeSQLTool path, against current data. A new question goes
+    through the agent, and the final validated SQL it ran is remembered.
+
+    Args:
+        question (str): Natural-language analytics question
+
+    Returns:
+        str: The agent's answer, or a result table when served from the plan cache
+    """
+    cached = answer_from_plan(question)
+    if cached is not None:
+        return cached
+
+    response = get_agent(get_rollups()).invoke({"input": agent_input(question)})
+    plan_cache.record(question, response["intermediate_steps"], scope="04_complex_queries")
+    return response["output"]
+
+async def aask(question: str) -> str:
+    """
+    Async version of ask(): the agent runs with ainvoke(), so SafeSQLTool uses
+    _arun and several questions can be in flight at once.
+
+    Args:
+        question (str): Natural-language analytics question
+
+    Returns:
+        str: The agent's answer, or a result table when served from the plan cache
+    """
+    cached = answer_from_plan(question)
+    if cached is not None:
+        return cached
+
+    response = await get_agent(get_rollups()).ainvoke({"input": agent_input(question)})
+    plan_cache.record(question, response["intermediate_steps"], scope="04_complex_queries")
+    return response["output"]
+
+def answer_from_plan(question: str) -> str | None:
+    """Result table for a repeat question from its cached plan, or None."""
+    plan = plan_cache.lookup(question, scope="04_complex_queries")
+    if plan is not None:
+        if shards is not None:  # Replay on the shards, through the tool
+            result = SafeSQLTool()._run(plan.sql)
+            result = result if isinstance(result, dict) else None
+        else:
+            result = plan_cache.replay(plan)
+        if result is not None:
+            return f"[plan cache] {plan.sql}\n{render_result(result)}"
+    return None
+
+def agent_input(question: str) -> str:
+    """The question plus only the schema relevant to it (prints the prompt savings)."""
+    rollups = get_rollups()
+    pruned = get_linker(rollups).prune(question, get_database(rollups))
+    print(f"[schema] {len(pruned.tables)}/{pruned.total_tables} tables, "
+          f"~{pruned.pruned_tokens} of ~{pruned.full_tokens} tokens ({pruned.saved_pct:.0f}% saved)")
+    return f"{question}\n\nSchema:\n{pruned.text}"
+
+async def ask_concurrently(*questions):
+    """Answer several questions at once on the async agent path."""
+    return await asyncio.gather(*(aask(q) for q in questions))
+
+def main():
+    """
+    Run the analytics demo questions.
+
+    Run it twice: the second run answers repeat questions from the plan cache, and
+    within one process (the CLI) it also reuses the schema, linker and agent.
+    """
+
+    # Complex Analytics Query Demonstrations
+    # These examples showcase the agent's ability to handle sophisticated business intelligence queries
+
+    # Query 1: Product Revenue Analysis
+    # Demonstrates: Multi-table JOINs, aggregation, ranking, business metric calculation
+    print(ask("Top 5 products by gross revenue (before refunds). Include product name and total_cents."))
+
+    # Query 2: Time-Series Revenue Analysis
+    # Demonstrates: Date functions, window operations, trend analysis, recent data filtering
+    print(ask("Weekly net revenue for the last 6 weeks. Return week_start, net_cents."))
+
+    # Query 3: Customer Lifecycle Analysis
+    # Demonstrates: Customer segmentation, date aggregation, multi-metric analysis
+    print(ask("For each customer, show their first_order_month, total_orders, last_order_date. Return 10 rows."))
+
+    # Query 4: Customer Lifetime Value Ranking
+    # Demonstrates: Complex revenue calculations, customer ranking, net value computation
+    print(ask("Rank customers by lifetime net revenue (sum of items minus refunds). Show rank, customer, net_cents. Top 10."))
+
+    # Multi-Turn Conversation Demonstrations
+    # These examples show the agent's ability to maintain context across multiple queries
+    # for iterative business intelligence analysis
+
+    # Turn 1: High-level category analysis
+    print(ask("What categories drive the most revenue?"))
+
+    # Turn 2: Drill-down analysis building on previous context
+    # Demonstrates: Context retention, iterative analysis, detailed breakdowns
+    print(ask("Break the top category down by product with totals."))
+
+    # Concurrent Questions
+    # Demonstrates: the async path - both agents run at the same time, their LLM calls
+    # overlap, and their SQL runs on the async executor's worker threads
+    for answer in asyncio.run(ask_concurrently(
+            "How many orders does each status have?",
+            "Which payment method is used most often?")):
+        print(answer)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+Warm Agent Registry
+
+Every CLI chat mode used to build its own Gemini client, SQLDatabase, toolkit and
+agent executor each time its menu was entered, and the plain chat and quick LLM
+test built yet more clients. The heavy parts - importing LangChain, creating the
+HTTP client, reflecting the schema - were paid again on every visit.
+
+This module builds those components once per database and hands them out:
+
+Key Features:
+- One LLM client per temperature, shared by every mode (keeps HTTP connections alive)
+- One cached SQLDatabase and one SQLDatabaseToolkit per database
+- Per-mode agent executors built on the shared components and reused on re-entry
+- Background warm-up at CLI startup (imports, clients, schema context)
+- Build timings and reuse counters
+
+Usage:
+    from agent_registry import get_agent_registry
+
+    registry = get_agent_registry(pool)
+    registry.warm()  # returns immediately, builds in a background thread
+    agent = registry.executor("secure", max_iterations=3)
+"""
+
+import threading  # Background warm-up and the build lock
+import time  # Build-time measurement
+
+# Model every chat mode talks to
+DEFAULT_MODEL = "gemini-1.5-flash"
+
+# Temperatures used by the CLI: agents need deterministic SQL, plain chat a little variety
+AGENT_TEMPERATURE = 0
+CHAT_TEMPERATURE = 0.7
+
+# Secure chat mode (CLI and query service): short, time-boxed runs that return their
+# tool calls so the plan cache can learn the final SQL
+SECURE_AGENT_OPTIONS = {
+    "verbose": False,
+    "max_iterations": 3,
+    "max_execution_time": 30,
+    "agent_executor_kwargs": {"return_intermediate_steps": True},
+}
+
+# Put in front of every secure-mode question to keep answers to small SELECTs
+SECURE_PREFIX = "Please answer this question using only SELECT queries and limit results to 10 rows maximum: "
+
+
+class AgentRegistry:
+    """
+    Lazily built, shared LangChain components for one database.
+
+    Attributes:
+        pool: ReadOnlyPool the database handle borrows connections from
+        model (str): Gemini model name
+    """
+
+    def __init__(self, pool, model: str = DEFAULT_MODEL, **database_options):
+        """
+        Args:
+            pool: ReadOnlyPool for the database
+            model (str): Gemini model name for every client
+            **database_options: SQLDatabase options (include_tables, sample_rows_in_table_info, ...)
+        """
+        self.pool = pool
+        self.model = model
+        self.database_options = database_options
+
+        self._llms = {}  # temperature -> chat model client
+        self._database = None
+        self._toolkit = None
+        self._executors = {}  # mode -> AgentExecutor
+        self._lock = threading.RLock()  # Held while building, so nothing is built twice
+
+        # Warm-up state and counters reported by stats()
+        self._warm_thread = None
+        self._warm_error = None
+        self._warm_time = None
+        self._build_times = {}  # component -> seconds
+        self._reuses = 0
+
+    def _timed(self, name: str, build):
+        """Run a builder and record how long it took."""
+        started = time.perf_counter()
+        value = build()
+        self._build_times[name] = self._build_times.get(name, 0.0) + time.perf_counter() - started
+        return value
+
+    def llm(self, temperature: float = AGENT_TEMPERATURE):
+        """
+        Shared Gemini client for a temperature, created on first use.
+
+        Args:
+            temperature (float): Sampling temperature
+
+        Returns:
+            ChatGoogleGenerativeAI: The shared client
+        """
+        with self._lock:
+            client = self._llms.get(temperature)
+            if client is not None:
+                self._reuses += 1
+                return client
+
+            def build():
+                from langchain_google_genai import ChatGoogleGenerativeAI
+                return ChatGoogleGenerativeAI(model=self.model, temperature=temperature)
+
+            client = self._llms[temperature] = self._timed(f"llm@{temperature}", build)
+            return client
+
+    def database(self):
+        """Shared SQLDatabase with cached schema rendering, created on first use."""
+        with self._lock:
+            if self._database is not None:
+                self._reuses += 1
+                return self._database
+
+            def build():
+                from schema_cache import cached_database
+                return cached_database(self.pool, **self.database_options)
+
+            self._database = self._timed("database", build)
+            return self._database
+
+    def toolkit(self):
+        """Shared SQLDatabaseToolkit (agent LLM + database), created on first use."""
+        with self._lock:
+            if self._toolkit is not None:
+                self._reuses += 1
+                return self._toolkit
+
+            def build():
+                from langchain_community.agent_toolkits import SQLDatabaseToolkit
+                return SQLDatabaseToolkit(db=self.database(), llm=self.llm(AGENT_TEMPERATURE))
+
+            self._toolkit = self._timed("toolkit", build)
+            return self._toolkit
+
+    def executor(self, mode: str, **agent_options):
+        """
+        Agent executor for a chat mode, built on the shared LLM and toolkit.
+
+        The options only apply the first time a mode is requested; later calls
+        return the same executor.
+
+        Args:
+            mode (str): Chat mode name ("secure", "simple", "analytics", ...)
+            **agent_options: create_sql_agent options (verbose, max_iterations, ...)
+
+        Returns:
+            AgentExecutor: The mode's executor
+        """
+        with self._lock:
+            agent = self._executors.get(mode)
+            if agent is not None:
+                self._reuses += 1
+                return agent
+
+            def build():
+                from langchain.agents import create_sql_agent
+                agent_options.setdefault("agent_type", "zero-shot-react-description")
+                agent_options.setdefault("handle_parsing_errors", True)
+                return create_sql_agent(llm=self.llm(AGENT_TEMPERATURE), toolkit=self.toolkit(), **agent_options)
+
+            agent = self._executors[mode] = self._timed(f"executor:{mode}", build)
+            return agent
+
+    def warm(self, background: bool = True, temperatures=(AGENT_TEMPERATURE, CHAT_TEMPERATURE)):
+        """
+        Build the shared components ahead of the first chat.
+
+        Imports LangChain, creates the LLM clients, the database handle and the
+        toolkit, and renders the schema context once (filling the schema cache).
+        Errors (missing packages, no API key) are recorded, not raised; the chat
+        modes report them when they try to build the same component.
+
+        Args:
+            background (bool): Run in a daemon thread and return immediately
+            temperatures: LLM clients to create
+
+        Returns:
+            threading.Thread | None: The warm-up thread when running in the background
+        """
+        def run():
+            started = time.perf_counter()
+            try:
+                for temperature in temperatures:
+                    self.llm(temperature)
+                self.toolkit()
+                self.database().get_table_info()
+            except Exception as e:  # Reported via stats(); the chat modes retry
+                self._warm_error = f"{type(e).__name__}: {e}"
+            self._warm_time = time.perf_counter() - started
+
+        if not background:
+            run()
+            return None
+        with self._lock:
+            if self._warm_thread is None:
+                self._warm_thread = threading.Thread(target=run, name="agent-registry-warm", daemon=True)
+                self._warm_thread.start()
+            return self._warm_thread
+
+    def clear(self):
+        """Drop every built component (the next request rebuilds it)."""
+        with self._lock:
+            self._llms.clear()
+            self._database = None
+            self._toolkit = None
+            self._executors.clear()
+            self._warm_thread = None
+            self._warm_error = None
+            self._warm_time = None
+
+    def stats(self) -> dict:
+        """
+        Snapshot of registry state.
+
+        Returns:
+            dict: warm-up status and time, built components, executors, reuses and build times in ms
+        """
+        # No lock: a warm-up in progress holds it for seconds, and a slightly
+        # stale snapshot is fine for reporting
+        if self._warm_thread is None:
+            warm = "not started"
+        elif self._warm_time is None:
+            warm = "running"
+        else:
+            warm = "failed" if self._warm_error else "done"
+        return {
+            "warm": warm,
+            "warm_ms": round(self._warm_time * 1000, 1) if self._warm_time is not None else None,
+            "warm_error": self._warm_error,
+            "llms": len(self._llms),
+            "database": self._database is not None,
+            "toolkit": self._toolkit is not None,
+            "executors": sorted(list(self._executors)),
+            "reuses": self._reuses,
+            "build_ms": {name: round(seconds * 1000, 1) for name, seconds in list(self._build_times.items())},
+        }
+
+
+# Process-wide registry: one set of agent components per database file
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_agent_registry(pool, **options) -> AgentRegistry:
+    """
+    Return the shared agent registry for a pool's database, creating it on first use.
+
+    Options (model, SQLDatabase options) only apply when the registry is created.
+    """
+    with _registries_lock:
+        registry = _registries.get(pool.db_path)
+        if registry is None:
+            registry = _registries[pool.db_path] = AgentRegistry(pool, **options)
+        return registry
+
+
+def agent_registry_stats() -> dict:
+    """State of every agent registry in this process, keyed by database path."""
+    with _registries_lock:
+        registries = list(_registries.items())
+    return {str(path): registry.stats() for path, registry in registries}
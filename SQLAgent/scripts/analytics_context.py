@@ -0,0 +1,57 @@
+"""
+Analytics Agent Context
+
+The business rules the secure analytics agent works with: its system message,
+the table whitelist and the business vocabulary the schema linker maps to
+columns. 04_complex_queries.py, batch_questions.py and bench_agent.py all
+build their agents from these, so the rules are written in one place.
+
+When the revenue rollups are installed, agent_context() extends all three
+with them (the rollup prompt, the rollup tables and the rollup synonyms).
+
+Usage:
+    from analytics_context import agent_context
+    from rollups import installed_rollups
+
+    system, tables, synonyms = agent_context(installed_rollups(pool))
+"""
+
+from rollups import ROLLUP_PROMPT, ROLLUP_SYNONYMS  # Trigger-maintained revenue rollups
+
+# Role and business logic. The schema itself is attached to each question,
+# pruned to the tables relevant to it
+SYSTEM = """You are a careful analytics engineer for SQLite.
+The schema shown with each question covers the tables relevant to it. Revenue = sum(quantity*unit_price_cents) - refunds.amount_cents."""
+
+# Tables the agent may see
+TABLES = ["customers", "orders", "order_items", "products", "refunds", "payments"]
+
+# Business vocabulary that doesn't appear in table or column names
+SYNONYMS = {
+    "revenue": ["order_items.quantity", "order_items.unit_price_cents", "refunds.amount_cents"],
+    "sales": ["order_items.quantity", "order_items.unit_price_cents"],
+    "sold": ["order_items.quantity"],
+    "total": ["order_items.quantity", "order_items.unit_price_cents"],
+    "lifetime": ["orders.order_date", "order_items.unit_price_cents"],
+    "spend": ["order_items.unit_price_cents", "payments.amount_cents"],
+    "spent": ["order_items.unit_price_cents", "payments.amount_cents"],
+    "spending": ["order_items.unit_price_cents", "payments.amount_cents"],
+}
+
+
+def agent_context(rollups=()) -> tuple:
+    """
+    System message, tables and synonyms for the analytics agent.
+
+    Args:
+        rollups: Installed rollup tables the agent may use (rollups.installed_rollups)
+
+    Returns:
+        tuple: (system message, table list, synonyms), extended with the rollups when given
+    """
+    if not rollups:
+        return SYSTEM, list(TABLES), dict(SYNONYMS)
+    # Revenue vocabulary also points at the rollups, so those questions link to the small tables
+    synonyms = {word: SYNONYMS.get(word, []) + ROLLUP_SYNONYMS.get(word, [])
+                for word in {**SYNONYMS, **ROLLUP_SYNONYMS}}
+    return SYSTEM + "\n" + ROLLUP_PROMPT, TABLES + list(rollups), synonyms
@@ -0,0 +1,305 @@
+"""
+Guarded SQL Execution, Sync and Async
+
+run_guarded() is the one guarded SELECT path: guardrail, LIMIT injection,
+result cache, pooled connection under the query budget, bounded fetch and the
+workload log. SafeSQLTool in 03/04, the batch tool and plan-cache replays call
+it directly.
+
+AsyncGuardedExecutor runs the same path for agents driven with `ainvoke`.
+SQLite has no async driver in the standard library, so each statement runs on a
+small dedicated thread pool over the shared read-only connection pool, while the
+event loop stays free for LLM calls and other questions.
+
+Key Features:
+- One implementation of the guarded path for every caller
+- Bounded concurrency (an asyncio semaphore in front of a fixed-size thread pool)
+- Real cancellation: cancelling the awaiting task interrupts the SQLite statement
+  (connection.interrupt()), so a runaway scan stops instead of running on
+- Optional per-query timeout, implemented as a cancellation
+- Counters for running, queued, completed, cancelled and timed-out queries
+
+Usage:
+    from async_executor import get_async_executor, run_guarded
+
+    payload = run_guarded("SELECT name FROM customers", pool, cache, query_log)
+
+    executor = get_async_executor(pool)
+    payload = await executor.run("SELECT name FROM customers", timeout=10)
+"""
+
+import asyncio  # Event loop integration
+import sqlite3  # Interrupted-statement errors
+import threading  # Cancellation handshake with the worker thread
+import time  # Query timing for the workload log
+import weakref  # Per-event-loop semaphores
+from concurrent.futures import ThreadPoolExecutor  # Dedicated SQL worker threads
+
+from query_budget import DEFAULT_BUDGET  # Per-statement execution limits
+from query_log import get_query_log  # Executed-SQL workload log
+from result_cache import get_result_cache  # Shared SELECT result cache
+from sql_executor import fetch_bounded  # Bounded streaming fetch
+from sql_guard import inspect_sql  # Single-pass SQL guardrail
+
+
+class _RunningStatement:
+    """
+    Handshake between the awaiting task and the worker thread.
+
+    The worker attaches its connection before executing; cancel() interrupts
+    whatever is attached, or makes a not-yet-started statement refuse to run.
+    """
+
+    def __init__(self):
+        self._conn = None
+        self._cancelled = False
+        self._lock = threading.Lock()
+
+    def attach(self, conn):
+        with self._lock:
+            if self._cancelled:
+                raise sqlite3.OperationalError("interrupted")
+            self._conn = conn
+
+    def detach(self):
+        with self._lock:
+            self._conn = None
+
+    def cancel(self):
+        with self._lock:
+            self._cancelled = True
+            if self._conn is not None:
+                self._conn.interrupt()
+
+
+def run_guarded(sql: str, pool, cache=None, query_log=None, budget=DEFAULT_BUDGET, max_rows: int = 200,
+                shards=None, running=None) -> str | dict:
+    """
+    Validate, bound and run one SELECT on the calling thread.
+
+    Args:
+        sql (str): SQL produced by the agent (or a stored plan)
+        pool: ReadOnlyPool to borrow a connection from
+        cache: ResultCache for repeated statements (None skips it)
+        query_log: QueryLog the executed statement is recorded in (None skips it)
+        budget (QueryBudget): Limits enforced while the statement runs
+        max_rows (int): Row budget of the result (also the injected LIMIT)
+        shards: ShardSet to fan the statement out to instead of `pool`
+        running: _RunningStatement the connection is attached to, so another
+            thread can interrupt the statement
+
+    Returns:
+        dict: {"columns": [...], "rows": [...]} (plus "truncated" and "note" when cut short)
+        str: Guardrail or execution error ("ERROR: ...")
+    """
+    verdict = inspect_sql(sql)
+    if not verdict.allowed:
+        return verdict.error
+    bounded = verdict.bounded_sql(max_rows)
+
+    cached = cache.get(bounded) if cache is not None else None
+    if cached is not None:
+        return cached
+
+    try:
+        started = time.perf_counter()
+        if shards is not None:
+            # Every shard runs its part under its own budget; partial results are merged
+            payload = shards.execute(bounded, max_rows=max_rows)
+        else:
+            with pool.connection() as conn:
+                if running is not None:
+                    running.attach(conn)
+                try:
+                    with budget.limit(conn, bounded):
+                        payload = fetch_bounded(conn.execute(bounded), max_rows=max_rows)
+                finally:
+                    if running is not None:
+                        running.detach()
+        if query_log is not None:
+            query_log.record(bounded, time.perf_counter() - started)
+    except Exception as e:  # SQL errors, budget exceeded, pool exhaustion, interrupts
+        return f"ERROR: {e}"
+
+    if cache is not None:
+        cache.put(bounded, payload)
+    return payload
+
+
+class AsyncGuardedExecutor:
+    """
+    Runs guarded SELECTs from async code with bounded concurrency.
+
+    Attributes:
+        pool: ReadOnlyPool the statements run on
+        max_concurrency (int): Statements allowed to run at once
+        max_rows (int): Row budget per result (also the injected LIMIT)
+        budget (QueryBudget): VM-step, wall-clock and memory limits per statement
+    """
+
+    def __init__(self, pool, max_concurrency: int | None = None, max_rows: int = 200, budget=DEFAULT_BUDGET):
+        """
+        Args:
+            pool: ReadOnlyPool for the database
+            max_concurrency (int | None): Concurrent statements (defaults to the pool size)
+            max_rows (int): Row budget per result
+            budget (QueryBudget): Limits enforced while each statement runs
+        """
+        self.pool = pool
+        self.max_concurrency = max_concurrency or pool.size
+        self.max_rows = max_rows
+        self.budget = budget
+        self.cache = get_result_cache(pool)
+        self.query_log = get_query_log(pool)
+
+        self._threads = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="sql-async")
+        self._slots = weakref.WeakKeyDictionary()  # event loop -> semaphore (semaphores bind to one loop)
+        self._lock = threading.Lock()
+
+        # Counters reported by stats()
+        self._running = 0
+        self._queued = 0
+        self._completed = 0
+        self._cancelled = 0
+        self._timeouts = 0
+        self._errors = 0
+
+    def _count(self, name: str, delta: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + delta)
+
+    def _execute(self, sql: str, running: _RunningStatement) -> str | dict:
+        """Worker-thread side: the guarded path on this executor's pool, cache and budget."""
+        return run_guarded(sql, self.pool, self.cache, self.query_log, self.budget, self.max_rows, running=running)
+
+    async def run(self, sql: str, timeout: float | None = None) -> str | dict:
+        """
+        Validate and execute one SELECT without blocking the event loop.
+
+        Args:
+            sql (str): SQL produced by the agent
+            timeout (float | None): Seconds before the statement is interrupted
+
+        Returns:
+            dict: {"columns": [...], "rows": [...]} (plus truncation info), as SafeSQLTool
+            str: Guardrail, timeout or SQL error message
+
+        Raises:
+            asyncio.CancelledError: If the calling task is cancelled (the statement is interrupted first)
+        """
+        try:
+            payload = await asyncio.wait_for(self._submit(sql), timeout)
+        except asyncio.TimeoutError:
+            self._count("_timeouts")
+            return f"ERROR: query timed out after {timeout}s and was interrupted."
+        if isinstance(payload, str):
+            self._count("_errors")
+        return payload
+
+    async def _submit(self, sql: str) -> str | dict:
+        """Wait for a slot, run the statement in a worker, interrupt it if cancelled."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            slots = self._slots.get(loop)
+            if slots is None:
+                slots = self._slots[loop] = asyncio.Semaphore(self.max_concurrency)
+
+        self._count("_queued")
+        try:
+            await slots.acquire()
+        finally:
+            self._count("_queued", -1)
+
+        running = _RunningStatement()
+        self._count("_running")
+        try:
+            future = loop.run_in_executor(self._threads, self._execute, sql, running)
+            try:
+                payload = await future
+            except asyncio.CancelledError:
+                running.cancel()  # Stops the SQLite VM; the worker returns its connection
+                self._count("_cancelled")
+                raise
+            self._count("_completed")
+            return payload
+        finally:
+            self._count("_running", -1)
+            slots.release()
+
+    def stats(self) -> dict:
+        """
+        Snapshot of async executor counters.
+
+        Returns:
+            dict: concurrency limit, running/queued now, completed, cancelled, timeouts and
+            errors (rejected or failed statements)
+        """
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "running": self._running,
+                "queued": self._queued,
+                "completed": self._completed,
+                "cancelled": self._cancelled,
+                "timeouts": self._timeouts,
+                "errors": self._errors,
+            }
+
+    def close(self):
+        """Stop the worker threads once running statements finish."""
+        self._threads.shutdown(wait=False, cancel_futures=True)
+
+
+# Process-wide registry: one async executor per database file
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_async_executor(pool, **options) -> AsyncGuardedExecutor:
+    """
+    Return the shared async executor for a pool's database, creating it on first use.
+
+    Options (max_concurrency, max_rows) only apply when the executor is created.
+    """
+    with _executors_lock:
+        executor = _executors.get(pool.db_path)
+        if executor is None:
+            executor = _executors[pool.db_path] = AsyncGuardedExecutor(pool, **options)
+        return executor
+
+
+def async_executor_stats() -> dict:
+    """Counters for every async executor in this process, keyed by database path."""
+    with _executors_lock:
+        executors = list(_executors.items())
+    return {str(path): executor.stats() for path, executor in executors}
+
+
+def run_cancellable(loop, coro, on_cancel=None):
+    """
+    Run a coroutine to completion on `loop`, turning Ctrl-C into a cancellation.
+
+    The task is cancelled (which interrupts any SQL it is awaiting) and allowed
+    to unwind before KeyboardInterrupt is re-raised, so the loop stays usable for
+    the next question.
+
+    Args:
+        loop: Event loop kept for the whole session (LLM clients bind to it)
+        coro: Coroutine to run, e.g. agent.ainvoke({...})
+        on_cancel: Optional callable run right after cancelling (e.g. pool.interrupt)
+
+    Returns:
+        The coroutine's result
+    """
+    task = loop.create_task(coro)
+    try:
+        return loop.run_until_complete(task)
+    except KeyboardInterrupt:
+        task.cancel()
+        if on_cancel is not None:
+            on_cancel()
+        try:
+            loop.run_until_complete(task)
+        except (asyncio.CancelledError, Exception):
+            pass
+        raise
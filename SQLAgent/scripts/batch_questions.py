@@ -0,0 +1,332 @@
+"""
+Batch Question Runner
+
+Runs a file of report questions through the secure analytics agent (the same
+guarded SQL tool, business rules and schema pruning as 04_complex_queries.py),
+several at a time, and streams one JSON record per question to a JSONL file.
+
+Key Features:
+- Configurable concurrency (agents run with ainvoke, SQL on the async executor)
+- One JSONL record per question: answer, final SQL, rows, LLM calls and a
+  latency breakdown (schema pruning, LLM, SQL, other)
+- Checkpoint/resume: the output file is the checkpoint. Questions that already
+  have a record are skipped on the next run, so an interrupted batch doesn't
+  pay for finished questions again (`--retry-failed` re-runs errors/timeouts;
+  the newest record for an id supersedes older ones)
+- Repeat questions are answered from the plan cache without an LLM call
+- Per-question timeout; a timed-out question's SQL is interrupted
+
+Question files:
+- `.txt`: one question per line (blank lines and `#` comments are ignored)
+- `.jsonl`: one {"id": ..., "question": ...} object per line ("id" optional)
+Questions without an id get a stable one derived from the normalized text.
+
+Usage (from the SQLAgent folder):
+    python scripts/batch_questions.py report_questions.txt --out nightly.jsonl --concurrency 4
+"""
+
+import argparse  # Command-line options
+import asyncio  # Concurrent agent runs
+import hashlib  # Stable question ids
+import json  # Question files and JSONL records
+import os  # fsync of each record
+import pathlib  # File paths
+import time  # Latency measurement
+from typing import Type  # Type hinting for the tool's args schema
+
+from dotenv import load_dotenv; load_dotenv()  # Environment variable loading
+from pydantic import BaseModel, Field  # Tool input validation
+from langchain.tools import BaseTool  # Base class for the guarded SQL tool
+from langchain.callbacks.base import AsyncCallbackHandler  # Per-question LLM/tool timing
+from langchain.agents import initialize_agent, AgentType  # Agent creation and configuration
+from langchain.schema import SystemMessage  # System message formatting for agents
+
+from sql_executor import DEFAULT_DB_PATH, get_pool  # Shared read-only pool
+from async_executor import get_async_executor, run_guarded  # The guarded SELECT path, sync and async
+from schema_cache import cached_database  # SQLDatabase with version-keyed schema caching
+from schema_linker import get_schema_linker  # Question-relevant schema pruning
+from rollups import installed_rollups  # Trigger-maintained revenue rollups
+from analytics_context import SYSTEM, agent_context  # Business rules shared with 04_complex_queries.py
+from agent_registry import get_agent_registry  # Shared Gemini client
+from observation_encoder import encode_observation  # Compact, token-budgeted observations for the LLM
+from plan_cache import SQL_TOOLS, get_plan_cache, normalize_question, plan_from_steps, render_result
+
+# Plan cache scope for batch questions (separate from the interactive scripts)
+PLAN_SCOPE = "batch"
+
+
+class QueryInput(BaseModel):
+    """Input of the batch SQL tool: one read-only SELECT."""
+    sql: str = Field(description="A single read-only SELECT statement, bounded with LIMIT when returning many rows.")
+
+
+class BatchSQLTool(BaseTool):
+    """
+    SafeSQLTool for the batch path.
+
+    With ainvoke(), validation, LIMIT injection, result caching, bounded fetch
+    and cancellation all happen in the shared async executor. invoke() runs the
+    same guarded SELECT on the executor's pool, cache, budget and query log.
+    """
+
+    name: str = "execute_sql"
+    description: str = "Execute one read-only SELECT."
+    args_schema: Type[BaseModel] = QueryInput
+    executor: object = None
+
+    def _run(self, sql: str) -> str | dict:
+        """Validate and execute one SELECT on the calling thread (same rules as 03's SafeSQLTool)."""
+        executor = self.executor
+        return encode_observation(run_guarded(sql, executor.pool, executor.cache, executor.query_log,
+                                              executor.budget, executor.max_rows))
+
+    async def _arun(self, sql: str) -> str | dict:
+        """Validate and execute one SELECT on the async executor."""
+        return encode_observation(await self.executor.run(sql))
+
+
+class StageTimer(AsyncCallbackHandler):
+    """Counts LLM and SQL tool calls for one question and times them."""
+
+    def __init__(self):
+        self.llm_calls = 0
+        self.sql_calls = 0
+        self.llm_seconds = 0.0
+        self.sql_seconds = 0.0
+        self._started = {}  # run_id -> start time
+
+    def _stop(self, run_id) -> float:
+        started = self._started.pop(run_id, None)
+        return time.perf_counter() - started if started is not None else 0.0
+
+    async def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self.llm_calls += 1
+        self._started[run_id] = time.perf_counter()
+
+    async def on_llm_end(self, response, *, run_id, **kwargs):
+        self.llm_seconds += self._stop(run_id)
+
+    async def on_llm_error(self, error, *, run_id, **kwargs):
+        self.llm_seconds += self._stop(run_id)
+
+    async def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self.sql_calls += 1
+        self._started[run_id] = time.perf_counter()
+
+    async def on_tool_end(self, output, *, run_id, **kwargs):
+        self.sql_seconds += self._stop(run_id)
+
+    async def on_tool_error(self, error, *, run_id, **kwargs):
+        self.sql_seconds += self._stop(run_id)
+
+
+def question_id(question: str) -> str:
+    """Stable id for a question without one (same id for trivially different wording)."""
+    return hashlib.sha1(normalize_question(question).encode("utf-8")).hexdigest()[:12]
+
+
+def load_questions(path: pathlib.Path) -> list:
+    """
+    Read questions from a .txt or .jsonl file.
+
+    Returns:
+        list: [{"id": ..., "question": ...}] in file order, duplicates removed
+    """
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if path.suffix == ".jsonl":
+                item = json.loads(line)
+                question = item["question"]
+                qid = str(item.get("id") or question_id(question))
+            else:
+                question, qid = line, question_id(line)
+            items.append({"id": qid, "question": question})
+
+    seen = set()
+    unique = []
+    for item in items:
+        if item["id"] not in seen:
+            seen.add(item["id"])
+            unique.append(item)
+    return unique
+
+
+def load_checkpoint(out_path: pathlib.Path, retry_failed: bool = False) -> set:
+    """
+    Ids of questions that already have a record in the output file.
+
+    A line cut short by a crash is ignored (that question simply runs again).
+    With `retry_failed`, only successful records count as done.
+    """
+    done = set()
+    if not out_path.exists():
+        return done
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("status") == "ok" or not retry_failed:
+                done.add(record.get("id"))
+    return done
+
+
+def build_agent(pool, max_iterations: int = 8, system: str = SYSTEM):
+    """Secure analytics agent on the async executor (same setup as 04_complex_queries.py)."""
+    llm = get_agent_registry(pool).llm(temperature=0)
+    tool = BatchSQLTool(executor=get_async_executor(pool))
+    return initialize_agent(
+        tools=[tool],
+        llm=llm,
+        agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+        verbose=False,
+        handle_parsing_errors=True,
+        max_iterations=max_iterations,
+        agent_kwargs={"system_message": SystemMessage(content=system)},
+        return_intermediate_steps=True,
+    )
+
+
+def _last_result(steps):
+    """Observation of the last SQL tool call, if it returned rows."""
+    for action, observation in reversed(steps or []):
+        if getattr(action, "tool", None) in SQL_TOOLS:
+            return observation if isinstance(observation, dict) else None
+    return None
+
+
+async def run_question(item: dict, agent, linker, db, plans, timeout: float | None) -> dict:
+    """
+    Answer one question and build its JSONL record.
+
+    Errors and timeouts are recorded, not raised, so one bad question doesn't
+    stop the batch.
+    """
+    question = item["question"]
+    record = {"id": item["id"], "question": question}
+    started = time.perf_counter()
+    timer = StageTimer()
+    schema_seconds = 0.0
+    result = None
+
+    try:
+        plan = plans.lookup(question, scope=PLAN_SCOPE) if plans is not None else None
+        result = await asyncio.to_thread(plans.replay, plan) if plan is not None else None
+        if result is not None:
+            record.update(status="ok", source="plan_cache", answer=render_result(result),
+                          sql=plan.sql, plan_confidence=plan.confidence)
+        else:
+            schema_started = time.perf_counter()
+            pruned = linker.prune(question, db)
+            schema_seconds = time.perf_counter() - schema_started
+
+            response = await asyncio.wait_for(
+                agent.ainvoke({"input": f"{question}\n\nSchema:\n{pruned.text}"}, config={"callbacks": [timer]}),
+                timeout,
+            )
+            steps = response.get("intermediate_steps")
+            if plans is not None:
+                plans.record(question, steps, scope=PLAN_SCOPE)
+            plan_info = plan_from_steps(steps)
+            result = _last_result(steps)
+            record.update(status="ok", source="agent", answer=response["output"],
+                          sql=plan_info[0] if plan_info else None,
+                          plan_confidence=plan_info[1] if plan_info else None,
+                          schema_tokens=pruned.pruned_tokens)
+    except asyncio.TimeoutError:
+        record.update(status="timeout", error=f"no answer within {timeout}s")
+    except Exception as e:
+        record.update(status="error", error=f"{type(e).__name__}: {e}")
+
+    total = time.perf_counter() - started
+    if result is not None:
+        record["rows"] = len(result.get("rows", []))
+        record["truncated"] = bool(result.get("truncated"))
+    record["llm_calls"] = timer.llm_calls
+    record["sql_calls"] = timer.sql_calls
+    record["latency_ms"] = {
+        "total": round(total * 1000, 1),
+        "schema": round(schema_seconds * 1000, 1),
+        "llm": round(timer.llm_seconds * 1000, 1),
+        "sql": round(timer.sql_seconds * 1000, 1),
+        "other": round(max(total - schema_seconds - timer.llm_seconds - timer.sql_seconds, 0.0) * 1000, 1),
+    }
+    record["finished_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    return record
+
+
+async def run_batch(args) -> dict:
+    """Run every pending question, appending records as they finish."""
+    items = load_questions(args.questions)
+    done = load_checkpoint(args.out, args.retry_failed)
+    pending = [item for item in items if item["id"] not in done]
+    print(f"Questions: {len(items)} ({len(items) - len(pending)} already in {args.out}, {len(pending)} to run)")
+    if not pending:
+        return {"ran": 0, "ok": 0, "failed": 0, "llm_calls": 0, "seconds": 0.0}
+
+    pool = get_pool(args.db)
+    system, tables, synonyms = agent_context(installed_rollups(pool))
+    db = cached_database(pool, include_tables=tables)
+    linker = get_schema_linker(pool, synonyms=synonyms)
+    plans = get_plan_cache(pool) if args.plan_cache else None
+    agent = build_agent(pool, args.max_iterations, system)
+
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def limited(item):
+        async with slots:
+            return await run_question(item, agent, linker, db, plans, args.timeout)
+
+    summary = {"ran": 0, "ok": 0, "failed": 0, "llm_calls": 0}
+    started = time.perf_counter()
+    with open(args.out, "a", encoding="utf-8") as out:
+        if out.tell() and not args.out.read_bytes().endswith(b"\n"):
+            out.write("\n")  # Finish a line cut short by a crash; load_checkpoint skips it
+        for finished in asyncio.as_completed([limited(item) for item in pending]):
+            record = await finished
+            # One complete line per question, flushed to disk: this is the checkpoint
+            out.write(json.dumps(record, default=str) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+
+            summary["ran"] += 1
+            summary["ok" if record["status"] == "ok" else "failed"] += 1
+            summary["llm_calls"] += record["llm_calls"]
+            print(f"[{summary['ran']}/{len(pending)}] {record['id']} {record['status']:<7} "
+                  f"{record['latency_ms']['total']:>9.0f} ms  {record.get('source', '-')}")
+    summary["seconds"] = time.perf_counter() - started
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a file of questions with the secure analytics agent")
+    parser.add_argument("questions", type=pathlib.Path, help=".txt (one per line) or .jsonl question file")
+    parser.add_argument("--out", type=pathlib.Path, default=None,
+                        help="JSONL output and checkpoint file (default: <questions>.answers.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=4, help="questions answered at once")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds per question")
+    parser.add_argument("--max-iterations", type=int, default=8, help="agent steps per question")
+    parser.add_argument("--retry-failed", action="store_true", help="re-run questions whose record is an error/timeout")
+    parser.add_argument("--no-plan-cache", dest="plan_cache", action="store_false",
+                        help="always ask the agent, even for repeat questions")
+    parser.add_argument("--db", type=pathlib.Path, default=DEFAULT_DB_PATH, help="SQLite database file")
+    args = parser.parse_args()
+    if args.out is None:
+        args.out = args.questions.with_suffix(".answers.jsonl")
+
+    summary = asyncio.run(run_batch(args))
+    if summary["ran"]:
+        rate = summary["ran"] / summary["seconds"] * 60 if summary["seconds"] else 0.0
+        print(f"\nDone: {summary['ok']} ok, {summary['failed']} failed in {summary['seconds']:.1f}s "
+              f"({rate:.1f} questions/min, {summary['llm_calls']} LLM calls)")
+        if summary["failed"]:
+            print("Re-run with --retry-failed to retry the failed questions.")
+
+
+if __name__ == "__main__":
+    main()
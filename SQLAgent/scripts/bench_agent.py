@@ -0,0 +1,355 @@
+"""
+Offline Agent Pipeline Benchmark
+
+Measures the local cost of the agent stack - prompt construction, ReAct parsing,
+executor bookkeeping, SafeSQLTool._run and result serialization - without any
+network access. A scripted stand-in for ChatGoogleGenerativeAI replays canned
+thoughts and SQL for the 04_complex_queries.py workload, so LLM latency is zero
+and every run follows the same steps.
+
+Reports, per question:
+- wall time split into fake-LLM, tool (SafeSQLTool._run) and agent overhead
+- LLM and tool calls
+- memory: peak and net (still allocated afterwards) traced allocation
+
+And per pipeline stage (timed directly, many iterations):
+- prompt construction, ReAct output parsing, guardrail, SQL execute + bounded
+  fetch, observation serialization
+
+The tools come from 04_complex_queries.py itself (through script_runner;
+importing the script builds nothing and runs none of its demos), built on the
+benchmark's pool and caches, and the agent gets the same system message
+(analytics_context.py), so the benchmark tracks the real agent.
+
+Usage (from the SQLAgent folder):
+    python scripts/bench_agent.py [--repeat 20] [--warm-cache] [--json results.json]
+"""
+
+import argparse  # Command-line options
+import json  # Optional machine-readable output
+import pathlib  # Export folder and --json path
+import tempfile  # Export folder for the benchmarked tool
+import time  # Timing
+import tracemalloc  # Allocation measurement
+
+from langchain.agents import initialize_agent, AgentType  # Same agent setup as 04
+from langchain.schema import SystemMessage  # Same agent setup as 04
+from langchain.callbacks.base import BaseCallbackHandler  # Per-question stage timing
+from langchain_core.language_models.chat_models import BaseChatModel  # Base of the scripted model
+from langchain_core.messages import AIMessage  # Scripted replies
+from langchain_core.outputs import ChatGeneration, ChatResult  # Scripted replies
+
+from sql_executor import fetch_bounded, get_pool  # Shared read-only pool and bounded fetch
+from result_cache import get_result_cache  # Cleared between runs unless --warm-cache
+from sql_guard import inspect_sql  # Guardrail stage
+from async_executor import get_async_executor  # SafeSQLTool._arun on the benchmark's pool
+from query_log import QueryLog  # In-memory log for the benchmarked tool
+from query_budget import DEFAULT_BUDGET  # Plan-check stage and the tools' limits
+from script_runner import load_script  # Importing 04_complex_queries.py without running it
+from observation_encoder import encode_observation, estimate_tokens  # Observation encoding stage
+from analytics_context import SYSTEM  # The analytics agent's system message
+
+SCRIPT_04 = "04_complex_queries.py"
+
+# The 04_complex_queries.py workload: question -> canned SQL the "LLM" runs, in order
+# (the last question starts with a failing query, as real runs sometimes do)
+WORKLOAD = {
+    "Top 5 products by gross revenue (before refunds). Include product name and total_cents.": [
+        "SELECT p.name, SUM(oi.quantity * oi.unit_price_cents) AS total_cents FROM order_items oi "
+        "JOIN products p ON p.id = oi.product_id GROUP BY p.id ORDER BY total_cents DESC LIMIT 5",
+    ],
+    "Weekly net revenue for the last 6 weeks. Return week_start, net_cents.": [
+        "SELECT date(o.order_date, 'weekday 0', '-6 days') AS week_start, "
+        "SUM(oi.quantity * oi.unit_price_cents) - COALESCE(SUM(r.amount_cents), 0) AS net_cents "
+        "FROM orders o JOIN order_items oi ON oi.order_id = o.id LEFT JOIN refunds r ON r.order_id = o.id "
+        "GROUP BY week_start ORDER BY week_start DESC LIMIT 6",
+    ],
+    "For each customer, show their first_order_month, total_orders, last_order_date. Return 10 rows.": [
+        "SELECT c.name, strftime('%Y-%m', MIN(o.order_date)) AS first_order_month, COUNT(o.id) AS total_orders, "
+        "MAX(o.order_date) AS last_order_date FROM customers c JOIN orders o ON o.customer_id = c.id "
+        "GROUP BY c.id LIMIT 10",
+    ],
+    "Rank customers by lifetime net revenue (sum of items minus refunds). Show rank, customer, net_cents. Top 10.": [
+        "WITH items AS (SELECT o.customer_id, SUM(oi.quantity * oi.unit_price_cents) AS gross FROM orders o "
+        "JOIN order_items oi ON oi.order_id = o.id GROUP BY o.customer_id), refunded AS (SELECT o.customer_id, "
+        "SUM(r.amount_cents) AS refunded FROM refunds r JOIN orders o ON o.id = r.order_id GROUP BY o.customer_id) "
+        "SELECT RANK() OVER (ORDER BY gross - COALESCE(refunded, 0) DESC) AS rank, c.name, "
+        "gross - COALESCE(refunded, 0) AS net_cents FROM items JOIN customers c ON c.id = items.customer_id "
+        "LEFT JOIN refunded USING (customer_id) LIMIT 10",
+    ],
+    "What categories drive the most revenue?": [
+        "SELECT p.category, SUM(oi.quantity * oi.unit_price_cents) AS revenue_cents FROM order_items oi "
+        "JOIN products p ON p.id = oi.product_id GROUP BY p.category ORDER BY revenue_cents DESC",
+    ],
+    "Break the top category down by product with totals.": [
+        "SELECT p.name, SUM(oi.quantity * oi.price_cents) AS total_cents FROM order_items oi "
+        "JOIN products p ON p.id = oi.product_id GROUP BY p.id",
+        "SELECT p.name, SUM(oi.quantity * oi.unit_price_cents) AS total_cents FROM order_items oi "
+        "JOIN products p ON p.id = oi.product_id WHERE p.category = (SELECT p2.category FROM order_items oi2 "
+        "JOIN products p2 ON p2.id = oi2.product_id GROUP BY p2.category "
+        "ORDER BY SUM(oi2.quantity * oi2.unit_price_cents) DESC LIMIT 1) GROUP BY p.id ORDER BY total_cents DESC",
+    ],
+}
+
+
+def script_for(sqls: list) -> list:
+    """ReAct replies for one question: one Action per SQL, then a Final Answer."""
+    replies = [
+        f"Thought: I need to query the database.\nAction: execute_sql\nAction Input: {sql}"
+        for sql in sqls
+    ]
+    replies.append("Thought: I now know the final answer\nFinal Answer: The results are shown above.")
+    return replies
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for ChatGoogleGenerativeAI.
+
+    Replies are queued with load() and returned one per call, whatever the
+    prompt says. Running out of replies is an error (the agent took a step the
+    script didn't expect).
+    """
+
+    replies: list = []
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def load(self, replies: list):
+        """Queue the replies for the next question."""
+        self.replies = list(replies)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if not self.replies:
+            raise RuntimeError("scripted model ran out of replies")
+        self.calls += 1
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.replies.pop(0)))])
+
+
+class StageTimer(BaseCallbackHandler):
+    """Counts LLM and tool calls for one question and times them."""
+
+    def __init__(self):
+        self.llm_calls = 0
+        self.tool_calls = 0
+        self.llm_seconds = 0.0
+        self.tool_seconds = 0.0
+        self._started = {}  # run_id -> start time
+
+    def _stop(self, run_id) -> float:
+        started = self._started.pop(run_id, None)
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self.llm_calls += 1
+        self._started[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self.llm_calls += 1
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self.llm_seconds += self._stop(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.llm_seconds += self._stop(run_id)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self.tool_calls += 1
+        self._started[run_id] = time.perf_counter()
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self.tool_seconds += self._stop(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self.tool_seconds += self._stop(run_id)
+
+
+def load_tools(pool) -> list:
+    """04_complex_queries.py's agent tools on the given pool, without running the script's demos."""
+    return load_script(SCRIPT_04).analytics_tools(
+        pool=pool,
+        result_cache=get_result_cache(pool),
+        async_executor=get_async_executor(pool),
+        query_log=QueryLog(),  # In-memory: benchmark runs don't belong in the real workload
+        budget=DEFAULT_BUDGET,
+        export_dir=pathlib.Path(tempfile.gettempdir()) / "sql_agent_exports",
+        shards=None,  # Always the single database, whatever SQL_AGENT_SHARDS says
+    )
+
+
+def build_agent(llm, tools):
+    """Agent configured like 04_complex_queries.py (non-verbose, so printing isn't measured)."""
+    return initialize_agent(
+        tools=tools,
+        llm=llm,
+        agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+        verbose=False,
+        agent_kwargs={"system_message": SystemMessage(content=SYSTEM)},
+        return_intermediate_steps=True,
+    )
+
+
+def bench_questions(agent, llm, cache, repeat: int, warm_cache: bool) -> list:
+    """
+    End-to-end agent runs per question; returns one result dict per question.
+
+    Timings come from `repeat` untraced runs; memory from one extra run under
+    tracemalloc (which slows Python down too much to time alongside).
+    """
+    results = []
+    for question, sqls in WORKLOAD.items():
+        replies = script_for(sqls)
+        wall = llm_time = tool_time = 0.0
+        timer = None
+        for _ in range(repeat):
+            if not warm_cache:
+                cache.clear()
+            llm.load(replies)
+            timer = StageTimer()
+            started = time.perf_counter()
+            agent.invoke({"input": question}, config={"callbacks": [timer]})
+            wall += time.perf_counter() - started
+            llm_time += timer.llm_seconds
+            tool_time += timer.tool_seconds
+
+        if not warm_cache:
+            cache.clear()
+        llm.load(replies)
+        tracemalloc.start()
+        agent.invoke({"input": question})
+        net, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results.append({
+            "question": question,
+            "wall_ms": wall / repeat * 1000,
+            "llm_ms": llm_time / repeat * 1000,
+            "tool_ms": tool_time / repeat * 1000,
+            "agent_ms": (wall - llm_time - tool_time) / repeat * 1000,
+            "llm_calls": timer.llm_calls,
+            "tool_calls": timer.tool_calls,
+            "peak_kib": peak / 1024,
+            "net_kib": net / 1024,
+        })
+    return results
+
+
+def _per_call(fn, items, seconds: float = 0.2) -> float:
+    """Average microseconds per call of fn over items, repeated for ~`seconds`."""
+    calls = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        for item in items:
+            fn(item)
+        calls += len(items)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def bench_stages(agent, pool) -> dict:
+    """Time each local pipeline stage directly (microseconds per call)."""
+    sqls = [sql for sqls in WORKLOAD.values() for sql in sqls]
+    valid = [inspect_sql(sql).bounded_sql() for sql in sqls]
+    with pool.connection() as conn:
+        valid = [sql for sql in valid if _runs(conn, sql)]
+        payloads = [fetch_bounded(conn.execute(sql)) for sql in valid]
+    replies = [reply for sqls in WORKLOAD.values() for reply in script_for(sqls)]
+    stages = {}
+
+    # Prompt construction: the ReAct prompt with a one-step scratchpad
+    prompt = getattr(getattr(agent.agent, "llm_chain", None), "prompt", None)
+    if prompt is not None:
+        scratchpad = f"{replies[0]}\nObservation: {encode_observation(payloads[0])}\nThought:"
+        stages["prompt"] = _per_call(
+            lambda q: prompt.format(input=q, agent_scratchpad=scratchpad), list(WORKLOAD))
+
+    # ReAct parsing of the model's reply
+    parser = getattr(agent.agent, "output_parser", None)
+    if parser is not None:
+        stages["react_parse"] = _per_call(parser.parse, replies)
+
+    stages["guard"] = _per_call(inspect_sql.__wrapped__, sqls)
+
+    def execute(sql):
+        with pool.connection() as conn:
+            fetch_bounded(conn.execute(sql))
+    stages["sql_fetch"] = _per_call(execute, valid)
+
+    # Query budget pre-check (EXPLAIN QUERY PLAN), paid once per executed statement
+    def check_plan(sql):
+        with pool.connection() as conn:
+            DEFAULT_BUDGET.check_plan(conn, sql)
+    stages["budget_plan_check"] = _per_call(check_plan, valid)
+
+    # The observation the agent appends to its scratchpad: str() of the encoded payload
+    # ("serialize_repr" is the plain dict repr it replaced)
+    stages["serialize"] = _per_call(lambda payload: str(encode_observation(payload)), payloads)
+    stages["serialize_repr"] = _per_call(str, payloads)
+    return stages
+
+
+def observation_tokens(pool) -> dict:
+    """Estimated observation tokens of the workload's queries, as dict repr and encoded."""
+    valid = [inspect_sql(sql).bounded_sql() for sqls in WORKLOAD.values() for sql in sqls]
+    with pool.connection() as conn:
+        payloads = [fetch_bounded(conn.execute(sql)) for sql in valid if _runs(conn, sql)]
+    return {"repr": sum(estimate_tokens(str(payload)) for payload in payloads),
+            "encoded": sum(estimate_tokens(str(encode_observation(payload))) for payload in payloads)}
+
+
+def _runs(conn, sql: str) -> bool:
+    """True if the SQL executes (the deliberate failing query is left out of stage timings)."""
+    try:
+        conn.execute(sql).fetchone()
+        return True
+    except Exception:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the agent pipeline offline with a scripted LLM")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per question")
+    parser.add_argument("--warm-cache", action="store_true", help="keep the result cache between runs")
+    parser.add_argument("--json", type=pathlib.Path, help="also write the results to this file")
+    args = parser.parse_args()
+
+    pool = get_pool()
+    cache = get_result_cache(pool)
+    llm = ScriptedChatModel()
+    agent = build_agent(llm, load_tools(pool))
+
+    # Warm-up run (imports, prompt templates) outside the measurements
+    llm.load(script_for([]))
+    agent.invoke({"input": "warm-up"})
+
+    questions = bench_questions(agent, llm, cache, args.repeat, args.warm_cache)
+    stages = bench_stages(agent, pool)
+    tokens = observation_tokens(pool)
+
+    print(f"Agent runs ({args.repeat} per question, result cache {'warm' if args.warm_cache else 'cleared'}):")
+    print(f"{'question':<42}{'wall ms':>9}{'llm ms':>8}{'tool ms':>9}{'agent ms':>10}"
+          f"{'llm':>5}{'tools':>6}{'peak KiB':>10}{'net KiB':>9}")
+    for r in questions:
+        print(f"{r['question'][:40]:<42}{r['wall_ms']:>9.2f}{r['llm_ms']:>8.2f}{r['tool_ms']:>9.2f}"
+              f"{r['agent_ms']:>10.2f}{r['llm_calls']:>5}{r['tool_calls']:>6}{r['peak_kib']:>10.1f}{r['net_kib']:>9.1f}")
+    total = sum(r["wall_ms"] for r in questions)
+    print(f"{'total':<42}{total:>9.2f}")
+
+    print("\nPipeline stages (µs per call):")
+    for name, micros in stages.items():
+        print(f"  {name:<12}{micros:>10.1f}")
+
+    print(f"\nObservation tokens (estimated, whole workload): {tokens['repr']:,} as dict repr, "
+          f"{tokens['encoded']:,} encoded")
+
+    if args.json:
+        args.json.write_text(json.dumps({"questions": questions, "stages_us": stages, "observation_tokens": tokens},
+                                        indent=2))
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Guardrail Validation Microbenchmark
+
+Measures how many SQL statements per second each validator can check:
+
+- legacy:   the original stack of re.search/re.match passes from SafeSQLTool
+- tokenizer: sql_guard.inspect_sql without memoization (every call tokenizes)
+- memoized: sql_guard.inspect_sql as the agents use it (repeated SQL hits the LRU)
+
+The workload mixes the analytics queries from 04_complex_queries.py with large
+generated statements (wide UNION ALL reports) of the kind LLMs produce.
+It also lists statements where the legacy checks and the tokenizer disagree.
+
+Usage (from the SQLAgent folder):
+    python scripts/bench_sql_guard.py [--seconds 1.0]
+"""
+
+import argparse  # Command-line options
+import re  # Legacy validator
+import time  # Timing
+
+from sql_guard import inspect_sql
+
+
+def legacy_check(sql: str):
+    """The pre-sql_guard SafeSQLTool validation, kept here for comparison."""
+    s = sql.strip().rstrip(";")
+    if re.search(r"\b(INSERT|UPDATE|DELETE|DROP|TRUNCATE|ALTER|CREATE|REPLACE)\b", s, re.I):
+        return "ERROR: write operations are not allowed."
+    if ";" in s:
+        return "ERROR: multiple statements are not allowed."
+    if not re.match(r"(?is)^\s*select\b", s):
+        return "ERROR: only SELECT statements are allowed."
+    if not re.search(r"\blimit\s+\d+\b", s, re.I) and not re.search(r"\bcount\(|\bgroup\s+by\b|\bsum\(|\bavg\(|\bmax\(|\bmin\(", s, re.I):
+        s += " LIMIT 200"
+    return s
+
+
+def tokenizer_check(sql: str):
+    """sql_guard without the memo cache."""
+    verdict = inspect_sql.__wrapped__(sql)
+    return verdict.error if not verdict.allowed else verdict.bounded_sql()
+
+
+def memoized_check(sql: str):
+    """sql_guard as SafeSQLTool calls it."""
+    verdict = inspect_sql(sql)
+    return verdict.error if not verdict.allowed else verdict.bounded_sql()
+
+
+WORKLOAD = [
+    "SELECT p.name, SUM(oi.quantity * oi.unit_price_cents) AS total_cents FROM order_items oi "
+    "JOIN products p ON p.id = oi.product_id GROUP BY p.id ORDER BY total_cents DESC LIMIT 5",
+    "SELECT date(o.order_date, 'weekday 0', '-6 days') AS week_start, "
+    "SUM(oi.quantity * oi.unit_price_cents) - COALESCE(SUM(r.amount_cents), 0) AS net_cents "
+    "FROM orders o JOIN order_items oi ON oi.order_id = o.id LEFT JOIN refunds r ON r.order_id = o.id "
+    "GROUP BY week_start ORDER BY week_start DESC LIMIT 6",
+    "SELECT c.name, strftime('%Y-%m', MIN(o.order_date)) AS first_order_month, COUNT(o.id) AS total_orders, "
+    "MAX(o.order_date) AS last_order_date FROM customers c JOIN orders o ON o.customer_id = c.id "
+    "GROUP BY c.id LIMIT 10",
+    "WITH items AS (SELECT o.customer_id, SUM(oi.quantity * oi.unit_price_cents) AS gross FROM orders o "
+    "JOIN order_items oi ON oi.order_id = o.id GROUP BY o.customer_id), refunded AS (SELECT o.customer_id, "
+    "SUM(r.amount_cents) AS refunded FROM refunds r JOIN orders o ON o.id = r.order_id GROUP BY o.customer_id) "
+    "SELECT RANK() OVER (ORDER BY gross - COALESCE(refunded, 0) DESC) AS rank, c.name, "
+    "gross - COALESCE(refunded, 0) AS net_cents FROM items JOIN customers c ON c.id = items.customer_id "
+    "LEFT JOIN refunded USING (customer_id) LIMIT 10",
+    "SELECT name, created_at, region FROM customers",
+    "SELECT replace(name, ' ', '-') AS slug FROM products",
+    "SELECT * FROM refunds WHERE reason = 'customer asked us to delete the order'",
+    "DELETE FROM orders WHERE order_date < '2025-07-01'",
+    "SELECT 1; DROP TABLE orders",
+]
+
+# Large generated report: 200 UNION ALL branches (~40 KB of SQL)
+WORKLOAD.append(" UNION ALL ".join(
+    f"SELECT '{region}' AS region, {i} AS bucket, COUNT(*) AS n FROM orders o "
+    f"JOIN customers c ON c.id = o.customer_id WHERE c.region = '{region}' AND o.status = 'paid'"
+    for i, region in enumerate(["APAC", "NA", "EU", "LATAM"] * 50)
+))
+
+
+def measure(check, seconds: float) -> tuple:
+    """Run the workload repeatedly for ~`seconds`; return (validations/s, MB/s)."""
+    total_bytes = sum(len(sql) for sql in WORKLOAD)
+    rounds = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        for sql in WORKLOAD:
+            check(sql)
+        rounds += 1
+    elapsed = time.perf_counter() - started
+    return rounds * len(WORKLOAD) / elapsed, rounds * total_bytes / elapsed / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SQL guardrail validation throughput")
+    parser.add_argument("--seconds", type=float, default=1.0, help="time budget per validator")
+    args = parser.parse_args()
+
+    print(f"Workload: {len(WORKLOAD)} statements, {sum(len(s) for s in WORKLOAD):,} bytes per round")
+    print(f"{'validator':<12}{'validations/s':>16}{'MB/s':>10}")
+    for name, check in [("legacy", legacy_check), ("tokenizer", tokenizer_check), ("memoized", memoized_check)]:
+        rate, mbps = measure(check, args.seconds)
+        print(f"{name:<12}{rate:>16,.0f}{mbps:>10.1f}")
+
+    print("\nVerdict differences (legacy vs tokenizer):")
+    for sql in WORKLOAD:
+        old, new = legacy_check(sql), tokenizer_check(sql)
+        if old.startswith("ERROR") != new.startswith("ERROR"):
+            print(f"  {sql[:70]!r}")
+            print(f"    legacy:    {old[:70]}")
+            print(f"    tokenizer: {new[:70]}")
+
+
+if __name__ == "__main__":
+    main()
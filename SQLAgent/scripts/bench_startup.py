@@ -0,0 +1,126 @@
+"""
+Startup Benchmark: Time to Menu
+
+Measures how long `python main.py` takes to put the main menu on screen, and
+which imports that time goes to. The CLI is started the way a user starts it
+(welcome screen, environment check, first menu). The benchmark answers "7"
+(exit) and times the first "Enter your choice" prompt.
+
+- Time to menu: median and worst of `--runs` cold starts, measured from
+  process launch (interpreter startup included) to the prompt
+- Import breakdown: one extra run under `python -X importtime`, with the
+  cumulative import time of each top-level package on the way to the menu
+- Budget: the run fails (exit status 1) when the median time to menu is over
+  `--budget-ms`, so the number can be tracked between commits
+
+The background preload thread is off by default (SQL_AGENT_PRELOAD=0), so the
+numbers are the critical path alone; `--preload` measures with it.
+
+Usage (from the project root):
+    python SQLAgent/scripts/bench_startup.py [--runs 5] [--budget-ms 500] [--preload] [--json startup.json]
+"""
+
+import argparse  # Command-line options
+import json  # Optional machine-readable output
+import os  # Child environment
+import pathlib  # Project paths
+import re  # -X importtime output
+import statistics  # Median
+import subprocess  # The CLI under test
+import sys  # Interpreter path
+import time  # Timing
+
+ROOT = pathlib.Path(__file__).resolve().parents[2]
+
+# Printed by the CLI's main menu input(); reaching it means the menu is on screen
+MENU_PROMPT = b"Enter your choice"
+
+# Time-to-menu budget (milliseconds)
+DEFAULT_BUDGET_MS = 500
+
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def start_cli(preload: bool, importtime: bool = False):
+    """Launch main.py with the exit choice already on stdin."""
+    env = dict(os.environ, PYTHONUNBUFFERED="1", TERM="dumb",
+               SQL_AGENT_PRELOAD="1" if preload else "0")
+    # main.py stops before the menu without a key; the benchmark never calls the LLM
+    env.setdefault("GOOGLE_API_KEY", "startup-benchmark")
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["main.py"]
+    choice, answer = os.pipe()
+    os.write(answer, b"7\n")
+    os.close(answer)
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdin=choice, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE if importtime else subprocess.DEVNULL)
+    os.close(choice)
+    return process
+
+
+def time_to_menu(preload: bool) -> float:
+    """Seconds from process launch to the main-menu prompt."""
+    started = time.perf_counter()
+    process = start_cli(preload)
+    seen = b""
+    while MENU_PROMPT not in seen:
+        chunk = process.stdout.read1(4096)
+        if not chunk:
+            process.wait()
+            raise RuntimeError(f"main.py exited (status {process.returncode}) before showing the menu:\n"
+                               f"{seen.decode(errors='replace')[-500:]}")
+        seen += chunk
+    elapsed = time.perf_counter() - started
+    process.stdout.read()
+    process.wait()
+    return elapsed
+
+
+def import_breakdown(preload: bool) -> list:
+    """
+    Cumulative import time per top-level package, from one `-X importtime` run.
+
+    Returns:
+        list: [(package, milliseconds)] sorted by time, slowest first
+    """
+    process = start_cli(preload, importtime=True)
+    _, stderr = process.communicate()
+    packages = {}
+    for line in stderr.decode(errors="replace").splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match and len(match.group(3)) == 1:  # Imported directly, not by another module
+            package = match.group(4).split(".")[0]
+            packages[package] = packages.get(package, 0) + int(match.group(2)) / 1000
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure time to the CLI main menu and its import breakdown")
+    parser.add_argument("--runs", type=int, default=5, help="cold starts to time")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="median time-to-menu budget")
+    parser.add_argument("--preload", action="store_true", help="leave the background preload thread on")
+    parser.add_argument("--top", type=int, default=15, help="packages listed in the import breakdown")
+    parser.add_argument("--json", type=pathlib.Path, help="also write the results to this file")
+    args = parser.parse_args()
+
+    times = [time_to_menu(args.preload) * 1000 for _ in range(args.runs)]
+    median = statistics.median(times)
+    imports = import_breakdown(args.preload)
+
+    print(f"Time to menu ({args.runs} runs, preload {'on' if args.preload else 'off'}): "
+          f"median {median:.0f} ms, worst {max(times):.0f} ms, budget {args.budget_ms:.0f} ms")
+    total = sum(ms for _, ms in imports)
+    print(f"\nImports on the way to the menu (cumulative ms, -X importtime, total {total:.0f} ms):")
+    for package, ms in imports[:args.top]:
+        print(f"  {package:<28}{ms:>8.1f}")
+
+    within = median <= args.budget_ms
+    print(f"\n{'✅ Within' if within else '❌ Over'} the time-to-menu budget")
+    if args.json:
+        args.json.write_text(json.dumps({"time_to_menu_ms": times, "median_ms": median,
+                                         "budget_ms": args.budget_ms, "imports_ms": dict(imports)}, indent=2))
+        print(f"Results written to {args.json}")
+    sys.exit(0 if within else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Cancellable Interactive Queries
+
+The CLI's Direct SQL Query and Custom Query views used to call
+`cursor.execute()` on the input thread. A bad query on a big table pinned the
+CLI, and Ctrl-C unwound the whole menu loop instead of stopping the statement.
+
+This module runs the statement on a worker thread and keeps the input thread
+free to:
+- show live progress (elapsed time, SQLite VM steps, rows fetched) once the
+  query has run for a moment
+- turn Ctrl-C into `connection.interrupt()`, so SQLite stops at its next VM step
+  and the caller gets QueryCancelled instead of a KeyboardInterrupt
+- enforce a per-query timeout, using the wall-clock budget from query_budget
+
+Usage:
+    from cancellable_query import QueryCancelled, run_query
+
+    try:
+        result = run_query(lambda: sqlite3.connect(path, check_same_thread=False), fetch_all, timeout=30)
+    except QueryCancelled:
+        print("cancelled")
+"""
+
+import dataclasses  # Interactive variant of the default budget
+import sqlite3  # Interrupted-statement errors
+import sys  # Progress line
+import threading  # Worker thread
+import time  # Elapsed time
+
+from query_budget import DEFAULT_BUDGET  # Wall-clock limit and VM-step counting
+
+# Seconds a query runs before the progress line appears (fast queries print nothing)
+PROGRESS_AFTER = 0.5
+PROGRESS_EVERY = 0.2
+
+
+class QueryCancelled(Exception):
+    """The user pressed Ctrl-C and the statement was interrupted."""
+
+    def __init__(self, elapsed: float):
+        self.elapsed = elapsed
+        super().__init__(f"query cancelled after {elapsed:.1f}s")
+
+
+class QueryProgress:
+    """
+    Live counters of one running statement (written by the worker, read by the input thread).
+
+    Attributes:
+        rows (int): Rows fetched so far (the work function increments it)
+        meter: The budget meter counting VM steps, set once the statement starts
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.rows = 0
+        self.meter = None
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def steps(self) -> int:
+        return self.meter.steps if self.meter is not None else 0
+
+    def line(self) -> str:
+        return f"⏳ {self.elapsed:6.1f}s  {self.steps:>14,} VM steps  {self.rows:>10,} rows  (Ctrl-C to cancel)"
+
+
+def fetch_all(conn, cursor, progress: QueryProgress, chunk_size: int = 500) -> list:
+    """Default work step: fetch every row in chunks, counting them for the progress line."""
+    rows = []
+    while True:
+        chunk = cursor.fetchmany(chunk_size)
+        if not chunk:
+            return rows
+        rows.extend(chunk)
+        progress.rows += len(chunk)
+
+
+def run_query(connect, sql: str, work=fetch_all, timeout: float | None = None, show_progress: bool = True):
+    """
+    Execute one statement on a worker thread, cancellable with Ctrl-C.
+
+    Args:
+        connect: Callable returning the connection to use (opened with check_same_thread=False)
+        sql (str): The statement
+        work: work(conn, cursor, progress) -> result, run on the worker after execute()
+            (fetch rows, commit, ...); increment progress.rows while fetching
+        timeout (float | None): Seconds before the statement is interrupted (None = no limit)
+        show_progress (bool): Print the live progress line for slow queries
+
+    Returns:
+        tuple: (result of work, cursor.description, QueryProgress)
+
+    Raises:
+        QueryCancelled: Ctrl-C interrupted the statement
+        BudgetExceeded: The timeout (budget "timeout") or the heap/length limits were hit
+        sqlite3.Error: The statement itself failed
+    """
+    conn = connect()
+
+    def task(progress):
+        cursor = conn.execute(sql)
+        return work(conn, cursor, progress), cursor.description
+
+    try:
+        (result, description), progress = run_on(conn, task, timeout, show_progress)
+    finally:
+        conn.close()
+    return result, description, progress
+
+
+def run_on(conn, task, timeout: float | None = None, show_progress: bool = True):
+    """
+    Run task(progress) against an open connection on a worker thread, cancellable with Ctrl-C.
+
+    The connection stays open, so a caller can keep a cursor across calls and
+    fetch more of it later (the result pager does this page by page).
+
+    Args:
+        conn: Connection the task uses (opened with check_same_thread=False)
+        task: task(progress) -> result; increment progress.rows while fetching
+        timeout (float | None): Seconds before the task's statement is interrupted (None = no limit)
+        show_progress (bool): Print the live progress line for slow tasks
+
+    Returns:
+        tuple: (result of task, QueryProgress)
+
+    Raises:
+        QueryCancelled, BudgetExceeded, sqlite3.Error: As for run_query
+    """
+    # Only the wall clock is limited here: the user typed the query and can cancel it
+    budget = dataclasses.replace(DEFAULT_BUDGET, timeout=timeout, max_vm_steps=None, max_cross_join_rows=None)
+    progress = QueryProgress()
+    outcome = {}
+    done = threading.Event()  # Waited on instead of join(): a Ctrl-C inside join() can corrupt is_alive()
+
+    def worker():
+        try:
+            with budget.limit(conn) as meter:
+                progress.meter = meter
+                outcome["result"] = task(progress)
+        except BaseException as e:  # Re-raised on the input thread
+            outcome["error"] = e
+        finally:
+            done.set()
+
+    thread = threading.Thread(target=worker, name="sql-interactive", daemon=True)
+    thread.start()
+    shown = False
+    cancelled = False
+    try:
+        while not done.is_set():
+            try:
+                if not done.wait(PROGRESS_EVERY) and show_progress and progress.elapsed >= PROGRESS_AFTER:
+                    sys.stdout.write("\r" + progress.line())
+                    sys.stdout.flush()
+                    shown = True
+            except KeyboardInterrupt:
+                cancelled = True
+                conn.interrupt()  # The worker's execute/fetch raises "interrupted" at the next VM step
+    finally:
+        if shown:
+            sys.stdout.write("\r" + " " * len(progress.line()) + "\r")
+            sys.stdout.flush()
+
+    error = outcome.get("error")
+    if cancelled and isinstance(error, sqlite3.OperationalError):
+        raise QueryCancelled(progress.elapsed) from error
+    if error is not None:
+        raise error
+    return outcome["result"], progress
@@ -0,0 +1,401 @@
+"""
+Synthetic E-Commerce Data Generator
+
+`sql_agent_seed.sql` has a few dozen rows, which says nothing about how the
+agent's queries behave at production volume. This script builds a database with
+the same six-table schema at a chosen scale, measured in order_items rows
+(1M, 10M, 100M, ...), with the other tables sized to match.
+
+Realism:
+- Regions, categories, payment methods and order statuses follow skewed weights
+- Product popularity is Zipf-like; a few products dominate sales
+- Order volume grows over two years, with weekend and November/December peaks
+- Early customers order more often than recent ones
+- Everything is referentially consistent: order dates follow the customer's
+  sign-up, item prices follow product prices (with occasional discounts),
+  payments match item totals, refunds exist only for paid/refunded orders and
+  happen after the order
+
+Bulk loading:
+- Schema comes from sql_agent_seed.sql (the part before the seed rows)
+- Rows are generated in primary-key order and inserted with executemany() in
+  large batches, committing every `--commit-rows` rows
+- Journal and fsync are off during the load and foreign keys are not checked per
+  row; one `PRAGMA foreign_key_check` at the end validates the whole file
+- The finished database is switched to WAL (as the connection pool expects)
+
+Usage (from the SQLAgent folder):
+    python scripts/generate_data.py --scale 1M
+    python scripts/generate_data.py --scale 10M --out /data/sql_agent_10m.db
+    SQL_AGENT_DB=sql_agent_scale_1m.db python scripts/04_complex_queries.py
+"""
+
+import argparse  # Command-line options
+import bisect  # Weighted sampling by cumulative weights
+import datetime  # Order, payment and refund dates
+import itertools  # Cumulative weights
+import math  # Trend and seasonality curves
+import pathlib  # Output and seed file locations
+import random  # Deterministic pseudo-random generation
+import sqlite3  # Bulk loading
+import time  # Load timing
+
+SQLAGENT_DIR = pathlib.Path(__file__).resolve().parents[1]
+SEED_SQL = SQLAGENT_DIR / "sql_agent_seed.sql"
+
+# Time span covered by the generated orders
+START_DATE = datetime.date(2023, 9, 1)
+END_DATE = datetime.date(2025, 8, 31)
+
+# Table sizes relative to order_items
+ITEMS_PER_ORDER = 2.5  # average; actual counts are 1-6, skewed low
+ORDERS_PER_CUSTOMER = 8
+ITEMS_PER_PRODUCT = 1000  # products = order_items / 1000, clamped below
+MIN_PRODUCTS, MAX_PRODUCTS = 200, 50_000
+
+REGIONS = {"APAC": 35, "NA": 30, "EU": 24, "LATAM": 8, "MEA": 3}
+STATUSES = {"paid": 82, "canceled": 8, "pending": 5, "refunded": 5}
+METHODS = {"card": 70, "paypal": 20, "bank_transfer": 6, "gift_card": 4}
+REFUND_REASONS = {"damaged": 30, "late delivery": 25, "wrong item": 20, "changed mind": 20, "duplicate charge": 5}
+QUANTITIES = {1: 70, 2: 18, 3: 7, 4: 3, 5: 2}
+ITEM_COUNTS = {1: 30, 2: 28, 3: 20, 4: 12, 5: 6, 6: 4}  # mean ~2.5
+
+# category -> (share of the catalog, (min, max) price in cents, product nouns)
+CATEGORIES = {
+    "Electronics": (25, (1999, 149999), ["Headphones", "Speaker", "Charger", "Fitness Band", "Keyboard", "Webcam"]),
+    "Home": (22, (999, 29999), ["Lamp", "Mug", "Throw", "Vase", "Candle", "Planter"]),
+    "Apparel": (20, (1499, 19999), ["Jacket", "Backpack", "Sneakers", "Hoodie", "Cap", "Scarf"]),
+    "Beauty": (10, (599, 8999), ["Serum", "Cleanser", "Palette", "Balm", "Mist"]),
+    "Sports": (9, (1499, 39999), ["Yoga Mat", "Bottle", "Racket", "Helmet", "Dumbbells"]),
+    "Books": (8, (499, 4999), ["Novel", "Cookbook", "Atlas", "Journal"]),
+    "Toys": (6, (799, 12999), ["Puzzle", "Robot Kit", "Board Game", "Plush"]),
+}
+ADJECTIVES = ["Aurora", "Nimbus", "Terra", "Zephyr", "Pulse", "Orbit", "Nova", "Ember", "Lumen", "Atlas",
+              "Cobalt", "Summit", "Willow", "Vertex", "Harbor", "Solstice", "Quartz", "Drift", "Echo", "Maple"]
+FIRST_NAMES = ["Ayesha", "Bilal", "Chris", "Diana", "Ethan", "Fatima", "Gabriel", "Hana", "Ivan", "Jin",
+               "Kofi", "Lucia", "Mateo", "Nadia", "Omar", "Priya", "Quinn", "Rosa", "Sven", "Tariq",
+               "Umar", "Valeria", "Wei", "Ximena", "Yusuf", "Zara"]
+LAST_NAMES = ["Khan", "Ahmed", "Evans", "Prince", "Lee", "Noor", "Garcia", "Kim", "Petrov", "Wang",
+              "Mensah", "Rossi", "Silva", "Haddad", "Patel", "Murphy", "Santos", "Berg", "Ali", "Chen"]
+
+
+def parse_scale(text: str) -> int:
+    """'1M' -> 1_000_000, '250k' -> 250_000, '5000' -> 5000."""
+    text = text.strip().lower().replace("_", "")
+    factor = {"k": 1_000, "m": 1_000_000, "b": 1_000_000_000}.get(text[-1:], 1)
+    number = text[:-1] if factor != 1 else text
+    value = int(float(number) * factor)
+    if value <= 0:
+        raise argparse.ArgumentTypeError(f"scale must be positive: {text!r}")
+    return value
+
+
+class Weighted:
+    """Fast repeated sampling from a fixed weighted population."""
+
+    def __init__(self, weights: dict):
+        self.values = list(weights)
+        self.cumulative = list(itertools.accumulate(weights.values()))
+        self.total = self.cumulative[-1]
+
+    def draw(self, rng: random.Random):
+        return self.values[bisect.bisect(self.cumulative, rng.random() * self.total)]
+
+
+def daily_weights() -> list:
+    """Relative order volume per day: growth trend, weekend lift, holiday peak."""
+    days = (END_DATE - START_DATE).days + 1
+    weights = []
+    for offset in range(days):
+        day = START_DATE + datetime.timedelta(days=offset)
+        trend = 1.0 + 1.5 * offset / days  # volume grows ~2.5x over the period
+        weekly = 1.25 if day.weekday() >= 5 else 1.0
+        holiday = 1.0 + 0.8 * math.exp(-((day.timetuple().tm_yday - 335) / 18) ** 2)  # late-Nov/Dec peak
+        weights.append(trend * weekly * holiday)
+    return weights
+
+
+def spread(total: int, weights: list, rng: random.Random) -> list:
+    """Split `total` into per-slot counts proportional to weights (stochastic rounding)."""
+    scale = total / sum(weights)
+    counts = []
+    for weight in weights:
+        expected = weight * scale
+        count = int(expected)
+        if rng.random() < expected - count:
+            count += 1
+        counts.append(count)
+    return counts
+
+
+class Generator:
+    """
+    Generates the six tables in primary-key order for one scale.
+
+    Attributes:
+        order_items (int): Target order_items rows (actual count is within a few percent)
+        orders, customers, products (int): Derived table sizes
+    """
+
+    def __init__(self, order_items: int, seed: int = 42):
+        self.rng = random.Random(seed)
+        self.order_items = order_items
+        self.orders = max(12, int(order_items / ITEMS_PER_ORDER))
+        self.customers = max(6, self.orders // ORDERS_PER_CUSTOMER)
+        self.products = min(MAX_PRODUCTS, max(MIN_PRODUCTS, order_items // ITEMS_PER_PRODUCT))
+
+        self.regions = Weighted(REGIONS)
+        self.statuses = Weighted(STATUSES)
+        self.methods = Weighted(METHODS)
+        self.reasons = Weighted(REFUND_REASONS)
+        self.quantities = Weighted(QUANTITIES)
+        self.item_counts = Weighted(ITEM_COUNTS)
+
+        self.day_weights = daily_weights()
+        self.product_prices = []  # index = product id - 1
+        self.product_pick = None  # Zipf-like popularity, built in product_rows()
+        self.customer_days = []  # sign-up day offset per customer (sorted)
+
+    def product_rows(self):
+        """products: (id, name, category, price_cents)."""
+        categories = Weighted({name: spec[0] for name, spec in CATEGORIES.items()})
+        popularity = {}
+        for product_id in range(1, self.products + 1):
+            category = categories.draw(self.rng)
+            _, (low, high), nouns = CATEGORIES[category]
+            # Log-uniform prices, rounded to .99
+            price = int(math.exp(self.rng.uniform(math.log(low), math.log(high)))) // 100 * 100 + 99
+            self.product_prices.append(price)
+            popularity[product_id] = 1.0 / product_id ** 0.9
+            name = f"{self.rng.choice(ADJECTIVES)} {self.rng.choice(nouns)}"
+            if product_id > len(ADJECTIVES) * 4:
+                name += f" {product_id}"
+            yield (product_id, name, category, price)
+        # Shuffle which ids are popular so popularity isn't tied to the id order
+        ids = list(popularity)
+        self.rng.shuffle(ids)
+        self.product_pick = Weighted(dict(zip(ids, popularity.values())))
+
+    def customer_rows(self):
+        """customers: (id, name, email, created_at, region), ordered by sign-up date."""
+        # 5% existed before the period starts; the rest sign up following order volume
+        early = max(1, self.customers // 20)
+        counts = spread(self.customers - early, self.day_weights, self.rng)
+        self.customer_days = [0] * early + [day for day, n in enumerate(counts) for _ in range(n)]
+        self.customers = len(self.customer_days)
+        for customer_id, day in enumerate(self.customer_days, start=1):
+            name = f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}"
+            created = START_DATE + datetime.timedelta(days=day)
+            yield (customer_id, name, f"customer{customer_id}@example.com", created.isoformat(),
+                   self.regions.draw(self.rng))
+
+    def order_rows(self):
+        """
+        Orders and their dependent rows, in order-id (= date) order.
+
+        Yields:
+            tuple: (table, row) for orders, order_items, payments and refunds
+        """
+        rng = self.rng
+        per_day = spread(self.orders, self.day_weights, rng)
+        order_id = item_id = payment_id = refund_id = 0
+        signed_up = 0  # customers whose sign-up day is <= the current day
+
+        for day, n_orders in enumerate(per_day):
+            while signed_up < self.customers and self.customer_days[signed_up] <= day:
+                signed_up += 1
+            date = START_DATE + datetime.timedelta(days=day)
+            date_text = date.isoformat()
+
+            for _ in range(n_orders):
+                order_id += 1
+                # Long-standing customers (low ids) place more orders
+                customer_id = 1 + int(signed_up * rng.random() ** 1.6)
+                status = self.statuses.draw(rng)
+                yield "orders", (order_id, customer_id, date_text, status)
+
+                total = 0
+                for _ in range(self.item_counts.draw(rng)):
+                    item_id += 1
+                    product_id = self.product_pick.draw(rng)
+                    price = self.product_prices[product_id - 1]
+                    if rng.random() < 0.1:  # occasional discount
+                        price = int(price * rng.uniform(0.7, 0.9))
+                    quantity = self.quantities.draw(rng)
+                    total += quantity * price
+                    yield "order_items", (item_id, order_id, product_id, quantity, price)
+
+                method = self.methods.draw(rng)
+                payment_id += 1
+                if status == "pending":
+                    yield "payments", (payment_id, order_id, total, None, method, "pending")
+                    continue
+                if status == "canceled":
+                    yield "payments", (payment_id, order_id, total, None, method, "failed")
+                    continue
+                if rng.random() < 0.03:  # declined first attempt, then a successful retry
+                    yield "payments", (payment_id, order_id, total, None, method, "failed")
+                    payment_id += 1
+                paid_at = date + datetime.timedelta(days=rng.random() < 0.15)
+                yield "payments", (payment_id, order_id, total, paid_at.isoformat(), method,
+                                   "refunded" if status == "refunded" else "succeeded")
+
+                # Refunded orders are refunded (mostly in full); ~1% of paid orders get a partial refund
+                if status == "refunded" or rng.random() < 0.01:
+                    refund_id += 1
+                    amount = total if status == "refunded" and rng.random() < 0.8 else int(total * rng.uniform(0.1, 0.6))
+                    refunded_at = paid_at + datetime.timedelta(days=rng.randint(1, 30))
+                    yield "refunds", (refund_id, order_id, max(amount, 1), refunded_at.isoformat(),
+                                      self.reasons.draw(rng))
+
+
+INSERTS = {
+    "customers": "INSERT INTO customers (id, name, email, created_at, region) VALUES (?, ?, ?, ?, ?)",
+    "products": "INSERT INTO products (id, name, category, price_cents) VALUES (?, ?, ?, ?)",
+    "orders": "INSERT INTO orders (id, customer_id, order_date, status) VALUES (?, ?, ?, ?)",
+    "order_items": "INSERT INTO order_items (id, order_id, product_id, quantity, unit_price_cents) VALUES (?, ?, ?, ?, ?)",
+    "payments": "INSERT INTO payments (id, order_id, amount_cents, paid_at, method, status) VALUES (?, ?, ?, ?, ?, ?)",
+    "refunds": "INSERT INTO refunds (id, order_id, amount_cents, refunded_at, reason) VALUES (?, ?, ?, ?, ?)",
+}
+
+
+def schema_sql() -> str:
+    """DDL part of sql_agent_seed.sql (everything before the seed rows)."""
+    return SEED_SQL.read_text(encoding="utf-8").split("-- Seed data", 1)[0]
+
+
+class BulkLoader:
+    """Batched executemany() inserts with periodic commits."""
+
+    def __init__(self, conn: sqlite3.Connection, batch_size: int, commit_rows: int):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.commit_rows = commit_rows
+        self.buffers = {table: [] for table in INSERTS}
+        self.counts = dict.fromkeys(INSERTS, 0)
+        self._uncommitted = 0
+
+    def add(self, table: str, row: tuple):
+        buffer = self.buffers[table]
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self.flush(table)
+
+    def flush(self, table: str):
+        buffer = self.buffers[table]
+        if not buffer:
+            return
+        self.conn.executemany(INSERTS[table], buffer)
+        self.counts[table] += len(buffer)
+        self._uncommitted += len(buffer)
+        buffer.clear()
+        if self._uncommitted >= self.commit_rows:
+            self.conn.commit()
+            self._uncommitted = 0
+
+    def finish(self):
+        for table in self.buffers:
+            self.flush(table)
+        self.conn.commit()
+
+
+def generate(out: pathlib.Path, order_items: int, seed: int = 42, batch_size: int = 50_000,
+             commit_rows: int = 1_000_000, check: bool = True, analyze: bool = True) -> dict:
+    """
+    Build a database at `out` with about `order_items` order_items rows.
+
+    Args:
+        out (pathlib.Path): Database file to create (replaced if it exists)
+        order_items (int): Target order_items rows
+        seed (int): Random seed (same seed and scale = same data)
+        batch_size (int): Rows per executemany() call
+        commit_rows (int): Rows per transaction
+        check (bool): Run PRAGMA foreign_key_check after loading
+        analyze (bool): Run ANALYZE so the query planner has statistics
+
+    Returns:
+        dict: rows per table, seconds, rows/s and file size in MB
+    """
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        pathlib.Path(f"{out}{suffix}").unlink(missing_ok=True)
+
+    gen = Generator(order_items, seed)
+    conn = sqlite3.connect(out.as_posix(), isolation_level="DEFERRED")
+    # Bulk-load settings: no rollback journal, no fsync, no per-row FK checks
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA locking_mode = EXCLUSIVE")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -262144")  # 256 MiB
+    conn.executescript(schema_sql())
+    conn.execute("PRAGMA foreign_keys = OFF")  # checked once at the end instead
+
+    loader = BulkLoader(conn, batch_size, commit_rows)
+    started = time.perf_counter()
+    last_report = started
+    for row in gen.product_rows():
+        loader.add("products", row)
+    for row in gen.customer_rows():
+        loader.add("customers", row)
+    for table, row in gen.order_rows():
+        loader.add(table, row)
+        if time.perf_counter() - last_report > 5:
+            last_report = time.perf_counter()
+            done = loader.counts["order_items"] + len(loader.buffers["order_items"])
+            rate = done / (last_report - started)
+            print(f"  {done:,} / ~{order_items:,} order_items ({rate:,.0f} rows/s)", flush=True)
+    loader.finish()
+    load_seconds = time.perf_counter() - started
+
+    problems = 0
+    if check:
+        problems = len(conn.execute("PRAGMA foreign_key_check").fetchall())
+    if analyze:
+        conn.execute("ANALYZE")
+    conn.execute("PRAGMA locking_mode = NORMAL")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.close()
+
+    rows = sum(loader.counts.values())
+    return {
+        "rows": loader.counts,
+        "seconds": round(load_seconds, 1),
+        "rows_per_s": round(rows / load_seconds) if load_seconds else 0,
+        "fk_violations": problems if check else None,
+        "size_mb": round(out.stat().st_size / 1e6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a large synthetic copy of the e-commerce database")
+    parser.add_argument("--scale", type=parse_scale, default=parse_scale("1M"),
+                        help="order_items rows, e.g. 250k, 1M, 10M, 100M (default 1M)")
+    parser.add_argument("--out", type=pathlib.Path, default=None,
+                        help="database file (default: SQLAgent/sql_agent_scale_<scale>.db)")
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    parser.add_argument("--batch-size", type=int, default=50_000, help="rows per executemany()")
+    parser.add_argument("--commit-rows", type=int, default=1_000_000, help="rows per transaction")
+    parser.add_argument("--no-check", dest="check", action="store_false", help="skip PRAGMA foreign_key_check")
+    parser.add_argument("--no-analyze", dest="analyze", action="store_false", help="skip ANALYZE")
+    args = parser.parse_args()
+
+    if args.out is None:
+        label = f"{args.scale // 1_000_000}m" if args.scale % 1_000_000 == 0 else f"{args.scale // 1000}k"
+        args.out = SQLAGENT_DIR / f"sql_agent_scale_{label}.db"
+    if args.out.resolve() == (SQLAGENT_DIR / "sql_agent_class.db").resolve():
+        parser.error("refusing to overwrite the class database; use reset_db.py to rebuild it")
+
+    print(f"Generating ~{args.scale:,} order_items into {args.out}")
+    result = generate(args.out, args.scale, args.seed, args.batch_size, args.commit_rows, args.check, args.analyze)
+
+    print(f"\n{'table':<14}{'rows':>14}")
+    for table, count in result["rows"].items():
+        print(f"{table:<14}{count:>14,}")
+    print(f"\nLoaded in {result['seconds']}s ({result['rows_per_s']:,} rows/s), {result['size_mb']} MB")
+    if result["fk_violations"] is not None:
+        print(f"Foreign key check: {result['fk_violations']} violations")
+    print(f"Point the scripts at it with: SQL_AGENT_DB={args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,486 @@
+"""
+Workload-Driven Index Advisor
+
+The seed schema has no secondary indexes, so at scale every join the agent
+writes (orders.customer_id, order_items.order_id, payments.order_id, ...) and
+every date/status filter is a full table scan. This script looks at the SQL the
+agents actually ran - the query log written by SafeSQLTool, the async executor
+and plan-cache replays - and proposes indexes for it.
+
+How it works:
+1. Each logged SELECT is run through `EXPLAIN QUERY PLAN` to find full scans
+2. Candidate indexes are derived from the columns the query filters, joins,
+   groups and sorts on (plus covering and partial variants)
+3. All candidates are evaluated "what-if" in an empty in-memory copy of the
+   schema whose sqlite_stat1 statistics are computed from the real data, so the
+   SQLite planner picks between them exactly as it would on the real file
+4. Indexes the planner actually uses are ranked by estimated rows no longer
+   touched (per execution x times the query ran)
+5. With --apply, the chosen indexes are created, ANALYZE is run, and every
+   logged query is timed before and after
+
+"Rows touched" charges a full table scan the table's row count (30% of it for a
+covering-index scan, which reads narrower rows) and an index search the rows
+per key from sqlite_stat1, multiplied by how many times the surrounding join
+loop runs it.
+
+Usage (from the SQLAgent folder):
+    python scripts/index_advisor.py                      # advise on the class database's log
+    python scripts/index_advisor.py --db sql_agent_scale_10m.db --log sql_agent_class.queries.json
+    python scripts/index_advisor.py --db sql_agent_scale_10m.db --log sql_agent_class.queries.json --apply
+"""
+
+import argparse  # Command-line options
+import json  # Query log file
+import pathlib  # Database and log paths
+import re  # SQL column-usage heuristics and plan parsing
+import sqlite3  # Planner, statistics and timing
+import statistics  # Median timings
+import time  # Timing
+
+from sql_executor import DEFAULT_DB_PATH  # Default database
+from sql_guard import inspect_sql  # Only guarded SELECTs are explained or timed
+
+# Share of a table's rows a covering-index scan is counted as
+COVERING_SCAN_FACTOR = 0.3
+
+# Widest index proposed (equality + range/order + covering columns)
+MAX_INDEX_COLUMNS = 5
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_TABLE_REF = re.compile(
+    r"\b(?:FROM|JOIN)\s+([A-Za-z_]\w*)(?:\s+(?:AS\s+)?(?!(?:ON|USING|WHERE|JOIN|LEFT|RIGHT|INNER|OUTER|CROSS|"
+    r"NATURAL|GROUP|ORDER|LIMIT|HAVING|UNION|WINDOW)\b)([A-Za-z_]\w*))?", re.I)
+_REF = r"(?:([A-Za-z_]\w*)\.)?([A-Za-z_]\w*)(?![\w.]|\s*\()"
+_VALUE = r"(?:\?|'(?:[^']|'')*'|-?\d+(?:\.\d+)?)"
+_EQ_VALUE = re.compile(rf"{_REF}\s*=\s*({_VALUE})|({_VALUE})\s*=\s*{_REF}", re.I)
+_EQ_JOIN = re.compile(rf"{_REF}\s*=\s*{_REF}", re.I)
+_IN = re.compile(rf"{_REF}\s+IN\s*\(", re.I)
+_RANGE = re.compile(rf"{_REF}\s*(?:<=|>=|<|>|\bBETWEEN\b|\bLIKE\s+'[^'%_]+%')", re.I)
+_USING = re.compile(r"\bUSING\s*\(([^)]*)\)", re.I)
+_CLAUSE = re.compile(r"\b(GROUP\s+BY|ORDER\s+BY)\b(.*?)(?=\bLIMIT\b|\bHAVING\b|\bORDER\s+BY\b|\bWINDOW\b|\)|\Z)", re.I | re.S)
+_ANY_REF = re.compile(_REF)
+_ORDER_ITEM = re.compile(rf"\s*{_REF}(?:\s+(?:ASC|DESC))?\s*", re.I)
+_PLAN_ACCESS = re.compile(
+    r"^(SCAN|SEARCH)(?: TABLE)? (\S+)(?: AS (\S+))?(?: USING (COVERING )?INDEX (\S+)| USING (?:INTEGER )?PRIMARY KEY)?")
+
+
+class Workload:
+    """Logged statements with execution counts."""
+
+    def __init__(self, entries):
+        self.entries = [e for e in entries if inspect_sql(e["sql"]).allowed]
+
+    @classmethod
+    def from_log(cls, path: pathlib.Path) -> "Workload":
+        data = json.loads(path.read_text()) if path.exists() else {}
+        return cls(data.get("queries", []))
+
+    def drop_invalid(self, conn: sqlite3.Connection) -> int:
+        """Drop statements this database cannot plan (e.g. a log captured on another schema)."""
+        valid = []
+        for entry in self.entries:
+            try:
+                conn.execute(f"EXPLAIN QUERY PLAN {entry['sql']}").fetchall()
+                valid.append(entry)
+            except sqlite3.Error:
+                pass
+        dropped = len(self.entries) - len(valid)
+        self.entries = valid
+        return dropped
+
+
+class Statistics:
+    """Row counts and distinct-value counts from the real database (cached)."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.columns = {}
+        self.primary_keys = {}
+        for (table,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"):
+            info = conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+            self.columns[table] = [row[1] for row in info]
+            self.primary_keys[table] = [row[1] for row in info if row[5]]
+        self._rows = {}
+        self._distinct = {}
+
+    def rows(self, table: str, where: str | None = None) -> int:
+        key = (table, where)
+        if key not in self._rows:
+            sql = f'SELECT COUNT(*) FROM "{table}"' + (f" WHERE {where}" if where else "")
+            self._rows[key] = self.conn.execute(sql).fetchone()[0]
+        return self._rows[key]
+
+    def distinct(self, table: str, columns: tuple, where: str | None = None) -> int:
+        key = (table, columns, where)
+        if key not in self._distinct:
+            cols = ", ".join(f'"{c}"' for c in columns)
+            sql = f'SELECT COUNT(*) FROM (SELECT DISTINCT {cols} FROM "{table}"' + (f" WHERE {where})" if where else ")")
+            self._distinct[key] = max(1, self.conn.execute(sql).fetchone()[0])
+        return self._distinct[key]
+
+    def stat1(self, table: str, columns: tuple, where: str | None = None) -> str:
+        """sqlite_stat1 'stat' string for an index: total rows, then avg rows per key prefix."""
+        total = self.rows(table, where)
+        parts = [str(total)]
+        for i in range(1, len(columns) + 1):
+            parts.append(str(max(1, round(total / self.distinct(table, columns[:i], where)))))
+        return " ".join(parts)
+
+
+class Candidate:
+    """A proposed index and the queries it helps."""
+
+    def __init__(self, table: str, columns: tuple, where: str | None = None):
+        self.table = table
+        self.columns = columns
+        self.where = where
+        suffix = "_".join(columns)
+        if where:
+            suffix += "_" + re.sub(r"\W+", "_", where.split("=", 1)[1]).strip("_").lower()
+        self.name = f"idx_{table}_{suffix}"[:60]
+        self.saved_rows = 0.0
+        self.queries = set()
+
+    @property
+    def key(self):
+        return (self.table, self.columns, self.where)
+
+    def ddl(self) -> str:
+        cols = ", ".join(self.columns)
+        return f"CREATE INDEX IF NOT EXISTS {self.name} ON {self.table} ({cols})" + (f" WHERE {self.where}" if self.where else "")
+
+
+def column_usage(sql: str, stats: Statistics) -> dict:
+    """
+    Heuristic per-table column usage of one statement.
+
+    Returns:
+        dict: table -> {"eq": [...], "literal": {col: 'value'}, "range": [...], "order": [...], "used": [...]}
+    """
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        if table.lower() in {t.lower() for t in stats.columns}:
+            table = next(t for t in stats.columns if t.lower() == table.lower())
+            aliases[table.lower()] = table
+            if alias:
+                aliases[alias.lower()] = table
+    tables = set(aliases.values())
+    usage = {t: {"eq": [], "literal": {}, "range": [], "order": [], "used": []} for t in tables}
+
+    def resolve(qualifier, column):
+        if qualifier:
+            table = aliases.get(qualifier.lower())
+            if table and column in stats.columns[table]:
+                return table, column
+            return None
+        owners = [t for t in tables if column in stats.columns[t]]
+        return (owners[0], column) if len(owners) == 1 else None
+
+    def add(kind, ref):
+        if ref and ref[1] not in usage[ref[0]][kind]:
+            usage[ref[0]][kind].append(ref[1])
+
+    for q1, c1, value, value2, q2, c2 in _EQ_VALUE.findall(sql):
+        ref = resolve(q1, c1) if c1 else resolve(q2, c2)
+        add("eq", ref)
+        literal = value or value2
+        if ref and literal.startswith("'"):
+            usage[ref[0]]["literal"][ref[1]] = literal
+    masked = _LITERAL.sub("?", sql)
+    for q1, c1, q2, c2 in _EQ_JOIN.findall(masked):
+        add("eq", resolve(q1, c1))
+        add("eq", resolve(q2, c2))
+    for q, c in _IN.findall(masked):
+        add("eq", resolve(q, c))
+    for q, c in _RANGE.findall(sql):
+        add("range", resolve(q, c))
+    for names in _USING.findall(masked):
+        for name in (n.strip() for n in names.split(",")):
+            for table in tables:
+                if name in stats.columns[table]:
+                    add("eq", (table, name))
+    for _, clause in _CLAUSE.findall(masked):
+        for item in clause.split(","):
+            match = _ORDER_ITEM.fullmatch(item)  # Plain columns only; expressions cannot use an index
+            if match:
+                add("order", resolve(*match.groups()))
+    for q, c in _ANY_REF.findall(masked):
+        add("used", resolve(q, c))
+    return usage
+
+
+def candidates_for(usage: dict, stats: Statistics) -> list:
+    """Candidate indexes for one statement's column usage."""
+    found = []
+    for table, use in usage.items():
+        pk = set(stats.primary_keys[table])
+        eq = [c for c in use["eq"] if c not in pk]
+        rng = [c for c in use["range"] if c not in pk and c not in eq]
+        order = [c for c in use["order"] if c not in pk and c not in eq]
+        lead_options = []
+        if eq:
+            lead_options.append(tuple(eq))
+            if rng:
+                lead_options.append(tuple(eq + rng[:1]))
+            if order:
+                lead_options.append(tuple(eq + order))
+        else:
+            if rng:
+                lead_options.append(tuple(rng[:1]))
+            if order:
+                lead_options.append(tuple(order))
+
+        for lead in lead_options:
+            lead = lead[:MAX_INDEX_COLUMNS]
+            found.append(Candidate(table, lead))
+            rest = [c for c in use["used"] if c not in lead and c not in pk]
+            if rest and len(lead) + len(rest) <= MAX_INDEX_COLUMNS:
+                found.append(Candidate(table, lead + tuple(rest)))  # covering
+
+        # Partial index: a filter on a literal value ("status = 'paid'") becomes the index WHERE clause
+        for column, literal in use["literal"].items():
+            if column in pk:
+                continue
+            rest = tuple(c for c in eq + rng[:1] + order if c != column)[:MAX_INDEX_COLUMNS]
+            if rest:
+                found.append(Candidate(table, rest, where=f"{column} = {literal}"))
+    return found
+
+
+def touched_rows(conn, sql: str, stats: Statistics) -> tuple:
+    """
+    Estimated rows touched by one statement's plan, plus the indexes it uses.
+
+    Plan lines that share a parent form one loop nest: every access runs once per
+    row produced by the accesses before it, so a full scan placed inside a loop
+    is charged once per outer row.
+
+    Returns:
+        tuple: (rows touched, set of index names used)
+    """
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        for known in stats.columns:
+            if known.lower() == table.lower():
+                aliases[table.lower()] = known
+                if alias:
+                    aliases[alias.lower()] = known
+    rows = 0.0
+    used = set()
+    outer = {}  # plan parent id -> rows produced so far by that loop nest
+    for _, parent, _, detail in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+        match = _PLAN_ACCESS.match(detail)
+        if not match:
+            continue
+        op, name, alias, covering, index = match.groups()
+        table = aliases.get((alias or name).lower()) or aliases.get(name.lower())
+        if table is None:
+            continue  # CTE or subquery result
+        loops = outer.get(parent, 1.0)
+        total = stats.rows(table)
+        if index:
+            used.add(index)
+        if op == "SCAN":
+            per_loop = total
+            rows += loops * total * (COVERING_SCAN_FACTOR if covering else 1.0)
+        elif "PRIMARY KEY" in detail:
+            per_loop = 1
+            rows += loops
+        elif "AUTOMATIC" in detail:
+            per_loop = 10  # SQLite's own guess for an automatic index lookup
+            rows += total + loops * per_loop  # Built from a full scan every execution
+        else:
+            per_loop = _rows_per_lookup(conn, index, detail, total)
+            rows += loops * per_loop
+        outer[parent] = loops * per_loop
+    return rows, used
+
+
+def _rows_per_lookup(conn, index: str, detail: str, total: int) -> float:
+    """Rows one index search returns, from the index's sqlite_stat1 entry."""
+    row = conn.execute("SELECT stat FROM sqlite_stat1 WHERE idx = ?", (index,)).fetchone()
+    stat = [int(part) for part in row[0].split()[:MAX_INDEX_COLUMNS + 1]] if row else [total]
+    terms = detail[detail.find("(") + 1:].split(" AND ")
+    equal = sum(1 for term in terms if "=?" in term and not any(op in term for op in ("<", ">")))
+    per_lookup = stat[min(equal, len(stat) - 1)]
+    if len(terms) > equal:
+        per_lookup /= 4  # Range term on the next column
+    return max(1.0, per_lookup)
+
+
+def what_if(db_conn, stats: Statistics, workload: Workload, candidates: dict) -> tuple:
+    """
+    Plan every statement in an empty schema copy, without and with the candidates.
+
+    Returns:
+        tuple: (baseline rows per statement, rows per statement with candidates,
+        index names used per statement)
+    """
+    mem = sqlite3.connect(":memory:")
+    for (sql,) in db_conn.execute(
+            "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+            "AND type IN ('table', 'index', 'view')"):
+        mem.execute(sql)
+    mem.execute("ANALYZE")  # Creates sqlite_stat1
+
+    def load_stats(with_candidates: bool):
+        mem.execute("DELETE FROM sqlite_stat1")
+        for table in stats.columns:
+            mem.execute("INSERT INTO sqlite_stat1 VALUES (?, NULL, ?)", (table, str(stats.rows(table))))
+            for (index,) in db_conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,)):
+                cols = tuple(row[2] for row in db_conn.execute(f'PRAGMA index_info("{index}")'))
+                mem.execute("INSERT INTO sqlite_stat1 VALUES (?, ?, ?)", (table, index, stats.stat1(table, cols)))
+        if with_candidates:
+            for cand in candidates.values():
+                mem.execute("INSERT INTO sqlite_stat1 VALUES (?, ?, ?)",
+                            (cand.table, cand.name, stats.stat1(cand.table, cand.columns, cand.where)))
+        mem.execute("ANALYZE sqlite_schema")  # Reload statistics into the planner
+
+    load_stats(False)
+    before = [touched_rows(mem, e["sql"], stats)[0] for e in workload.entries]
+
+    for cand in candidates.values():
+        mem.execute(cand.ddl())
+    load_stats(True)
+    after, used = [], []
+    for e in workload.entries:
+        rows, names = touched_rows(mem, e["sql"], stats)
+        after.append(rows)
+        used.append(names)
+    mem.close()
+    return before, after, used
+
+
+def advise(db_path: pathlib.Path, workload: Workload) -> list:
+    """
+    Rank candidate indexes for a workload.
+
+    Returns:
+        list: Candidates the planner used, most estimated rows saved first
+    """
+    conn = sqlite3.connect(f"{db_path.as_uri()}?mode=ro", uri=True)
+    stats = Statistics(conn)
+    candidates = {}
+    for entry in workload.entries:
+        for cand in candidates_for(column_usage(entry["sql"], stats), stats):
+            candidates.setdefault(cand.key, cand)
+    by_name = {c.name: c for c in candidates.values()}
+
+    before, after, used = what_if(conn, stats, workload, candidates)
+    for i, entry in enumerate(workload.entries):
+        saved = (before[i] - after[i]) * entry["count"]
+        helpers = [by_name[name] for name in used[i] if name in by_name]
+        for cand in helpers:
+            cand.saved_rows += saved / len(helpers)
+            cand.queries.add(i)
+    conn.close()
+    return sorted((c for c in candidates.values() if c.queries and c.saved_rows > 0), key=lambda c: -c.saved_rows)
+
+
+def time_workload(db_path: pathlib.Path, workload: Workload, runs: int = 3) -> list:
+    """Median milliseconds per logged statement (LIMIT-bounded like the agents run them)."""
+    conn = sqlite3.connect(f"{db_path.as_uri()}?mode=ro", uri=True)
+    timings = []
+    for entry in workload.entries:
+        sql = inspect_sql(entry["sql"]).bounded_sql()
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            conn.execute(sql).fetchall()
+            samples.append((time.perf_counter() - started) * 1000)
+        timings.append(statistics.median(samples))
+    conn.close()
+    return timings
+
+
+def apply(db_path: pathlib.Path, chosen: list):
+    """Create the chosen indexes and refresh planner statistics."""
+    conn = sqlite3.connect(db_path.as_posix())
+    with conn:
+        for cand in chosen:
+            conn.execute(cand.ddl())
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def drop_unused(db_path: pathlib.Path, workload: Workload, chosen: list) -> list:
+    """
+    Drop created indexes the real planner does not use for any logged statement.
+
+    Returns:
+        list: Names of the dropped indexes
+    """
+    conn = sqlite3.connect(db_path.as_posix())
+    plans = " ".join(row[3] for entry in workload.entries
+                     for row in conn.execute(f"EXPLAIN QUERY PLAN {entry['sql']}"))
+    unused = [cand.name for cand in chosen if f"INDEX {cand.name}" not in plans]
+    with conn:
+        for name in unused:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.close()
+    return unused
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Propose (and optionally create) indexes for the logged agent SQL")
+    parser.add_argument("--db", type=pathlib.Path, default=DEFAULT_DB_PATH, help="database to advise on")
+    parser.add_argument("--log", type=pathlib.Path, default=None,
+                        help="query log to use as the workload (default: <db>.queries.json)")
+    parser.add_argument("--top", type=int, default=10, help="indexes to propose")
+    parser.add_argument("--apply", action="store_true", help="create the proposed indexes and run ANALYZE")
+    parser.add_argument("--keep-unused", action="store_true",
+                        help="keep created indexes the planner ends up not using")
+    parser.add_argument("--runs", type=int, default=3, help="timing runs per statement with --apply")
+    args = parser.parse_args()
+
+    db_path = args.db.resolve()
+    log_path = args.log or db_path.with_suffix(".queries.json")
+    workload = Workload.from_log(log_path)
+    conn = sqlite3.connect(f"{db_path.as_uri()}?mode=ro", uri=True)
+    dropped = workload.drop_invalid(conn)
+    conn.close()
+    if dropped:
+        print(f"Skipping {dropped} logged statements this database cannot plan")
+    if not workload.entries:
+        print(f"No logged queries in {log_path}.")
+        print("Run the secure agents (scripts 03/04, batch_questions.py) first, or pass --log.")
+        return
+    print(f"Workload: {len(workload.entries)} statements, "
+          f"{sum(e['count'] for e in workload.entries)} executions (from {log_path.name})")
+
+    chosen = advise(db_path, workload)[:args.top]
+    if not chosen:
+        print("No index would reduce the rows touched by this workload.")
+        return
+
+    print(f"\n{'#':<3}{'est. rows saved':>16}{'queries':>9}  index")
+    for rank, cand in enumerate(chosen, start=1):
+        print(f"{rank:<3}{cand.saved_rows:>16,.0f}{len(cand.queries):>9}  {cand.ddl()};")
+
+    if not args.apply:
+        print("\nRe-run with --apply to create these indexes and time the workload before/after.")
+        return
+
+    print(f"\nTiming {len(workload.entries)} statements before...")
+    before = time_workload(db_path, workload, args.runs)
+    started = time.perf_counter()
+    apply(db_path, chosen)
+    print(f"Created {len(chosen)} indexes and ran ANALYZE in {time.perf_counter() - started:.1f}s")
+    if not args.keep_unused:
+        for name in drop_unused(db_path, workload, chosen):
+            print(f"Dropped {name}: not used by any logged statement after ANALYZE")
+    after = time_workload(db_path, workload, args.runs)
+
+    print(f"\n{'before ms':>10}{'after ms':>10}{'speedup':>9}  statement")
+    for entry, b, a in zip(workload.entries, before, after):
+        flag = "  <- slower" if a > b * 1.1 else ""
+        print(f"{b:>10.2f}{a:>10.2f}{b / a if a else float('inf'):>8.1f}x  {entry['sql'][:70]}{flag}")
+    total_before = sum(b * e["count"] for b, e in zip(before, workload.entries))
+    total_after = sum(a * e["count"] for a, e in zip(after, workload.entries))
+    print(f"\nWorkload total (weighted by executions): {total_before:,.1f} ms -> {total_after:,.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
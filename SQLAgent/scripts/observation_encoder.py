@@ -0,0 +1,228 @@
+"""
+Token-Efficient Tool Observations
+
+SafeSQLTool returns {"columns": [...], "rows": [[...], ...]}, and the ReAct
+agent appends str() of that dict to its scratchpad. From then on, every LLM
+hop re-reads the Python repr: quotes around every string, brackets around
+every row, and the same category or region names spelled out row after row.
+Prompt size drives LLM latency, so this module renders the observation compactly:
+
+- Tab-separated rows under a single header line (no quotes or brackets)
+- Dictionary encoding: long values that repeat within a column are replaced
+  by short codes (@1, @2, ...) defined once above the table, and only when it
+  saves characters
+- A hard token budget: rows are added until the budget is reached, then an
+  explicit marker says how many rows were left out (fetch_bounded's own
+  "at least N rows" note is carried over)
+
+encode_observation() returns an Observation, a dict subclass. Code that reads
+the result (plan cache, batch runner) still gets the columns and rows, while
+str() gives the agent the compact text. Every call logs the estimated tokens
+before and after encoding (logger "observation_encoder", INFO), and the totals
+are kept for Performance Metrics (encoder_stats()).
+
+Usage:
+    from observation_encoder import encode_observation
+
+    return encode_observation(fetch_bounded(cursor))   # in a tool's _run
+"""
+
+import logging  # Per-call token counts
+import os  # Budget override
+import threading  # Lock around the counters
+from collections import Counter, deque  # Value frequencies, recent calls
+
+from result_profile import render_profile  # Text form of summarize-mode results
+
+logger = logging.getLogger("observation_encoder")
+
+# Token budget for one observation (SQL_AGENT_OBSERVATION_TOKENS overrides it)
+DEFAULT_MAX_TOKENS = int(os.getenv("SQL_AGENT_OBSERVATION_TOKENS", "2000"))
+
+# Same estimate fetch_bounded uses for its max_tokens budget
+CHARS_PER_TOKEN = 4
+
+# Longest cell shown (longer text is cut with "…")
+MAX_CELL_CHARS = 200
+
+# Values shorter than this are never dictionary-encoded (the code would not be shorter)
+MIN_CODED_CHARS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count (~4 characters per token)."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+class Observation(dict):
+    """
+    A SQL result dict whose str() is the compact encoding the LLM reads.
+
+    Attributes:
+        text (str): The encoded observation
+        tokens_before (int): Estimated tokens of the plain str(dict)
+        tokens_after (int): Estimated tokens of `text`
+        shown (int): Rows that fit in the token budget
+    """
+
+    def __init__(self, payload: dict, text: str, tokens_before: int, shown: int):
+        super().__init__(payload)
+        self.text = text
+        self.tokens_before = tokens_before
+        self.shown = shown
+        self.tokens_after = estimate_tokens(text)
+
+    def __str__(self):
+        return self.text
+
+    __repr__ = __str__
+
+
+def _cell(value) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, bytes):
+        text = value.hex()
+    else:
+        text = str(value)
+    # Tabs and newlines would break the row layout
+    text = text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    return text if len(text) <= MAX_CELL_CHARS else text[:MAX_CELL_CHARS - 1] + "…"
+
+
+def _dictionary(values: list) -> set:
+    """The repeated values of one column that are worth replacing by a code."""
+    if any(value.startswith("@") for value in values):
+        return set()  # A literal "@..." value would be ambiguous
+    counts = Counter(values)
+    code = len(f"@{len(counts)}")  # Longest code this column could need
+    return {value for value, count in counts.items()
+            if len(value) >= MIN_CODED_CHARS and count * (len(value) - code) > code + len(value) + 2}
+
+
+def encode(payload: dict, max_tokens: int = DEFAULT_MAX_TOKENS) -> str:
+    """
+    Compact text for a {"columns", "rows"} result, within `max_tokens`.
+
+    Layout:
+        [rows: 3 of 3; tab-separated; @n = code from the dictionary lines]
+        @ category: @1=Electronics	@2=Home & Kitchen
+        name	category	total_cents
+        Laptop	@1	129900
+        ...
+        [truncated: 57 more rows not shown (token budget 2000)]
+    """
+    return _render(payload, max_tokens)[0]
+
+
+def _render(payload: dict, max_tokens: int) -> tuple:
+    """(encoded text, rows shown)"""
+    columns = [_cell(name) for name in payload.get("columns", [])]
+    rows = [[_cell(value) for value in row] for row in payload.get("rows", [])]
+    text, shown = _layout(payload, columns, rows, rows, max_tokens)
+    if shown < len(rows):
+        # Values that repeat across all rows may occur once in the rows that fit: re-pick the
+        # dictionary from those rows (usually lets a few more rows in)
+        text, shown = _layout(payload, columns, rows, rows[:shown], max_tokens)
+    return text, shown
+
+
+def _layout(payload: dict, columns: list, rows: list, sample: list, max_tokens: int) -> tuple:
+    dictionaries = [_dictionary([row[j] for row in sample]) for j in range(len(columns))]
+    budget = max_tokens * CHARS_PER_TOKEN
+
+    header = "\t".join(columns)
+    codes = [{} for _ in columns]  # Per column: value -> "@n", numbered in order of first appearance
+    legend = {}  # column index -> [(code, value)] used by the rows shown so far
+    used = len(header) + 200  # Header plus room for the first and last marker lines
+    lines = []
+    for row in rows:
+        new_codes = []
+        cells = []
+        for j, value in enumerate(row):
+            if value not in dictionaries[j]:
+                cells.append(value)
+                continue
+            code = codes[j].get(value)
+            if code is None:
+                code = codes[j][value] = f"@{len(codes[j]) + 1}"
+                new_codes.append((j, code, value))
+            cells.append(code)
+        line = "\t".join(cells)
+        cost = len(line) + 1 + sum(len(code) + len(value) + 2 + (len(columns[j]) + 4 if j not in legend else 0)
+                                   for j, code, value in new_codes)
+        if used + cost > budget:
+            for j, code, value in new_codes:
+                del codes[j][value]
+            break
+        used += cost
+        lines.append(line)
+        for j, code, value in new_codes:
+            legend.setdefault(j, []).append((code, value))
+
+    total = payload.get("rows_seen", len(rows)) if payload.get("truncated") else len(rows)
+    of = f"at least {total}" if payload.get("truncated") else str(total)
+    intro = f"[rows: {len(lines)} of {of}; tab-separated"
+    intro += "; @n = code from the dictionary lines]" if legend else "]"
+    out = [intro]
+    for j in sorted(legend):
+        out.append(f"@ {columns[j]}: " + "\t".join(f"{code}={value}" for code, value in legend[j]))
+    out.append(header)
+    out.extend(lines)
+    if len(lines) < len(rows):
+        out.append(f"[truncated: {len(rows) - len(lines)} more rows not shown (token budget {max_tokens}); "
+                   f"aggregate or filter to see them]")
+    elif payload.get("truncated"):
+        out.append(f"[truncated: {payload.get('note', 'more rows exist')}; aggregate or filter to see them]")
+    return "\n".join(out), len(lines)
+
+
+# Process-wide counters reported by encoder_stats()
+_stats = {"calls": 0, "tokens_before": 0, "tokens_after": 0, "truncated": 0}
+_recent = deque(maxlen=50)  # (rows, rows shown, tokens before, tokens after) of recent calls
+_stats_lock = threading.Lock()
+
+
+def encode_observation(payload, max_tokens: int = DEFAULT_MAX_TOKENS):
+    """
+    Wrap a SQL tool result so the agent reads its compact encoding.
+
+    Summaries from result_profile are rendered with render_profile(). Error
+    strings and other dicts (e.g. export reports) are returned unchanged.
+
+    Args:
+        payload: Tool result ({"columns", "rows"} dict, profile dict, or an error string)
+        max_tokens (int): Token budget of the encoded text
+
+    Returns:
+        Observation | object: The wrapped result, or `payload` itself
+    """
+    if isinstance(payload, dict) and payload.get("profile"):
+        text = render_profile(payload)  # Already a few lines per column, whatever the row count
+        rows = shown = payload["row_count"]
+    elif isinstance(payload, dict) and "columns" in payload and "rows" in payload:
+        text, shown = _render(payload, max_tokens)
+        rows = len(payload["rows"])
+    else:
+        return payload
+    before = estimate_tokens(str(dict(payload)))
+    observation = Observation(payload, text, before, shown)
+    truncated = shown < rows
+    with _stats_lock:
+        _stats["calls"] += 1
+        _stats["tokens_before"] += before
+        _stats["tokens_after"] += observation.tokens_after
+        _stats["truncated"] += truncated
+        _recent.append((rows, shown, before, observation.tokens_after))
+    logger.info("observation: %d rows (%d shown), ~%d -> ~%d tokens", rows, shown, before, observation.tokens_after)
+    return observation
+
+
+def encoder_stats() -> dict:
+    """Observations encoded, estimated tokens before/after, and how many were cut by the budget."""
+    with _stats_lock:
+        stats = dict(_stats)
+        stats["recent"] = list(_recent)
+    before = stats["tokens_before"]
+    stats["saved_pct"] = round(100 * (1 - stats["tokens_after"] / before), 1) if before else 0.0
+    return stats
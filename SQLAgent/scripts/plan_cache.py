@@ -0,0 +1,426 @@
+"""
+Question-to-SQL Plan Cache
+
+Analysts ask the same questions over and over ("Top 5 products by gross revenue",
+"Weekly net revenue for the last 6 weeks"). Each one costs several LLM round trips
+through the ReAct loop, even though the agent ends up running the same SQL.
+
+This module remembers the final validated SQL the agent ran for a normalized
+question. On a repeat, the SQL is re-executed against current data through the
+guarded path (sql_guard + pool + result cache) and the LLM is skipped entirely.
+
+Key Features:
+- Questions normalized (case, punctuation, whitespace) and scoped per agent/chat mode
+- Confidence score per plan: failed attempts, exploratory queries and empty
+  results lower it; plans below `min_confidence` are neither stored nor served
+- TTL expiry, and plans recorded under an older schema_version are dropped
+- Relative-time questions ("last 6 weeks", "this month") whose SQL pins the
+  dates as literals are not stored: a replay would keep answering for the day
+  the plan was learned (SQL using date('now') stays replayable)
+- A plan whose replay errors is forgotten, so the next ask goes back to the LLM
+- Runs that exported or summarized a result are not recorded (a replay only
+  returns rows)
+- Persisted to a JSON file next to the database, so plans survive restarts
+
+Usage:
+    from plan_cache import get_plan_cache
+
+    plans = get_plan_cache(pool)
+    plan = plans.lookup(question, scope="analytics")
+    if plan is None:
+        result = agent.invoke({"input": question})  # agent built with return_intermediate_steps=True
+        plans.record(question, result["intermediate_steps"], scope="analytics")
+"""
+
+import json  # On-disk plan store
+import os  # Atomic file replacement
+import pathlib  # Plan file location
+import re  # Question normalization
+import threading  # Lock around the plan table
+import time  # TTL bookkeeping
+import unicodedata  # Unicode normalization of questions
+from dataclasses import asdict, dataclass  # Plan records
+
+from async_executor import run_guarded  # Replays take the same guarded SELECT path as the tools
+from query_budget import DEFAULT_BUDGET  # Replays run under the same execution limits
+from query_log import get_query_log  # Replayed SQL counts toward the index advisor workload
+from result_cache import get_result_cache  # Replays share the SELECT result cache
+from sql_guard import inspect_sql  # Plans must pass the same guardrail
+
+# Tools whose input is SQL: SafeSQLTool (03/04) and the SQLDatabaseToolkit query tool
+SQL_TOOLS = ("execute_sql", "sql_db_query")
+
+# Tools whose answer isn't a row set (an exported file, a column summary): a replay
+# would hand back raw rows instead, so runs that used them are never recorded
+UNREPLAYABLE_TOOLS = ("export_sql", "summarize_sql")
+
+# Anything that isn't a letter or digit separates words
+_NON_WORD = re.compile(r"[^\w]+")
+
+# Questions whose answer depends on when they are asked, and date literals in SQL
+_RELATIVE_TIME = re.compile(r"\b(?:last|this|today|yesterday|recent|recently|past|current|now|ago|so far|to date)\b")
+_DATE_LITERAL = re.compile(r"'\d{4}(?:-\d{2}){0,2}(?:[ T][\d:.]+)?'")
+
+# Confidence penalties applied when a plan is learned from an agent run
+FAILED_ATTEMPT_PENALTY = 0.2  # each SQL call that errored before the final one
+EXPLORATORY_PENALTY = 0.35  # each earlier successful query (the final SQL may depend on it)
+EMPTY_RESULT_PENALTY = 0.2  # the final query returned no rows
+
+
+def normalize_question(question: str) -> str:
+    """
+    Canonical form of a question for use as a cache key.
+
+    Lower-cases, applies Unicode NFKC, and collapses punctuation and whitespace,
+    so "Top 5 products by gross revenue?" and "top 5 products, by gross revenue"
+    share a plan. Numbers are kept: "top 5" and "top 10" are different questions.
+    """
+    text = unicodedata.normalize("NFKC", question).lower()
+    return _NON_WORD.sub(" ", text).strip()
+
+
+@dataclass
+class Plan:
+    """
+    One cached question-to-SQL plan.
+
+    Attributes:
+        question (str): The question as first asked (for display)
+        sql (str): Final validated SQL the agent ran
+        confidence (float): 0-1 score; see plan_from_steps()
+        created_at (float): Unix time the plan was (re)learned
+        schema_version (int): PRAGMA schema_version when the plan was learned
+        hits (int): Times the plan answered a question without the LLM
+        confirmations (int): Times the LLM independently produced the same SQL again
+    """
+    question: str
+    sql: str
+    confidence: float
+    created_at: float
+    schema_version: int
+    hits: int = 0
+    confirmations: int = 0
+
+
+def _tool_sql(tool_input) -> str | None:
+    """SQL text from an agent action's tool_input (a string or an args dict)."""
+    if isinstance(tool_input, str):
+        return tool_input
+    if isinstance(tool_input, dict):
+        for key in ("sql", "query"):
+            if isinstance(tool_input.get(key), str):
+                return tool_input[key]
+    return None
+
+
+def _has_options(tool_input) -> bool:
+    """True if an args dict carries more than the SQL (e.g. export/summarize flags)."""
+    return isinstance(tool_input, dict) and any(value for key, value in tool_input.items()
+                                                if key not in ("sql", "query"))
+
+
+def _is_error(observation) -> bool:
+    """True if a SQL tool observation reports a failure."""
+    return isinstance(observation, str) and observation.lstrip().lower().startswith("error")
+
+
+def _is_empty(observation) -> bool:
+    """True if a SQL tool observation is a successful but empty result."""
+    if isinstance(observation, dict):
+        return not observation.get("rows")
+    return isinstance(observation, str) and observation.strip() in ("", "[]")
+
+
+def pins_relative_time(question: str, sql: str) -> bool:
+    """
+    True if a relative-time question was answered with hard-coded dates.
+
+    "Weekly net revenue for the last 6 weeks" answered with
+    `WHERE order_date >= '2024-05-01'` is only right on the day it was asked,
+    so such a plan must not be replayed later.
+    """
+    return bool(_RELATIVE_TIME.search(normalize_question(question)) and _DATE_LITERAL.search(sql))
+
+
+def plan_from_steps(steps, tools=SQL_TOOLS) -> tuple | None:
+    """
+    Extract the final validated SQL and a confidence score from an agent run.
+
+    Args:
+        steps: AgentExecutor intermediate_steps, a list of (AgentAction, observation)
+        tools: Names of tools whose input is SQL
+
+    Returns:
+        tuple | None: (sql, confidence), or None if the run has no usable plan
+        (no SQL ran, the last SQL call failed, the SQL isn't a guarded SELECT,
+        or the run exported or summarized a result, which a replay can't reproduce)
+    """
+    calls = []
+    for action, observation in steps or ():
+        tool = getattr(action, "tool", None)
+        tool_input = getattr(action, "tool_input", None)
+        if tool in UNREPLAYABLE_TOOLS or (tool in tools and _has_options(tool_input)):
+            return None
+        if tool in tools:
+            sql = _tool_sql(tool_input)
+            if sql:
+                calls.append((sql, observation))
+    if not calls:
+        return None
+
+    sql, observation = calls[-1]
+    if _is_error(observation) or not inspect_sql(sql).allowed:
+        return None
+
+    failed = sum(1 for _, obs in calls[:-1] if _is_error(obs))
+    exploratory = len(calls) - 1 - failed
+    confidence = 1.0 - FAILED_ATTEMPT_PENALTY * failed - EXPLORATORY_PENALTY * exploratory
+    if _is_empty(observation):
+        confidence -= EMPTY_RESULT_PENALTY
+    return inspect_sql(sql).sql, round(max(confidence, 0.0), 3)
+
+
+class PlanCache:
+    """
+    Persistent cache of question-to-SQL plans for one database.
+
+    Attributes:
+        path (pathlib.Path): JSON file the plans are saved to (None = memory only)
+        ttl (float): Seconds a plan stays valid after it was learned
+        min_confidence (float): Plans below this score are not stored or served
+    """
+
+    def __init__(self, pool, path=None, ttl: float = 7 * 24 * 3600, min_confidence: float = 0.7):
+        """
+        Args:
+            pool: ReadOnlyPool for the database the plans run against
+            path: JSON file for persistence (None keeps plans in memory only)
+            ttl (float): Plan lifetime in seconds
+            min_confidence (float): Minimum confidence to store or serve a plan
+        """
+        self.pool = pool
+        self.path = pathlib.Path(path) if path is not None else None
+        self.ttl = ttl
+        self.min_confidence = min_confidence
+
+        self._plans = {}  # (scope, normalized question) -> Plan
+        self._lock = threading.Lock()
+
+        # Counters reported by stats()
+        self._hits = 0
+        self._misses = 0
+        self._stored = 0
+        self._expired = 0
+        self._replay_failures = 0
+
+        self._load()
+
+    def _schema_version(self) -> int:
+        with self.pool.connection() as conn:
+            return conn.execute("PRAGMA schema_version").fetchone()[0]
+
+    def _load(self):
+        """Read persisted plans, ignoring a missing or unreadable file."""
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text())
+            for item in data.get("plans", []):
+                scope = item.pop("scope")
+                if pins_relative_time(item["question"], item["sql"]):
+                    continue  # Saved before such plans were refused
+                self._plans[(scope, normalize_question(item["question"]))] = Plan(**item)
+        except (OSError, ValueError, TypeError, KeyError):
+            self._plans = {}
+
+    def _save(self):
+        """Write all plans atomically. Caller holds the lock."""
+        if self.path is None:
+            return
+        data = {"plans": [dict(asdict(plan), scope=scope) for (scope, _), plan in self._plans.items()]}
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        try:
+            tmp.write_text(json.dumps(data, indent=1))
+            os.replace(tmp, self.path)
+        except OSError:
+            pass  # Read-only checkout: keep the plans in memory
+
+    def lookup(self, question: str, scope: str = "default") -> Plan | None:
+        """
+        Find a servable plan for a question.
+
+        Expired plans, plans below `min_confidence` and plans learned under a
+        different schema_version are dropped and reported as misses.
+
+        Returns:
+            Plan | None: The plan to replay, or None to ask the LLM
+        """
+        key = (scope, normalize_question(question))
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None and (time.time() - plan.created_at > self.ttl or
+                                     plan.schema_version != self._schema_version()):
+                del self._plans[key]
+                self._expired += 1
+                self._save()
+                plan = None
+            if plan is None or plan.confidence < self.min_confidence:
+                self._misses += 1
+                return None
+            return plan
+
+    def replay(self, plan: Plan, max_rows: int = 200):
+        """
+        Re-execute a plan's SQL against current data through run_guarded.
+
+        The SQL is re-validated with inspect_sql, bounded with LIMIT, served from
+        the shared result cache when possible and otherwise run on a pooled
+        read-only connection under the default query budget. A failing plan
+        (including one that now blows its budget) is forgotten.
+
+        Returns:
+            dict | None: {"columns", "rows"} result, or None if the replay failed
+        """
+        result = run_guarded(plan.sql, self.pool, get_result_cache(self.pool), get_query_log(self.pool),
+                             DEFAULT_BUDGET, max_rows)
+        if isinstance(result, str):  # Rejected or failed
+            result = None
+
+        with self._lock:
+            if result is None:
+                self._replay_failures += 1
+                self._forget_plan(plan)
+            else:
+                plan.hits += 1
+                self._hits += 1
+                self._save()
+        return result
+
+    def _forget_plan(self, plan: Plan):
+        """Drop a plan object wherever it is stored. Caller holds the lock."""
+        for key, stored in list(self._plans.items()):
+            if stored is plan:
+                del self._plans[key]
+        self._save()
+
+    def store(self, question: str, sql: str, confidence: float, scope: str = "default") -> Plan | None:
+        """
+        Store (or confirm) the SQL that answered a question.
+
+        If the same SQL is already cached, its confirmation count goes up and
+        the confidence is raised by 0.1 (up to 1.0) instead of being replaced.
+
+        Returns:
+            Plan | None: The stored plan, or None if confidence was too low or
+            the SQL pins a relative-time question to fixed dates (pins_relative_time)
+        """
+        if pins_relative_time(question, sql):
+            return None
+        key = (scope, normalize_question(question))
+        with self._lock:
+            existing = self._plans.get(key)
+            if existing is not None and existing.sql == sql:
+                existing.confirmations += 1
+                existing.confidence = round(min(1.0, max(existing.confidence, confidence) + 0.1), 3)
+                existing.created_at = time.time()
+                self._save()
+                return existing
+            if confidence < self.min_confidence:
+                return None
+            plan = Plan(question=question, sql=sql, confidence=confidence,
+                        created_at=time.time(), schema_version=self._schema_version())
+            self._plans[key] = plan
+            self._stored += 1
+            self._save()
+            return plan
+
+    def record(self, question: str, steps, scope: str = "default", tools=SQL_TOOLS) -> Plan | None:
+        """
+        Learn a plan from an agent run's intermediate steps.
+
+        Returns:
+            Plan | None: The stored plan, or None if the run had no usable plan
+        """
+        extracted = plan_from_steps(steps, tools)
+        if extracted is None:
+            return None
+        sql, confidence = extracted
+        return self.store(question, sql, confidence, scope)
+
+    def forget(self, question: str, scope: str = "default") -> bool:
+        """Drop the plan for a question. Returns True if one existed."""
+        with self._lock:
+            plan = self._plans.pop((scope, normalize_question(question)), None)
+            if plan is not None:
+                self._save()
+            return plan is not None
+
+    def clear(self):
+        """Drop every plan."""
+        with self._lock:
+            self._plans.clear()
+            self._save()
+
+    def stats(self) -> dict:
+        """
+        Snapshot of plan cache counters.
+
+        Returns:
+            dict: plans held, hits (LLM skipped), misses, hit rate, plans
+            stored, plans expired (TTL or schema change) and failed replays
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "plans": len(self._plans),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+                "stored": self._stored,
+                "expired": self._expired,
+                "replay_failures": self._replay_failures,
+            }
+
+
+def render_result(result: dict, max_rows: int = 10) -> str:
+    """Plain-text table of a {"columns", "rows"} result, for answers served without the LLM."""
+    lines = [" | ".join(result["columns"])]
+    for row in result["rows"][:max_rows]:
+        lines.append(" | ".join(str(value) for value in row))
+    shown = min(len(result["rows"]), max_rows)
+    if result.get("note"):
+        lines.append(f"({result['note']})")
+    elif len(result["rows"]) > shown:
+        lines.append(f"({shown} of {len(result['rows'])} rows shown)")
+    return "\n".join(lines)
+
+
+# Process-wide registry: one plan cache per database file
+_plan_caches = {}
+_plan_caches_lock = threading.Lock()
+
+
+def get_plan_cache(pool, **options) -> PlanCache:
+    """
+    Return the shared plan cache for a pool's database, creating it on first use.
+
+    Plans persist to `<database>.plans.json` next to the database file unless
+    a `path` option is given.
+
+    Args:
+        pool: ReadOnlyPool whose database the plans run against
+        **options: PlanCache settings, applied only when the cache is created
+    """
+    with _plan_caches_lock:
+        cache = _plan_caches.get(pool.db_path)
+        if cache is None:
+            options.setdefault("path", pool.db_path.with_suffix(".plans.json"))
+            cache = _plan_caches[pool.db_path] = PlanCache(pool, **options)
+        return cache
+
+
+def plan_cache_stats() -> dict:
+    """Counters for every plan cache in this process, keyed by database path."""
+    with _plan_caches_lock:
+        caches = list(_plan_caches.items())
+    return {str(path): cache.stats() for path, cache in caches}
@@ -0,0 +1,268 @@
+"""
+Per-Query Execution Budgets
+
+The LIMIT that SafeSQLTool appends only bounds how many rows come back. It is
+skipped for aggregates, and it does nothing about a query that works for
+minutes before producing its first row: a cartesian join, or a GROUP BY over a
+self-join. This module enforces budgets inside SQLite while the statement runs.
+
+Budgets:
+- VM steps: a progress handler counts SQLite virtual-machine instructions and
+  aborts the statement past `max_vm_steps`
+- Wall clock: the same handler aborts it past `timeout` seconds
+- Heap: SQLite's hard heap limit (process-wide). The pool keeps temp storage in
+  memory, so sorts and temporary B-trees count against it too
+- String/blob length: the per-connection SQLITE_LIMIT_LENGTH caps runaway
+  group_concat() or string building
+- Plan pre-check (optional): `EXPLAIN QUERY PLAN` is inspected first, and plans
+  that nest full scans of large tables (a join without a usable join condition)
+  are rejected before they run
+
+A blown budget raises BudgetExceeded, whose message ("budget exceeded
+(vm_steps): ...") tells the agent which limit it hit and how to rewrite the
+query; to_dict() gives the same information to programs.
+
+Usage:
+    from query_budget import DEFAULT_BUDGET
+
+    with pool.connection() as conn:
+        with DEFAULT_BUDGET.limit(conn, sql):
+            payload = fetch_bounded(conn.execute(sql))
+"""
+
+import re  # Query-plan parsing
+import sqlite3  # Limits, progress handler and error types
+import threading  # Lock around the counters
+import time  # Wall-clock deadline
+from contextlib import contextmanager  # Budget scope around one statement
+from dataclasses import dataclass  # Budget settings
+
+# Agent-facing rewrite hints per budget
+HINTS = {
+    "vm_steps": "The query does too much work. Filter earlier (WHERE on dates/ids), aggregate a smaller range, "
+                "or join on key columns.",
+    "timeout": "The query ran too long. Filter earlier, aggregate a smaller range, or join on key columns.",
+    "heap": "The query needs too much memory (large sort, DISTINCT or GROUP BY). Aggregate before joining, "
+            "group by fewer columns, or filter first.",
+    "length": "A single value grew too large (e.g. group_concat over many rows). Return rows instead, or add LIMIT.",
+    "cross_join": "The plan nests full scans of large tables, i.e. a join without a usable join condition. "
+                  "Join on the foreign-key columns (e.g. order_items.order_id = orders.id) or filter first.",
+}
+
+_PLAN_SCAN = re.compile(r"^SCAN (?:TABLE )?(\S+)(?: AS (\S+))?")
+_TABLE_ALIAS = re.compile(
+    r"\b(?:FROM|JOIN|,)\s*([A-Za-z_]\w*)(?:\s+(?:AS\s+)?(?!(?:ON|USING|WHERE|JOIN|LEFT|RIGHT|INNER|OUTER|CROSS|"
+    r"NATURAL|GROUP|ORDER|LIMIT|HAVING|UNION|WINDOW)\b)([A-Za-z_]\w*))?", re.I)
+
+
+class BudgetExceeded(Exception):
+    """
+    A query went over one of its budgets.
+
+    Attributes:
+        budget (str): Which budget: vm_steps, timeout, heap, length or cross_join
+        limit: The configured limit
+        used: How much had been used (steps, seconds, estimated row combinations)
+        elapsed (float): Seconds the statement ran before it was stopped
+    """
+
+    def __init__(self, budget: str, limit, used=None, elapsed: float = 0.0, detail: str = ""):
+        self.budget = budget
+        self.limit = limit
+        self.used = used
+        self.elapsed = elapsed
+        self.detail = detail
+        super().__init__(str(self))
+
+    def __str__(self):
+        used = f", used {self.used:,}" if isinstance(self.used, int) else ""
+        detail = f"; {self.detail}" if self.detail else ""
+        return (f"budget exceeded ({self.budget}): limit {self.limit:,}{used}, stopped after "
+                f"{self.elapsed:.2f}s{detail}. {HINTS[self.budget]}")
+
+    def to_dict(self) -> dict:
+        """Machine-readable form of the error."""
+        return {
+            "error": "budget_exceeded",
+            "budget": self.budget,
+            "limit": self.limit,
+            "used": self.used,
+            "elapsed_ms": round(self.elapsed * 1000, 3),
+            "detail": self.detail,
+            "hint": HINTS[self.budget],
+        }
+
+
+# Process-wide counters reported by budget_stats()
+_counts = {"statements": 0, "rejected_plans": 0, "exceeded": {}}
+_counts_lock = threading.Lock()
+
+
+def _count(budget: str | None = None):
+    with _counts_lock:
+        if budget is None:
+            _counts["statements"] += 1
+        else:
+            _counts["exceeded"][budget] = _counts["exceeded"].get(budget, 0) + 1
+            if budget == "cross_join":
+                _counts["rejected_plans"] += 1
+
+
+def budget_stats() -> dict:
+    """Statements run under a budget, plans rejected, and budgets exceeded by kind."""
+    with _counts_lock:
+        return {**_counts, "exceeded": dict(_counts["exceeded"])}
+
+
+class _Meter:
+    """Progress-handler state for one statement."""
+
+    def __init__(self, budget: "QueryBudget"):
+        self.budget = budget
+        self.started = time.perf_counter()
+        self.deadline = self.started + budget.timeout if budget.timeout else None
+        self.steps = 0
+        self.exceeded = None  # BudgetExceeded to raise once SQLite reports the interrupt
+
+    def __call__(self) -> int:
+        self.steps += self.budget.check_every
+        budget = self.budget
+        if budget.max_vm_steps is not None and self.steps > budget.max_vm_steps:
+            self.exceeded = BudgetExceeded("vm_steps", budget.max_vm_steps, self.steps, self.elapsed())
+            return 1
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            self.exceeded = BudgetExceeded("timeout", budget.timeout, None, self.elapsed())
+            return 1
+        return 0
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+@dataclass(frozen=True)
+class QueryBudget:
+    """
+    Limits applied to one statement.
+
+    Attributes:
+        max_vm_steps (int | None): SQLite VM instructions before the statement is aborted
+        timeout (float | None): Seconds before the statement is aborted
+        max_heap_bytes (int | None): SQLite hard heap limit (process-wide, includes in-memory temp storage)
+        max_length (int | None): Largest string or blob a statement may build
+        max_cross_join_rows (int | None): Reject plans whose nested full scans multiply
+            out to more row combinations than this (None disables the pre-check)
+        check_every (int): VM instructions between progress-handler calls
+    """
+    max_vm_steps: int | None = 500_000_000
+    timeout: float | None = 15.0
+    max_heap_bytes: int | None = 1024 * 1024 * 1024
+    max_length: int | None = 16 * 1024 * 1024
+    max_cross_join_rows: int | None = 10_000_000
+    check_every: int = 10_000
+
+    def check_plan(self, conn: sqlite3.Connection, sql: str):
+        """
+        Reject nested full scans of large tables before running anything.
+
+        Sibling SCAN lines in EXPLAIN QUERY PLAN form one nested loop: each runs
+        in full once per row of the scans before it. The estimate ignores
+        filters, so it is an upper bound.
+
+        Raises:
+            BudgetExceeded: budget "cross_join" when the product is over the limit
+        """
+        if self.max_cross_join_rows is None:
+            return
+        started = time.perf_counter()
+        aliases = {alias.lower(): table for table, alias in _TABLE_ALIAS.findall(sql) if alias}
+        scans = {}  # plan parent -> [(table, estimated rows)]
+        for _, parent, _, detail in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+            match = _PLAN_SCAN.match(detail)
+            if match:
+                # Newer SQLite prints only the alias ("SCAN oi"), older ones "SCAN TABLE order_items AS oi"
+                name = match.group(1) if match.group(2) else aliases.get(match.group(1).lower(), match.group(1))
+                rows = _estimate_rows(conn, name, self.max_cross_join_rows)
+                if rows is not None:
+                    scans.setdefault(parent, []).append((name, rows))
+        for nest in scans.values():
+            if len(nest) < 2:
+                continue
+            combinations = 1
+            for _, rows in nest:
+                combinations *= max(rows, 1)
+            if combinations > self.max_cross_join_rows:
+                tables = " x ".join(f"{name} (~{rows:,} rows)" for name, rows in nest)
+                error = BudgetExceeded("cross_join", self.max_cross_join_rows, combinations,
+                                       time.perf_counter() - started, f"plan scans {tables}")
+                _count("cross_join")
+                raise error
+
+    @contextmanager
+    def limit(self, conn: sqlite3.Connection, sql: str | None = None):
+        """
+        Run the enclosed execute/fetch under this budget.
+
+        Args:
+            conn: Connection the statement runs on
+            sql (str | None): The statement, for the plan pre-check (None skips it)
+
+        Raises:
+            BudgetExceeded: When a limit stops the statement (or the plan is rejected)
+        """
+        if sql is not None:
+            self.check_plan(conn, sql)
+        _count()
+        previous_length = None
+        if self.max_length is not None:
+            previous_length = conn.setlimit(sqlite3.SQLITE_LIMIT_LENGTH, self.max_length)
+        meter = _Meter(self)
+        conn.set_progress_handler(meter, self.check_every)
+        try:
+            if self.max_heap_bytes is not None:
+                _set_heap_limit(conn, self.max_heap_bytes)
+            yield meter
+        except sqlite3.OperationalError as e:
+            if meter.exceeded is not None:  # Our handler stopped it (not a user interrupt)
+                _count(meter.exceeded.budget)
+                raise meter.exceeded from e
+            raise
+        except MemoryError as e:
+            _count("heap")
+            raise BudgetExceeded("heap", self.max_heap_bytes, None, meter.elapsed()) from e
+        except sqlite3.DataError as e:  # "string or blob too big"
+            _count("length")
+            raise BudgetExceeded("length", self.max_length, None, meter.elapsed()) from e
+        finally:
+            conn.set_progress_handler(None, 0)
+            if previous_length is not None:
+                conn.setlimit(sqlite3.SQLITE_LIMIT_LENGTH, previous_length)
+
+
+_heap_limit = None  # Process-wide, so only set when it changes
+_heap_lock = threading.Lock()
+
+
+def _set_heap_limit(conn: sqlite3.Connection, limit: int):
+    global _heap_limit
+    with _heap_lock:
+        if _heap_limit != limit:
+            conn.execute(f"PRAGMA hard_heap_limit = {int(limit)}")
+            _heap_limit = limit
+
+
+def _estimate_rows(conn: sqlite3.Connection, table: str, cap: int) -> int | None:
+    """Cheap row estimate for a table (None for CTEs and subqueries)."""
+    quoted = '"' + table.replace('"', '""') + '"'
+    try:
+        return conn.execute(f"SELECT MAX(rowid) FROM {quoted}").fetchone()[0] or 0  # O(log n) for rowid tables
+    except sqlite3.OperationalError:
+        pass
+    try:
+        # WITHOUT ROWID table: count, but never past the cap
+        return conn.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM {quoted} LIMIT ?)", (cap + 1,)).fetchone()[0]
+    except sqlite3.OperationalError:
+        return None  # Not a table (CTE or subquery result)
+
+
+# Budget used by the guarded SQL paths (SafeSQLTool, async executor, plan-cache replays)
+DEFAULT_BUDGET = QueryBudget()
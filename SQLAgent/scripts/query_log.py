@@ -0,0 +1,173 @@
+"""
+Executed-SQL Workload Log
+
+Records every guarded SELECT that actually reaches the database - from
+SafeSQLTool in scripts 03/04, the async executor and plan-cache replays - with
+how often it ran and how long it took. The index advisor reads this workload to
+decide which indexes would pay off.
+
+Key Features:
+- Keyed on normalized SQL (same normalization as the result cache); the
+  statement itself is kept as executed, so the advisor plans the real query
+- Count, total/max execution time and last-seen time per statement
+- Bounded: the least-run statements are dropped beyond `max_entries`
+- Persisted to `<database>.queries.json` next to the database (written every
+  few records and at exit)
+
+Usage:
+    from query_log import get_query_log
+
+    log = get_query_log(pool)
+    log.record(sql, elapsed_seconds)
+    for entry in log.entries():
+        print(entry["count"], entry["sql"])
+"""
+
+import atexit  # Final save at interpreter exit
+import json  # On-disk log file
+import os  # Atomic file replacement
+import pathlib  # Log file location
+import threading  # Lock around the entries
+import time  # Last-seen timestamps
+
+from result_cache import normalize_sql  # Statement normalization
+
+
+class QueryLog:
+    """
+    Frequency and timing of executed SQL for one database.
+
+    Attributes:
+        path (pathlib.Path | None): JSON file the log persists to
+        max_entries (int): Statements kept (least-run ones are dropped first)
+        save_every (int): Records between saves
+    """
+
+    def __init__(self, path=None, max_entries: int = 2000, save_every: int = 20):
+        """
+        Args:
+            path: JSON file for persistence (None keeps the log in memory only)
+            max_entries (int): Maximum distinct statements kept
+            save_every (int): Save after this many new records
+        """
+        self.path = pathlib.Path(path) if path is not None else None
+        self.max_entries = max_entries
+        self.save_every = save_every
+
+        self._entries = {}  # normalized sql -> {"key", "sql", "count", "total_ms", "max_ms", "last_seen"}
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self._recorded = 0
+
+        self._load()
+        atexit.register(self.save)
+
+    def _load(self):
+        """Read the persisted log, ignoring a missing or unreadable file."""
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            for entry in json.loads(self.path.read_text()).get("queries", []):
+                entry.setdefault("key", normalize_sql(entry["sql"]))
+                self._entries[entry["key"]] = entry
+        except (OSError, ValueError, TypeError, KeyError, AttributeError):
+            self._entries = {}
+
+    def save(self):
+        """Write the log atomically."""
+        with self._lock:
+            if self.path is None or not self._unsaved:
+                return
+            data = {"queries": sorted(self._entries.values(), key=lambda e: -e["count"])}
+            self._unsaved = 0
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        try:
+            tmp.write_text(json.dumps(data, indent=1))
+            os.replace(tmp, self.path)
+        except OSError:
+            pass  # Read-only checkout: keep the log in memory
+
+    def record(self, sql: str, seconds: float):
+        """
+        Count one execution of a statement.
+
+        Args:
+            sql (str): The SQL as executed (after LIMIT injection)
+            seconds (float): Execution plus fetch time
+        """
+        key = normalize_sql(sql)
+        ms = seconds * 1000
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {"key": key, "sql": sql, "count": 0, "total_ms": 0.0, "max_ms": 0.0}
+            entry["count"] += 1
+            entry["total_ms"] = round(entry["total_ms"] + ms, 3)
+            entry["max_ms"] = round(max(entry["max_ms"], ms), 3)
+            entry["last_seen"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+            self._recorded += 1
+            self._unsaved += 1
+
+            if len(self._entries) > self.max_entries:
+                coldest = min(self._entries.values(), key=lambda e: (e["count"], e["last_seen"]))
+                del self._entries[coldest["key"]]
+            due = self._unsaved >= self.save_every
+        if due:
+            self.save()
+
+    def entries(self) -> list:
+        """Logged statements, most total time first."""
+        with self._lock:
+            return sorted((dict(e) for e in self._entries.values()), key=lambda e: -e["total_ms"])
+
+    def clear(self):
+        """Forget every statement (memory and disk)."""
+        with self._lock:
+            self._entries.clear()
+            self._unsaved = 0
+            if self.path is not None:
+                try:
+                    self.path.unlink()
+                except OSError:
+                    pass
+
+    def stats(self) -> dict:
+        """
+        Snapshot of query log counters.
+
+        Returns:
+            dict: distinct statements, executions recorded this session, total logged time in ms
+        """
+        with self._lock:
+            return {
+                "statements": len(self._entries),
+                "recorded": self._recorded,
+                "total_ms": round(sum(e["total_ms"] for e in self._entries.values()), 3),
+            }
+
+
+# Process-wide registry: one query log per database file
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+def get_query_log(pool, **options) -> QueryLog:
+    """
+    Return the shared query log for a pool's database, creating it on first use.
+
+    Entries persist to `<database>.queries.json` next to the database file
+    unless a `path` option is given.
+    """
+    with _logs_lock:
+        log = _logs.get(pool.db_path)
+        if log is None:
+            options.setdefault("path", pool.db_path.with_suffix(".queries.json"))
+            log = _logs[pool.db_path] = QueryLog(**options)
+        return log
+
+
+def query_log_stats() -> dict:
+    """Counters for every query log in this process, keyed by database path."""
+    with _logs_lock:
+        logs = list(_logs.items())
+    return {str(path): log.stats() for path, log in logs}
@@ -0,0 +1,373 @@
+"""
+Local HTTP Query Service
+
+Other programs could only reach the agent by shelling out to a script, paying
+for the LangChain import, the Gemini client, the schema context and the
+connection pool on every call. This service builds all of that once, at
+startup, and keeps it warm across requests:
+
+- Raw SQL goes through SafeSQLTool from 03_guardrailed_agent.py (guardrail,
+  LIMIT injection, result cache, query budget, bounded fetch, query log)
+- Questions go to 03's secure agent, whose only tool is that same SafeSQLTool,
+  so LLM-written SQL gets the guardrail, LIMIT and query budget too. Runs are
+  time-boxed like the CLI's secure chat (ASK_AGENT_OPTIONS). Repeat questions
+  are answered from the plan cache, which the service shares with the CLI's
+  secure mode
+- Requests run on a fixed worker pool (--workers). Up to --backlog more
+  connections wait for a worker, and beyond that the service answers 503 at once
+  instead of queueing without bound
+
+Endpoints (JSON in, JSON out):
+- POST /sql     {"sql": "SELECT ..."} -> {"columns", "rows", ["truncated", "note"], "ms"}
+                 guardrail or SQL errors -> 400 {"error"}
+- POST /ask     {"question": "..."} -> {"answer", "sql", "source": "agent" | "plan_cache", "ms"}
+                 (plan-cache answers also carry "result")
+- GET  /health  -> {"status": "ok", ...}; 503 when the database can't be queried
+- GET  /metrics -> per-endpoint request counts and latencies, plus the pool, result
+                 cache, plan cache, budget, guard, registry and encoder counters
+
+The database is the scripts' default (SQL_AGENT_DB selects another one). The
+service binds to 127.0.0.1 by default and has no authentication; don't expose
+it beyond the machine it runs on.
+
+Usage (from the SQLAgent folder):
+    python scripts/query_service.py [--port 8765] [--workers 8] [--no-agent]
+    curl -s localhost:8765/sql -d '{"sql": "SELECT region, COUNT(*) FROM customers GROUP BY region"}'
+    curl -s localhost:8765/ask -d '{"question": "Which region has most orders?"}'
+"""
+
+import argparse  # Command-line options
+import json  # Request and response bodies
+import logging  # Access log
+import os  # API key check
+import socket  # Write-side shutdown of rejected connections
+import threading  # Request slots and counter lock
+import time  # Latency and uptime
+from collections import deque  # Recent latencies per endpoint
+from concurrent.futures import ThreadPoolExecutor  # Request worker pool
+from http.server import BaseHTTPRequestHandler, HTTPServer  # Standard-library HTTP server
+
+from sql_executor import DEFAULT_DB_PATH, get_pool, pool_stats  # Shared read-only pool
+from agent_registry import SECURE_PREFIX, agent_registry_stats  # Secure chat prefix, metrics
+from plan_cache import get_plan_cache, plan_cache_stats, render_result  # Repeat questions without the LLM
+from result_cache import cache_stats  # Metrics
+from query_budget import budget_stats  # Metrics
+from sql_guard import guard_stats  # Metrics
+from observation_encoder import encoder_stats  # Metrics
+from replica import replica_stats  # Metrics (SQL_AGENT_REPLICA=1)
+from script_runner import load_script  # SafeSQLTool and its agent from 03_guardrailed_agent.py
+
+logger = logging.getLogger("query_service")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Requests handled at once, and connections allowed to wait for a worker
+DEFAULT_WORKERS = 8
+DEFAULT_BACKLOG = 32
+
+# Largest request body accepted (a question or one SELECT)
+MAX_BODY_BYTES = 64 * 1024
+
+# Plan-cache scope shared with the CLI's secure chat mode
+SCOPE = "secure"
+
+# /ask agent runs: short and time-boxed (the query budget stops a runaway statement), and
+# returning their tool calls so the plan cache can learn the final SQL
+ASK_AGENT_OPTIONS = {
+    "max_iterations": 3,
+    "max_execution_time": 30,
+    "return_intermediate_steps": True,
+    "handle_parsing_errors": True,
+}
+
+# Sent straight to the socket when every worker and waiting slot is taken
+_BUSY_BODY = b'{"error": "busy: all workers are occupied"}'
+_BUSY = (b"HTTP/1.0 503 Service Unavailable\r\nContent-Type: application/json\r\nRetry-After: 1\r\n"
+         b"Content-Length: %d\r\n\r\n%s" % (len(_BUSY_BODY), _BUSY_BODY))
+
+
+class QueryService:
+    """
+    The warm components behind the HTTP endpoints.
+
+    Attributes:
+        pool: ReadOnlyPool every query runs on
+        tool: SafeSQLTool instance for /sql (set by warm())
+        agent: 03's secure agent (SafeSQLTool only) for /ask, or None when NL questions are disabled
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.plans = get_plan_cache(pool)
+        self.tool = None
+        self.agent = None
+        self.agent_error = None
+        self.started = time.time()
+        self.warm_seconds = None
+        self._lock = threading.Lock()
+        self._endpoints = {}  # path -> {"requests", "errors", "ms_total", "recent"}
+        self._rejected = 0
+
+    def warm(self, agent: bool = True):
+        """
+        Build everything a request needs, so no request pays for it.
+
+        Args:
+            agent (bool): Also build the LLM client, schema context and secure agent
+        """
+        started = time.perf_counter()
+        script = load_script("03_guardrailed_agent.py")
+        self.tool = script.SafeSQLTool()
+        if agent:
+            try:
+                # Shared LLM client and rendered schema context, then the agent on top of them
+                self.agent = script.build_agent(verbose=False, **ASK_AGENT_OPTIONS)
+            except Exception as e:  # /sql keeps working; /ask reports why it can't
+                self.agent = None
+                self.agent_error = f"{type(e).__name__}: {e}"
+        else:
+            self.agent_error = "NL questions are disabled (--no-agent)"
+        self.warm_seconds = time.perf_counter() - started
+
+    def run_sql(self, sql: str) -> tuple:
+        """Guarded SELECT through SafeSQLTool. Returns (HTTP status, body)."""
+        result = self.tool._run(sql)
+        if not isinstance(result, dict):
+            return 400, {"error": str(result)}  # Guardrail message or "ERROR: ..."
+        return 200, dict(result)
+
+    def ask(self, question: str) -> tuple:
+        """Natural-language question: plan cache first, then the secure agent. Returns (status, body)."""
+        plan = self.plans.lookup(question, scope=SCOPE)
+        if plan is not None:
+            result = self.plans.replay(plan)
+            if result is not None:
+                return 200, {"answer": render_result(result), "sql": plan.sql, "source": "plan_cache",
+                             "confidence": plan.confidence, "result": dict(result)}
+        if self.agent is None:
+            return 503, {"error": self.agent_error or "the agent is not ready"}
+        response = self.agent.invoke({"input": SECURE_PREFIX + question})
+        learned = self.plans.record(question, response.get("intermediate_steps"), scope=SCOPE)
+        return 200, {"answer": response["output"], "sql": learned.sql if learned else None, "source": "agent"}
+
+    def health(self) -> tuple:
+        """Database reachability and readiness. Returns (status, body)."""
+        body = {"status": "ok", "database": str(self.pool.db_path), "uptime_s": round(time.time() - self.started, 1),
+                "agent": "ready" if self.agent is not None else "unavailable"}
+        if self.agent is None:
+            body["agent_error"] = self.agent_error
+        try:
+            with self.pool.connection() as conn:
+                conn.execute("SELECT 1").fetchone()
+        except Exception as e:
+            body.update(status="unavailable", error=f"{type(e).__name__}: {e}")
+            return 503, body
+        return 200, body
+
+    def metrics(self) -> tuple:
+        """Service and execution-layer counters. Returns (status, body)."""
+        with self._lock:
+            endpoints = {}
+            for path, counts in self._endpoints.items():
+                recent = sorted(counts["recent"])
+                endpoints[path] = {
+                    "requests": counts["requests"],
+                    "errors": counts["errors"],
+                    "avg_ms": round(counts["ms_total"] / counts["requests"], 1) if counts["requests"] else 0.0,
+                    "p50_ms": round(recent[len(recent) // 2], 1) if recent else 0.0,
+                    "p95_ms": round(recent[int(len(recent) * 0.95)], 1) if recent else 0.0,
+                }
+            rejected = self._rejected
+        return 200, {
+            "service": {"uptime_s": round(time.time() - self.started, 1),
+                        "warm_ms": round(self.warm_seconds * 1000, 1) if self.warm_seconds is not None else None,
+                        "rejected_busy": rejected, "endpoints": endpoints},
+            "pools": pool_stats(),
+            "replicas": replica_stats(),
+            "result_caches": cache_stats(),
+            "plan_caches": plan_cache_stats(),
+            "agent_registries": agent_registry_stats(),
+            "query_budget": budget_stats(),
+            "sql_guard": guard_stats(),
+            "observations": encoder_stats(),
+        }
+
+    def record(self, path: str, status: int, seconds: float):
+        """Count one handled request."""
+        with self._lock:
+            counts = self._endpoints.get(path)
+            if counts is None:
+                counts = self._endpoints[path] = {"requests": 0, "errors": 0, "ms_total": 0.0,
+                                                  "recent": deque(maxlen=500)}
+            counts["requests"] += 1
+            counts["errors"] += status >= 400
+            counts["ms_total"] += seconds * 1000
+            counts["recent"].append(seconds * 1000)
+
+    def record_rejected(self):
+        with self._lock:
+            self._rejected += 1
+
+
+def _json_value(value):
+    if isinstance(value, bytes):
+        return value.hex()
+    return str(value)
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    """Routes one HTTP request to the QueryService of its server."""
+
+    server_version = "SQLAgentQueryService/1.0"
+    timeout = 10  # Seconds a client may take to send its request
+
+    def do_GET(self):
+        routes = {"/health": self.server.service.health, "/metrics": self.server.service.metrics}
+        self._dispatch(routes, lambda route, body: route())
+
+    def do_POST(self):
+        routes = {"/sql": (self.server.service.run_sql, "sql"), "/ask": (self.server.service.ask, "question")}
+        self._dispatch(routes, self._call_with_field)
+
+    def _dispatch(self, routes, call):
+        started = time.perf_counter()
+        path = self.path.split("?", 1)[0]
+        route = routes.get(path)
+        if route is None:
+            status, body = 404, {"error": f"no endpoint {self.command} {path}"}
+        else:
+            try:
+                status, body = call(route, self._read_json() if self.command == "POST" else None)
+            except _BadRequest as e:
+                status, body = e.status, {"error": str(e)}
+            except Exception as e:
+                logger.exception("%s %s failed", self.command, path)
+                status, body = 500, {"error": f"{type(e).__name__}: {e}"}
+        elapsed = time.perf_counter() - started
+        if isinstance(body, dict) and path in ("/sql", "/ask"):
+            body["ms"] = round(elapsed * 1000, 1)
+        self._send_json(status, body)
+        self.server.service.record(path if route is not None else "other", status, elapsed)
+
+    @staticmethod
+    def _call_with_field(route, payload):
+        handler, field = route
+        value = payload.get(field) if isinstance(payload, dict) else None
+        if not isinstance(value, str) or not value.strip():
+            raise _BadRequest(400, f'expected a JSON object with a non-empty "{field}" string')
+        return handler(value.strip())
+
+    def _read_json(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            raise _BadRequest(400, "invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise _BadRequest(413, f"request body over {MAX_BODY_BYTES} bytes")
+        try:
+            return json.loads(self.rfile.read(length) or b"null")
+        except ValueError as e:
+            raise _BadRequest(400, f"invalid JSON: {e}")
+
+    def _send_json(self, status: int, body):
+        data = json.dumps(body, ensure_ascii=False, default=_json_value).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.info("%s %s", self.address_string(), format % args)
+
+
+class _BadRequest(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class WorkerPoolHTTPServer(HTTPServer):
+    """
+    HTTPServer that handles requests on a fixed thread pool instead of a thread per connection.
+
+    Attributes:
+        service (QueryService): Components shared by every request
+        workers (int): Requests handled at once
+        backlog (int): Accepted connections allowed to wait for a worker
+    """
+
+    def __init__(self, address, service: QueryService, workers: int = DEFAULT_WORKERS,
+                 backlog: int = DEFAULT_BACKLOG):
+        super().__init__(address, QueryRequestHandler)
+        self.service = service
+        self.workers = workers
+        self.backlog = backlog
+        self._threads = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query-service")
+        self._slots = threading.BoundedSemaphore(workers + backlog)
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            # Everything is busy and the waiting line is full: answer now rather than queue without bound
+            self.service.record_rejected()
+            try:
+                request.sendall(_BUSY)
+                request.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self._threads.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self._threads.shutdown(wait=True, cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve guarded SQL and secure-agent questions over HTTP/JSON.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Interface to bind (default: localhost only)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Requests handled at once")
+    parser.add_argument("--backlog", type=int, default=DEFAULT_BACKLOG,
+                        help="Connections allowed to wait for a worker before 503s")
+    parser.add_argument("--no-agent", action="store_true", help="Serve /sql only (no LLM, no API key needed)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
+    # Connections for the workers plus one spare for /health while every worker is busy
+    # (created before SafeSQLTool's script asks for the same pool, so this size applies)
+    pool = get_pool(DEFAULT_DB_PATH, size=max(4, args.workers + 1))
+    service = QueryService(pool)
+    api_key = os.getenv("GOOGLE_API_KEY")
+    agent = not args.no_agent and bool(api_key) and api_key != "your-gemini-api-key-here"
+    if not args.no_agent and not agent:
+        logger.warning("GOOGLE_API_KEY is not set: serving /sql only")
+    print("⏳ Warming up (SQL tool" + (", LLM client, schema context, secure agent" if agent else "") + ")...")
+    service.warm(agent=agent)
+    if agent and service.agent is None:
+        logger.warning("secure agent unavailable, /ask will answer 503: %s", service.agent_error)
+
+    server = WorkerPoolHTTPServer((args.host, args.port), service, args.workers, args.backlog)
+    print(f"✅ Ready in {service.warm_seconds:.2f}s: http://{args.host}:{server.server_port} "
+          f"({args.workers} workers; POST /sql, POST /ask, GET /health, GET /metrics)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⏹️  Stopping...")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+"""
+In-Memory Hot Replica for Agent Reads
+
+The agents read sql_agent_class.db while the CLI's direct SQL interface commits
+DELETE/UPDATE statements to the same file. Every commit invalidates the page
+cache of every pooled reader, so the next agent query goes back to the
+filesystem, and readers share the file's locks with the writer.
+
+This module keeps an in-memory copy of the database for the agents instead:
+
+- The copy is loaded with the SQLite online backup API in one step (a
+  consistent snapshot; WAL writers are not blocked while it is taken)
+- It lives in SQLite's memdb VFS under a unique name, so every pooled
+  connection reads the same copy (no per-connection duplicate)
+- A background thread watches `PRAGMA data_version` on the file and builds a
+  fresh copy after a commit - at most once per `interval` seconds - then swaps
+  it in atomically: new checkouts read the new copy, statements already running
+  finish on the old one, which is freed when its last reader closes
+- Replica lag (how long a committed change has not been visible to the agents),
+  copy age and refresh cost are reported by stats()
+
+Enable it for every pool with SQL_AGENT_REPLICA=1 (SQL_AGENT_REPLICA_INTERVAL
+sets the minimum seconds between refreshes, default 1; 0 refreshes on every
+commit). Memory use is the database size, twice over for a moment during a swap.
+
+Usage:
+    SQL_AGENT_REPLICA=1 python scripts/04_complex_queries.py
+    python scripts/replica.py bench --db sql_agent_scale_1m.db
+"""
+
+import argparse  # Command-line actions
+import itertools  # Unique memdb names
+import os  # SQL_AGENT_REPLICA_INTERVAL, scratch copy cleanup
+import pathlib  # Database paths
+import random  # Customers the benchmark reads
+import sqlite3  # Backup API, watcher and memdb connections
+import statistics  # Latency percentiles for the benchmark
+import tempfile  # Scratch copy the benchmark writes to
+import threading  # Refresh thread, registry lock and counters
+import time  # Lag, age and refresh timing
+
+from sql_executor import DEFAULT_DB_PATH, ReadOnlyPool, fetch_bounded  # Pools the replica serves, bounded fetch
+
+DEFAULT_INTERVAL = float(os.environ.get("SQL_AGENT_REPLICA_INTERVAL", "1"))
+
+_names = itertools.count(1)
+
+# Short customer-keyed reads, the shape most agent follow-up questions take
+BENCH_QUERIES = [
+    "SELECT name, email, region, created_at FROM customers WHERE id = ?",
+    "SELECT o.id, o.order_date, o.status, SUM(oi.quantity * oi.unit_price_cents) AS total_cents "
+    "FROM orders o JOIN order_items oi ON oi.order_id = o.id WHERE o.customer_id = ? GROUP BY o.id",
+    "SELECT COUNT(*), COALESCE(SUM(r.amount_cents), 0) FROM refunds r "
+    "JOIN orders o ON o.id = r.order_id WHERE o.customer_id = ?",
+]
+
+
+class HotReplica:
+    """
+    In-memory copy of one database file, refreshed when the file changes.
+
+    Attributes:
+        db_path (pathlib.Path): Database file being replicated
+        interval (float): Minimum seconds between refreshes (0 = after every commit)
+        poll (float): Seconds between PRAGMA data_version checks
+        uri (str): URI of the current copy; pooled connections open this
+    """
+
+    def __init__(self, db_path, interval: float = DEFAULT_INTERVAL, poll: float = 0.25,
+                 timeout: float = 10.0, follow: bool = True):
+        """
+        Load the first copy and start following the file.
+
+        Args:
+            db_path: SQLite database file to replicate
+            interval (float): Minimum seconds between refreshes; changes committed
+                sooner are picked up when the interval has passed
+            poll (float): Seconds between checks for committed changes
+            timeout (float): Busy timeout for the backup's read of the file
+            follow (bool): Start the background refresh thread
+        """
+        self.db_path = pathlib.Path(db_path).resolve()
+        self.interval = interval
+        self.poll = poll
+        self.timeout = timeout
+        self.uri = None
+
+        self._lock = threading.Lock()  # current copy, counters, watcher
+        self._refresh_lock = threading.Lock()  # one backup at a time
+        self._listeners = []
+        self._holder = None  # keeps the current memdb copy alive
+        self._generation = 0
+        self._stop = threading.Event()
+
+        # Dedicated connection used only to watch for committed changes
+        self._watcher = sqlite3.connect(f"{self.db_path.as_uri()}?mode=ro", uri=True, check_same_thread=False)
+        self._synced_version = None  # file data_version the current copy was taken at
+        self._synced_at = 0.0
+        self._changed_at = None  # when a change not yet in the copy was first seen
+
+        # Counters reported by stats()
+        self._refreshes = 0
+        self._refresh_time = 0.0
+        self._last_refresh = 0.0
+        self._max_lag = 0.0
+        self._failures = 0
+        self._last_error = None
+        self._bytes = 0
+
+        self.refresh()
+        self._thread = None
+        if follow:
+            self._thread = threading.Thread(target=self._follow, name=f"replica-{self.db_path.name}", daemon=True)
+            self._thread.start()
+
+    def _read_data_version(self) -> int:
+        """Current PRAGMA data_version of the file. Caller holds the lock."""
+        return self._watcher.execute("PRAGMA data_version").fetchone()[0]
+
+    def _note_changes(self) -> bool:
+        """Record when the file moved past the copy. Caller holds the lock; returns True if stale."""
+        if self._read_data_version() == self._synced_version:
+            return False
+        if self._changed_at is None:
+            self._changed_at = time.time()
+        return True
+
+    def version(self) -> int:
+        """Generation of the current copy (changes on every swap; watched by the result cache)."""
+        return self._generation
+
+    def on_swap(self, listener):
+        """Call `listener()` after every swap (ReadOnlyPool.recycle reopens idle connections)."""
+        self._listeners.append(listener)
+
+    def refresh(self) -> float:
+        """
+        Copy the file into a new in-memory database and swap it in.
+
+        Returns:
+            float: Seconds the copy took
+        """
+        with self._refresh_lock:
+            with self._lock:
+                # Read before the copy: a commit landing during it triggers another refresh
+                version = self._read_data_version()
+            started = time.perf_counter()
+            uri = f"file:/sql-agent-replica-{os.getpid()}-{next(_names)}?vfs=memdb"
+            holder = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            try:
+                # The copied header says WAL, which memdb can only open under an exclusive
+                # lock; switch the copy to a rollback journal before other connections open it
+                holder.execute("PRAGMA locking_mode = EXCLUSIVE")
+                source = sqlite3.connect(f"{self.db_path.as_uri()}?mode=ro", uri=True, timeout=self.timeout)
+                try:
+                    source.backup(holder)  # All pages in one step: one consistent snapshot
+                finally:
+                    source.close()
+                holder.execute("PRAGMA journal_mode = DELETE")
+                holder.execute("PRAGMA locking_mode = NORMAL")
+                pages = holder.execute("PRAGMA page_count").fetchone()[0]  # (releases the exclusive lock)
+                page_size = holder.execute("PRAGMA page_size").fetchone()[0]
+            except Exception:
+                holder.close()
+                raise
+            elapsed = time.perf_counter() - started
+
+            with self._lock:
+                old = self._holder
+                if self._changed_at is not None:
+                    self._max_lag = max(self._max_lag, time.time() - self._changed_at)
+                self._holder, self.uri = holder, uri
+                self._generation += 1
+                self._synced_version = version
+                self._synced_at = time.time()
+                self._changed_at = None
+                self._refreshes += 1
+                self._refresh_time += elapsed
+                self._last_refresh = elapsed
+                self._bytes = pages * page_size
+            for listener in self._listeners:
+                listener()
+            if old is not None:
+                old.close()  # The old copy is freed once its last reader closes
+            return elapsed
+
+    def sync(self) -> bool:
+        """
+        Refresh now if the file changed since the current copy (read-your-writes).
+
+        Returns:
+            bool: True if a new copy was swapped in
+        """
+        with self._lock:
+            stale = self._note_changes()
+        if stale:
+            self.refresh()
+        return stale
+
+    def _follow(self):
+        """Background loop: refresh once the file changed and `interval` has passed."""
+        while not self._stop.wait(self.poll):
+            try:
+                with self._lock:
+                    due = self._note_changes() and time.time() - self._synced_at >= self.interval
+                if due:
+                    self.refresh()
+            except Exception as e:
+                # Keep serving the last good copy; the lag shows it falling behind
+                with self._lock:
+                    self._failures += 1
+                    self._last_error = str(e)
+
+    def stats(self) -> dict:
+        """
+        Snapshot of replica counters.
+
+        Returns:
+            dict: generation, size in bytes, whether changes are pending (stale),
+            lag_ms (how long the oldest pending change has been invisible),
+            max_lag_ms, age_s of the copy, refresh counts and times, failures
+        """
+        with self._lock:
+            try:
+                stale = self._note_changes()
+            except sqlite3.Error:
+                stale = self._changed_at is not None
+            now = time.time()
+            return {
+                "interval": self.interval,
+                "generation": self._generation,
+                "bytes": self._bytes,
+                "stale": stale,
+                "lag_ms": round((now - self._changed_at) * 1000, 1) if self._changed_at is not None else 0.0,
+                "max_lag_ms": round(self._max_lag * 1000, 1),
+                "age_s": round(now - self._synced_at, 1),
+                "refreshes": self._refreshes,
+                "refresh_ms_last": round(self._last_refresh * 1000, 1),
+                "refresh_ms_total": round(self._refresh_time * 1000, 1),
+                "failures": self._failures,
+                "last_error": self._last_error,
+            }
+
+    def close(self):
+        """Stop following the file; connections still reading the copy keep it until they close."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            self._watcher.close()
+            if self._holder is not None:
+                self._holder.close()
+                self._holder = None
+
+
+# Process-wide registry: one replica per database file
+_replicas = {}
+_replicas_lock = threading.Lock()
+
+
+def get_replica(pool, **options) -> HotReplica:
+    """
+    Return the replica behind a pool, creating it and switching the pool to it on first use.
+
+    Args:
+        pool: ReadOnlyPool whose checkouts should read the in-memory copy
+        **options: HotReplica settings, applied only when the replica is created
+
+    Returns:
+        HotReplica: The process-wide replica for that database
+    """
+    with _replicas_lock:
+        replica = _replicas.get(pool.db_path)
+        if replica is None:
+            replica = _replicas[pool.db_path] = HotReplica(pool.db_path, **options)
+    if pool.replica is None:
+        pool.use_replica(replica)
+    return replica
+
+
+def sync_replica(db_path) -> bool:
+    """
+    Refresh the replica of `db_path` (if one exists) after a write made by this process.
+
+    Returns:
+        bool: True if a new copy was swapped in
+    """
+    with _replicas_lock:
+        replica = _replicas.get(pathlib.Path(db_path).resolve())
+    return replica.sync() if replica is not None else False
+
+
+def replica_stats() -> dict:
+    """Counters for every replica in this process, keyed by database path."""
+    with _replicas_lock:
+        replicas = list(_replicas.items())
+    return {str(path): replica.stats() for path, replica in replicas}
+
+
+def _percentile(values: list, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))] if values else 0.0
+
+
+def bench(source, seconds: float = 5.0, write_every: float = 0.01, interval: float = DEFAULT_INTERVAL) -> list:
+    """
+    Read latency from the file and from a replica, quiet and under a steady writer.
+
+    Works on a scratch copy of `source` (the writer appends to customer names
+    in it), so the source database is never modified.
+
+    Args:
+        source: Database to copy and measure
+        seconds (float): Length of each timed phase
+        write_every (float): Seconds between writer commits
+        interval (float): Replica refresh interval
+
+    Returns:
+        list: {"reads", "writes", "queries", "p50_ms", "p95_ms", "max_ms"} per
+        configuration, plus "refreshes" and "max_lag_ms" for the replica ones
+    """
+    folder = tempfile.mkdtemp(prefix="replica-bench-")
+    path = pathlib.Path(folder) / "bench.db"
+    src = sqlite3.connect(f"{pathlib.Path(source).resolve().as_uri()}?mode=ro", uri=True)
+    dst = sqlite3.connect(path)
+    try:
+        src.backup(dst)
+        customers = dst.execute("SELECT max(id) FROM customers").fetchone()[0] or 1
+    finally:
+        src.close()
+        dst.close()
+
+    def writer(stop: threading.Event) -> int:
+        conn = sqlite3.connect(path, timeout=30)
+        writes = 0
+        while not stop.wait(write_every):
+            # A real change: SQLite skips rows an UPDATE leaves identical, and data_version with them
+            conn.execute("UPDATE customers SET name = name || '.' WHERE id = ?", (writes % customers + 1,))
+            conn.commit()
+            writes += 1
+        conn.close()
+        return writes
+
+    def measure(pool: ReadOnlyPool, with_writer: bool) -> dict:
+        stop = threading.Event()
+        writes = []
+        thread = threading.Thread(target=lambda: writes.append(writer(stop))) if with_writer else None
+        if thread:
+            thread.start()
+        latencies = []
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            customer = random.randint(1, customers)
+            for sql in BENCH_QUERIES:
+                started = time.perf_counter()
+                with pool.connection() as conn:
+                    fetch_bounded(conn.execute(sql, (customer,)), max_rows=200)
+                latencies.append((time.perf_counter() - started) * 1000)
+        stop.set()
+        if thread:
+            thread.join()
+        return {"queries": len(latencies), "writes": writes[0] if writes else 0,
+                "p50_ms": statistics.median(latencies), "p95_ms": _percentile(latencies, 0.95),
+                "max_ms": max(latencies)}
+
+    results = []
+    try:
+        for reads in ("file", "replica"):
+            for with_writer in (False, True):
+                pool = ReadOnlyPool(path, size=2)
+                replica = None
+                if reads == "replica":
+                    replica = HotReplica(path, interval=interval)
+                    pool.use_replica(replica)
+                row = {"reads": reads, **measure(pool, with_writer)}
+                if replica is not None:
+                    stats = replica.stats()
+                    row.update(refreshes=stats["refreshes"] - 1, max_lag_ms=stats["max_lag_ms"],
+                               refresh_ms=stats["refresh_ms_last"])
+                    replica.close()
+                pool.close()
+                results.append(row)
+    finally:
+        for name in os.listdir(folder):
+            os.remove(os.path.join(folder, name))
+        os.rmdir(folder)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark agent reads from an in-memory replica")
+    parser.add_argument("action", choices=["bench"])
+    parser.add_argument("--db", type=pathlib.Path, default=DEFAULT_DB_PATH, help="database to copy and measure")
+    parser.add_argument("--seconds", type=float, default=5.0, help="length of each timed phase")
+    parser.add_argument("--write-every", type=float, default=0.01, help="seconds between writer commits")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="replica refresh interval")
+    args = parser.parse_args()
+
+    print(f"Customer lookups ({len(BENCH_QUERIES)} queries each), {args.seconds:g}s per phase, "
+          f"writer commits every {args.write_every * 1000:g} ms:")
+    for row in bench(args.db, args.seconds, args.write_every, args.interval):
+        label = f"{row['reads']}, " + (f"{row['writes']} writes" if row["writes"] else "no writes")
+        line = (f"  {label:<22}{row['queries']:>7} queries  p50 {row['p50_ms']:7.2f} ms  "
+                f"p95 {row['p95_ms']:7.2f} ms  max {row['max_ms']:8.2f} ms")
+        if row["reads"] == "replica":
+            line += f"  ({row['refreshes']} refreshes of {row['refresh_ms']:.0f} ms, max lag {row['max_lag_ms']:.0f} ms)"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+"""
+Result-Set Cache for Guarded SELECT Statements
+
+The secure agents re-issue the same SELECT statements constantly: the same COUNTs,
+the same top-products join, the same schema probes. This module keeps an in-process
+LRU cache of their results, keyed on the normalized, post-LIMIT-injection SQL.
+
+Key Features:
+- Byte-size-bounded LRU eviction (plus an entry-count cap)
+- Invalidation on any committed change, detected with `PRAGMA data_version`
+  (or, when agent reads go to an in-memory replica, on every replica swap)
+- Per-table invalidation for writes made through this process (`begin_write`
+  before COMMIT, `notify_write` after), so a write to `refunds` does not flush
+  cached `products` results unless another connection committed at the same time
+- Hit/miss counters and bytes held, for tuning the size bound
+
+Usage:
+    from result_cache import get_result_cache
+
+    cache = get_result_cache(pool)
+    result = cache.get(sql)
+    if result is None:
+        result = run_query(sql)
+        cache.put(sql, result)
+"""
+
+import pathlib  # Database path normalization
+import re  # Normalization and table-name extraction
+import sqlite3  # Watcher connection for PRAGMA data_version
+import threading  # Lock around the LRU and counters
+from collections import OrderedDict  # LRU ordering
+
+# Literals and quoted identifiers are kept verbatim; comments and whitespace runs outside
+# them collapse to one space (a "--" comment ends at a newline, so it can't be joined first)
+_LITERAL_OR_SPACE = re.compile(
+    r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\])|(?:--[^\n]*|/\*.*?(?:\*/|$)|\s+)+", re.S)
+
+# Single-quoted literals are removed before looking for table names
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+
+# Bare, double-quoted, backtick-quoted and bracketed identifiers
+_IDENTIFIER = re.compile(r'"((?:[^"]|"")*)"|`([^`]*)`|\[([^\]]*)\]|([A-Za-z_][A-Za-z0-9_$]*)')
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Canonical form of a statement for use as a cache key.
+
+    Drops comments, collapses whitespace outside string literals and strips
+    trailing semicolons; literal contents and identifier case are left untouched.
+    """
+    s = _LITERAL_OR_SPACE.sub(lambda m: m.group(1) or " ", sql)
+    return s.strip().rstrip(";").strip()
+
+
+def _estimate_bytes(result: dict) -> int:
+    """Approximate memory held by a {"columns", "rows"} result."""
+    size = 64
+    for col in result.get("columns", ()):
+        size += 49 + len(col)
+    for row in result.get("rows", ()):
+        size += 56 + 8 * len(row)
+        for value in row:
+            if isinstance(value, (str, bytes)):
+                size += 49 + len(value)
+            elif value is not None:
+                size += 32
+    return size
+
+
+def _copy(result: dict) -> dict:
+    """A result the caller may modify without changing the cached entry."""
+    copied = dict(result)
+    if "columns" in copied:
+        copied["columns"] = list(copied["columns"])
+    if "rows" in copied:
+        copied["rows"] = [list(row) for row in copied["rows"]]
+    return copied
+
+
+class ResultCache:
+    """
+    LRU cache of SELECT results for one database file.
+
+    Attributes:
+        max_bytes (int): Upper bound on the estimated bytes held
+        max_entries (int): Upper bound on the number of cached statements
+    """
+
+    def __init__(self, db_path, max_bytes: int = 32 * 1024 * 1024, max_entries: int = 1024, version=None):
+        """
+        Args:
+            db_path: SQLite database file whose results are cached
+            max_bytes (int): Estimated memory budget for cached results
+            max_entries (int): Maximum number of cached statements
+            version: Callable returning the data version to watch instead of
+                PRAGMA data_version (HotReplica.version when reads go to a replica,
+                so results are flushed when the copy the agent reads changes)
+        """
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._version = version
+
+        self._entries = OrderedDict()  # key -> (result, tables, size)
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+        # Invalidation epochs: a result computed before an invalidation of one of
+        # its tables must not be stored afterwards
+        self._epoch = 0
+        self._flush_epoch = 0
+        self._table_epochs = {}
+        self._pending = threading.local()  # per-thread: key -> epoch at miss time
+
+        # Dedicated connection used only to watch for committed changes
+        self._watcher = sqlite3.connect(f"{db_path.as_uri()}?mode=ro", uri=True, check_same_thread=False)
+        self._data_version = self._read_data_version()
+        self._tables = self._load_tables()
+
+        # Counters reported by stats()
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+        self._invalidations = 0
+        self._rejected = 0
+
+    def _read_data_version(self) -> int:
+        if self._version is not None:
+            return self._version()
+        return self._watcher.execute("PRAGMA data_version").fetchone()[0]
+
+    def _load_tables(self) -> dict:
+        """
+        Map every table and view name to the base tables it reads.
+
+        Views expand to the tables named in their definition, so invalidating
+        a table also drops results that were read through a view.
+        """
+        objects = self._watcher.execute(
+            "SELECT type, name, sql FROM sqlite_master WHERE type IN ('table', 'view')"
+        ).fetchall()
+        tables = {name.lower() for kind, name, _ in objects if kind == "table"}
+        mapping = {name: frozenset([name]) for name in tables}
+        for kind, name, sql in objects:
+            if kind == "view":
+                mapping[name.lower()] = frozenset(self._identifiers(sql or "") & tables)
+        return mapping
+
+    @staticmethod
+    def _identifiers(sql: str) -> set:
+        """Lower-cased identifiers appearing outside string literals."""
+        found = set()
+        for match in _IDENTIFIER.finditer(_STRING_LITERAL.sub(" ", sql)):
+            name = next(g for g in match.groups() if g is not None)
+            found.add(name.replace('""', '"').lower())
+        return found
+
+    def referenced_tables(self, sql: str) -> frozenset:
+        """
+        Base tables a statement may read or write.
+
+        This is a conservative superset: any identifier that names a table
+        (or a view over tables) counts, which can only cause extra invalidation.
+        """
+        tables = set()
+        for name in self._identifiers(sql):
+            tables |= self._tables.get(name, frozenset())
+        return frozenset(tables)
+
+    def _check_data_version(self):
+        """Flush everything if another connection committed a change. Caller holds the lock."""
+        version = self._read_data_version()
+        if version != self._data_version:
+            self._data_version = version
+            self._epoch += 1
+            self._flush_epoch = self._epoch
+            if self._entries:
+                self._invalidations += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+            # A commit may have been DDL, so re-read the table list
+            self._tables = self._load_tables()
+
+    def get(self, sql: str):
+        """
+        Look up a cached result.
+
+        Args:
+            sql (str): Final SQL as it will be executed (after LIMIT injection)
+
+        Returns:
+            dict | None: A copy of the cached {"columns", "rows"} result, or None on a miss
+        """
+        key = normalize_sql(sql)
+        with self._lock:
+            self._check_data_version()
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                self._pending_misses()[key] = self._epoch
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return _copy(entry[0])
+
+    def _pending_misses(self) -> dict:
+        """This thread's outstanding misses (failed queries never call put, so keep it small)."""
+        pending = getattr(self._pending, "misses", None)
+        if pending is None or len(pending) > 256:
+            pending = self._pending.misses = {}
+        return pending
+
+    def put(self, sql: str, result: dict, tables=None):
+        """
+        Store a result, evicting least-recently-used entries to stay within budget.
+
+        Args:
+            sql (str): Final SQL that produced the result
+            result (dict): {"columns": [...], "rows": [...]}
+            tables: Base tables the statement reads (derived from the SQL if omitted)
+        """
+        key = normalize_sql(sql)
+        size = _estimate_bytes(result)
+        if tables is None:
+            tables = self.referenced_tables(key)
+        since = self._pending_misses().pop(key, None)
+        tables = frozenset(t.lower() for t in tables)
+        with self._lock:
+            # Data changed while the query ran: the result may already be stale
+            if since is not None and (self._flush_epoch > since or
+                                      any(self._table_epochs.get(t, 0) > since for t in tables)):
+                return
+            # One huge result shouldn't wipe out the whole cache
+            if size > self.max_bytes // 4:
+                self._rejected += 1
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (_copy(result), tables, size)
+            self._bytes += size
+            self._stores += 1
+            while self._bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._evictions += 1
+
+    def invalidate_tables(self, tables) -> int:
+        """
+        Drop every cached result that reads any of `tables`.
+
+        Returns:
+            int: Number of entries removed
+        """
+        targets = {t.lower() for t in tables}
+        with self._lock:
+            self._epoch += 1
+            for table in targets:
+                self._table_epochs[table] = self._epoch
+            stale = [key for key, (_, deps, _) in self._entries.items() if deps & targets]
+            for key in stale:
+                self._bytes -= self._entries.pop(key)[2]
+            self._invalidations += len(stale)
+            return len(stale)
+
+    def begin_write(self, conn):
+        """
+        Sync with the database from inside a write transaction, before COMMIT.
+
+        While `conn` holds the write lock no other connection can commit, so
+        anything committed before our write is flushed here. The writer's own
+        data_version is returned: it only moves when *other* connections
+        commit, which lets note_write tell our commit from a foreign one.
+
+        Args:
+            conn: Connection with the write open (statement run, not yet committed)
+
+        Returns:
+            int | None: Token for note_write, or None if conn holds no transaction
+        """
+        if not conn.in_transaction:
+            return None
+        with self._lock:
+            self._check_data_version()
+        return conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def note_write(self, sql: str, conn=None, token=None) -> int:
+        """
+        Record a write committed by this process.
+
+        Results that read the written tables are dropped. The data_version
+        baseline only absorbs the commit when nobody else committed since
+        begin_write; otherwise it is left behind, so the next lookup flushes
+        everything. Call this right after commit.
+
+        Args:
+            sql (str): The statement that was committed
+            conn: The connection that committed it
+            token: What begin_write returned for that transaction
+
+        Returns:
+            int: Number of entries removed
+        """
+        removed = self.invalidate_tables(self.referenced_tables(sql))
+        # A replica swap always flushes: the new copy may hold other commits too
+        if self._version is not None or conn is None or token is None:
+            return removed
+        with self._lock:
+            version = self._read_data_version()
+            # Read after the watcher: a commit that slipped in before it shows up here
+            if conn.execute("PRAGMA data_version").fetchone()[0] == token:
+                self._data_version = version
+                self._tables = self._load_tables()
+        return removed
+
+    def clear(self):
+        """Drop all cached results."""
+        with self._lock:
+            self._epoch += 1
+            self._flush_epoch = self._epoch
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """
+        Snapshot of cache counters.
+
+        Returns:
+            dict: entries, bytes held vs. budget, hits/misses/hit rate,
+            stores, evictions, invalidations and oversized results rejected
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+                "stores": self._stores,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+                "rejected": self._rejected,
+            }
+
+
+# Process-wide registry: one cache per database file
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_result_cache(pool, **options) -> ResultCache:
+    """
+    Return the shared result cache for a pool's database, creating it on first use.
+
+    Args:
+        pool: ReadOnlyPool whose database the cache covers
+        **options: ResultCache settings, applied only when the cache is created
+    """
+    with _caches_lock:
+        cache = _caches.get(pool.db_path)
+        if cache is None:
+            if pool.replica is not None:
+                options.setdefault("version", pool.replica.version)
+            cache = _caches[pool.db_path] = ResultCache(pool.db_path, **options)
+        return cache
+
+
+def begin_write(db_path, conn):
+    """
+    Call ResultCache.begin_write on the cache for `db_path` (if one exists).
+
+    Returns:
+        int | None: Token to pass to notify_write
+    """
+    with _caches_lock:
+        cache = _caches.get(pathlib.Path(db_path).resolve())
+    return cache.begin_write(conn) if cache is not None else None
+
+
+def notify_write(db_path, sql: str, conn=None, token=None) -> int:
+    """
+    Tell the cache for `db_path` (if one exists) about a committed write.
+
+    Args:
+        db_path: Database file that was written
+        sql (str): The committed statement
+        conn: Connection that committed it
+        token: What begin_write returned before the commit
+
+    Returns:
+        int: Number of cached results invalidated
+    """
+    with _caches_lock:
+        cache = _caches.get(pathlib.Path(db_path).resolve())
+    return cache.note_write(sql, conn, token) if cache is not None else 0
+
+
+def cache_stats() -> dict:
+    """Counters for every result cache in this process, keyed by database path."""
+    with _caches_lock:
+        caches = list(_caches.items())
+    return {str(path): cache.stats() for path, cache in caches}
@@ -0,0 +1,269 @@
+"""
+Streaming Result Export
+
+Writes a query's result to CSV, JSONL, Parquet or Arrow in fixed-size batches
+(`fetchmany()`), so an extract of any size needs only one batch in memory. It
+reports throughput in rows/s and MB/s.
+
+Formats (picked from the file extension, or given explicitly):
+- csv: header row plus one line per row (NULL is written as an empty field)
+- jsonl: one JSON object per row (BLOBs are written as hex)
+- parquet / arrow: columnar files via pyarrow (optional dependency, only
+  imported for these formats). Column types come from the first batch, where
+  an all-NULL column becomes a string column
+
+The file is written to `<path>.part` and renamed on success, so a cancelled
+or failed export never leaves a truncated file behind.
+
+Used by the CLI (`.export <file> <SELECT ...>` in Direct SQL Query) and by
+the `export_sql` tool in 04 (ExportSQLTool), via export_query().
+
+Usage:
+    python scripts/result_export.py orders.parquet "SELECT * FROM orders"
+
+    from result_export import export_cursor
+    stats = export_cursor(conn.execute(sql), "orders.csv")
+    print(stats.line())
+"""
+
+import argparse  # Command-line options
+import csv  # CSV writer
+import dataclasses  # Export budget
+import hashlib  # Export file names
+import json  # JSONL writer
+import os  # Atomic rename
+import pathlib  # File paths
+import time  # Throughput
+from dataclasses import dataclass  # Export statistics
+
+from query_budget import DEFAULT_BUDGET  # Limits for tool-driven exports
+
+# Rows fetched and written per batch
+BATCH_ROWS = 10_000
+
+# Format for each recognised file extension
+EXTENSIONS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet",
+              ".arrow": "arrow", ".feather": "arrow"}
+FORMATS = ("csv", "jsonl", "parquet", "arrow")
+
+# Exports read the whole result, so there is no step limit; the plan check and heap limit
+# still apply and a stuck export stops after 10 minutes
+EXPORT_BUDGET = dataclasses.replace(DEFAULT_BUDGET, max_vm_steps=None, timeout=600.0)
+
+
+@dataclass
+class ExportStats:
+    """
+    Outcome of one export.
+
+    Attributes:
+        path (str): File written
+        format (str): csv, jsonl, parquet or arrow
+        rows (int): Rows written
+        bytes (int): Size of the file
+        seconds (float): Wall time of fetch plus write
+    """
+    path: str
+    format: str
+    rows: int
+    bytes: int
+    seconds: float
+
+    @property
+    def rows_per_s(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    @property
+    def mb_per_s(self) -> float:
+        return self.bytes / 1e6 / self.seconds if self.seconds else 0.0
+
+    def line(self) -> str:
+        return (f"{self.rows:,} rows -> {self.path} ({self.bytes / 1e6:,.1f} MB, {self.format}) in "
+                f"{self.seconds:.2f}s: {self.rows_per_s:,.0f} rows/s, {self.mb_per_s:,.1f} MB/s")
+
+    def to_dict(self) -> dict:
+        return {"exported": self.path, "format": self.format, "rows": self.rows, "bytes": self.bytes,
+                "seconds": round(self.seconds, 3), "rows_per_s": round(self.rows_per_s),
+                "mb_per_s": round(self.mb_per_s, 2)}
+
+
+def format_for(path, fmt: str | None = None) -> str:
+    """The export format for a path (explicit `fmt` wins over the extension)."""
+    fmt = fmt or EXTENSIONS.get(pathlib.Path(path).suffix.lower())
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format for {path}; use one of: {', '.join(EXTENSIONS)}")
+    return fmt
+
+
+def export_cursor(cursor, path, fmt: str | None = None, batch_rows: int = BATCH_ROWS, progress=None) -> ExportStats:
+    """
+    Stream an executed cursor's rows to a file in batches.
+
+    Args:
+        cursor: Cursor of an executed SELECT
+        path: Output file
+        fmt (str | None): Format (None = from the file extension)
+        batch_rows (int): Rows per fetchmany() batch
+        progress: Optional QueryProgress whose `rows` counter is advanced (CLI progress line)
+
+    Returns:
+        ExportStats: Rows, bytes, time and throughput
+
+    Raises:
+        ValueError: Unknown format, or a value that doesn't fit its Parquet/Arrow column type
+        ImportError: Parquet/Arrow requested without pyarrow installed
+    """
+    fmt = format_for(path, fmt)
+    path = pathlib.Path(path)
+    columns = [column[0] for column in cursor.description]
+    started = time.perf_counter()
+    part = path.with_name(path.name + ".part")
+
+    def batches():
+        while True:
+            rows = cursor.fetchmany(batch_rows)
+            if not rows:
+                return
+            if progress is not None:
+                progress.rows += len(rows)
+            yield rows
+
+    try:
+        rows = WRITERS[fmt](part, columns, batches())
+        os.replace(part, path)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+    return ExportStats(str(path), fmt, rows, path.stat().st_size, time.perf_counter() - started)
+
+
+def export_query(pool, sql: str, fmt: str, directory, budget=EXPORT_BUDGET) -> ExportStats:
+    """
+    Export a SELECT through the shared read-only pool to a generated file name.
+
+    Args:
+        pool: ReadOnlyPool to borrow a connection from
+        sql (str): Validated SELECT (no LIMIT is injected; the whole result is written)
+        fmt (str): csv, jsonl, parquet or arrow
+        directory: Folder for the file (created if missing)
+        budget: QueryBudget the export runs under
+
+    Returns:
+        ExportStats: Where the file went and how fast it was written
+    """
+    fmt = format_for(f"export.{fmt}", fmt)
+    directory = pathlib.Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha1(sql.encode("utf-8")).hexdigest()[:8]
+    path = directory / f"export-{time.strftime('%Y%m%d-%H%M%S')}-{digest}.{fmt}"
+    with pool.connection() as conn:
+        with budget.limit(conn, sql):
+            return export_cursor(conn.execute(sql), path, fmt)
+
+
+def _write_csv(path, columns, batches) -> int:
+    rows = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for batch in batches:
+            writer.writerows(batch)
+            rows += len(batch)
+    return rows
+
+
+def _json_value(value):
+    if isinstance(value, bytes):
+        return value.hex()
+    raise TypeError(f"cannot export {type(value).__name__} to JSON")
+
+
+def _write_jsonl(path, columns, batches) -> int:
+    rows = 0
+    encode = json.JSONEncoder(ensure_ascii=False, default=_json_value).encode
+    with open(path, "w", encoding="utf-8") as f:
+        for batch in batches:
+            f.write("".join(encode(dict(zip(columns, row))) + "\n" for row in batch))
+            rows += len(batch)
+    return rows
+
+
+def _write_arrow_file(path, columns, batches, parquet: bool) -> int:
+    try:
+        import pyarrow as pa  # Columnar batches (optional dependency)
+        if parquet:
+            import pyarrow.parquet as pq  # Parquet writer
+    except ImportError as e:
+        raise ImportError("Parquet/Arrow export needs pyarrow: pip install pyarrow") from e
+
+    rows = 0
+    schema = writer = None
+    try:
+        for batch in batches:
+            values = list(zip(*batch))  # Row batch -> one tuple per column
+            if schema is None:
+                fields = []
+                for name, column in zip(columns, values):
+                    inferred = pa.array(column).type
+                    fields.append(pa.field(name, pa.string() if pa.types.is_null(inferred) else inferred))
+                schema = pa.schema(fields)
+                writer = pq.ParquetWriter(path, schema) if parquet else pa.ipc.new_file(str(path), schema)
+            arrays = []
+            for field, column in zip(schema, values):
+                try:
+                    arrays.append(pa.array(column, type=field.type))
+                except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                    raise ValueError(f"column {field.name!r} changes type after the first batch "
+                                     f"(was {field.type}); CAST it in the query") from e
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            rows += len(batch)
+        if writer is None:  # Empty result: still write a valid file with the column names
+            schema = pa.schema([pa.field(name, pa.string()) for name in columns])
+            writer = pq.ParquetWriter(path, schema) if parquet else pa.ipc.new_file(str(path), schema)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+WRITERS = {
+    "csv": _write_csv,
+    "jsonl": _write_jsonl,
+    "parquet": lambda path, columns, batches: _write_arrow_file(path, columns, batches, parquet=True),
+    "arrow": lambda path, columns, batches: _write_arrow_file(path, columns, batches, parquet=False),
+}
+
+
+def main():
+    import sqlite3  # Direct connection for the command line
+    from sql_executor import DEFAULT_DB_PATH  # Default database
+    from sql_guard import inspect_sql  # Only SELECTs are exported
+
+    parser = argparse.ArgumentParser(description="Stream a SELECT's result to CSV, JSONL, Parquet or Arrow.")
+    parser.add_argument("out", help="Output file (.csv, .jsonl, .parquet, .arrow)")
+    parser.add_argument("sql", help="SELECT to export")
+    parser.add_argument("--db", default=str(DEFAULT_DB_PATH), help="SQLite database")
+    parser.add_argument("--format", choices=FORMATS, help="Override the format implied by the extension")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS, help="Rows per fetch/write batch")
+    args = parser.parse_args()
+
+    verdict = inspect_sql(args.sql)
+    if not verdict.allowed:
+        parser.error(verdict.error)
+    try:
+        format_for(args.out, args.format)
+    except ValueError as e:
+        parser.error(str(e))
+    conn = sqlite3.connect(f"{pathlib.Path(args.db).resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        with EXPORT_BUDGET.limit(conn, args.sql):
+            stats = export_cursor(conn.execute(args.sql), args.out, args.format, args.batch_rows)
+    except ImportError as e:
+        raise SystemExit(f"❌ {e}")
+    finally:
+        conn.close()
+    print(f"✅ {stats.line()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Streaming Result Pager
+
+The CLI's query views used to call `cursor.fetchall()` and then print the
+first 10-20 rows. A `SELECT * FROM order_items` loaded the whole table into
+Python just to print how many rows were left.
+
+ResultPager keeps the cursor open and pulls one page at a time with
+`fetchmany()`:
+- Memory stays flat: at most `keep_pages` pages are held, whatever the result size
+- Next/previous/jump: moving forward fetches (and discards) rows up to the
+  target page; moving back past the kept pages re-runs the query and skips forward
+- Column widths come from the first page, so later pages line up without
+  knowing every value in advance
+- The total is never computed up front. It becomes known for free once the
+  cursor reaches the end, or count() runs `SELECT COUNT(*)` over the query on demand
+
+Every fetch goes through cancellable_query, so Ctrl-C and the timeout work the
+same way while paging as they do for the first page.
+
+While a pager is open its statement holds a read lock on the database (a
+SHARED lock in rollback-journal mode), so close() it when the user is done.
+
+Usage:
+    pager = ResultPager(connect, "SELECT * FROM order_items", page_size=20)
+    try:
+        print(pager.render(pager.page(0)))
+        print(pager.render(pager.page(5)))
+        print(pager.count())
+    finally:
+        pager.close()
+"""
+
+from collections import OrderedDict  # Recently viewed pages
+
+from cancellable_query import run_on, run_query  # Cancellable execute/fetch
+
+# Widest a column is drawn (longer values are cut with "…")
+MAX_COLUMN_WIDTH = 40
+
+
+class ResultPager:
+    """
+    Page through one query's result without fetching all of it.
+
+    Args:
+        connect: Callable returning a connection (opened with check_same_thread=False)
+        sql (str): The SELECT to page through
+        page_size (int): Rows per page
+        timeout (float | None): Seconds each fetch may run before it is interrupted
+        keep_pages (int): Pages kept for going back without re-running the query
+    """
+
+    def __init__(self, connect, sql: str, page_size: int = 20, timeout: float | None = None, keep_pages: int = 10):
+        self.connect = connect
+        self.sql = sql.strip().rstrip(";").strip()
+        self.page_size = page_size
+        self.timeout = timeout
+        self.keep_pages = keep_pages
+        self.columns = None
+        self.widths = None
+        self.last_page = None  # Index of the final page, once the cursor has reached the end
+        self.total = None  # Row count, once known
+        self._conn = None
+        self._cursor = None
+        self._next_page = 0  # Page the cursor will produce next
+        self._carry = []  # Row read ahead to learn whether another page exists
+        self._pages = OrderedDict()
+        self.reruns = 0
+
+    def page(self, index: int) -> list:
+        """
+        Rows of one page (0-based), fetching forward as needed.
+
+        An index past the end is clamped to the last page.
+
+        Raises:
+            QueryCancelled, BudgetExceeded, sqlite3.Error: From the fetch
+        """
+        index = max(index, 0)
+        if self.last_page is not None:
+            index = min(index, self.last_page)
+        if index in self._pages:
+            self._pages.move_to_end(index)
+            return self._pages[index]
+        if self._cursor is None or index < self._next_page:
+            self._restart()
+        return run_on(self._conn, lambda progress: self._read_to(index, progress), self.timeout)[0]
+
+    def has_next(self, index: int) -> bool:
+        """Whether a page follows page `index` (it has been read ahead already)."""
+        return self.last_page is None or index < self.last_page
+
+    def count(self) -> int:
+        """
+        Total number of rows, computed on demand.
+
+        Free once the cursor has reached the end; otherwise runs
+        `SELECT COUNT(*) FROM (<query>)` on a separate connection.
+        """
+        if self.total is None:
+            count_sql = f"SELECT COUNT(*) FROM ({self.sql}\n)"  # A trailing -- comment must not eat the ")"
+            rows, _, _ = run_query(self.connect, count_sql, lambda conn, cursor, progress: cursor.fetchone()[0],
+                                   self.timeout)
+            self.total = rows
+            self.last_page = max((rows - 1) // self.page_size, 0)
+        return self.total
+
+    def render(self, rows: list) -> str:
+        """Header and rows as aligned columns (widths from the first page)."""
+        def cell(value, width):
+            text = "NULL" if value is None else str(value).replace("\n", " ")
+            return text if len(text) <= width else text[:width - 1] + "…"
+
+        lines = [" | ".join(name.ljust(width) for name, width in zip(self.columns, self.widths)),
+                 "-+-".join("-" * width for width in self.widths)]
+        for row in rows:
+            lines.append(" | ".join(cell(value, width).ljust(width) for value, width in zip(row, self.widths)))
+        return "\n".join(lines)
+
+    def status(self, index: int) -> str:
+        """'page 3 of 12 (rows 41-60 of 231)', or 'page 3 of ≥4' while the total is unknown."""
+        first = index * self.page_size + 1
+        shown = len(self._pages.get(index, ()))
+        if self.last_page is None:
+            return f"page {index + 1} of ≥{index + 2} (rows {first}-{first + shown - 1}; total not counted)"
+        total = f" of {self.total:,}" if self.total is not None else ""
+        span = f"rows {first}-{first + shown - 1}{total}" if shown else f"no rows{total}"
+        return f"page {index + 1} of {self.last_page + 1} ({span})"
+
+    def close(self):
+        """Close the cursor and its connection (releasing the read lock)."""
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = self._cursor = None
+
+    def _restart(self):
+        """(Re)run the query from the first row."""
+        if self._cursor is not None:
+            self.reruns += 1
+        self.close()
+        self._conn = self.connect()
+        self._next_page = 0
+        self._carry = []
+
+    def _read_to(self, index: int, progress) -> list:
+        """Worker side of page(): execute if needed, then read pages up to `index`."""
+        try:
+            if self._next_page == 0 and not self._carry:
+                self._cursor = self._conn.execute(self.sql)
+                if self.columns is None:
+                    self.columns = [column[0] for column in self._cursor.description]
+            rows = []
+            while self._next_page <= index:
+                rows = self._read_page(progress)
+                if self._next_page - 1 == self.last_page:
+                    break
+            return rows
+        except BaseException:
+            self._cursor = None  # An interrupted statement cannot continue; the next page() re-runs it
+            raise
+
+    def _read_page(self, progress) -> list:
+        rows = self._carry + self._cursor.fetchmany(self.page_size + 1 - len(self._carry))
+        self._carry = rows[self.page_size:]
+        rows = rows[:self.page_size]
+        progress.rows += len(rows)
+        index = self._next_page
+        self._next_page += 1
+        if self.widths is None:  # The first page is the sample for column widths
+            self.widths = [min(max([len(name)] + [len("NULL" if row[i] is None else str(row[i])) for row in rows]),
+                               MAX_COLUMN_WIDTH) for i, name in enumerate(self.columns)]
+        if not self._carry:
+            self.last_page = index
+            self.total = index * self.page_size + len(rows)
+        self._pages[index] = rows
+        while len(self._pages) > self.keep_pages:
+            self._pages.popitem(last=False)
+        return rows
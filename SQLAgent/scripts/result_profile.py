@@ -0,0 +1,232 @@
+"""
+Local Statistical Summaries of Large Results
+
+An analytics question like "how are order values distributed?" returns
+thousands of rows. The agent then sees either a 200-row slice that misleads
+it, or a truncation marker. The summarize_sql tool in 04 runs the query
+without a LIMIT and profiles every row locally. The LLM gets the profile
+instead of the rows, so its prompt cost stays the same however large the result.
+
+One pass over the cursor, in `fetchmany()` batches. Each batch is
+transposed into columns and aggregated with C-level builtins (min, max, sum,
+Counter.update), so the per-row work in Python stays small:
+- every column: count, nulls, distinct values (exact up to a cap)
+- numeric columns: min, max, mean, standard deviation and quantiles
+  (p5/p25/p50/p75/p95; exact up to SAMPLE_SIZE values, from a reservoir sample beyond)
+- date columns (ISO 'YYYY-MM-DD...' text): first and last date and the number of distinct days
+- text columns: top-k values with counts (approximate once a column has more
+  than MAX_TRACKED distinct values, and marked as such)
+
+Usage:
+    from result_profile import profile_cursor, render_profile
+
+    profile = profile_cursor(conn.execute(sql))
+    print(render_profile(profile))
+"""
+
+import math  # Standard deviation
+import operator  # C-level products for the sum of squares
+import random  # Reservoir sampling
+import re  # ISO date detection
+from collections import Counter  # Top-k values
+
+# Rows fetched per batch
+BATCH_ROWS = 5_000
+
+# Numeric values kept per column for quantiles (exact up to this many rows)
+SAMPLE_SIZE = 10_000
+
+# Distinct values tracked per text column; beyond this, rare values are dropped
+# and top-k counts become approximate (lower bounds)
+MAX_TRACKED = 10_000
+
+# Values listed per text column
+TOP_K = 5
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+_ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+class _Column:
+    """Running statistics of one result column."""
+
+    def __init__(self, name: str, rng: random.Random):
+        self.name = name
+        self.rng = rng
+        self.count = 0  # Non-null values
+        self.nulls = 0
+        # Numeric
+        self.numbers = 0
+        self.total = 0.0
+        self.squares = 0.0
+        self.low = self.high = None
+        self.sample = []
+        self.next_slot = None  # Reservoir position of the next replacement (Algorithm L)
+        self.weight = 1.0
+        # Text (and dates)
+        self.texts = 0
+        self.first_text = self.last_text = None
+        self.values = Counter()
+        self.pruned = False
+
+    def add(self, column: tuple):
+        present = [value for value in column if value is not None]
+        self.nulls += len(column) - len(present)
+        self.count += len(present)
+        numbers = [value for value in present if isinstance(value, (int, float))]
+        if numbers:
+            self._add_numbers(numbers)
+        if len(numbers) < len(present):
+            texts = [value if isinstance(value, str) else value.hex() if isinstance(value, bytes) else str(value)
+                     for value in present if not isinstance(value, (int, float))]
+            self._add_texts(texts)
+        elif len(self.values) < MAX_TRACKED:
+            self.values.update(numbers)  # Distinct count (and top-k) of low-cardinality numeric columns
+
+    def _add_numbers(self, numbers: list):
+        self.numbers += len(numbers)
+        self.total += sum(numbers)
+        self.squares += sum(map(operator.mul, numbers, numbers))
+        low, high = min(numbers), max(numbers)
+        self.low = low if self.low is None else min(self.low, low)
+        self.high = high if self.high is None else max(self.high, high)
+        start = self.numbers - len(numbers)  # Position of numbers[0] in the column
+        room = SAMPLE_SIZE - len(self.sample)
+        self.sample.extend(numbers[:room])
+        if len(self.sample) < SAMPLE_SIZE:
+            return
+        # Reservoir sampling with skips (Algorithm L): draw random numbers only for the
+        # values that replace a sample entry, not for every value
+        if self.next_slot is None:
+            self.next_slot = SAMPLE_SIZE - 1
+            self._skip()
+        while self.next_slot < self.numbers:
+            self.sample[self.rng.randrange(SAMPLE_SIZE)] = numbers[self.next_slot - start]
+            self._skip()
+
+    def _skip(self):
+        self.weight *= math.exp(math.log(self.rng.random()) / SAMPLE_SIZE)
+        self.next_slot += math.floor(math.log(self.rng.random()) / math.log(1 - self.weight)) + 1
+
+    def _add_texts(self, texts: list):
+        self.texts += len(texts)
+        first, last = min(texts), max(texts)  # ISO dates sort chronologically as text
+        self.first_text = first if self.first_text is None else min(self.first_text, first)
+        self.last_text = last if self.last_text is None else max(self.last_text, last)
+        self.values.update(texts)
+        if len(self.values) > MAX_TRACKED:
+            self.values = Counter(dict(self.values.most_common(MAX_TRACKED // 10)))
+            self.pruned = True
+
+    def kind(self) -> str:
+        if self.count == 0:
+            return "empty"
+        if self.numbers == self.count:
+            return "numeric"
+        if self.numbers:
+            return "mixed"
+        # Dates are detected once over the distinct values, not per row
+        return "date" if all(_ISO_DATE.match(value) for value in self.values) else "text"
+
+    def profile(self) -> dict:
+        kind = self.kind()
+        profile = {"name": self.name, "type": kind, "count": self.count, "nulls": self.nulls}
+        if not self.pruned and len(self.values) < MAX_TRACKED:
+            profile["distinct"] = len(self.values)
+        else:
+            profile["distinct_at_least"] = len(self.values) if not self.pruned else MAX_TRACKED
+        if self.numbers:
+            mean = self.total / self.numbers
+            variance = max(self.squares / self.numbers - mean * mean, 0.0)
+            profile.update(min=_round(self.low), max=_round(self.high), mean=_round(mean),
+                           stddev=_round(math.sqrt(variance)))
+            ordered = sorted(self.sample)
+            profile["quantiles"] = {f"p{round(q * 100)}": _round(_quantile(ordered, q)) for q in QUANTILES}
+            if self.numbers > SAMPLE_SIZE:
+                profile["quantiles_sampled"] = SAMPLE_SIZE
+        if kind == "date":
+            profile.update(first=self.first_text, last=self.last_text)
+            if not self.pruned:
+                profile["days"] = len({value[:10] for value in self.values})
+        if kind in ("text", "mixed") or (kind == "numeric" and self.values and len(self.values) <= TOP_K * 4):
+            profile["top"] = [[value, count] for value, count in self.values.most_common(TOP_K)]
+            if self.pruned:
+                profile["top_approximate"] = True
+        return profile
+
+
+def _quantile(ordered: list, q: float):
+    """Linear-interpolated quantile of a sorted list."""
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * q
+    below = math.floor(position)
+    above = min(below + 1, len(ordered) - 1)
+    return ordered[below] + (ordered[above] - ordered[below]) * (position - below)
+
+
+def _round(value):
+    if value is None or isinstance(value, int):
+        return value
+    if value.is_integer():
+        return int(value)
+    return round(value, 4) if abs(value) < 1000 else round(value, 2)
+
+
+def profile_cursor(cursor, batch_rows: int = BATCH_ROWS, seed: int = 0) -> dict:
+    """
+    Profile every row of an executed cursor in one streaming pass.
+
+    Args:
+        cursor: Cursor of an executed SELECT
+        batch_rows (int): Rows per fetchmany() batch
+        seed (int): Reservoir-sampling seed (fixed, so repeated runs give the same quantiles)
+
+    Returns:
+        dict: {"profile": True, "row_count": N, "columns": [per-column profile dicts]}
+    """
+    rng = random.Random(seed)
+    columns = [_Column(description[0], rng) for description in cursor.description or ()]
+    rows = 0
+    while True:
+        batch = cursor.fetchmany(batch_rows)
+        if not batch:
+            break
+        rows += len(batch)
+        for column, values in zip(columns, zip(*batch)):  # Row batch -> one tuple per column
+            column.add(values)
+    return {"profile": True, "row_count": rows, "columns": [column.profile() for column in columns]}
+
+
+def render_profile(profile: dict) -> str:
+    """
+    Compact text form of a profile for the LLM.
+
+    Example:
+        [summary of 79,999 rows, 4 columns; computed locally over all rows]
+        order_date (date): 79,999 values, 0 nulls, 731 distinct; 2023-09-01 .. 2025-08-31, 731 days
+        total_cents (numeric): 79,999 values, 0 nulls; min 199 max 1299990 mean 15312.4 sd 40001.2;
+            p5 899 p25 2399 p50 4999 p75 11997 p95 62999
+        status (text): 79,999 values, 0 nulls, 4 distinct; top: paid 61,020 | refunded 9,001 | ...
+    """
+    lines = [f"[summary of {profile['row_count']:,} rows, {len(profile['columns'])} columns; "
+             f"computed locally over all rows]"]
+    for column in profile["columns"]:
+        distinct = (f", {column['distinct']:,} distinct" if "distinct" in column
+                    else f", {column['distinct_at_least']:,}+ distinct")
+        line = f"{column['name']} ({column['type']}): {column['count']:,} values, {column['nulls']:,} nulls{distinct}"
+        if "first" in column:
+            line += f"; {column['first']} .. {column['last']}"
+            if "days" in column:
+                line += f", {column['days']:,} days"
+        if "mean" in column:
+            line += (f"; min {column['min']} max {column['max']} mean {column['mean']} sd {column['stddev']}; "
+                     + " ".join(f"{name} {value}" for name, value in column["quantiles"].items()))
+            if "quantiles_sampled" in column:
+                line += f" (quantiles from a {column['quantiles_sampled']:,}-value sample)"
+        if "top" in column:
+            approximate = " (approximate)" if column.get("top_approximate") else ""
+            line += f"; top{approximate}: " + " | ".join(f"{value} {count:,}" for value, count in column["top"])
+        lines.append(line)
+    return "\n".join(lines)
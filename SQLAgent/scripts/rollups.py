@@ -0,0 +1,429 @@
+"""
+Incrementally Maintained Revenue Rollups
+
+"Top products", "weekly net revenue", "revenue by category" and "lifetime net
+revenue per customer" all recompute Revenue = sum(quantity*unit_price_cents) -
+refunds.amount_cents from the raw order_items and refunds rows. This module
+keeps those sums precomputed in small rollup tables, maintained by triggers on
+every insert, update and delete, so the agent can answer from them instead.
+
+Rollup tables (revenue is attributed to the order's date, like the raw-table
+queries do; missing categories/regions are rolled up as 'unknown'):
+- rollup_daily_product(day, product_id, units, gross_cents)
+- rollup_daily_category(day, category, units, gross_cents)
+- rollup_daily_region(day, region, gross_cents, refund_cents, net_cents)
+- rollup_customer_revenue(customer_id, gross_cents, refund_cents, net_cents)
+- rollup_meta(name, built_at, updated_at, changes): freshness
+
+Triggers cover order_items and refunds (insert/update/delete), orders that are
+inserted (after their items), deleted or change date or customer, customers that
+are inserted, deleted or change region and products that are inserted, deleted
+or change category.
+
+Usage (from the SQLAgent folder):
+    python scripts/rollups.py install    # create tables + triggers and backfill
+    python scripts/rollups.py status     # freshness, trigger health, row counts
+    python scripts/rollups.py verify     # compare rollup totals with the raw tables (--deep: row by row)
+    python scripts/rollups.py drop
+"""
+
+import argparse  # Command-line actions
+import pathlib  # Database path
+import sqlite3  # Writable connection for install/drop
+import time  # Build timing
+
+from sql_executor import DEFAULT_DB_PATH  # Default database
+
+META = "revenue"  # rollup_meta row shared by every revenue rollup
+
+ROLLUP_TABLES = ("rollup_daily_product", "rollup_daily_category", "rollup_daily_region", "rollup_customer_revenue")
+
+# Business words mapped to the rollups, merged into the schema linker's synonyms
+ROLLUP_SYNONYMS = {
+    "revenue": list(ROLLUP_TABLES),
+    "sales": ["rollup_daily_product", "rollup_daily_category", "rollup_daily_region"],
+    "sold": ["rollup_daily_product.units"],
+    "daily": ["rollup_daily_region.day"],
+    "weekly": ["rollup_daily_region.day"],
+    "monthly": ["rollup_daily_region.day"],
+    "lifetime": ["rollup_customer_revenue"],
+    "net": ["rollup_daily_region.net_cents", "rollup_customer_revenue.net_cents"],
+}
+
+# Added to the agent's system message when the rollups are installed
+ROLLUP_PROMPT = """Precomputed revenue rollups are kept current by triggers; prefer them over raw order_items/refunds:
+rollup_daily_product(day, product_id, units, gross_cents), rollup_daily_category(day, category, units, gross_cents),
+rollup_daily_region(day, region, gross_cents, refund_cents, net_cents),
+rollup_customer_revenue(customer_id, gross_cents, refund_cents, net_cents).
+day is the order date (YYYY-MM-DD). Use the raw tables only for filters the rollups don't carry (e.g. order status)."""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup_daily_product (
+  day TEXT NOT NULL,
+  product_id INTEGER NOT NULL,
+  units INTEGER NOT NULL DEFAULT 0,
+  gross_cents INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, product_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS rollup_daily_category (
+  day TEXT NOT NULL,
+  category TEXT NOT NULL,
+  units INTEGER NOT NULL DEFAULT 0,
+  gross_cents INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, category)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS rollup_daily_region (
+  day TEXT NOT NULL,
+  region TEXT NOT NULL,
+  gross_cents INTEGER NOT NULL DEFAULT 0,
+  refund_cents INTEGER NOT NULL DEFAULT 0,
+  net_cents INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, region)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS rollup_customer_revenue (
+  customer_id INTEGER PRIMARY KEY,
+  gross_cents INTEGER NOT NULL DEFAULT 0,
+  refund_cents INTEGER NOT NULL DEFAULT 0,
+  net_cents INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS rollup_meta (
+  name TEXT PRIMARY KEY,
+  built_at TEXT NOT NULL,
+  updated_at TEXT NOT NULL,
+  changes INTEGER NOT NULL DEFAULT 0
+);
+
+-- Order-level trigger paths look items and refunds up by order
+CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items (order_id);
+CREATE INDEX IF NOT EXISTS idx_refunds_order_id ON refunds (order_id);
+CREATE INDEX IF NOT EXISTS idx_orders_customer_id ON orders (customer_id);
+"""
+
+_NOW = "strftime('%Y-%m-%dT%H:%M:%f', 'now')"
+_CATEGORY = "IFNULL(p.category, 'unknown')"
+_REGION = "IFNULL(c.region, 'unknown')"
+
+
+def _items(sign: str, source: str, item: str, order: str, category: str = _CATEGORY, region: str = _REGION,
+           targets=ROLLUP_TABLES) -> list:
+    """
+    Upserts adding `sign` x the items selected by `source` to the rollups.
+
+    Args:
+        sign (str): "1" or "-1"
+        source (str): FROM ... WHERE clause producing the item rows (and their order)
+        item (str): Alias or pseudo-row (NEW/OLD) of the order_items row
+        order (str): Alias or pseudo-row of the order the item belongs to
+        category (str): Category expression (joins products p when it uses p)
+        region (str): Region expression (joins customers c when it uses c)
+        targets: Rollup tables to update
+    """
+    day = f"date({order}.order_date)"
+    units = f"{sign} * {item}.quantity"
+    gross = f"{sign} * {item}.quantity * {item}.unit_price_cents"
+    products = f" JOIN products p ON p.id = {item}.product_id" if "p." in category else ""
+    customers = f" JOIN customers c ON c.id = {order}.customer_id" if "c." in region else ""
+    statements = {
+        "rollup_daily_product": f"""INSERT INTO rollup_daily_product (day, product_id, units, gross_cents)
+    SELECT {day}, {item}.product_id, {units}, {gross} {source}
+    ON CONFLICT (day, product_id) DO UPDATE SET
+      units = units + excluded.units, gross_cents = gross_cents + excluded.gross_cents""",
+        "rollup_daily_category": f"""INSERT INTO rollup_daily_category (day, category, units, gross_cents)
+    SELECT {day}, {category}, {units}, {gross} {_join(source, products)}
+    ON CONFLICT (day, category) DO UPDATE SET
+      units = units + excluded.units, gross_cents = gross_cents + excluded.gross_cents""",
+        "rollup_daily_region": f"""INSERT INTO rollup_daily_region (day, region, gross_cents, net_cents)
+    SELECT {day}, {region}, {gross}, {gross} {_join(source, customers)}
+    ON CONFLICT (day, region) DO UPDATE SET
+      gross_cents = gross_cents + excluded.gross_cents, net_cents = net_cents + excluded.net_cents""",
+        "rollup_customer_revenue": f"""INSERT INTO rollup_customer_revenue (customer_id, gross_cents, net_cents)
+    SELECT {order}.customer_id, {gross}, {gross} {source}
+    ON CONFLICT (customer_id) DO UPDATE SET
+      gross_cents = gross_cents + excluded.gross_cents, net_cents = net_cents + excluded.net_cents""",
+    }
+    return [statements[t] for t in targets]
+
+
+def _refunds(sign: str, source: str, refund: str, order: str, region: str = _REGION,
+             targets=("rollup_daily_region", "rollup_customer_revenue")) -> list:
+    """Upserts adding `sign` x the refunds selected by `source` (same arguments as _items)."""
+    amount = f"{sign} * {refund}.amount_cents"
+    customers = f" JOIN customers c ON c.id = {order}.customer_id" if "c." in region else ""
+    statements = {
+        "rollup_daily_region": f"""INSERT INTO rollup_daily_region (day, region, refund_cents, net_cents)
+    SELECT date({order}.order_date), {region}, {amount}, -({amount}) {_join(source, customers)}
+    ON CONFLICT (day, region) DO UPDATE SET
+      refund_cents = refund_cents + excluded.refund_cents, net_cents = net_cents + excluded.net_cents""",
+        "rollup_customer_revenue": f"""INSERT INTO rollup_customer_revenue (customer_id, refund_cents, net_cents)
+    SELECT {order}.customer_id, {amount}, -({amount}) {source}
+    ON CONFLICT (customer_id) DO UPDATE SET
+      refund_cents = refund_cents + excluded.refund_cents, net_cents = net_cents + excluded.net_cents""",
+    }
+    return [statements[t] for t in targets]
+
+
+def _join(source: str, join: str) -> str:
+    """Insert a JOIN before the WHERE of a FROM ... WHERE clause."""
+    head, _, where = source.partition(" WHERE ")
+    return f"{head}{join} WHERE {where}"
+
+
+def _trigger(name: str, event: str, statements: list, when: str = "") -> str:
+    """CREATE TRIGGER running the statements plus the freshness bump."""
+    body = ";\n  ".join(statements + [
+        f"UPDATE rollup_meta SET updated_at = {_NOW}, changes = changes + 1 WHERE name = '{META}'"])
+    return f"CREATE TRIGGER {name} AFTER {event}{f' WHEN {when}' if when else ''}\nBEGIN\n  {body};\nEND"
+
+
+def trigger_sql() -> dict:
+    """Trigger name -> CREATE TRIGGER statement for every maintained path."""
+    def by_order(row):
+        return f"FROM orders o WHERE o.id = {row}.order_id"
+
+    triggers = {
+        "rollup_order_items_insert": ("INSERT ON order_items", _items("1", by_order("NEW"), "NEW", "o")),
+        "rollup_order_items_delete": ("DELETE ON order_items", _items("-1", by_order("OLD"), "OLD", "o")),
+        "rollup_order_items_update": (
+            "UPDATE OF order_id, product_id, quantity, unit_price_cents ON order_items",
+            _items("-1", by_order("OLD"), "OLD", "o") + _items("1", by_order("NEW"), "NEW", "o")),
+        "rollup_refunds_insert": ("INSERT ON refunds", _refunds("1", by_order("NEW"), "NEW", "o")),
+        "rollup_refunds_delete": ("DELETE ON refunds", _refunds("-1", by_order("OLD"), "OLD", "o")),
+        "rollup_refunds_update": (
+            "UPDATE OF order_id, amount_cents ON refunds",
+            _refunds("-1", by_order("OLD"), "OLD", "o") + _refunds("1", by_order("NEW"), "NEW", "o")),
+        # Moving an order moves its items and refunds; deleting it removes them
+        # (items deleted afterwards no longer find their order and are not subtracted twice),
+        # and inserting it adds the items and refunds that were written before it
+        "rollup_orders_insert": (
+            "INSERT ON orders",
+            _items("1", "FROM order_items oi WHERE oi.order_id = NEW.id", "oi", "NEW")
+            + _refunds("1", "FROM refunds r WHERE r.order_id = NEW.id", "r", "NEW")),
+        "rollup_orders_update": (
+            "UPDATE OF order_date, customer_id ON orders",
+            _items("-1", "FROM order_items oi WHERE oi.order_id = OLD.id", "oi", "OLD")
+            + _refunds("-1", "FROM refunds r WHERE r.order_id = OLD.id", "r", "OLD")
+            + _items("1", "FROM order_items oi WHERE oi.order_id = NEW.id", "oi", "NEW")
+            + _refunds("1", "FROM refunds r WHERE r.order_id = NEW.id", "r", "NEW")),
+        "rollup_orders_delete": (
+            "DELETE ON orders",
+            _items("-1", "FROM order_items oi WHERE oi.order_id = OLD.id", "oi", "OLD")
+            + _refunds("-1", "FROM refunds r WHERE r.order_id = OLD.id", "r", "OLD")),
+    }
+
+    # The region rollup only counts orders whose customer exists (and the category rollup
+    # only items whose product exists), like the raw-table joins: a customer's orders move
+    # between regions when the region changes and enter or leave it with the customer row
+    def customer(sign, row):
+        region = f"IFNULL({row}.region, 'unknown')"
+        orders = f"FROM orders o JOIN order_items oi ON oi.order_id = o.id WHERE o.customer_id = {row}.id"
+        refunds = f"FROM orders o JOIN refunds r ON r.order_id = o.id WHERE o.customer_id = {row}.id"
+        return (_items(sign, orders, "oi", "o", region=region, targets=("rollup_daily_region",))
+                + _refunds(sign, refunds, "r", "o", region=region, targets=("rollup_daily_region",)))
+
+    def product(sign, row):
+        items = f"FROM order_items oi JOIN orders o ON o.id = oi.order_id WHERE oi.product_id = {row}.id"
+        return _items(sign, items, "oi", "o", category=f"IFNULL({row}.category, 'unknown')",
+                      targets=("rollup_daily_category",))
+
+    triggers["rollup_customers_insert"] = ("INSERT ON customers", customer("1", "NEW"))
+    triggers["rollup_customers_delete"] = ("DELETE ON customers", customer("-1", "OLD"))
+    triggers["rollup_customers_region"] = (
+        "UPDATE OF region ON customers", customer("-1", "OLD") + customer("1", "NEW"),
+        "IFNULL(OLD.region, 'unknown') <> IFNULL(NEW.region, 'unknown')")
+    triggers["rollup_products_insert"] = ("INSERT ON products", product("1", "NEW"))
+    triggers["rollup_products_delete"] = ("DELETE ON products", product("-1", "OLD"))
+    triggers["rollup_products_category"] = (
+        "UPDATE OF category ON products", product("-1", "OLD") + product("1", "NEW"),
+        "IFNULL(OLD.category, 'unknown') <> IFNULL(NEW.category, 'unknown')")
+
+    return {name: _trigger(name, spec[0], spec[1], *spec[2:]) for name, spec in triggers.items()}
+
+
+# Full recomputation, used for the backfill and by verify()
+_BACKFILL = {
+    "rollup_daily_product": """
+        SELECT date(o.order_date) AS day, oi.product_id, SUM(oi.quantity) AS units,
+               SUM(oi.quantity * oi.unit_price_cents) AS gross_cents
+        FROM order_items oi JOIN orders o ON o.id = oi.order_id
+        GROUP BY 1, 2""",
+    "rollup_daily_category": """
+        SELECT date(o.order_date) AS day, IFNULL(p.category, 'unknown') AS category, SUM(oi.quantity) AS units,
+               SUM(oi.quantity * oi.unit_price_cents) AS gross_cents
+        FROM order_items oi JOIN orders o ON o.id = oi.order_id JOIN products p ON p.id = oi.product_id
+        GROUP BY 1, 2""",
+    "rollup_daily_region": """
+        SELECT day, region, SUM(gross) AS gross_cents, SUM(refund) AS refund_cents,
+               SUM(gross) - SUM(refund) AS net_cents
+        FROM (
+          SELECT date(o.order_date) AS day, IFNULL(c.region, 'unknown') AS region,
+                 oi.quantity * oi.unit_price_cents AS gross, 0 AS refund
+          FROM order_items oi JOIN orders o ON o.id = oi.order_id JOIN customers c ON c.id = o.customer_id
+          UNION ALL
+          SELECT date(o.order_date), IFNULL(c.region, 'unknown'), 0, r.amount_cents
+          FROM refunds r JOIN orders o ON o.id = r.order_id JOIN customers c ON c.id = o.customer_id
+        )
+        GROUP BY 1, 2""",
+    "rollup_customer_revenue": """
+        SELECT customer_id, SUM(gross) AS gross_cents, SUM(refund) AS refund_cents,
+               SUM(gross) - SUM(refund) AS net_cents
+        FROM (
+          SELECT o.customer_id, oi.quantity * oi.unit_price_cents AS gross, 0 AS refund
+          FROM order_items oi JOIN orders o ON o.id = oi.order_id
+          UNION ALL
+          SELECT o.customer_id, 0, r.amount_cents FROM refunds r JOIN orders o ON o.id = r.order_id
+        )
+        GROUP BY 1""",
+}
+
+# Totals compared by verify()
+_CHECKS = {
+    "rollup_daily_product": ("units", "gross_cents"),
+    "rollup_daily_category": ("units", "gross_cents"),
+    "rollup_daily_region": ("gross_cents", "refund_cents", "net_cents"),
+    "rollup_customer_revenue": ("gross_cents", "refund_cents", "net_cents"),
+}
+
+
+def install(conn: sqlite3.Connection) -> dict:
+    """
+    Create (or rebuild) the rollup tables and triggers and backfill them.
+
+    Runs in one transaction, so concurrent readers see either no rollups or
+    complete ones.
+
+    Returns:
+        dict: rollup table -> rows after the backfill, plus "seconds"
+    """
+    started = time.perf_counter()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")  # DDL too, not just the inserts
+        _drop(conn)
+        for statement in _SCHEMA.split(";"):
+            if statement.strip():
+                conn.execute(statement)
+        for table, select in _BACKFILL.items():
+            conn.execute(f"INSERT INTO {table} {select}")
+        for sql in trigger_sql().values():
+            conn.execute(sql)
+        conn.execute(f"INSERT INTO rollup_meta (name, built_at, updated_at) VALUES (?, {_NOW}, {_NOW})", (META,))
+    conn.execute("ANALYZE")
+    rows = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ROLLUP_TABLES}
+    rows["seconds"] = round(time.perf_counter() - started, 2)
+    return rows
+
+
+def _drop(conn: sqlite3.Connection):
+    for name in trigger_sql():
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    for table in ROLLUP_TABLES + ("rollup_meta",):
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def drop(conn: sqlite3.Connection):
+    """Remove the rollup tables and triggers (the supporting indexes stay)."""
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        _drop(conn)
+
+
+def status(conn: sqlite3.Connection) -> dict:
+    """
+    Rollup freshness and health.
+
+    Returns:
+        dict: installed (bool), fresh (bool: every trigger present, so the rollups
+        track the raw tables), missing_triggers, built_at, updated_at (last
+        incremental change), changes (trigger firings since the build), rows
+    """
+    names = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")}
+    installed = all(t in names for t in ROLLUP_TABLES + ("rollup_meta",))
+    missing = sorted(set(trigger_sql()) - names)
+    result = {"installed": installed, "fresh": installed and not missing, "missing_triggers": missing}
+    if installed:
+        meta = conn.execute("SELECT built_at, updated_at, changes FROM rollup_meta WHERE name = ?", (META,)).fetchone()
+        result.update(dict(zip(("built_at", "updated_at", "changes"), meta or (None, None, 0))))
+        result["rows"] = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ROLLUP_TABLES}
+    return result
+
+
+def verify(conn: sqlite3.Connection, deep: bool = False) -> dict:
+    """
+    Compare each rollup with a recomputation from the raw tables.
+
+    Args:
+        conn: Connection to the database
+        deep (bool): Also compare row by row (catches sums booked under the wrong key)
+
+    Returns:
+        dict: rollup table -> {column: rollup total - raw total} (all zero when in
+        sync), plus "mismatched_rows" when deep
+    """
+    drift = {}
+    for table, columns in _CHECKS.items():
+        sums = ", ".join(f"IFNULL(SUM({c}), 0)" for c in columns)
+        stored = conn.execute(f"SELECT {sums} FROM {table}").fetchone()
+        raw = conn.execute(f"SELECT {sums} FROM ({_BACKFILL[table]})").fetchone()
+        drift[table] = {c: s - r for c, s, r in zip(columns, stored, raw)}
+        if deep:
+            # Rows that netted out to zero are left behind by deletes; they aren't drift
+            live = f"SELECT * FROM {table} WHERE " + " OR ".join(f"{c} <> 0" for c in columns)
+            drift[table]["mismatched_rows"] = conn.execute(
+                f"SELECT COUNT(*) FROM (SELECT * FROM ({live} EXCEPT {_BACKFILL[table]}) "
+                f"UNION ALL SELECT * FROM ({_BACKFILL[table]} EXCEPT {live}))").fetchone()[0]
+    return drift
+
+
+def installed_rollups(pool) -> list:
+    """Rollup tables the agent can use: installed with every maintaining trigger present."""
+    with pool.connection() as conn:
+        return list(ROLLUP_TABLES) if status(conn)["fresh"] else []
+
+
+def rollup_status(pool) -> dict:
+    """status() through a pool connection."""
+    with pool.connection() as conn:
+        return status(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the trigger-maintained revenue rollups")
+    parser.add_argument("action", choices=["install", "status", "verify", "drop"])
+    parser.add_argument("--db", type=pathlib.Path, default=DEFAULT_DB_PATH, help="database file")
+    parser.add_argument("--deep", action="store_true", help="verify: compare row by row, not just totals")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db.resolve().as_posix())
+    if args.action == "install":
+        rows = install(conn)
+        print(f"Rollups built in {rows.pop('seconds')}s:")
+        for table, count in rows.items():
+            print(f"  {table:<26}{count:>10,} rows")
+    elif args.action == "drop":
+        drop(conn)
+        print("Rollup tables and triggers dropped.")
+    elif args.action == "status":
+        info = status(conn)
+        if not info["installed"]:
+            print("Rollups are not installed. Run: python scripts/rollups.py install")
+            return
+        print(f"Fresh: {'yes' if info['fresh'] else 'NO - missing triggers: ' + ', '.join(info['missing_triggers'])}")
+        print(f"Built: {info['built_at']}, last change: {info['updated_at']}, changes since build: {info['changes']:,}")
+        for table, count in info["rows"].items():
+            print(f"  {table:<26}{count:>10,} rows")
+    else:
+        started = time.perf_counter()
+        drift = verify(conn, deep=args.deep)
+        in_sync = all(not any(d.values()) for d in drift.values())
+        for table, columns in drift.items():
+            print(f"  {table:<26}" + ", ".join(f"{c} {d:+,}" for c, d in columns.items()))
+        print(f"{'In sync' if in_sync else 'DRIFT detected - rebuild with: python scripts/rollups.py install'} "
+              f"(checked in {time.perf_counter() - started:.1f}s)")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
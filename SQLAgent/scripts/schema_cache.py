@@ -0,0 +1,227 @@
+"""
+Persistent Schema Context Cache
+
+LangChain's SQLDatabase reflects every table and runs sample-row queries each time
+the schema text is rendered: at import time in scripts 03/04, whenever a CLI chat
+mode builds its SQLDatabaseToolkit, and on every `sql_db_schema` tool call the
+agent makes. The text only changes when the schema does.
+
+This module caches the rendered schema context in memory and on disk, keyed on
+SQLite's `PRAGMA schema_version` plus the table allow-list, so startup and
+per-turn schema tool calls are a lookup until DDL actually changes.
+
+Key Features:
+- `CachedSQLDatabase`: drop-in SQLDatabase whose get_table_info() is cached
+  (the toolkit's sql_db_schema tool goes through it too)
+- Lazy table reflection: nothing is reflected until a cache miss needs it
+- Keyed on schema_version + allow-list + requested tables + sample-row count
+- Persisted to a JSON file next to the database; stale versions are pruned
+- Hit/miss counters
+
+Note: the rendered text includes a few sample rows per table. Those samples are
+refreshed on schema changes only, which is enough for the agent to learn the
+value formats.
+
+Usage:
+    from schema_cache import cached_database
+
+    db = cached_database(pool, include_tables=["customers", "orders"])
+    schema_context = db.get_table_info()  # rendered once per schema version
+"""
+
+import json  # On-disk cache file
+import os  # Atomic file replacement
+import pathlib  # Cache file location
+import threading  # Lock around the cache and counters
+import time  # Render-time measurement
+
+from langchain_community.utilities import SQLDatabase  # Class being cached
+
+
+class SchemaCache:
+    """
+    Rendered schema text for one database, keyed on its schema version.
+
+    Attributes:
+        path (pathlib.Path | None): JSON file the entries persist to
+    """
+
+    def __init__(self, pool, path=None):
+        """
+        Args:
+            pool: ReadOnlyPool for the database (used to read schema_version)
+            path: JSON file for persistence (None keeps entries in memory only)
+        """
+        self.pool = pool
+        self.path = pathlib.Path(path) if path is not None else None
+
+        self._entries = {}  # key -> rendered text
+        self._lock = threading.Lock()
+
+        # Counters reported by stats()
+        self._hits = 0
+        self._misses = 0
+        self._render_time = 0.0
+
+        self._load()
+
+    def schema_version(self) -> int:
+        """Current `PRAGMA schema_version` (bumped by SQLite on every DDL change)."""
+        with self.pool.connection() as conn:
+            return conn.execute("PRAGMA schema_version").fetchone()[0]
+
+    def _load(self):
+        """Read persisted entries, ignoring a missing or unreadable file."""
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            entries = json.loads(self.path.read_text()).get("entries", {})
+            self._entries = {key: text for key, text in entries.items() if isinstance(text, str)}
+        except (OSError, ValueError, AttributeError):
+            self._entries = {}
+
+    def _save(self, version: int):
+        """Persist entries for the current schema version. Caller holds the lock."""
+        prefix = f"{version}|"
+        self._entries = {key: text for key, text in self._entries.items() if key.startswith(prefix)}
+        if self.path is None:
+            return
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        try:
+            tmp.write_text(json.dumps({"entries": self._entries}, indent=1))
+            os.replace(tmp, self.path)
+        except OSError:
+            pass  # Read-only checkout: keep the entries in memory
+
+    @staticmethod
+    def _key(version: int, allowed, tables, sample_rows: int) -> str:
+        allowed_part = ",".join(sorted(t.lower() for t in allowed)) if allowed else "*"
+        tables_part = ",".join(sorted(t.lower() for t in tables)) if tables else "*"
+        return f"{version}|{allowed_part}|{tables_part}|{sample_rows}"
+
+    def get(self, render, allowed=None, tables=None, sample_rows: int = 3) -> str:
+        """
+        Return the cached schema text, rendering it on a miss.
+
+        Args:
+            render: Zero-argument callable producing the text (called on a miss)
+            allowed: Table allow-list of the SQLDatabase (None = all tables)
+            tables: Tables requested (None = every allowed table)
+            sample_rows (int): Sample rows per table included in the text
+
+        Returns:
+            str: Rendered schema context
+        """
+        version = self.schema_version()
+        key = self._key(version, allowed, tables, sample_rows)
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._hits += 1
+                return text
+            self._misses += 1
+
+        started = time.perf_counter()
+        text = render()  # Errors (unknown tables) propagate and are not cached
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self._render_time += elapsed
+            self._entries[key] = text
+            self._save(version)
+        return text
+
+    def clear(self):
+        """Drop every cached entry (memory and disk)."""
+        with self._lock:
+            self._entries.clear()
+            if self.path is not None:
+                try:
+                    self.path.unlink()
+                except OSError:
+                    pass
+
+    def stats(self) -> dict:
+        """
+        Snapshot of schema cache counters.
+
+        Returns:
+            dict: entries held, hits, misses, hit rate and total render time in ms
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+                "render_ms_total": round(self._render_time * 1000, 3),
+            }
+
+
+class CachedSQLDatabase(SQLDatabase):
+    """
+    SQLDatabase whose rendered table info comes from a SchemaCache.
+
+    Everything that asks for schema text - the scripts' system prompts and the
+    toolkit's `sql_db_schema` tool (via get_table_info_no_throw) - is served
+    from the cache until the schema version changes.
+    """
+
+    def __init__(self, engine, schema_cache: SchemaCache, **kwargs):
+        """
+        Args:
+            engine: SQLAlchemy engine (normally pool.sqlalchemy_engine())
+            schema_cache (SchemaCache): Cache for the same database
+            **kwargs: SQLDatabase options (include_tables, sample_rows_in_table_info, ...)
+        """
+        kwargs.setdefault("lazy_table_reflection", True)  # Reflect only on a cache miss
+        super().__init__(engine, **kwargs)
+        self.schema_cache = schema_cache
+
+    def get_table_info(self, table_names=None) -> str:
+        """Cached SQLDatabase.get_table_info()."""
+        return self.schema_cache.get(
+            lambda: SQLDatabase.get_table_info(self, table_names),
+            allowed=self._include_tables,
+            tables=table_names,
+            sample_rows=self._sample_rows_in_table_info,
+        )
+
+
+# Process-wide registry: one schema cache per database file
+_schema_caches = {}
+_schema_caches_lock = threading.Lock()
+
+
+def get_schema_cache(pool, **options) -> SchemaCache:
+    """
+    Return the shared schema cache for a pool's database, creating it on first use.
+
+    Entries persist to `<database>.schema.json` next to the database file
+    unless a `path` option is given.
+    """
+    with _schema_caches_lock:
+        cache = _schema_caches.get(pool.db_path)
+        if cache is None:
+            options.setdefault("path", pool.db_path.with_suffix(".schema.json"))
+            cache = _schema_caches[pool.db_path] = SchemaCache(pool, **options)
+        return cache
+
+
+def cached_database(pool, **kwargs) -> CachedSQLDatabase:
+    """
+    SQLDatabase on the shared pool with cached schema rendering.
+
+    Args:
+        pool: ReadOnlyPool to borrow connections from
+        **kwargs: SQLDatabase options (include_tables, sample_rows_in_table_info, ...)
+    """
+    return CachedSQLDatabase(pool.sqlalchemy_engine(), get_schema_cache(pool), **kwargs)
+
+
+def schema_cache_stats() -> dict:
+    """Counters for every schema cache in this process, keyed by database path."""
+    with _schema_caches_lock:
+        caches = list(_schema_caches.items())
+    return {str(path): cache.stats() for path, cache in caches}
@@ -0,0 +1,396 @@
+"""
+Question-Relevant Schema Pruning (Schema Linking)
+
+Embedding the full schema in every prompt costs thousands of tokens per LLM hop on
+a wide schema, even though a question usually touches two or three tables. This
+module scores tables and columns against the question locally - no LLM call - and
+renders only the relevant subset.
+
+Scoring signals:
+- Lexical match: question words against table and column names (split on "_",
+  crude plural stemming); a column word shared by many tables counts for less
+- Column-value hits: the question mentions a stored value ("Electronics",
+  "APAC", "paypal") of a low-cardinality text column
+- Business synonyms supplied by the caller ("revenue" -> order_items, refunds)
+- FK-graph neighbourhood: the direct foreign-key neighbours of every matched
+  table are always added, and so are the tables on the shortest foreign-key path
+  between two matched tables, so the agent can write the joins
+
+The neighbours are a recall safety net: "Which products were never ordered?"
+names only products, but the answer needs order_items. The agent has no
+schema-lookup tool, so a table left out is a table it can't use; the rendered
+schema still names every other table in one line.
+
+If nothing matches, the full schema is used. Wide tables (more than
+`max_columns`) are rendered with only their key and matched columns.
+
+Usage:
+    from schema_linker import get_schema_linker
+
+    linker = get_schema_linker(pool)
+    pruned = linker.prune("Top 5 products by gross revenue", db)
+    print(pruned.text, pruned.full_tokens, pruned.pruned_tokens)
+"""
+
+import re  # Question and identifier word splitting
+import threading  # Lock around the schema index and counters
+from collections import deque  # BFS over the foreign-key graph
+from dataclasses import dataclass, field  # Link results
+
+# Words that never identify a table or column
+_STOPWORDS = frozenset("""
+a an and are as at be by do does each for from give has have how i in include is it its
+last list me most my of on or our per return rows show than that the their them then these
+this those to top was we what when where which who with
+""".split())
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# Signal weights
+TABLE_NAME_SCORE = 3.0
+SYNONYM_SCORE = 3.0
+VALUE_HIT_SCORE = 2.0
+NEIGHBOUR_SHARE = 0.5  # fraction of a matched table's score its FK neighbours inherit (for ordering)
+MIN_TABLE_SCORE = 1.0  # a table needs this much to be included on its own
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count (~4 characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def _stem(word: str) -> str:
+    """Crude singular form so "products"/"product" and "categories"/"category" match."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _words(text: str) -> set:
+    """Stemmed, lower-cased content words of a question or identifier."""
+    return {_stem(w) for w in _WORD.findall(text.lower().replace("_", " ")) if w not in _STOPWORDS}
+
+
+@dataclass
+class PrunedSchema:
+    """
+    Schema context selected for one question.
+
+    Attributes:
+        text (str): Rendered schema for the prompt
+        tables (tuple): Included tables, highest score first
+        columns (dict): table -> matched columns (shown as hints)
+        reasons (list): Why each table was included
+        total_tables (int): Tables in the full schema
+        full_tokens (int): Estimated tokens of the full schema
+        pruned_tokens (int): Estimated tokens of `text`
+    """
+    text: str
+    tables: tuple
+    columns: dict = field(default_factory=dict)
+    reasons: list = field(default_factory=list)
+    total_tables: int = 0
+    full_tokens: int = 0
+    pruned_tokens: int = 0
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(self.full_tokens - self.pruned_tokens, 0)
+
+    @property
+    def saved_pct(self) -> float:
+        return 100.0 * self.saved_tokens / self.full_tokens if self.full_tokens else 0.0
+
+
+class SchemaLinker:
+    """
+    Scores the tables and columns of one database against questions.
+
+    The schema index (columns, foreign keys, low-cardinality values) is built
+    from the database on first use and rebuilt when schema_version changes.
+
+    Attributes:
+        synonyms (dict): word -> ["table" or "table.column", ...] business vocabulary
+        max_values (int): Text columns with at most this many distinct values are indexed
+        max_columns (int): Tables wider than this are rendered with matched columns only
+    """
+
+    def __init__(self, pool, synonyms=None, max_values: int = 50, sample_rows: int = 10000,
+                 max_columns: int = 15):
+        """
+        Args:
+            pool: ReadOnlyPool for the database
+            synonyms (dict): Business words mapped to tables or table.columns
+            max_values (int): Distinct-value cap for indexing a text column
+            sample_rows (int): Rows scanned per column when collecting values
+            max_columns (int): Column count above which a table is rendered pruned
+        """
+        self.pool = pool
+        self.synonyms = {_stem(k.lower()): list(v) for k, v in (synonyms or {}).items()}
+        self.max_values = max_values
+        self.sample_rows = sample_rows
+        self.max_columns = max_columns
+
+        self._lock = threading.Lock()
+        self._version = None
+        self._columns = {}  # table -> [(name, type, is_pk)]
+        self._edges = {}  # table -> set of FK-adjacent tables
+        self._fk_columns = {}  # table -> set of FK column names
+        self._column_words = {}  # stemmed word -> [(table, column)]
+        self._values = {}  # normalized value -> [(table, column)]
+
+        # Counters reported by stats()
+        self._questions = 0
+        self._full_tokens = 0
+        self._pruned_tokens = 0
+        self._fallbacks = 0
+
+    def _index(self):
+        """(Re)build the schema index if the schema changed."""
+        with self.pool.connection() as conn:
+            version = conn.execute("PRAGMA schema_version").fetchone()[0]
+            if version == self._version:
+                return
+            tables = [r[0] for r in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+            columns, edges, fk_columns, column_words, values = {}, {}, {}, {}, {}
+            for table in tables:
+                quoted = '"' + table.replace('"', '""') + '"'
+                info = conn.execute(f"PRAGMA table_info({quoted})").fetchall()
+                columns[table] = [(row[1], (row[2] or "").upper(), bool(row[5])) for row in info]
+                edges.setdefault(table, set())
+                fk_columns[table] = set()
+                for fk in conn.execute(f"PRAGMA foreign_key_list({quoted})"):
+                    target, column = fk[2], fk[3]
+                    fk_columns[table].add(column)
+                    if target in tables or target.lower() in tables:
+                        edges[table].add(target)
+                        edges.setdefault(target, set()).add(table)
+                for name, col_type, is_pk in columns[table]:
+                    # Key columns echo other tables' names ("order_id"); the FK graph covers them
+                    if not is_pk and name not in fk_columns[table]:
+                        for word in _words(name):
+                            column_words.setdefault(word, []).append((table, name))
+                    if is_pk or (col_type and "CHAR" not in col_type and "TEXT" not in col_type):
+                        continue  # Only text columns hold values worth matching
+                    qcol = '"' + name.replace('"', '""') + '"'
+                    found = conn.execute(
+                        f"SELECT DISTINCT {qcol} FROM (SELECT {qcol} FROM {quoted} LIMIT ?) LIMIT ?",
+                        (self.sample_rows, self.max_values + 1)).fetchall()
+                    if len(found) <= self.max_values:
+                        for (value,) in found:
+                            if isinstance(value, str) and 2 < len(value) <= 40:
+                                key = " ".join(_WORD.findall(value.lower()))
+                                if key:
+                                    values.setdefault(key, []).append((table, name))
+        self._columns, self._edges, self._fk_columns = columns, edges, fk_columns
+        self._column_words, self._values, self._version = column_words, values, version
+
+    def _path(self, start: str, goal: str) -> list:
+        """Shortest FK path between two tables (inclusive), or [] if unconnected."""
+        previous = {start: None}
+        queue = deque([start])
+        while queue:
+            table = queue.popleft()
+            if table == goal:
+                path = []
+                while table is not None:
+                    path.append(table)
+                    table = previous[table]
+                return path[::-1]
+            for neighbour in self._edges.get(table, ()):
+                if neighbour not in previous:
+                    previous[neighbour] = table
+                    queue.append(neighbour)
+        return []
+
+    def link(self, question: str, allowed=None) -> tuple:
+        """
+        Score tables and columns against a question.
+
+        Args:
+            question (str): Natural-language question
+            allowed: Tables the agent may use (None = every table)
+
+        Returns:
+            tuple: (tables ordered by score, {table: [matched columns]}, [reasons]);
+            tables is empty when nothing matched
+        """
+        with self._lock:
+            self._index()
+            allowed = {t for t in self._columns if allowed is None or t in set(allowed)}
+            words = _words(question)
+            padded = " " + " ".join(_WORD.findall(question.lower())) + " "
+
+            scores = dict.fromkeys(allowed, 0.0)
+            matched_columns = {}
+            reasons = []
+
+            def hit_column(table, column):
+                if column not in matched_columns.setdefault(table, []):
+                    matched_columns[table].append(column)
+
+            # Lexical: table names
+            for table in allowed:
+                if _words(table) <= words:
+                    scores[table] += TABLE_NAME_SCORE
+                    reasons.append(f"{table}: table name")
+
+            # Lexical: column names, weighted down when many tables share the word
+            for word in words:
+                owners = [(t, c) for t, c in self._column_words.get(word, ()) if t in allowed]
+                tables_sharing = {t for t, _ in owners}
+                for table, column in owners:
+                    scores[table] += 1.0 / len(tables_sharing)
+                    hit_column(table, column)
+                if len(tables_sharing) == 1:
+                    reasons.append(f"{owners[0][0]}: column word '{word}'")
+
+            # Column values mentioned in the question
+            for value, owners in self._values.items():
+                if f" {value} " in padded:
+                    for table, column in owners:
+                        if table in allowed:
+                            scores[table] += VALUE_HIT_SCORE
+                            hit_column(table, column)
+                            reasons.append(f"{table}.{column}: value '{value}'")
+
+            # Business vocabulary
+            for word in words:
+                for target in self.synonyms.get(word, ()):
+                    table, _, column = target.partition(".")
+                    if table in allowed:
+                        scores[table] += SYNONYM_SCORE
+                        if column:
+                            hit_column(table, column)
+                        reasons.append(f"{table}: synonym '{word}'")
+
+            matched = {t for t, s in scores.items() if s >= MIN_TABLE_SCORE}
+            if not matched:
+                return (), {}, ["no table matched: using the full schema"]
+
+            # FK neighbourhood: every direct neighbour of a matched table is included (ranked
+            # below the tables that matched), so the tables a question joins to are never missing
+            direct = sorted(matched)
+            for table in direct:
+                for neighbour in sorted(self._edges.get(table, ())):
+                    if neighbour in allowed and neighbour not in direct:
+                        scores[neighbour] += NEIGHBOUR_SHARE * scores[table]
+                        if neighbour not in matched:
+                            matched.add(neighbour)
+                            reasons.append(f"{neighbour}: FK neighbour of {table}")
+
+            # Join paths: tables linking every pair of matched tables
+            for table in sorted(matched):
+                for other in sorted(matched):
+                    if table < other:
+                        for step in self._path(table, other)[1:-1]:
+                            if step in allowed and step not in matched:
+                                matched.add(step)
+                                reasons.append(f"{step}: joins {table} and {other}")
+
+            ordered = tuple(sorted(matched, key=lambda t: (-scores[t], t)))
+            return ordered, {t: matched_columns.get(t, []) for t in ordered}, reasons
+
+    def _render_wide(self, table: str, keep) -> str:
+        """Compact CREATE TABLE for a wide table: keys and matched columns only."""
+        shown = [(n, t, pk) for n, t, pk in self._columns[table]
+                 if pk or n in self._fk_columns.get(table, ()) or n in keep]
+        lines = [f"\t{name} {col_type}{' PRIMARY KEY' if pk else ''}" for name, col_type, pk in shown]
+        omitted = len(self._columns[table]) - len(shown)
+        if omitted:
+            lines.append(f"\t/* {omitted} more columns not shown */")
+        return f"CREATE TABLE {table} (\n" + ",\n".join(lines) + "\n)"
+
+    def prune(self, question: str, db) -> PrunedSchema:
+        """
+        Render the schema subset relevant to a question.
+
+        Args:
+            question (str): Natural-language question
+            db: LangChain SQLDatabase (a CachedSQLDatabase makes the renders lookups)
+
+        Returns:
+            PrunedSchema: Text for the prompt plus the token accounting
+        """
+        allowed = db.get_usable_table_names()
+        full = db.get_table_info()
+        tables, columns, reasons = self.link(question, allowed)
+
+        if not tables:
+            text = full
+        else:
+            narrow = [t for t in tables if len(self._columns.get(t, ())) <= self.max_columns]
+            parts = [db.get_table_info(narrow)] if narrow else []
+            parts += [self._render_wide(t, columns.get(t, ())) for t in tables if t not in narrow]
+            hints = [f"{t}.{c}" for t in tables for c in columns.get(t, ())]
+            if hints:
+                parts.append("Relevant columns: " + ", ".join(hints))
+            others = [t for t in allowed if t not in tables]
+            if others:
+                parts.append("Other tables (not shown): " + ", ".join(others))
+            text = "\n\n".join(parts)
+
+        pruned = PrunedSchema(
+            text=text,
+            tables=tables or tuple(allowed),
+            columns=columns,
+            reasons=reasons,
+            total_tables=len(allowed),
+            full_tokens=estimate_tokens(full),
+            pruned_tokens=estimate_tokens(text),
+        )
+        with self._lock:
+            self._questions += 1
+            self._full_tokens += pruned.full_tokens
+            self._pruned_tokens += pruned.pruned_tokens
+            self._fallbacks += not tables
+        return pruned
+
+    def stats(self) -> dict:
+        """
+        Snapshot of pruning counters.
+
+        Returns:
+            dict: questions linked, full vs. pruned schema tokens, tokens saved
+            (total and percent) and fallbacks to the full schema
+        """
+        with self._lock:
+            saved = self._full_tokens - self._pruned_tokens
+            return {
+                "questions": self._questions,
+                "full_tokens": self._full_tokens,
+                "pruned_tokens": self._pruned_tokens,
+                "saved_tokens": saved,
+                "saved_pct": round(100.0 * saved / self._full_tokens, 1) if self._full_tokens else 0.0,
+                "fallbacks": self._fallbacks,
+            }
+
+
+# Process-wide registry: one linker per database file
+_linkers = {}
+_linkers_lock = threading.Lock()
+
+
+def get_schema_linker(pool, **options) -> SchemaLinker:
+    """
+    Return the shared schema linker for a pool's database, creating it on first use.
+
+    Args:
+        pool: ReadOnlyPool for the database
+        **options: SchemaLinker settings, applied only when the linker is created
+    """
+    with _linkers_lock:
+        linker = _linkers.get(pool.db_path)
+        if linker is None:
+            linker = _linkers[pool.db_path] = SchemaLinker(pool, **options)
+        return linker
+
+
+def schema_linker_stats() -> dict:
+    """Counters for every schema linker in this process, keyed by database path."""
+    with _linkers_lock:
+        linkers = list(_linkers.items())
+    return {str(path): linker.stats() for path, linker in linkers}
@@ -0,0 +1,110 @@
+"""
+In-Process Educational Script Runner
+
+The CLI used to start a fresh Python interpreter for every educational script,
+so each run re-imported LangChain and Gemini, rebuilt the engine and reflected
+the schema again. The scripts now build their components lazily (cached
+getters such as get_agent()) and keep their demos in main(), so importing one
+has no side effects beyond the shared registries.
+
+This module imports a script once per process, keeps the module, and calls
+its main() on every run:
+- First run: imports the script (and LangChain, if not already warm), then
+  main() builds the engine, schema context, LLM client and agent
+- Later runs: the same module and the same cached components; only the demo
+  questions themselves are paid for
+
+Scripts are loaded by file name (they start with digits, so a plain import
+statement can't name them) and registered in sys.modules under their stem,
+e.g. "04_complex_queries".
+
+Usage:
+    from script_runner import load_script, run_script
+
+    run_script("04_complex_queries.py")            # what the CLI menu does
+    tool = load_script("04_complex_queries.py").SafeSQLTool()
+"""
+
+import importlib.util  # Loading scripts whose names start with digits
+import pathlib  # Script paths
+import sys  # Module registration
+import threading  # Lock around the module table
+import time  # Load and run timings
+
+SCRIPTS_DIR = pathlib.Path(__file__).resolve().parent
+
+# Process-wide table of loaded scripts (stem -> module) and their timings
+_modules = {}
+_timings = {}  # stem -> {"load_seconds", "runs", "run_seconds", "last_run_seconds"}
+_modules_lock = threading.Lock()
+
+
+def load_script(filename: str):
+    """
+    Import an educational script once and return its module.
+
+    Args:
+        filename (str): Script file in the scripts folder, e.g. "04_complex_queries.py"
+
+    Returns:
+        module: The loaded script (the same object on every call)
+
+    Raises:
+        FileNotFoundError: No such script
+    """
+    path = SCRIPTS_DIR / filename
+    name = path.stem
+    with _modules_lock:
+        module = _modules.get(name)
+        if module is not None:
+            return module
+        if not path.is_file():
+            raise FileNotFoundError(f"no script {filename} in {SCRIPTS_DIR}")
+        started = time.perf_counter()
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module  # Pydantic resolves the tool input models through sys.modules
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[name]
+            raise
+        _modules[name] = module
+        _timings[name] = {"load_seconds": time.perf_counter() - started, "runs": 0,
+                          "run_seconds": 0.0, "last_run_seconds": 0.0}
+        return module
+
+
+def run_script(filename: str):
+    """
+    Run an educational script's demo (its main()) in this process.
+
+    Args:
+        filename (str): Script file in the scripts folder
+
+    Returns:
+        Whatever the script's main() returns
+
+    Raises:
+        AttributeError: The script has no main()
+    """
+    module = load_script(filename)
+    demo = getattr(module, "main", None)
+    if demo is None:
+        raise AttributeError(f"{filename} has no main() to run")
+    started = time.perf_counter()
+    try:
+        return demo()
+    finally:
+        elapsed = time.perf_counter() - started
+        with _modules_lock:
+            timing = _timings[module.__name__]
+            timing["runs"] += 1
+            timing["run_seconds"] += elapsed
+            timing["last_run_seconds"] = elapsed
+
+
+def runner_stats() -> dict:
+    """Load time, runs and run time of every script loaded in this process, keyed by script name."""
+    with _modules_lock:
+        return {name: dict(timing) for name, timing in _timings.items()}
@@ -0,0 +1,1758 @@
+"""
+Sharded Analytics Database
+
+One sql_agent_class.db file can't hold the order volume forever. This module
+splits the database into N SQLite shards partitioned by customer - by
+customers.region or by a hash of the customer id - and runs the agent's guarded
+SELECTs on all of them at once. The agent keeps seeing one logical schema.
+
+Partitioning (everything that belongs to a customer lives on one shard):
+- customers: regions bin-packed by customer count, or id % N
+- orders: with their customer
+- order_items, payments, refunds: with their order
+- products: copied to every shard (small, and joined by everything)
+
+Query execution (ShardSet.execute):
+- SELECTs that only read replicated tables run on one shard
+- Other SELECTs are rewritten once (memoized), fanned out to every shard in
+  parallel - each under the query budget - and the partial results are merged
+  centrally in an in-memory SQLite database:
+  - SUM/TOTAL/COUNT partials are summed, MIN/MAX re-minimized/maximized, AVG
+    is shipped as SUM and COUNT partials
+  - GROUP BY keys are regrouped; HAVING, ORDER BY and LIMIT run after the merge
+  - ORDER BY ... LIMIT k: each shard returns only its top k (+ OFFSET) rows,
+    also for RANK()/ROW_NUMBER()/DENSE_RANK() OVER (ORDER BY ...) LIMIT k
+  - Groups keyed by customer or order (or, on region shards, region) never span
+    shards, so those queries run whole on every shard and only the rows are merged
+  - Uncorrelated subqueries that aggregate across customers ("the top category")
+    are answered across the shards first and inlined as literals
+- Shapes that can't be merged from per-shard partials are rejected with an
+  ERROR the agent can act on: COUNT(DISTINCT)/GROUP_CONCAT over groups that
+  span shards, UNION/EXCEPT/INTERSECT at the top level, and CTEs, FROM
+  subqueries or correlated subqueries that aggregate across customers
+
+Joins between partitioned tables must follow the customer -> order keys (those
+rows are co-located): every pair of customer-row sources - tables, self-joins,
+CTEs and subqueries - has to be linked by equal customer or order ids (or, on
+region shards, customers.region). Other joins are rejected with a ShardingError;
+products can be joined freely.
+
+Usage (from the SQLAgent folder):
+    python scripts/sharding.py build --by region --shards 4 --out shards/
+    python scripts/sharding.py bench --db sql_agent_scale_1m.db --shards 1,2,4,8
+    SQL_AGENT_SHARDS=shards/shards.json python scripts/04_complex_queries.py
+"""
+
+import argparse  # Command-line actions
+import json  # Shard manifest
+import os  # Atomic renames
+import pathlib  # Shard and manifest paths
+import re  # SQL tokenizer
+import sqlite3  # Shard builds and the in-memory merge database
+import threading  # Registry lock and counters
+import time  # Build and query timing
+from concurrent.futures import ThreadPoolExecutor  # Parallel fan-out to the shards
+from dataclasses import dataclass  # Immutable (memoizable) query plans
+from functools import lru_cache  # Plan memoization
+
+from sql_executor import DEFAULT_DB_PATH, fetch_bounded, get_pool  # Per-shard pools and bounded fetch
+from query_budget import DEFAULT_BUDGET  # Per-shard statement limits
+from sql_guard import inspect_sql  # Tables referenced, for single-shard routing
+
+MANIFEST = "shards.json"
+
+# Copied in this order: a table's rows are chosen by the rows already copied before it
+PARTITIONED_TABLES = ("customers", "orders", "order_items", "payments", "refunds")
+REPLICATED_TABLES = ("products",)
+
+_COPY_ROWS = {
+    "orders": "SELECT * FROM src.orders WHERE customer_id IN (SELECT id FROM main.customers)",
+    "order_items": "SELECT * FROM src.order_items WHERE order_id IN (SELECT id FROM main.orders)",
+    "payments": "SELECT * FROM src.payments WHERE order_id IN (SELECT id FROM main.orders)",
+    "refunds": "SELECT * FROM src.refunds WHERE order_id IN (SELECT id FROM main.orders)",
+    "products": "SELECT * FROM src.products",
+}
+
+PARTIAL_ROW_LIMIT = 1_000_000  # Rows one shard may send to the merge
+INLINE_ROW_LIMIT = 10_000  # Values an IN (subquery) may expand to
+
+# The SQL the 04_complex_queries.py questions run (bench_agent.WORKLOAD, minus its failing query)
+BENCH_QUERIES = [
+    "SELECT p.name, SUM(oi.quantity * oi.unit_price_cents) AS total_cents FROM order_items oi "
+    "JOIN products p ON p.id = oi.product_id GROUP BY p.id ORDER BY total_cents DESC LIMIT 5",
+    "SELECT date(o.order_date, 'weekday 0', '-6 days') AS week_start, "
+    "SUM(oi.quantity * oi.unit_price_cents) - COALESCE(SUM(r.amount_cents), 0) AS net_cents "
+    "FROM orders o JOIN order_items oi ON oi.order_id = o.id LEFT JOIN refunds r ON r.order_id = o.id "
+    "GROUP BY week_start ORDER BY week_start DESC LIMIT 6",
+    "SELECT c.name, strftime('%Y-%m', MIN(o.order_date)) AS first_order_month, COUNT(o.id) AS total_orders, "
+    "MAX(o.order_date) AS last_order_date FROM customers c JOIN orders o ON o.customer_id = c.id "
+    "GROUP BY c.id ORDER BY c.id LIMIT 10",
+    "WITH items AS (SELECT o.customer_id, SUM(oi.quantity * oi.unit_price_cents) AS gross FROM orders o "
+    "JOIN order_items oi ON oi.order_id = o.id GROUP BY o.customer_id), refunded AS (SELECT o.customer_id, "
+    "SUM(r.amount_cents) AS refunded FROM refunds r JOIN orders o ON o.id = r.order_id GROUP BY o.customer_id) "
+    "SELECT RANK() OVER (ORDER BY gross - COALESCE(refunded, 0) DESC) AS rank, c.name, "
+    "gross - COALESCE(refunded, 0) AS net_cents FROM items JOIN customers c ON c.id = items.customer_id "
+    "LEFT JOIN refunded USING (customer_id) LIMIT 10",
+    "SELECT p.category, SUM(oi.quantity * oi.unit_price_cents) AS revenue_cents FROM order_items oi "
+    "JOIN products p ON p.id = oi.product_id GROUP BY p.category ORDER BY revenue_cents DESC",
+    "SELECT p.name, SUM(oi.quantity * oi.unit_price_cents) AS total_cents FROM order_items oi "
+    "JOIN products p ON p.id = oi.product_id WHERE p.category = (SELECT p2.category FROM order_items oi2 "
+    "JOIN products p2 ON p2.id = oi2.product_id GROUP BY p2.category "
+    "ORDER BY SUM(oi2.quantity * oi2.unit_price_cents) DESC LIMIT 1) GROUP BY p.id ORDER BY total_cents DESC",
+]
+
+
+class ShardingError(ValueError):
+    """A SELECT whose result can't be merged from per-shard results."""
+
+
+# ---------------------------------------------------------------------------
+# Building shards
+# ---------------------------------------------------------------------------
+
+def _region_groups(conn: sqlite3.Connection, shards: int) -> list:
+    """Regions per shard: largest first, each onto the shard with the fewest customers."""
+    counts = conn.execute(
+        "SELECT region, COUNT(*) FROM src.customers GROUP BY region ORDER BY 2 DESC").fetchall()
+    if len(counts) < shards:
+        raise ValueError(f"only {len(counts)} regions for {shards} shards; use --by hash")
+    bins = [[0, []] for _ in range(shards)]
+    for region, count in counts:
+        target = min(bins, key=lambda b: b[0])
+        target[0] += count
+        target[1].append(region)
+    return [regions for _, regions in bins]
+
+
+def _customer_filter(by: str, key, shards: int) -> tuple:
+    """WHERE clause (and parameters) selecting one shard's customers."""
+    if by == "hash":
+        return f"id % {shards} = ?", (key,)
+    named = [r for r in key if r is not None]
+    where = f"region IN ({', '.join('?' * len(named))})" if named else "0"
+    if None in key:
+        where += " OR region IS NULL"
+    return where, tuple(named)
+
+
+def build_shards(source, out_dir, by: str = "hash", shards: int = 4) -> dict:
+    """
+    Split a database into `shards` SQLite files plus a manifest.
+
+    Each shard is written to a .part file and renamed when complete, with the
+    source's tables, indexes and fresh ANALYZE statistics (rollup tables and
+    their triggers are not copied). The manifest is replaced last, so readers
+    never see a half-built shard set.
+
+    Args:
+        source: Database to split
+        out_dir: Folder for shard_<k>.db and shards.json
+        by (str): "hash" (customer id % shards) or "region" (customers.region)
+        shards (int): Number of shards
+
+    Returns:
+        dict: The manifest, with per-shard row counts and the build time
+    """
+    if by not in ("hash", "region"):
+        raise ValueError(f"unknown partitioning {by!r}; use hash or region")
+    started = time.perf_counter()
+    source = pathlib.Path(source).resolve()
+    out_dir = pathlib.Path(out_dir).resolve()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tables = PARTITIONED_TABLES + REPLICATED_TABLES
+
+    src = sqlite3.connect(":memory:")
+    src.execute("ATTACH DATABASE ? AS src", (source.as_posix(),))
+    marks = ", ".join("?" * len(tables))
+    schema = dict(src.execute(
+        f"SELECT name, sql FROM src.sqlite_master WHERE type = 'table' AND name IN ({marks})", tables))
+    indexes = [sql for (sql,) in src.execute(
+        f"SELECT sql FROM src.sqlite_master WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN ({marks})",
+        tables)]
+    missing = [t for t in tables if t not in schema]
+    if missing:
+        raise ValueError(f"{source.name} has no {', '.join(missing)} table")
+    keys = _region_groups(src, shards) if by == "region" else list(range(shards))
+    src.close()
+
+    entries = []
+    for k, key in enumerate(keys):
+        path = out_dir / f"shard_{k}.db"
+        part = out_dir / f"shard_{k}.db.part"
+        part.unlink(missing_ok=True)
+        conn = sqlite3.connect(part.as_posix(), isolation_level=None)
+        conn.execute("PRAGMA journal_mode = OFF")  # A failed build is simply rebuilt
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("ATTACH DATABASE ? AS src", (source.as_posix(),))
+        conn.execute("BEGIN")
+        where, params = _customer_filter(by, key, shards)
+        for table in tables:
+            conn.execute(schema[table])
+            select = f"SELECT * FROM src.customers WHERE {where}" if table == "customers" else _COPY_ROWS[table]
+            conn.execute(f"INSERT INTO main.{table} {select}", params if table == "customers" else ())
+        conn.execute("COMMIT")
+        conn.execute("DETACH DATABASE src")
+        for sql in indexes:
+            conn.execute(sql)
+        conn.execute("ANALYZE")
+        rows = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in tables}
+        conn.close()
+        os.replace(part, path)
+        entries.append({"path": path.name, "key": key, "rows": rows})
+
+    manifest = {
+        "by": by,
+        "source": str(source),
+        "built_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "replicated": list(REPLICATED_TABLES),
+        "shards": entries,
+    }
+    tmp = out_dir / f"{MANIFEST}.part"
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, out_dir / MANIFEST)
+    return {**manifest, "seconds": round(time.perf_counter() - started, 1)}
+
+
+# ---------------------------------------------------------------------------
+# Tokenizer
+# ---------------------------------------------------------------------------
+
+_LEXER = re.compile(r"""
+    (?P<skip>\s+|--[^\n]*|/\*.*?\*/)
+  | (?P<string>[xX]'[0-9a-fA-F]*'|'(?:[^']|'')*')
+  | (?P<name>"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\]|[^\W\d][\w$]*)
+  | (?P<number>(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<param>[?:@$]\w*)
+  | (?P<op>\|\||->>|->|<<|>>|<=|>=|==|!=|<>|.)
+""", re.X | re.S)
+
+# Words that never name a column or an alias
+_KEYWORDS = frozenset({
+    "ALL", "AND", "AS", "ASC", "BETWEEN", "BY", "CASE", "CAST", "COLLATE", "CROSS", "CURRENT",
+    "CURRENT_DATE", "CURRENT_TIME", "CURRENT_TIMESTAMP", "DESC", "DISTINCT", "ELSE", "END", "ESCAPE",
+    "EXCEPT", "EXCLUDE", "EXISTS", "FALSE", "FILTER", "FIRST", "FOLLOWING", "FROM", "FULL", "GLOB",
+    "GROUP", "GROUPS", "HAVING", "IN", "INNER", "INTERSECT", "IS", "ISNULL", "JOIN", "LAST", "LEFT",
+    "LIKE", "LIMIT", "MATCH", "NATURAL", "NO", "NOT", "NOTNULL", "NULL", "NULLS", "OFFSET", "ON", "OR",
+    "ORDER", "OTHERS", "OUTER", "OVER", "PARTITION", "PRECEDING", "RANGE", "REGEXP", "RIGHT", "ROW",
+    "ROWS", "SELECT", "THEN", "TIES", "TRUE", "UNBOUNDED", "UNION", "USING", "VALUES", "WHEN", "WHERE",
+    "WINDOW", "WITH",
+})
+
+# Keywords that can end an expression, so a bare name right after one is an alias
+_EXPRESSION_ENDS = frozenset({"END", "NULL", "TRUE", "FALSE", "CURRENT_DATE", "CURRENT_TIME", "CURRENT_TIMESTAMP"})
+
+# Clauses of one SELECT core, in order
+_CLAUSES = ("SELECT", "FROM", "WHERE", "GROUP", "HAVING", "WINDOW", "ORDER", "LIMIT")
+_COMPOUND = frozenset({"UNION", "EXCEPT", "INTERSECT"})
+
+# Aggregates that merge from per-shard partials, and those that don't
+_MERGEABLE = frozenset({"COUNT", "SUM", "TOTAL", "MIN", "MAX", "AVG"})
+_UNMERGEABLE = frozenset({"GROUP_CONCAT", "STRING_AGG", "JSON_GROUP_ARRAY", "JSON_GROUP_OBJECT"})
+
+# Window functions whose first k rows only need each shard's first k rows
+_TOP_K_WINDOWS = frozenset({"ROW_NUMBER", "RANK", "DENSE_RANK"})
+
+
+@dataclass(frozen=True)
+class _Token:
+    kind: str  # string, name, number, param or op
+    text: str
+    start: int
+    end: int
+
+    @property
+    def word(self) -> str | None:
+        """Upper-cased text of an unquoted name (keywords, function names), else None."""
+        return self.text.upper() if self.kind == "name" and self.text[0] not in '"`[' else None
+
+    @property
+    def norm(self) -> str:
+        """Comparison form: names unquoted and case-folded, everything else as written."""
+        if self.kind == "name":
+            return _unquote(self.text).lower()
+        return self.text
+
+
+def _unquote(text: str) -> str:
+    """Identifier text without SQL quoting (case kept)."""
+    if text[0] in '"`':
+        return text[1:-1].replace(text[0] * 2, text[0])
+    if text[0] == "[":
+        return text[1:-1]
+    return text
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _tokenize(sql: str) -> list:
+    return [_Token(m.lastgroup, m.group(), m.start(), m.end())
+            for m in _LEXER.finditer(sql) if m.lastgroup != "skip"]
+
+
+def _close(tokens: list, i: int) -> int:
+    """Index of the ")" matching the "(" at tokens[i]."""
+    depth = 0
+    for j in range(i, len(tokens)):
+        if tokens[j].text == "(":
+            depth += 1
+        elif tokens[j].text == ")":
+            depth -= 1
+            if depth == 0:
+                return j
+    raise ShardingError("unbalanced parentheses")
+
+
+def _is_subquery(tokens: list, i: int) -> bool:
+    """tokens[i] is "(" opening a SELECT (or WITH ... SELECT)."""
+    return (tokens[i].text == "(" and i + 1 < len(tokens)
+            and tokens[i + 1].word in ("SELECT", "WITH", "VALUES"))
+
+
+def _split(tokens: list, separator: str = ",") -> list:
+    """Token lists between top-level separators ([] for no tokens)."""
+    if not tokens:
+        return []
+    parts, current, depth = [], [], 0
+    for t in tokens:
+        if t.text == "(":
+            depth += 1
+        elif t.text == ")":
+            depth -= 1
+        if depth == 0 and t.text == separator:
+            parts.append(current)
+            current = []
+        else:
+            current.append(t)
+    parts.append(current)
+    return parts
+
+
+def _text(sql: str, tokens: list) -> str:
+    """Source text of a token run (as written, comments inside included)."""
+    return sql[tokens[0].start:tokens[-1].end] if tokens else ""
+
+
+def _key(tokens: list) -> tuple:
+    return tuple(t.norm for t in tokens)
+
+
+def _column_ref(tokens: list) -> tuple | None:
+    """(qualifier or None, column) for `col` / `t.col`, else None."""
+    if len(tokens) == 1 and tokens[0].kind == "name" and tokens[0].word not in _KEYWORDS:
+        return None, tokens[0].norm
+    if (len(tokens) == 3 and tokens[0].kind == "name" and tokens[1].text == "."
+            and tokens[2].kind == "name"):
+        return tokens[0].norm, tokens[2].norm
+    return None
+
+
+# ---------------------------------------------------------------------------
+# SELECT structure
+# ---------------------------------------------------------------------------
+
+@dataclass
+class _Core:
+    """One SELECT core: clause token lists (empty when absent)."""
+    distinct: bool
+    items: list  # token list per select item
+    clauses: dict  # "FROM", "WHERE", "GROUP", "HAVING", "WINDOW", "ORDER", "LIMIT" -> tokens
+
+
+def _skip_with(tokens: list) -> int:
+    """Index of the statement's SELECT after an optional WITH clause."""
+    if not tokens or tokens[0].word != "WITH":
+        return 0
+    i = 1
+    if i < len(tokens) and tokens[i].word == "RECURSIVE":
+        i += 1
+    while i < len(tokens):
+        i += 1  # CTE name
+        if i < len(tokens) and tokens[i].text == "(":
+            i = _close(tokens, i) + 1  # Column list
+        while i < len(tokens) and tokens[i].word in ("AS", "NOT", "MATERIALIZED"):
+            i += 1
+        if i >= len(tokens) or tokens[i].text != "(":
+            raise ShardingError("malformed WITH clause")
+        i = _close(tokens, i) + 1
+        if i < len(tokens) and tokens[i].text == ",":
+            i += 1
+            continue
+        return i
+    raise ShardingError("malformed WITH clause")
+
+
+def _parse_core(tokens: list) -> _Core:
+    """Split one SELECT core (tokens start at SELECT) into its clauses at parenthesis depth 0."""
+    if not tokens or tokens[0].word != "SELECT":
+        raise ShardingError("only SELECT subqueries are supported across shards")
+    parts = {name: [] for name in _CLAUSES}
+    current = "SELECT"
+    depth = 0
+    i = 1
+    distinct = False
+    if i < len(tokens) and tokens[i].word in ("DISTINCT", "ALL"):
+        distinct = tokens[i].word == "DISTINCT"
+        i += 1
+    while i < len(tokens):
+        t = tokens[i]
+        if t.text == "(":
+            depth += 1
+        elif t.text == ")":
+            depth -= 1
+        elif depth == 0 and t.word in _CLAUSES and t.word != "SELECT":
+            current = t.word
+            i += 2 if t.word in ("GROUP", "ORDER") else 1  # Skip "BY"
+            continue
+        parts[current].append(t)
+        i += 1
+    items = _split(parts.pop("SELECT"))
+    return _Core(distinct, items, parts)
+
+
+def _compound_cores(tokens: list) -> tuple:
+    """(cores, operators) of a possibly compound SELECT, each core's tokens starting at SELECT."""
+    cores, ops, start, depth = [], [], 0, 0
+    i = 0
+    while i < len(tokens):
+        t = tokens[i]
+        if t.text == "(":
+            depth += 1
+        elif t.text == ")":
+            depth -= 1
+        elif depth == 0 and t.word in _COMPOUND:
+            cores.append(tokens[start:i])
+            op = t.word
+            if i + 1 < len(tokens) and tokens[i + 1].word == "ALL":
+                op += " ALL"
+                i += 1
+            ops.append(op)
+            start = i + 1
+        i += 1
+    cores.append(tokens[start:])
+    return cores, ops
+
+
+def _alias(item: list) -> tuple:
+    """(expression tokens, alias or None) of one select item."""
+    if len(item) >= 3 and item[-2].word == "AS" and item[-1].kind == "name":
+        return item[:-2], _unquote(item[-1].text)
+    if (len(item) >= 2 and item[-1].kind in ("name", "string") and item[-1].word not in _KEYWORDS
+            and item[-2].text not in (".", "*")
+            and (item[-2].word not in _KEYWORDS or item[-2].word in _EXPRESSION_ENDS)
+            and (item[-2].kind != "op" or item[-2].text == ")")):
+        return item[:-1], _unquote(item[-1].text.strip("'"))
+    return item, None
+
+
+def _output_name(sql: str, item: list) -> str:
+    """The column name SQLite reports for a select item."""
+    expr, alias = _alias(item)
+    if alias is not None:
+        return alias
+    ref = _column_ref(expr)
+    if ref is not None:
+        return _unquote(expr[-1].text)
+    return _text(sql, expr)
+
+
+def _from_aliases(from_tokens: list, cte_names: frozenset) -> dict:
+    """Alias (and table name) -> lower-cased table, or None for subqueries and CTEs."""
+    aliases = {}
+    i = 0
+    expect_source = True
+    while i < len(from_tokens):
+        t = from_tokens[i]
+        if t.text == "(":
+            end = _close(from_tokens, i)
+            if expect_source:  # Subquery or parenthesized join: name the alias, if any, below
+                i = end + 1
+                j = i + 1 if i < len(from_tokens) and from_tokens[i].word == "AS" else i
+                if j < len(from_tokens) and from_tokens[j].kind == "name" and from_tokens[j].word not in _KEYWORDS:
+                    aliases[from_tokens[j].norm] = None
+                    i = j + 1
+                expect_source = False
+                continue
+            i = end + 1
+            continue
+        if t.text == "," or t.word == "JOIN":
+            expect_source = True
+        elif expect_source and t.kind == "name" and t.word not in _KEYWORDS:
+            j = i
+            if j + 2 < len(from_tokens) and from_tokens[j + 1].text == ".":
+                j += 2  # schema.table
+            table = from_tokens[j].norm
+            if j + 1 < len(from_tokens) and from_tokens[j + 1].text == "(":  # Table-valued function
+                j = _close(from_tokens, j + 1)
+                table = None
+            resolved = None if table in cte_names else table
+            aliases[from_tokens[j].norm if table is not None else t.norm] = resolved
+            k = j + 1
+            if k < len(from_tokens) and from_tokens[k].word == "AS":
+                k += 1
+            if k < len(from_tokens) and from_tokens[k].kind == "name" and from_tokens[k].word not in _KEYWORDS:
+                aliases[from_tokens[k].norm] = resolved
+                k += 1
+            i = k
+            expect_source = False
+            continue
+        i += 1
+    return aliases
+
+
+def _cte_names(tokens: list) -> frozenset:
+    """Names defined by a leading WITH clause."""
+    return frozenset(_cte_bodies(tokens))
+
+
+def _cte_bodies(tokens: list) -> dict:
+    """Name -> body tokens of each CTE in a leading WITH clause, in definition order."""
+    bodies = {}
+    if tokens and tokens[0].word == "WITH":
+        i = 2 if len(tokens) > 1 and tokens[1].word == "RECURSIVE" else 1
+        while i < len(tokens) and tokens[i].kind == "name":
+            name = tokens[i].norm
+            i += 1
+            if tokens[i].text == "(":
+                i = _close(tokens, i) + 1
+            while tokens[i].word in ("AS", "NOT", "MATERIALIZED"):
+                i += 1
+            end = _close(tokens, i)
+            bodies[name] = tokens[i + 1:end]
+            i = end + 1
+            if i < len(tokens) and tokens[i].text == ",":
+                i += 1
+            else:
+                break
+    return bodies
+
+
+# ---------------------------------------------------------------------------
+# Join keys
+# ---------------------------------------------------------------------------
+
+# Words that start the next join of a FROM clause (and so end an ON condition)
+_JOIN_WORDS = frozenset({"JOIN", "LEFT", "RIGHT", "FULL", "INNER", "CROSS", "NATURAL"})
+
+# Tables that carry each co-location key column (for USING joins)
+_KEY_TABLES = {"customer_id": ("orders",), "order_id": ("order_items", "payments", "refunds"),
+               "region": ("customers",)}
+
+
+def _from_sources(from_tokens: list) -> tuple:
+    """
+    The row sources of a FROM clause, in order, and its ON conditions.
+
+    Returns:
+        tuple: ([(name, table, body, using)], [condition tokens]): per source its
+        alias (or table name), the lower-cased table or CTE name (None for
+        subqueries and table-valued functions), a subquery's tokens, and its
+        USING columns
+    """
+    sources, conditions = [], []
+    i = 0
+    expect_source = True
+    while i < len(from_tokens):
+        t = from_tokens[i]
+        if t.text == "(" and expect_source:
+            end = _close(from_tokens, i)
+            if not _is_subquery(from_tokens, i):  # Parenthesized join
+                inner_sources, inner_conditions = _from_sources(from_tokens[i + 1:end])
+                sources += inner_sources
+                conditions += inner_conditions
+                i = end + 1
+                expect_source = False
+                continue
+            body = from_tokens[i + 1:end]
+            i = end + 1
+            name = None
+            j = i + 1 if i < len(from_tokens) and from_tokens[i].word == "AS" else i
+            if j < len(from_tokens) and from_tokens[j].kind == "name" and from_tokens[j].word not in _KEYWORDS:
+                name = from_tokens[j].norm
+                i = j + 1
+            sources.append((name, None, body, ()))
+            expect_source = False
+            continue
+        if t.text == "(":
+            i = _close(from_tokens, i) + 1
+            continue
+        if t.text == "," or t.word == "JOIN":
+            expect_source = True
+        elif t.word == "ON":
+            end = i + 1
+            while end < len(from_tokens) and not (
+                    from_tokens[end].text == "," or (from_tokens[end].word in _JOIN_WORDS and not (
+                        end + 1 < len(from_tokens) and from_tokens[end + 1].text == "("))):
+                end = _close(from_tokens, end) + 1 if from_tokens[end].text == "(" else end + 1
+            conditions.append(from_tokens[i + 1:end])
+            i = end
+            continue
+        elif t.word == "USING" and sources and i + 1 < len(from_tokens) and from_tokens[i + 1].text == "(":
+            end = _close(from_tokens, i + 1)
+            name, table, body, _ = sources[-1]
+            using = tuple(column[0].norm for column in _split(from_tokens[i + 2:end]) if column)
+            sources[-1] = (name, table, body, using)
+            i = end + 1
+            continue
+        elif expect_source and t.kind == "name" and t.word not in _KEYWORDS:
+            j = i
+            if j + 2 < len(from_tokens) and from_tokens[j + 1].text == ".":
+                j += 2  # schema.table
+            table = from_tokens[j].norm
+            if j + 1 < len(from_tokens) and from_tokens[j + 1].text == "(":  # Table-valued function
+                j = _close(from_tokens, j + 1)
+                table = None
+            name = table or t.norm
+            k = j + 1
+            if k < len(from_tokens) and from_tokens[k].word == "AS":
+                k += 1
+            if k < len(from_tokens) and from_tokens[k].kind == "name" and from_tokens[k].word not in _KEYWORDS:
+                name = from_tokens[k].norm
+                k += 1
+            sources.append((name, table, None, ()))
+            i = k
+            expect_source = False
+            continue
+        i += 1
+    return sources, conditions
+
+
+def _reads_partitioned_rows(sql: str, tokens: list, ctes: dict) -> bool:
+    """A (sub)query reads partitioned tables, directly or through a CTE that does."""
+    tables = set(inspect_sql(_text(sql, tokens)).tables)
+    return bool(tables & set(PARTITIONED_TABLES)) or any(ctes.get(table) for table in tables)
+
+
+def _conjuncts(condition: list) -> list:
+    """The top-level AND terms of a condition ([] when an OR makes none of them required)."""
+    depth = 0
+    terms, current = [], []
+    for t in condition:
+        if t.text == "(":
+            depth += 1
+        elif t.text == ")":
+            depth -= 1
+        if depth == 0 and t.word == "OR":
+            return []
+        if depth == 0 and t.word == "AND":
+            terms.append(current)
+            current = []
+        else:
+            current.append(t)
+    terms.append(current)
+    return terms
+
+
+def _check_core_joins(sql: str, core: _Core, by: str, ctes: dict):
+    """
+    Reject a join of two row sources that hold customer rows unless they are
+    linked by equal customer or order keys (o.customer_id = c.id,
+    oi.order_id = o.id, USING (order_id), or customers.region on region shards).
+    Rows joined on anything else can live on different shards.
+    """
+    sources, conditions = _from_sources(core.clauses["FROM"])
+
+    def holds_customer_rows(table, body) -> bool:
+        if body is not None:
+            return _reads_partitioned_rows(sql, body, ctes)
+        return table in PARTITIONED_TABLES or bool(ctes.get(table))
+
+    partitioned = [n for n, (_, table, body, _) in enumerate(sources) if holds_customer_rows(table, body)]
+    if len(partitioned) < 2:
+        return
+
+    owner = {name: n for n, (name, _, _, _) in enumerate(sources) if name is not None}
+    parent = list(range(len(sources)))
+
+    def find(n: int) -> int:
+        while parent[n] != n:
+            n = parent[n]
+        return n
+
+    def link(a: int, b: int):
+        parent[find(a)] = find(b)
+
+    def key(ref: tuple) -> tuple:
+        """(source, key kind) of a qualified column, kind None when it isn't a co-location key."""
+        qualifier, column = ref
+        n = owner.get(qualifier)
+        table = sources[n][1] if n is not None else None
+        if column == "customer_id" or (column == "id" and table == "customers"):
+            return n, "customer"
+        if column == "order_id" or (column == "id" and table == "orders"):
+            return n, "order"
+        if by == "region" and column == "region" and table == "customers":
+            return n, "region"
+        return n, None
+
+    for condition in conditions + [core.clauses["WHERE"]]:
+        for term in _conjuncts(condition):
+            if term and term[0].text == "(" and _close(term, 0) == len(term) - 1:
+                term = term[1:-1]
+            if len(term) != 7 or term[3].text not in ("=", "=="):
+                continue
+            left, right = _column_ref(term[:3]), _column_ref(term[4:])
+            if left is None or right is None or left[0] is None or right[0] is None:
+                continue
+            (a, kind_a), (b, kind_b) = key(left), key(right)
+            if a is not None and b is not None and kind_a is not None and kind_a == kind_b:
+                link(a, b)
+
+    for n, (_, _, _, using) in enumerate(sources):
+        for column in using:
+            if column not in _KEY_TABLES or (column == "region" and by != "region"):
+                continue
+            for m in partitioned:
+                table = sources[m][1]
+                if m < n and (table is None or table in ctes or table in _KEY_TABLES[column]):
+                    link(m, n)
+
+    first = partitioned[0]
+    for n in partitioned[1:]:
+        if find(n) != find(first):
+            raise ShardingError(
+                f"the join of {sources[first][0] or 'a subquery'} and {sources[n][0] or 'a subquery'} doesn't "
+                f"match customer or order ids, so the joined rows can live on different shards; "
+                f"join on those keys, such as o.customer_id = c.id or oi.order_id = o.id")
+
+
+def _check_joins(sql: str, tokens: list, by: str, ctes: dict | None = None):
+    """
+    Apply _check_core_joins to every SELECT core of a statement: CTEs, the
+    main SELECT and its subqueries, at any depth.
+
+    Raises:
+        ShardingError: A join of customer rows isn't on co-located keys
+    """
+    ctes = dict(ctes or {})  # CTE name -> reads partitioned rows
+    for name, body in _cte_bodies(tokens).items():
+        _check_joins(sql, body, by, ctes)
+        ctes[name] = _reads_partitioned_rows(sql, body, ctes)
+    start = _skip_with(tokens)
+    for core_tokens in _compound_cores(tokens[start:])[0]:
+        _check_core_joins(sql, _parse_core(core_tokens), by, ctes)
+        for _, body, _ in _subqueries(core_tokens[1:]):
+            _check_joins(sql, body, by, ctes)
+
+
+# ---------------------------------------------------------------------------
+# Shard-locality
+# ---------------------------------------------------------------------------
+
+def _is_local_ref(ref: tuple | None, aliases: dict, by: str) -> bool:
+    """A column whose value pins a row to one shard (a customer or order key)."""
+    if ref is None:
+        return False
+    qualifier, column = ref
+    if column in ("customer_id", "order_id"):
+        return True
+    if qualifier is not None:
+        table = aliases.get(qualifier)
+    else:
+        tables = {t for t in aliases.values() if t is not None}
+        table = next(iter(tables)) if len(tables) == 1 else None
+    if column == "id" and table in ("customers", "orders"):
+        return True
+    return by == "region" and column == "region" and (
+        table == "customers" or (qualifier is None and "customers" in aliases.values()))
+
+
+def _resolve_term(term: list, items: list) -> list:
+    """A GROUP BY/ORDER BY term with select aliases and ordinals replaced by their expression."""
+    if len(term) == 1 and term[0].kind == "number" and term[0].text.isdigit():
+        n = int(term[0].text)
+        if 1 <= n <= len(items):
+            return _alias(items[n - 1])[0]
+    if len(term) == 1 and term[0].kind == "name":
+        for item in items:
+            expr, alias = _alias(item)
+            if alias is not None and alias.lower() == term[0].norm and _column_ref(term) is not None:
+                return expr
+    return term
+
+
+def _groups_are_local(core: _Core, aliases: dict, by: str) -> bool:
+    """Every group holds rows of one customer/order (so it lives on one shard)."""
+    return any(_is_local_ref(_column_ref(_resolve_term(_strip_collate(term), core.items)), aliases, by)
+               for term in _split(core.clauses["GROUP"]) if term)
+
+
+def _strip_collate(term: list) -> list:
+    for i, t in enumerate(term):
+        if t.word == "COLLATE":
+            return term[:i]
+    return term
+
+
+def _has_aggregate(tokens: list) -> bool:
+    """Aggregate calls outside subqueries and window functions."""
+    i = 0
+    while i < len(tokens):
+        if _is_subquery(tokens, i):
+            i = _close(tokens, i) + 1
+            continue
+        t = tokens[i]
+        if (t.word in _MERGEABLE | _UNMERGEABLE and i + 1 < len(tokens) and tokens[i + 1].text == "("
+                and (i == 0 or tokens[i - 1].text != ".")):
+            end = _call_end(tokens, i)
+            if not _is_window(tokens, end) and _is_aggregate_call(tokens, i):
+                return True
+            i = end + 1
+            continue
+        i += 1
+    return False
+
+
+def _is_aggregate_call(tokens: list, i: int) -> bool:
+    """tokens[i] starts an aggregate call (min/max with several arguments are scalar)."""
+    if tokens[i].word not in ("MIN", "MAX"):
+        return True
+    return len(_split(tokens[i + 2:_close(tokens, i + 1)])) == 1
+
+
+def _call_end(tokens: list, i: int) -> int:
+    """Last token of the call starting at tokens[i], including a FILTER (WHERE ...) clause."""
+    end = _close(tokens, i + 1)
+    if end + 2 < len(tokens) and tokens[end + 1].word == "FILTER" and tokens[end + 2].text == "(":
+        end = _close(tokens, end + 2)
+    return end
+
+
+def _is_window(tokens: list, end: int) -> bool:
+    return end + 1 < len(tokens) and tokens[end + 1].word == "OVER"
+
+
+def _has_window(tokens: list) -> bool:
+    """An OVER clause outside subqueries."""
+    i = 0
+    while i < len(tokens):
+        if _is_subquery(tokens, i):
+            i = _close(tokens, i) + 1
+            continue
+        if tokens[i].word == "OVER":
+            return True
+        i += 1
+    return False
+
+
+def _core_tokens(core: _Core) -> list:
+    tokens = [t for item in core.items for t in item]
+    for name in ("WHERE", "HAVING", "ORDER", "GROUP"):
+        tokens += core.clauses[name]
+    return tokens
+
+
+def _defined_names(tokens: list) -> set:
+    """Every table alias and CTE name a (sub)query defines, at any depth."""
+    names = set(_cte_names(tokens))
+    start = _skip_with(tokens)
+    for _, body, _ in _subqueries(tokens[:start]):
+        names |= _defined_names(body)
+    for core_tokens in _compound_cores(tokens[start:])[0]:
+        names |= set(_from_aliases(_parse_core(core_tokens).clauses["FROM"], frozenset()))
+        for _, body, _ in _subqueries(core_tokens[1:]):
+            names |= _defined_names(body)
+    return names
+
+
+def _correlation(tokens: list) -> list:
+    """Qualified column references to names the subquery doesn't define itself."""
+    defined = _defined_names(tokens)
+    return [ref for ref in _qualified_refs(tokens) if ref[0] not in defined]
+
+
+def _qualified_refs(tokens: list) -> list:
+    """(qualifier, column) of every `t.col` reference."""
+    refs = []
+    for i in range(len(tokens) - 2):
+        t = tokens[i]
+        if (t.kind == "name" and tokens[i + 1].text == "." and tokens[i + 2].kind == "name"
+                and (i == 0 or tokens[i - 1].text != ".")
+                and not (i + 3 < len(tokens) and tokens[i + 3].text == "(")):
+            refs.append((t.norm, tokens[i + 2].norm))
+    return refs
+
+
+def _pinned_to_outer_key(tokens: list, by: str, outer_aliases: dict) -> bool:
+    """
+    A correlated subquery with a `inner key = outer key` condition (such as
+    o2.customer_id = c.id): it only reads rows of the outer row's customer or
+    order, which live on the outer row's shard.
+    """
+    defined = _defined_names(tokens)
+    inner_aliases = {}
+    start = _skip_with(tokens)
+    for core_tokens in _compound_cores(tokens[start:])[0]:
+        inner_aliases.update(_from_aliases(_parse_core(core_tokens).clauses["FROM"], _cte_names(tokens)))
+    for i in range(len(tokens) - 6):
+        if tokens[i + 3].text not in ("=", "=="):
+            continue
+        left = _column_ref(tokens[i:i + 3])
+        right = _column_ref(tokens[i + 4:i + 7])
+        if left is None or right is None:
+            continue
+        if left[0] in defined:
+            left, right = right, left
+        if (left[0] not in defined and right[0] in defined
+                and _is_local_ref(left, outer_aliases, by) and _is_local_ref(right, inner_aliases, by)):
+            return True
+    return False
+
+
+def _reads_partitioned(sql: str, tokens: list) -> bool:
+    return bool(set(inspect_sql(_text(sql, tokens)).tables) & set(PARTITIONED_TABLES))
+
+
+def _is_local_select(sql: str, tokens: list, by: str, outer_aliases: dict, context: str = "from") -> bool:
+    """
+    A subquery that gives the same answer on each shard as on the whole
+    database, for the rows of that shard.
+
+    True when it is pinned to the outer row's customer/order (inner key =
+    outer key), or reads only replicated tables. Otherwise a subquery inside an expression (IN, EXISTS,
+    scalar) is never local: it needs the other shards' rows too. A row source
+    (FROM or CTE) is local when it has no LIMIT/OFFSET, no window functions,
+    no set operation other than UNION ALL, no DISTINCT except over a
+    customer/order key, and aggregates only within groups of one
+    customer/order - recursively for its own subqueries.
+    """
+    if _correlation(tokens):
+        return _pinned_to_outer_key(tokens, by, outer_aliases) or not _reads_partitioned(sql, tokens)
+    if not _reads_partitioned(sql, tokens):
+        return True
+    if context != "from":
+        return False
+    ctes = _cte_names(tokens)
+    start = _skip_with(tokens)
+    for _, body, _ in _subqueries(tokens[:start]):
+        if not _is_local_select(sql, body, by, outer_aliases):
+            return False
+    cores, ops = _compound_cores(tokens[start:])
+    if any(op != "UNION ALL" for op in ops):
+        return False
+    for core_tokens in cores:
+        core = _parse_core(core_tokens)
+        aliases = _from_aliases(core.clauses["FROM"], ctes)
+        if core.clauses["LIMIT"] or _has_window(_core_tokens(core)):
+            return False
+        if core.distinct and not any(
+                _is_local_ref(_column_ref(_alias(item)[0]), aliases, by) for item in core.items):
+            return False
+        if _has_aggregate(_core_tokens(core)) or core.clauses["GROUP"]:
+            if not _groups_are_local(core, aliases, by):
+                return False
+        scope = {**outer_aliases, **aliases}
+        for _, sub, context in _subqueries(core_tokens[1:]):
+            if not _is_local_select(sql, sub, by, scope, context):
+                return False
+    return True
+
+
+def _subqueries(tokens: list) -> list:
+    """(index of "(", tokens inside, context) for each outermost subquery in tokens."""
+    found = []
+    i = 0
+    while i < len(tokens):
+        if _is_subquery(tokens, i):
+            end = _close(tokens, i)
+            before = tokens[i - 1].word if i else None
+            if before == "IN":
+                context = "in"
+            elif before == "EXISTS":
+                context = "exists"
+            elif before in ("FROM", "JOIN", "AS", "MATERIALIZED") or (i and tokens[i - 1].text == ","
+                                                                    and _in_from(tokens, i)):
+                context = "from"
+            else:
+                context = "scalar"
+            found.append((i, tokens[i + 1:end], context))
+            i = end + 1
+            continue
+        i += 1
+    return found
+
+
+def _in_from(tokens: list, i: int) -> bool:
+    """The token at i sits in a FROM clause (the last clause keyword before it is FROM/JOIN)."""
+    depth = 0
+    for j in range(i - 1, -1, -1):
+        t = tokens[j]
+        if t.text == ")":
+            depth += 1
+        elif t.text == "(":
+            if depth == 0:
+                return False
+            depth -= 1
+        elif depth == 0 and t.word in _CLAUSES + ("JOIN", "ON"):
+            return t.word in ("FROM", "JOIN")
+    return False
+
+
+# ---------------------------------------------------------------------------
+# Query plans
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class ShardPlan:
+    """
+    How to run one SELECT on a shard set.
+
+    Attributes:
+        route (str): "single" (replicated tables only), "scatter" or "inline"
+            (uncorrelated subqueries must be answered and inlined first)
+        shard_sql (str): Statement each shard runs
+        merge_sql (str | None): Statement over the merged `part` table (scatter only)
+        part_columns (tuple | None): Names of the shard columns in `part`
+            (None for SELECT *: positional __c0.., then the hidden __h0..)
+        hidden (int): Trailing shard columns used only by merge_sql
+        columns (tuple | None): Output column names (None: take the shards' names)
+        subqueries (tuple): (start, end, context, sql) to inline, for route "inline"
+        kind (str): "rows", "groups" or "aggregate", for stats and explain()
+    """
+    route: str
+    shard_sql: str
+    merge_sql: str | None = None
+    part_columns: tuple | None = ()
+    hidden: int = 0
+    columns: tuple | None = None
+    subqueries: tuple = ()
+    kind: str = "rows"
+
+
+def _limit(core: _Core) -> tuple:
+    """(limit, offset) literal integers of a LIMIT clause, (None, 0) without one."""
+    tokens = core.clauses["LIMIT"]
+    if not tokens:
+        return None, 0
+    numbers = [t for t in tokens if t.text not in (",",) and t.word != "OFFSET"]
+    if any(t.kind != "number" or not t.text.isdigit() for t in numbers) or len(numbers) not in (1, 2):
+        raise ShardingError("only LIMIT <n> [OFFSET <m>] with literal numbers is supported across shards")
+    if len(numbers) == 1:
+        return int(numbers[0].text), 0
+    if any(t.text == "," for t in tokens):  # LIMIT m, n
+        return int(numbers[1].text), int(numbers[0].text)
+    return int(numbers[0].text), int(numbers[1].text)
+
+
+def _limit_sql(limit: int | None, offset: int) -> str:
+    if limit is None:
+        return ""
+    return f"\nLIMIT {limit}" + (f" OFFSET {offset}" if offset else "")
+
+
+def _order_terms(core: _Core) -> list:
+    """(expression tokens, suffix text) per ORDER BY term."""
+    terms = []
+    for term in _split(core.clauses["ORDER"]):
+        for i, t in enumerate(term):
+            if t.word in ("ASC", "DESC", "NULLS", "COLLATE"):
+                terms.append((term[:i], " " + " ".join(x.text for x in term[i:])))
+                break
+        else:
+            terms.append((term, ""))
+    return terms
+
+
+@lru_cache(maxsize=1024)
+def plan_query(sql: str, by: str = "hash") -> ShardPlan:
+    """
+    Plan a guarded SELECT for a shard set (memoized: agents repeat SQL).
+
+    Args:
+        sql (str): One read-only SELECT (already through inspect_sql/bounded_sql)
+        by (str): The shard set's partitioning ("hash" or "region")
+
+    Returns:
+        ShardPlan: The per-shard statement and the merge statement
+
+    Raises:
+        ShardingError: The query can't be answered from per-shard results
+    """
+    verdict = inspect_sql(sql)
+    if not set(verdict.tables) & set(PARTITIONED_TABLES):
+        return ShardPlan("single", verdict.sql)
+
+    sql = verdict.sql
+    tokens = _tokenize(sql)
+    _check_joins(sql, tokens, by)
+    ctes = _cte_names(tokens)
+    start = _skip_with(tokens)
+    prefix = _text(sql, tokens[:start])
+    for _, body, _ in _subqueries(tokens[:start]):
+        if not _is_local_select(sql, body, by, {}):
+            raise ShardingError("a CTE aggregates, limits or de-duplicates rows of many customers, which "
+                                "can't be done shard by shard; move that step into the main SELECT")
+
+    cores, ops = _compound_cores(tokens[start:])
+    if ops:
+        raise ShardingError(f"{ops[0]} is not supported across shards; run each part as its own query")
+    core = _parse_core(cores[0])
+    aliases = _from_aliases(core.clauses["FROM"], ctes)
+
+    # Subqueries: local ones stay inline; uncorrelated cross-customer ones are answered first
+    inline = []
+    for i, body, context in _subqueries(cores[0]):
+        if _is_local_select(sql, body, by, aliases, context):
+            continue
+        if context == "from":
+            raise ShardingError("a FROM subquery aggregates, limits or de-duplicates rows of many customers, "
+                                "which can't be done shard by shard; move that step into the main SELECT")
+        if _correlation(body):
+            raise ShardingError("a correlated subquery aggregates across customers, which can't be done "
+                                "shard by shard; join on customer or order ids, or use a JOIN with GROUP BY")
+        open_token = cores[0][i]
+        close_token = cores[0][i + len(body) + 1]
+        inline.append((open_token.start, close_token.end, context, _text(sql, body)))
+    if inline:
+        return ShardPlan("inline", sql, subqueries=tuple(inline))
+
+    if _has_window(core.clauses["HAVING"] + core.clauses["ORDER"] + core.clauses["WHERE"]):
+        raise ShardingError("window functions are only supported in the select list across shards")
+    if core.clauses["WINDOW"]:
+        raise ShardingError("named windows (WINDOW ...) are not supported across shards; write OVER (...) inline")
+
+    grouped = bool(core.clauses["GROUP"]) or _has_aggregate(_core_tokens(core))
+    if grouped and not _groups_are_local(core, aliases, by):
+        return _plan_aggregate(sql, prefix, core)
+    return _plan_rows(sql, prefix, core, "groups" if grouped else "rows")
+
+
+def _plan_rows(sql: str, prefix: str, core: _Core, kind: str) -> ShardPlan:
+    """
+    Rows that are complete on each shard: run the query everywhere, then re-sort
+    and re-limit the union. ORDER BY terms that aren't select items, and the
+    inputs of window functions, travel as hidden columns.
+    """
+    limit, offset = _limit(core)
+    items = core.items
+    star = any(item[-1].text == "*" and (len(item) == 1 or (len(item) == 3 and item[1].text == "."))
+               for item in items)
+    hidden = []  # (shard expression text, key)
+
+    def hidden_column(text: str, key: tuple) -> str:
+        for n, (_, k) in enumerate(hidden):
+            if k == key:
+                return f"__h{n}"
+        hidden.append((text, key))
+        return f"__h{len(hidden) - 1}"
+
+    # Window items: computed after the merge from hidden copies of their inputs
+    shard_items, final_items, windows = [], [], []
+    for n, item in enumerate(items):
+        expr, alias = _alias(item)
+        if not _has_window(expr):
+            shard_items.append(_text(sql, item))
+            final_items.append(f"__c{n}")
+            continue
+        if star:
+            raise ShardingError("window functions next to * are not supported across shards; list the columns")
+        rewritten, funcs = _rewrite_window(sql, expr, hidden_column)
+        windows.extend(funcs)
+        shard_items.append(f"NULL AS {_quote(_output_name(sql, item))}")
+        final_items.append(rewritten)
+
+    # ORDER BY: select items (by alias, ordinal or expression) or hidden columns
+    exprs = [_key(_alias(item)[0]) for item in items]
+    names = [(_alias(item)[1] or "").lower() for item in items]
+    order = []
+    for term, suffix in _order_terms(core):
+        if _has_window(term):
+            raise ShardingError("ORDER BY a window function is not supported across shards; "
+                                "give it an alias and order by that")
+        position = None
+        if len(term) == 1 and term[0].kind == "number" and term[0].text.isdigit():
+            position = int(term[0].text) - 1
+        elif len(term) == 1 and term[0].norm in names and term[0].kind == "name":
+            position = names.index(term[0].norm)
+        elif _key(term) in exprs:
+            position = exprs.index(_key(term))
+        if position is not None and not star:
+            order.append(final_items[position] + suffix)
+        elif star and _column_ref(term) is None and term[0].kind == "number":
+            raise ShardingError("ORDER BY <position> next to * is not supported across shards; order by name")
+        else:
+            order.append(hidden_column(_text(sql, term), ("order",) + _key(term)) + suffix)
+
+    if core.distinct and hidden:
+        raise ShardingError("SELECT DISTINCT with ORDER BY columns outside the select list is not supported "
+                            "across shards; select the ORDER BY columns too")
+
+    # Each shard's first limit+offset rows hold the answer when its order matches the final one
+    shard_limit = None
+    if limit is not None:
+        if not windows:
+            shard_limit = limit + offset
+        elif not order and _windows_share_top_k(windows):
+            shard_limit = limit + offset
+            order_text = windows[0][1]
+    shard_order = ""
+    if shard_limit is not None and windows:
+        shard_order = f"\nORDER BY {order_text}"
+    elif core.clauses["ORDER"] and not windows:
+        shard_order = "\nORDER BY " + _text(sql, core.clauses["ORDER"])
+
+    select = "SELECT DISTINCT " if core.distinct else "SELECT "
+    columns = shard_items + [f"{text} AS __h{n}" for n, (text, _) in enumerate(hidden)]
+    body = _text(sql, [t for name in ("FROM", "WHERE", "GROUP", "HAVING") for t in core.clauses[name]])
+    shard_sql = (f"{prefix} {select}{', '.join(columns)}\nFROM {body}"
+                 f"{shard_order}{_limit_sql(shard_limit, 0)}").strip()
+    part_columns = None if star else tuple(
+        [f"__c{n}" for n in range(len(items))] + [f"__h{n}" for n in range(len(hidden))])
+    merge_sql = (f"{select}{_VISIBLE if star else ', '.join(final_items)} FROM part"
+                 + (f"\nORDER BY {', '.join(order)}" if order else "")
+                 + _limit_sql(limit, offset))
+    return ShardPlan("scatter", shard_sql, merge_sql, part_columns, hidden=len(hidden), kind=kind)
+
+
+_VISIBLE = "__visible__"  # Stands for the columns of * in a merge statement, known once the shards answer
+
+
+def _windows_share_top_k(windows: list) -> bool:
+    """All windows are ranking functions over one unpartitioned ORDER BY."""
+    return (all(func in _TOP_K_WINDOWS and not partitioned and order for func, order, partitioned in windows)
+            and len({order for _, order, _ in windows}) == 1)
+
+
+def _rewrite_window(sql: str, expr: list, hidden_column) -> tuple:
+    """
+    A select item with window functions, rewritten over hidden columns.
+
+    Column references and (non-window) aggregate calls become hidden columns the
+    shards compute; function names, keywords and literals are kept.
+
+    Returns:
+        tuple: (merge expression text, [(function, ORDER BY text, partitioned), ...])
+    """
+    out, funcs = [], []
+    i = 0
+    while i < len(expr):
+        t = expr[i]
+        if _is_subquery(expr, i):
+            raise ShardingError("subqueries inside window functions are not supported across shards")
+        if t.kind == "name" and i + 1 < len(expr) and expr[i + 1].text == "(":
+            end = _call_end(expr, i)
+            if _is_window(expr, end):
+                over = end + 2
+                if over >= len(expr) or expr[over].text != "(":
+                    raise ShardingError("named windows are not supported across shards; write OVER (...) inline")
+                spec = expr[over + 1:_close(expr, over)]
+                funcs.append(_window_shape(sql, t.word, spec))
+            elif t.word in _MERGEABLE | _UNMERGEABLE and _is_aggregate_call(expr, i):
+                call = expr[i:end + 1]
+                out.append(hidden_column(_text(sql, call), _key(call)))
+                i = end + 1
+                continue
+            out.append(t.text)
+            i += 1
+            continue
+        if t.kind == "name" and t.word not in _KEYWORDS:
+            if i + 2 < len(expr) and expr[i + 1].text == "." and expr[i + 2].kind == "name":
+                ref = expr[i:i + 3]
+            else:
+                ref = [t]
+            out.append(hidden_column(_text(sql, ref), _key(ref)))
+            i += len(ref)
+            continue
+        out.append(t.text)
+        i += 1
+    return " ".join(out), funcs
+
+
+def _window_shape(sql: str, func: str | None, spec: list) -> tuple:
+    """(function, ORDER BY text, partitioned) of one OVER (...) clause."""
+    parts = {"PARTITION": [], "ORDER": []}
+    current = None
+    depth = 0
+    for i, t in enumerate(spec):
+        if t.text == "(":
+            depth += 1
+        elif t.text == ")":
+            depth -= 1
+        if depth == 0 and t.word in ("PARTITION", "ORDER"):
+            current = t.word
+            continue
+        if depth == 0 and t.word in ("ROWS", "RANGE", "GROUPS"):
+            current = None
+            func = None  # A frame makes even ranking functions depend on later rows
+        if current and t.word != "BY":
+            parts[current].append(t)
+    return func, _text(sql, parts["ORDER"]), bool(parts["PARTITION"])
+
+
+class _Partials:
+    """Per-shard partial aggregates (deduplicated) and their merge expressions."""
+
+    def __init__(self):
+        self.columns = []  # (partial expression text, column)
+        self._index = {}
+
+    def add(self, text: str) -> str:
+        column = self._index.get(text)
+        if column is None:
+            column = self._index[text] = f"__a{len(self.columns)}"
+            self.columns.append((text, column))
+        return column
+
+    def merge(self, sql: str, call: list) -> str:
+        """Merge expression for one aggregate call (tokens from the name to its ")" or FILTER)."""
+        func = call[0].word
+        close = _close(call, 1)
+        args = call[2:close]
+        tail = _text(sql, call[close + 1:])  # FILTER (WHERE ...)
+        if args and args[0].word == "DISTINCT":
+            if func in ("MIN", "MAX"):
+                args = args[1:]
+            else:
+                raise ShardingError(f"{func}(DISTINCT ...) over groups that span shards is not supported; "
+                                    f"group by customer, or count distinct values in a subquery")
+        inner = _text(sql, args) or "*"
+        if func in ("SUM", "COUNT"):
+            return f"SUM({self.add(f'{func}({inner}) {tail}'.strip())})"
+        if func == "TOTAL":
+            return f"TOTAL({self.add(f'TOTAL({inner}) {tail}'.strip())})"
+        if func in ("MIN", "MAX"):
+            return f"{func}({self.add(f'{func}({inner}) {tail}'.strip())})"
+        total = self.add(f"SUM({inner}) {tail}".strip())
+        count = self.add(f"COUNT({inner}) {tail}".strip())
+        return f"(CAST(SUM({total}) AS REAL) / SUM({count}))"
+
+
+def _plan_aggregate(sql: str, prefix: str, core: _Core) -> ShardPlan:
+    """
+    Groups that span shards: each shard returns partial aggregates per group
+    key, and the merge re-groups them, combines the partials and applies
+    HAVING, ORDER BY and LIMIT.
+    """
+    if any(t.text == "*" and len(item) == 1 for item in core.items for t in item):
+        raise ShardingError("SELECT * with GROUP BY is not supported across shards; list the columns")
+    partials = _Partials()
+    keys = []  # (expression key, shard text, column): select items first, then GROUP BY terms
+
+    def key_column(tokens: list) -> str:
+        k = _key(tokens)
+        for existing, _, column in keys:
+            if existing == k:
+                return column
+        column = f"__k{len(keys)}"
+        keys.append((k, _text(sql, tokens), column))
+        return column
+
+    names, aggregate_items = [], []
+    for item in core.items:
+        expr, _ = _alias(item)
+        names.append(_output_name(sql, item))
+        if _has_aggregate(expr):
+            aggregate_items.append(expr)
+        else:
+            key_column(expr)
+    # Items that aren't GROUP BY terms stay bare columns (any value of the group), as in SQLite
+    groups = list(dict.fromkeys(key_column(_resolve_term(_strip_collate(term), core.items))
+                                for term in _split(core.clauses["GROUP"])))
+
+    aliases = {name.lower() for name in names}
+    final_items = []
+    for item, name in zip(core.items, names):
+        expr, _ = _alias(item)
+        final_items.append(f"{_merge_expr(sql, expr, keys, partials, set())} AS {_quote(name)}")
+    having = _merge_expr(sql, core.clauses["HAVING"], keys, partials, aliases)
+    order = []
+    for term, suffix in _order_terms(core):
+        if len(term) == 1 and term[0].kind == "number" and term[0].text.isdigit():
+            order.append(term[0].text + suffix)
+        else:
+            order.append(_merge_expr(sql, term, keys, partials, aliases) + suffix)
+    limit, offset = _limit(core)
+
+    shard_columns = [f"{text} AS {column}" for _, text, column in keys]
+    shard_columns += [f"{text} AS {column}" for text, column in partials.columns]
+    body = " ".join(
+        [f"FROM {_text(sql, core.clauses['FROM'])}"]
+        + ([f"WHERE {_text(sql, core.clauses['WHERE'])}"] if core.clauses["WHERE"] else [])
+        + ([f"GROUP BY {', '.join(groups)}"] if groups else []))
+    shard_sql = f"{prefix} SELECT {', '.join(shard_columns)}\n{body}".strip()
+
+    part_columns = [column for _, _, column in keys] + [column for _, column in partials.columns]
+    select = "SELECT DISTINCT " if core.distinct else "SELECT "
+    merge_sql = (f"{select}{', '.join(final_items)} FROM part"
+                 + (f"\nGROUP BY {', '.join(groups)}" if groups else "")
+                 + (f"\nHAVING {having}" if having else "")
+                 + (f"\nORDER BY {', '.join(order)}" if order else "")
+                 + _limit_sql(limit, offset))
+    return ShardPlan("scatter", shard_sql, merge_sql, tuple(part_columns), columns=tuple(names),
+                     kind="aggregate")
+
+
+def _merge_expr(sql: str, tokens: list, keys: list, partials: _Partials, aliases: set) -> str:
+    """
+    An expression over the merged partials: aggregate calls become their merge
+    form, group-key expressions their key column, and output aliases stay.
+    Any other column is neither grouped nor aggregated and is rejected.
+    """
+    by_length = sorted(keys, key=lambda k: -len(k[0]))
+    out = []
+    i = 0
+    while i < len(tokens):
+        t = tokens[i]
+        if _is_subquery(tokens, i):
+            raise ShardingError("subqueries next to aggregates are not supported across shards")
+        if (t.word in _MERGEABLE | _UNMERGEABLE and i + 1 < len(tokens) and tokens[i + 1].text == "("
+                and _is_aggregate_call(tokens, i)):
+            end = _call_end(tokens, i)
+            if _is_window(tokens, end):
+                raise ShardingError("window functions over groups that span shards are not supported; "
+                                    "group by customer, or rank in a second query")
+            if t.word in _UNMERGEABLE:
+                raise ShardingError(f"{t.word} over groups that span shards is not supported; "
+                                    f"group by customer, or select the rows and combine them in the answer")
+            out.append(partials.merge(sql, tokens[i:end + 1]))
+            i = end + 1
+            continue
+        for k, _, column in by_length:
+            if k and _key(tokens[i:i + len(k)]) == k:
+                out.append(column)
+                i += len(k)
+                break
+        else:
+            if t.kind == "name" and t.word not in _KEYWORDS:
+                if i + 1 < len(tokens) and tokens[i + 1].text == "(":
+                    out.append(t.text)  # Scalar function
+                elif i > 0 and tokens[i - 1].word == "AS":
+                    out.append(t.text)  # CAST(... AS type)
+                elif t.norm in aliases:
+                    out.append(_quote(_unquote(t.text)))
+                else:
+                    ref = tokens[i:i + 3] if i + 2 < len(tokens) and tokens[i + 1].text == "." else [t]
+                    raise ShardingError(f"{_text(sql, ref)} is neither grouped nor aggregated")
+            else:
+                out.append(t.text)
+            i += 1
+    return " ".join(out)
+
+
+def _literal(value) -> str:
+    """SQL literal for an inlined subquery value."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bytes):
+        return f"X'{value.hex()}'"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+# ---------------------------------------------------------------------------
+# Shard sets
+# ---------------------------------------------------------------------------
+
+class ShardSet:
+    """
+    The shards of one manifest, queried as one database.
+
+    Each shard has its own read-only pool; a query's shard statements run in
+    parallel on a small thread pool (one thread per shard), and the merge runs
+    in a private in-memory SQLite database.
+
+    Attributes:
+        manifest_path (pathlib.Path): The shards.json this set was loaded from
+        by (str): "hash" or "region"
+        paths (list): Shard database files, in shard order
+    """
+
+    def __init__(self, manifest_path, budget=DEFAULT_BUDGET, max_partial_rows: int = PARTIAL_ROW_LIMIT):
+        """
+        Load a manifest and open a pool per shard.
+
+        Args:
+            manifest_path: shards.json written by build_shards()
+            budget: QueryBudget each shard statement runs under
+            max_partial_rows (int): Rows one shard may send to a merge
+        """
+        self.manifest_path = pathlib.Path(manifest_path).resolve()
+        manifest = json.loads(self.manifest_path.read_text())
+        self.by = manifest["by"]
+        self.paths = [self.manifest_path.parent / entry["path"] for entry in manifest["shards"]]
+        self.pools = [get_pool(path) for path in self.paths]
+        self.budget = budget
+        self.max_partial_rows = max_partial_rows
+        self._threads = ThreadPoolExecutor(max_workers=len(self.pools), thread_name_prefix="shard")
+        self._lock = threading.Lock()
+        self._counts = {"queries": 0, "single": 0, "scatter": 0, "inlined": 0, "rejected": 0, "errors": 0}
+        self._partial_rows = 0
+        self._shard_seconds = 0.0
+        self._merge_seconds = 0.0
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self._counts[name] += n
+
+    def _run_shard(self, pool, sql: str, limit: int) -> tuple:
+        """(column names, rows, seconds) of one shard statement under the budget."""
+        started = time.perf_counter()
+        with pool.connection() as conn:
+            with self.budget.limit(conn, sql):
+                cursor = conn.execute(sql)
+                rows = cursor.fetchmany(limit + 1)
+                columns = [d[0] for d in cursor.description] if cursor.description else []
+        if len(rows) > limit:
+            raise ShardingError(f"a shard returned more than {limit:,} rows to merge; "
+                                f"add a LIMIT or aggregate further")
+        return columns, rows, time.perf_counter() - started
+
+    def _scatter(self, sql: str) -> list:
+        """Run a statement on every shard in parallel: [(columns, rows, seconds), ...]."""
+        futures = [self._threads.submit(self._run_shard, pool, sql, self.max_partial_rows)
+                   for pool in self.pools]
+        results, error = [], None
+        for future in futures:  # Wait for every shard, then report the first failure
+            try:
+                results.append(future.result())
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+        return results
+
+    def _inline(self, sql: str, subqueries: tuple) -> str:
+        """The statement with each cross-customer subquery replaced by its answer."""
+        for start, end, context, sub in sorted(subqueries, reverse=True):
+            limit = INLINE_ROW_LIMIT if context == "in" else 1
+            payload = self.execute(inspect_sql(sub).sql, max_rows=limit, max_bytes=None)
+            if context == "in" and payload.get("truncated"):
+                raise ShardingError(f"an IN (subquery) matched more than {limit:,} values across shards; "
+                                    f"join instead")
+            rows = payload["rows"]
+            if context == "in":
+                value = "(" + ", ".join(_literal(row[0]) for row in rows) + ")"
+            elif context == "exists":
+                value = "(1)" if rows else "(0)"
+            else:
+                value = "(" + (_literal(rows[0][0]) if rows else "NULL") + ")"
+            if context == "exists":  # EXISTS (1) isn't SQL: replace the keyword too
+                start = len(sql[:start].rstrip()) - len("EXISTS")
+            sql = sql[:start] + value + sql[end:]
+        return sql
+
+    def execute(self, sql: str, max_rows: int = 200, max_bytes: int | None = 256 * 1024) -> dict:
+        """
+        Run one guarded SELECT across the shards.
+
+        Args:
+            sql (str): A SELECT that passed inspect_sql (bounded_sql applied)
+            max_rows (int): Row budget of the result, as for fetch_bounded
+            max_bytes (int | None): Byte budget of the result (None: rows only)
+
+        Returns:
+            dict: {"columns": [...], "rows": [...]} plus "truncated"/"rows_seen"/"note"
+            when the row or byte budget cut it short, as fetch_bounded returns
+
+        Raises:
+            ShardingError: The query shape can't be merged across shards
+        """
+        self._count("queries")
+        budget_bytes = max_bytes if max_bytes is not None else 1 << 62
+        try:
+            plan = plan_query(sql, self.by)
+            if plan.route == "inline":
+                self._count("inlined")
+                plan = plan_query(inspect_sql(self._inline(sql, plan.subqueries)).sql, self.by)
+        except ShardingError:
+            self._count("rejected")
+            raise
+        try:
+            if plan.route == "single":
+                self._count("single")
+                with self.pools[0].connection() as conn:
+                    with self.budget.limit(conn, plan.shard_sql):
+                        return fetch_bounded(conn.execute(plan.shard_sql), max_rows, budget_bytes)
+
+            self._count("scatter")
+            results = self._scatter(plan.shard_sql)
+            started = time.perf_counter()
+            names = results[0][0]
+            part_columns = plan.part_columns
+            merge_sql = plan.merge_sql
+            if part_columns is None:  # SELECT *: now we know how many columns * has
+                visible = len(names) - plan.hidden
+                part_columns = ([f"__c{n}" for n in range(visible)]
+                                + [f"__h{n}" for n in range(plan.hidden)])
+                merge_sql = merge_sql.replace(_VISIBLE, ", ".join(part_columns[:visible]), 1)
+            merge = sqlite3.connect(":memory:")
+            try:
+                merge.execute(f"CREATE TABLE part({', '.join(part_columns)})")
+                marks = ", ".join("?" * len(part_columns))
+                for _, rows, _ in results:
+                    merge.executemany(f"INSERT INTO part VALUES ({marks})", rows)
+                payload = fetch_bounded(merge.execute(merge_sql), max_rows, budget_bytes)
+            finally:
+                merge.close()
+            payload["columns"] = list(plan.columns or names[:len(names) - plan.hidden])
+            with self._lock:
+                self._partial_rows += sum(len(rows) for _, rows, _ in results)
+                self._shard_seconds += max(seconds for _, _, seconds in results)
+                self._merge_seconds += time.perf_counter() - started
+            return payload
+        except ShardingError:
+            self._count("rejected")
+            raise
+        except Exception:
+            self._count("errors")
+            raise
+
+    def explain(self, sql: str) -> dict:
+        """The shard and merge statements planned for a SELECT (for debugging rewrites)."""
+        plan = plan_query(inspect_sql(sql).sql, self.by)
+        return {"route": plan.route, "kind": plan.kind, "shard_sql": plan.shard_sql, "merge_sql": plan.merge_sql}
+
+    def stats(self) -> dict:
+        """Query counters, partial rows moved and time in the shards vs. the merge."""
+        with self._lock:
+            return {
+                **self._counts,
+                "shards": len(self.pools),
+                "by": self.by,
+                "partial_rows": self._partial_rows,
+                "shard_ms": round(self._shard_seconds * 1000, 1),
+                "merge_ms": round(self._merge_seconds * 1000, 1),
+            }
+
+    def close(self):
+        """Stop the fan-out threads (the shard pools stay registered)."""
+        self._threads.shutdown(wait=True)
+
+
+# Process-wide registry: one ShardSet per manifest
+_sets = {}
+_sets_lock = threading.Lock()
+
+
+def get_shard_set(manifest_path, **options) -> ShardSet:
+    """
+    Return the shared ShardSet for a manifest, loading it on first use.
+
+    Args:
+        manifest_path: shards.json (or the folder that holds it)
+        **options: ShardSet settings, applied only when the set is created
+
+    Returns:
+        ShardSet: The process-wide set for that manifest
+    """
+    path = pathlib.Path(manifest_path)
+    if path.is_dir():
+        path = path / MANIFEST
+    key = path.resolve()
+    with _sets_lock:
+        shard_set = _sets.get(key)
+        if shard_set is None:
+            shard_set = _sets[key] = ShardSet(key, **options)
+        return shard_set
+
+
+def shard_stats() -> dict:
+    """Counters for every shard set loaded in this process, keyed by manifest path."""
+    with _sets_lock:
+        sets = list(_sets.items())
+    return {str(path): shard_set.stats() for path, shard_set in sets}
+
+
+def _comparable(payload: dict) -> list:
+    """Rows as a sorted multiset with floats rounded (sums may add up in another order)."""
+    return sorted((tuple(round(v, 6) if isinstance(v, float) else v for v in row) for row in payload["rows"]),
+                  key=repr)
+
+
+def bench(source, counts: list, by: str = "hash", repeat: int = 3, out_dir=None) -> list:
+    """
+    Time BENCH_QUERIES on the single database and on 1..N shards built from it.
+
+    Shard sets are built under out_dir (default: <source>_shards/) on first
+    use and reused afterwards. Every sharded result is checked against the
+    single-database result.
+
+    Args:
+        source: Database to compare against (and split)
+        counts (list): Shard counts to measure
+        by (str): "hash" or "region"
+        repeat (int): Timed runs per configuration (the best one is reported)
+        out_dir: Folder for the <by>_<n>/ shard sets
+
+    Returns:
+        list: {"shards", "ms", "speedup", "mismatches"} per configuration
+        (shards 0 is the single database)
+    """
+    source = pathlib.Path(source).resolve()
+    out_dir = pathlib.Path(out_dir) if out_dir else source.with_name(f"{source.stem}_shards")
+    queries = [inspect_sql(sql).bounded_sql(200) for sql in BENCH_QUERIES]
+    single = get_pool(source)
+
+    def run_single(sql: str) -> dict:
+        with single.connection() as conn:
+            with DEFAULT_BUDGET.limit(conn, sql):
+                return fetch_bounded(conn.execute(sql), max_rows=200)
+
+    def best(run) -> float:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for sql in queries:
+                run(sql)
+            timings.append(time.perf_counter() - started)
+        return min(timings) * 1000
+
+    expected = [_comparable(run_single(sql)) for sql in queries]
+    baseline = best(run_single)
+    results = [{"shards": 0, "ms": baseline, "speedup": 1.0, "mismatches": 0}]
+    for n in counts:
+        folder = out_dir / f"{by}_{n}"
+        if not (folder / MANIFEST).exists():
+            build_shards(source, folder, by, n)
+        shards = get_shard_set(folder)
+        mismatches = sum(_comparable(shards.execute(sql)) != rows for sql, rows in zip(queries, expected))
+        ms = best(shards.execute)
+        results.append({"shards": n, "ms": ms, "speedup": baseline / ms, "mismatches": mismatches})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, benchmark and inspect customer-partitioned shards")
+    parser.add_argument("action", choices=["build", "bench", "explain"])
+    parser.add_argument("--db", type=pathlib.Path, default=DEFAULT_DB_PATH, help="source database")
+    parser.add_argument("--by", choices=["hash", "region"], default="hash", help="partition customers by")
+    parser.add_argument("--shards", default="4", help="build: shard count; bench: counts, e.g. 1,2,4,8")
+    parser.add_argument("--out", type=pathlib.Path, default=None,
+                        help="build/explain: shard folder; bench: folder for the shard sets")
+    parser.add_argument("--repeat", type=int, default=3, help="bench: timed runs per configuration")
+    parser.add_argument("--sql", default=None, help="explain: the SELECT to plan")
+    args = parser.parse_args()
+    out = args.out or args.db.resolve().with_name(f"{args.db.stem}_shards")
+
+    if args.action == "build":
+        manifest = build_shards(args.db, out, args.by, int(args.shards))
+        print(f"{len(manifest['shards'])} shards by {args.by} built in {manifest['seconds']}s -> {out / MANIFEST}")
+        for entry in manifest["shards"]:
+            rows = entry["rows"]
+            print(f"  {entry['path']:<12} key={entry['key']!s:<24} {rows['customers']:>10,} customers "
+                  f"{rows['orders']:>11,} orders {rows['order_items']:>12,} items")
+    elif args.action == "bench":
+        counts = [int(n) for n in args.shards.split(",")]
+        print(f"{len(BENCH_QUERIES)} queries from 04_complex_queries.py, best of {args.repeat}:")
+        for row in bench(args.db, counts, args.by, args.repeat, args.out):
+            label = "single database" if row["shards"] == 0 else f"{row['shards']} shards ({args.by})"
+            check = "" if row["shards"] == 0 else (
+                "  results match" if not row["mismatches"] else f"  {row['mismatches']} MISMATCHED")
+            print(f"  {label:<20}{row['ms']:>9.1f} ms  x{row['speedup']:.2f}{check}")
+    else:
+        if not args.sql:
+            parser.error("explain needs --sql")
+        try:
+            plan = get_shard_set(out).explain(args.sql)
+        except ShardingError as e:
+            print(f"ERROR: {e}")
+            return
+        print(f"Route: {plan['route']} ({plan['kind']})\n\n-- each shard\n{plan['shard_sql']}")
+        if plan["merge_sql"]:
+            print(f"\n-- merge\n{plan['merge_sql']}")
+
+
+if __name__ == "__main__":
+    main()
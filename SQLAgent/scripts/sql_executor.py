@@ -0,0 +1,479 @@
+"""
+Shared Read-Only SQL Execution Layer
+
+This module is the single path through which the secure agents (scripts 03 and 04)
+and the CLI chat modes talk to the SQLite database. Instead of opening a fresh
+connection for every tool call, it keeps a small pool of pre-warmed, read-only
+connections that are reused across agent steps.
+
+Key Features:
+- Read-only connections (`mode=ro` URI + `PRAGMA query_only`)
+- WAL journal mode so readers never block on writers
+- Tuned page cache, memory-mapped I/O and in-memory temp storage
+- Per-connection prepared-statement cache (`cached_statements`)
+- Hit/miss and wait-time counters for sizing the pool under load
+- SQLAlchemy engine adapter so LangChain's SQLDatabase shares the same pool
+- Bounded streaming fetch (`fetch_bounded`) with row, byte and token budgets
+- Optional in-memory replica (`SQL_AGENT_REPLICA=1`, see replica.py): reads never touch the file
+
+Usage:
+    from sql_executor import get_pool
+
+    pool = get_pool()
+    with pool.connection() as conn:
+        cursor = conn.execute("SELECT name FROM customers LIMIT 5")
+"""
+
+import os  # SQL_AGENT_DB override
+import pathlib  # Filesystem paths for locating the database
+import queue  # Thread-safe LIFO queue of idle connections
+import sqlite3  # Standard library SQLite driver
+import threading  # Locks for the pool registry and counters
+import time  # Wait-time measurement
+from contextlib import contextmanager  # Context manager for connection checkout
+
+# Default database location (same file reset_db.py rebuilds); SQL_AGENT_DB points the
+# scripts at another copy of the schema, e.g. one built by generate_data.py
+DEFAULT_DB_PATH = pathlib.Path(
+    os.environ.get("SQL_AGENT_DB") or pathlib.Path(__file__).resolve().parents[1] / "sql_agent_class.db"
+)
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    sqlite3 connection that returns itself to its pool when closed.
+
+    Code that calls close() (including SQLAlchemy's NullPool) hands the
+    connection back to the owning ReadOnlyPool instead of tearing it down.
+    """
+
+    _pool = None
+    _source = None  # URI the connection was opened on (file or in-memory replica)
+
+    def close(self):
+        """Return the connection to its pool, or close it if unpooled."""
+        if self._pool is None:
+            super().close()
+        else:
+            self._pool.release(self)
+
+    def really_close(self):
+        """Close the underlying SQLite handle."""
+        self._pool = None
+        super().close()
+
+
+class ReadOnlyPool:
+    """
+    Pool of pre-warmed, read-only SQLite connections.
+
+    Connections are handed out LIFO so the most recently used connection
+    (with the hottest page cache) is reused first.
+
+    Attributes:
+        db_path (pathlib.Path): Database file served by this pool
+        size (int): Maximum number of open connections
+        timeout (float): Seconds to wait for a free connection before failing
+        replica: HotReplica the connections read from instead of the file (None = the file)
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, size: int = 4, timeout: float = 10.0,
+                 cache_size_kib: int = 65536, mmap_size: int = 256 * 1024 * 1024,
+                 cached_statements: int = 256, wal: bool = True, warm: bool = True):
+        """
+        Create the pool and optionally open all connections up front.
+
+        Args:
+            db_path: SQLite database file to open read-only
+            size (int): Maximum number of pooled connections
+            timeout (float): Seconds to wait for a connection when all are busy
+            cache_size_kib (int): Page cache size per connection, in KiB
+            mmap_size (int): Bytes of the database file to memory-map
+            cached_statements (int): Prepared statements kept per connection
+            wal (bool): Switch the database to WAL journal mode if needed
+            warm (bool): Open and warm every connection immediately
+        """
+        self.db_path = pathlib.Path(db_path).resolve()
+        self.size = size
+        self.timeout = timeout
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+
+        self._idle = queue.LifoQueue()
+        self._busy = set()  # checked-out connections (for interrupt())
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+        self._engine = None
+        self.replica = None
+
+        # Counters reported by stats()
+        self._hits = 0
+        self._misses = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._in_use = 0
+        self._recycled = 0
+
+        if wal:
+            self._ensure_wal()
+        if warm:
+            self.warm()
+
+    def _ensure_wal(self):
+        """Switch the database to WAL mode (a persistent, one-time change)."""
+        try:
+            conn = sqlite3.connect(self.db_path.as_posix(), timeout=self.timeout)
+            try:
+                mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+                if mode.lower() != "wal":
+                    conn.execute("PRAGMA journal_mode=WAL")
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            # Read-only filesystem or locked database: stay on the rollback journal
+            pass
+
+    def _source_uri(self) -> str:
+        """URI new connections open: the current replica copy, or the file read-only."""
+        replica = self.replica
+        return replica.uri if replica is not None else f"{self.db_path.as_uri()}?mode=ro"
+
+    def _open(self) -> PooledConnection:
+        """Open and configure one read-only connection."""
+        uri = self._source_uri()
+        conn = sqlite3.connect(
+            uri,
+            uri=True,
+            timeout=self.timeout,
+            check_same_thread=False,  # Connections move between worker threads
+            cached_statements=self.cached_statements,
+            factory=PooledConnection,
+        )
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kib)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        # Load the schema so the first real query doesn't pay for it
+        conn.execute("SELECT name, sql FROM sqlite_master").fetchall()
+        conn._pool = self
+        conn._source = uri
+        return conn
+
+    def warm(self):
+        """Open connections until the pool is full."""
+        while True:
+            with self._lock:
+                if self._closed or self._created >= self.size:
+                    return
+                self._created += 1
+            try:
+                self._idle.put(self._open())
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+    def acquire(self) -> PooledConnection:
+        """
+        Check a connection out of the pool.
+
+        Returns:
+            PooledConnection: A read-only connection; call close() or
+            release() to return it
+
+        Raises:
+            TimeoutError: If no connection frees up within `timeout` seconds
+        """
+        if self._closed:
+            raise RuntimeError("connection pool is closed")
+
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self._hits += 1
+                self._in_use += 1
+                self._busy.add(conn)
+            return conn
+        except queue.Empty:
+            pass
+
+        # No idle connection: open a new one if we are below capacity
+        with self._lock:
+            can_open = self._created < self.size
+            if can_open:
+                self._created += 1
+                self._misses += 1
+        if can_open:
+            try:
+                conn = self._open()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+            with self._lock:
+                self._in_use += 1
+                self._busy.add(conn)
+            return conn
+
+        # Pool exhausted: wait for a connection to be released
+        started = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"no database connection available after {self.timeout}s") from None
+        waited = time.perf_counter() - started
+        with self._lock:
+            self._waits += 1
+            self._wait_time += waited
+            self._max_wait = max(self._max_wait, waited)
+            self._in_use += 1
+            self._busy.add(conn)
+        return conn
+
+    def release(self, conn: PooledConnection):
+        """Return a connection to the pool (closing it if the replica was swapped meanwhile)."""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self._in_use -= 1
+            self._busy.discard(conn)
+            closed = self._closed
+            # Checked under the lock so recycle() can't miss a connection put back mid-swap
+            stale = not closed and conn._source != self._source_uri()
+            if stale:
+                self._created -= 1
+                self._recycled += 1
+            elif not closed:
+                self._idle.put(conn)
+        if closed or stale:
+            conn.really_close()
+
+    def use_replica(self, replica):
+        """
+        Serve every checkout from an in-memory replica instead of the file.
+
+        Args:
+            replica: HotReplica of this pool's database (see replica.py)
+        """
+        self.replica = replica
+        replica.on_swap(self.recycle)
+        self.recycle()
+
+    def recycle(self) -> int:
+        """
+        Reopen the idle connections on the current source.
+
+        Called after the replica swaps in a new copy; checked-out connections
+        finish their statement on the old copy and are closed when released.
+
+        Returns:
+            int: Number of idle connections replaced
+        """
+        old = []
+        with self._lock:
+            while True:
+                try:
+                    old.append(self._idle.get_nowait())
+                except queue.Empty:
+                    break
+            self._created -= len(old)
+            self._recycled += len(old)
+        for conn in old:
+            conn.really_close()
+        for _ in old:
+            with self._lock:
+                if self._closed or self._created >= self.size:
+                    break
+                self._created += 1
+            try:
+                self._idle.put(self._open())
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return len(old)
+
+    def interrupt(self) -> int:
+        """
+        Abort the statement running on every checked-out connection.
+
+        Uses sqlite3's interrupt(), so a long scan stops at its next VM step
+        and raises "interrupted" in the thread running it. Idle connections
+        are unaffected.
+
+        Returns:
+            int: Number of connections interrupted
+        """
+        with self._lock:
+            busy = list(self._busy)
+        for conn in busy:
+            conn.interrupt()
+        return len(busy)
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks a connection out and returns it afterwards."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def sqlalchemy_engine(self):
+        """
+        SQLAlchemy engine backed by this pool (for LangChain's SQLDatabase).
+
+        SQLAlchemy's NullPool "closes" the connection after each use, which
+        PooledConnection turns into a return to this pool.
+        """
+        if self._engine is None:
+            import sqlalchemy
+            from sqlalchemy.pool import NullPool
+            self._engine = sqlalchemy.create_engine("sqlite://", creator=self.acquire, poolclass=NullPool)
+        return self._engine
+
+    def stats(self) -> dict:
+        """
+        Snapshot of pool counters.
+
+        Returns:
+            dict: size, open/idle/in-use connections, hits (idle connection
+            reused), misses (new connection opened), waits, wait times in ms, and
+            connections recycled after replica swaps
+        """
+        with self._lock:
+            checkouts = self._hits + self._misses + self._waits
+            return {
+                "size": self.size,
+                "open": self._created,
+                "idle": self._idle.qsize(),
+                "in_use": self._in_use,
+                "checkouts": checkouts,
+                "hits": self._hits,
+                "misses": self._misses,
+                "waits": self._waits,
+                "hit_rate": round(self._hits / checkouts, 3) if checkouts else 0.0,
+                "wait_ms_total": round(self._wait_time * 1000, 3),
+                "wait_ms_max": round(self._max_wait * 1000, 3),
+                "source": "replica" if self.replica is not None else "file",
+                "recycled": self._recycled,
+            }
+
+    def close(self):
+        """Close every idle connection; busy ones close when released."""
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().really_close()
+            except queue.Empty:
+                break
+        if self._engine is not None:
+            self._engine.dispose()
+            self._engine = None
+
+
+def _row_chars(row) -> int:
+    """Rough rendered size of one row (what the LLM will eventually read)."""
+    size = 2
+    for value in row:
+        if isinstance(value, (str, bytes)):
+            size += len(value) + 4
+        else:
+            size += 8
+    return size
+
+
+def fetch_bounded(cursor, max_rows: int = 200, max_bytes: int = 256 * 1024,
+                  max_tokens: int | None = None, chunk_size: int = 64) -> dict:
+    """
+    Stream rows from an executed cursor until a budget is hit.
+
+    Rows are pulled with fetchmany() in chunks of `chunk_size`, so peak memory
+    is bounded by the budgets no matter how many rows the query would return.
+    When a budget stops the fetch, one more chunk is read (and discarded) to
+    report a lower bound on the total, and the statement is then abandoned.
+
+    Args:
+        cursor: sqlite3 cursor after execute()
+        max_rows (int): Maximum rows to keep
+        max_bytes (int): Maximum rendered size of the kept rows
+        max_tokens (int | None): Maximum estimated LLM tokens (~4 chars each)
+        chunk_size (int): Rows pulled per fetchmany() call
+
+    Returns:
+        dict: {"columns": [...], "rows": [...]}; when truncated, also
+        "truncated": True, "rows_seen" (at least this many rows exist) and a
+        human-readable "note" such as "200 rows shown of at least 264"
+    """
+    cols = [d[0] for d in cursor.description] if cursor.description else []
+    if max_tokens is not None:
+        max_bytes = min(max_bytes, max_tokens * 4)
+
+    rows = []
+    used = 0
+    truncated = False
+    while not truncated:
+        chunk = cursor.fetchmany(chunk_size)
+        if not chunk:
+            break
+        for i, row in enumerate(chunk):
+            size = _row_chars(row)
+            if len(rows) >= max_rows or used + size > max_bytes:
+                truncated = True
+                seen = len(rows) + len(chunk) - i
+                break
+            rows.append(list(row))
+            used += size
+
+    if not truncated:
+        return {"columns": cols, "rows": rows}
+
+    # Peek one more chunk to report "at least M" without reading the rest
+    seen += len(cursor.fetchmany(chunk_size))
+    cursor.close()  # Reset the statement so SQLite stops producing rows
+    return {
+        "columns": cols,
+        "rows": rows,
+        "truncated": True,
+        "rows_seen": seen,
+        "note": f"{len(rows)} rows shown of at least {seen}",
+    }
+
+
+# Process-wide registry: one pool per database file
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path=DEFAULT_DB_PATH, **options) -> ReadOnlyPool:
+    """
+    Return the shared pool for `db_path`, creating it on first use.
+
+    Args:
+        db_path: SQLite database file
+        **options: ReadOnlyPool settings, applied only when the pool is created
+
+    Returns:
+        ReadOnlyPool: The process-wide pool for that file
+    """
+    key = pathlib.Path(db_path).resolve()
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ReadOnlyPool(key, **options)
+            # SQL_AGENT_REPLICA=1: reads go to an in-memory copy kept in sync with the file
+            if os.environ.get("SQL_AGENT_REPLICA", "0").lower() not in ("", "0", "false", "off", "no"):
+                from replica import get_replica
+                get_replica(pool)
+        return pool
+
+
+def pool_stats() -> dict:
+    """Counters for every pool created in this process, keyed by database path."""
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {str(path): pool.stats() for path, pool in pools}
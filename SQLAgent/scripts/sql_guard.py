@@ -0,0 +1,256 @@
+"""
+Single-Pass SQL Guardrail Engine
+
+Every entry point that needs to know "is this SQL read-only?" asks this module:
+the SafeSQLTool in scripts 03/04, the CLI's Direct SQL Query and Custom Query
+views, and the CLI's security self-test.
+
+Instead of a stack of independent regex searches over the raw text, one
+precompiled tokenizer walks the statement once. String literals, quoted
+identifiers and comments become single tokens, so `'please delete me'`,
+`replace(name, 'a', 'b')` or a `created_at` column no longer trip the
+write-operation check.
+
+Key Features:
+- One precompiled master regex, one pass over the SQL text
+- Structured verdict: statement type, referenced tables, LIMIT/aggregate flags
+- Same error messages the agents already understand
+- Verdicts memoized (LRU) because agents repeat the same SQL constantly
+
+Usage:
+    from sql_guard import inspect_sql
+
+    verdict = inspect_sql("SELECT name FROM customers")
+    if not verdict.allowed:
+        return verdict.error
+    sql = verdict.bounded_sql()  # LIMIT 200 appended when needed
+"""
+
+import re  # Master tokenizer pattern
+import string  # ASCII case table
+from dataclasses import dataclass  # Immutable verdict objects (safe to memoize)
+from functools import lru_cache  # Verdict memoization
+
+# Building blocks: the gap between tokens (whitespace/comments), a (possibly quoted)
+# name, and "this keyword ends here"
+_GAP = r"\s*(?:(?:--[^\n]*|/\*.*?\*/)\s*)*"
+_NAME = r'(?:"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\]|[^\W\d][\w$]*)'
+_END = r"(?![\w$])"
+
+# The master tokenizer, run over the upper-cased statement. Every alternative consumes
+# a whole token, so the scan stays aligned on token boundaries; only tokens that matter
+# to the guardrail are captured (literals, comments, ordinary words, numbers and
+# operators are skipped inside the regex engine, together with the whitespace after
+# them, which keeps large generated SQL fast).
+_TOKEN = re.compile(rf"""
+    (?:\s+|--[^\n]*|/\*.*?\*/|'(?:[^']|'')*'\s*|X'[0-9A-F]*'|[?:@$]\w*)
+  | (
+      ;(?:[\s;]|--[^\n]*|/\*.*?\*/)*\Z
+    | ;
+    | [()]
+    | ,{_GAP}(?:{_NAME}{_GAP}\.{_GAP})?{_NAME}{_END}(?!{_GAP}[(.])
+    | (?<!\.)(?:FROM|JOIN|INTO|UPDATE|TABLE){_END}
+        (?:{_GAP}(?:IF|NOT|EXISTS|OR|ROLLBACK|ABORT|FAIL|IGNORE|REPLACE){_END})*
+        (?:{_GAP}(?:{_NAME}{_GAP}\.{_GAP})?{_NAME}{_END}(?!{_GAP}[(.]))?
+    | (?<!\.)GROUP{_GAP}BY{_END}
+    | (?<!\.)(?:INSERT|DELETE|DROP|TRUNCATE|ALTER|CREATE|REPLACE|ATTACH|DETACH|PRAGMA|VACUUM|REINDEX){_END}(?!{_GAP}[(.])
+    | (?<!\.)(?:COUNT|SUM|AVG|MIN|MAX|TOTAL|GROUP_CONCAT)(?={_GAP}\()
+    | (?<!\.)(?:LIMIT|WHERE|ORDER|HAVING|UNION|EXCEPT|INTERSECT|WINDOW|SET|VALUES|RETURNING|SELECT){_END}
+    | (?<!\.)AS(?={_GAP}(?:NOT{_GAP})?(?:MATERIALIZED{_GAP})?\()
+    | /\*|'|"(?!(?:[^"]|"")*")|`(?!(?:[^`]|``)*`)|\[(?![^\]]*\])
+    )
+  | (?:"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\]|[^\W\d][\w$]*|\d[\w.]*|[^\w\s'"`\[;(),/-]+|[,/-])\s*
+""", re.X | re.S)
+
+# ASCII-only upper-casing, for the rare text whose str.upper() changes length ("ß" -> "SS")
+_ASCII_UPPER = str.maketrans(string.ascii_lowercase, string.ascii_uppercase)
+
+_FIRST_WORD = re.compile(rf"{_GAP}([^\W\d][\w$]*)", re.S)
+_LEADING_NAME = re.compile(_NAME)
+_TRAILING_NAME = re.compile(rf"({_NAME})\Z")
+
+# "name [(columns)] AS [NOT] [MATERIALIZED] (" - a common table expression (or a named
+# window, which is equally not a table); only scanned for when the tokenizer saw one
+_CTE_NAME = re.compile(
+    rf"({_NAME}){_END}{_GAP}(?:\([^()]*\){_GAP})?AS{_END}{_GAP}(?:NOT{_GAP})?(?:MATERIALIZED{_GAP})?\(", re.S)
+
+# Keywords that modify data, schema or the connection
+_WRITE_KEYWORDS = frozenset({
+    "INSERT", "UPDATE", "DELETE", "DROP", "TRUNCATE", "ALTER", "CREATE", "REPLACE",
+    "ATTACH", "DETACH", "PRAGMA", "VACUUM", "REINDEX",
+})
+
+# Statement types the guardrail accepts
+_READ_STATEMENTS = frozenset({"SELECT", "WITH"})
+
+_AGGREGATES = frozenset({"COUNT", "SUM", "AVG", "MIN", "MAX", "TOTAL", "GROUP_CONCAT"})
+
+# Keywords after which the next name is a table
+_TABLE_INTRODUCERS = frozenset({"FROM", "JOIN", "INTO", "UPDATE", "TABLE"})
+
+# Keywords that end a FROM clause (so commas stop introducing tables)
+_FROM_TERMINATORS = frozenset({
+    "WHERE", "GROUP", "ORDER", "LIMIT", "HAVING", "UNION", "EXCEPT", "INTERSECT",
+    "WINDOW", "SET", "VALUES", "RETURNING", "SELECT",
+})
+
+_UNTERMINATED = frozenset({"/*", "'", '"', "`", "["})
+
+WRITE_ERROR = "ERROR: write operations are not allowed."
+MULTI_ERROR = "ERROR: multiple statements are not allowed."
+SELECT_ERROR = "ERROR: only SELECT statements are allowed."
+SYNTAX_ERROR = "ERROR: unterminated string, identifier or comment."
+
+
+@dataclass(frozen=True)
+class SQLVerdict:
+    """
+    Result of inspecting one SQL string.
+
+    Attributes:
+        allowed (bool): True if the SQL is a single read-only SELECT
+        error (str | None): Agent-facing error message when not allowed
+        statement_type (str): First keyword, upper-cased ("SELECT", "DELETE", ...)
+        tables (frozenset): Lower-cased tables referenced (CTE names excluded)
+        has_limit (bool): A top-level LIMIT clause is present
+        has_aggregate (bool): Aggregate functions or GROUP BY are present
+        write_keyword (str | None): First write keyword found, if any
+        sql (str): The statement without trailing semicolons/whitespace
+    """
+    allowed: bool
+    error: str | None
+    statement_type: str
+    tables: frozenset
+    has_limit: bool
+    has_aggregate: bool
+    write_keyword: str | None
+    sql: str
+
+    def bounded_sql(self, limit: int = 200) -> str:
+        """
+        The statement with `LIMIT <limit>` appended when it has neither a LIMIT
+        nor aggregates (the same rule SafeSQLTool has always applied).
+
+        The LIMIT goes on a new line so a trailing `--` comment can't swallow it.
+        """
+        if self.has_limit or self.has_aggregate:
+            return self.sql
+        return f"{self.sql}\nLIMIT {limit}"
+
+
+def _unquote(text: str) -> str:
+    """Identifier text without SQL quoting, lower-cased."""
+    if text[0] in '"`':
+        text = text[1:-1].replace(text[0] * 2, text[0])
+    elif text[0] == "[":
+        text = text[1:-1]
+    return text.lower()
+
+
+@lru_cache(maxsize=4096)
+def inspect_sql(sql: str) -> SQLVerdict:
+    """
+    Tokenize and classify a SQL string in a single pass.
+
+    Args:
+        sql (str): Raw SQL as produced by the agent or typed by a user
+
+    Returns:
+        SQLVerdict: Structured verdict (memoized for repeated SQL)
+    """
+    first = _FIRST_WORD.match(sql)
+    statement_type = first.group(1).upper() if first else ""
+    statement = sql.strip()
+
+    depth = 0
+    tables = set()
+    from_depths = set()  # paren depths currently inside a FROM clause
+    has_limit = False
+    has_aggregate = False
+    write_keyword = None
+    multi = False
+    has_cte = False
+
+    upper_sql = sql.upper()
+    if len(upper_sql) != len(sql):
+        upper_sql = sql.translate(_ASCII_UPPER)
+    tokens = _TOKEN.findall(upper_sql)
+    if tokens and tokens[-1][:1] == ";":
+        # Trailing terminator (semicolons/comments running to the end of the text)
+        statement = sql[:len(sql) - len(tokens.pop())].strip()
+
+    for token in tokens:
+        if not token:
+            continue  # skipped token (literal, comment, ordinary word, ...)
+        head = token[0]
+        if head == "(":
+            depth += 1
+        elif head == ")":
+            from_depths.discard(depth)
+            depth -= 1
+        elif head == ",":
+            # ", name" only names a table inside a FROM list
+            if depth in from_depths:
+                tables.add(_unquote(_TRAILING_NAME.search(token).group(1)))
+        elif head == ";":
+            multi = True  # something follows the semicolon
+        elif token in _UNTERMINATED:
+            return SQLVerdict(False, SYNTAX_ERROR, statement_type, frozenset(), False, False, None, statement)
+        else:
+            word = _LEADING_NAME.match(token).group()
+            if word in _TABLE_INTRODUCERS:
+                if word == "UPDATE" and write_keyword is None:
+                    write_keyword = word
+                if word == "FROM":
+                    from_depths.add(depth)
+                if token != word:  # keyword followed by a table name
+                    tables.add(_unquote(_TRAILING_NAME.search(token).group(1)))
+            elif word in _WRITE_KEYWORDS:
+                if write_keyword is None:
+                    write_keyword = word
+            elif word in _AGGREGATES:
+                has_aggregate = True
+            elif word in _FROM_TERMINATORS:
+                from_depths.discard(depth)
+                if word == "GROUP":
+                    has_aggregate = True
+                elif word == "LIMIT" and depth == 0:
+                    has_limit = True
+            else:
+                has_cte = True  # "AS (" - a WITH clause (or named window)
+
+    if has_cte:
+        tables -= {_unquote(name) for name in _CTE_NAME.findall(upper_sql)}
+
+    if write_keyword:
+        error = WRITE_ERROR
+    elif multi:
+        error = MULTI_ERROR
+    elif statement_type not in _READ_STATEMENTS:
+        error = SELECT_ERROR
+    else:
+        error = None
+
+    return SQLVerdict(
+        allowed=error is None,
+        error=error,
+        statement_type=statement_type,
+        tables=frozenset(tables),
+        has_limit=has_limit,
+        has_aggregate=has_aggregate,
+        write_keyword=write_keyword,
+        sql=statement,
+    )
+
+
+def guard_stats() -> dict:
+    """Memoization counters for inspect_sql."""
+    info = inspect_sql.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_rate": round(info.hits / lookups, 3) if lookups else 0.0,
+        "entries": info.currsize,
+        "max_entries": info.maxsize,
+    }
@@ -0,0 +1,28 @@
+"""
+Shared pytest fixtures for the performance-layer modules.
+
+The modules under test live in scripts/ and import each other by bare name
+(the way the numbered scripts run them), so that folder goes on sys.path.
+"""
+
+import pathlib  # Locating scripts/ and the seed SQL
+import sqlite3  # Building throwaway databases
+import sys  # Import path for scripts/
+
+import pytest  # Fixtures
+
+SQLAGENT_DIR = pathlib.Path(__file__).resolve().parent.parent
+SEED_SQL = SQLAGENT_DIR / "sql_agent_seed.sql"
+
+sys.path.insert(0, str(SQLAGENT_DIR / "scripts"))
+
+
+@pytest.fixture
+def seed_db(tmp_path) -> pathlib.Path:
+    """A WAL-mode copy of the seed database, private to one test."""
+    path = tmp_path / "seed.db"
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.executescript(SEED_SQL.read_text())
+    conn.close()
+    return path.resolve()
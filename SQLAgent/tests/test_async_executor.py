@@ -0,0 +1,65 @@
+"""The shared guarded path (run_guarded) and its async executor."""
+
+import asyncio  # Driving the async executor
+import dataclasses  # Tight budgets
+
+from async_executor import AsyncGuardedExecutor, run_guarded
+from query_budget import DEFAULT_BUDGET
+from query_log import QueryLog
+from result_cache import ResultCache
+from sql_executor import get_pool
+
+# Counts forever unless something stops it
+SLOW = ("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) "
+        "SELECT COUNT(*) FROM n WHERE i < 0")
+UNBOUNDED = dataclasses.replace(DEFAULT_BUDGET, max_vm_steps=None, timeout=None)
+
+
+def test_rejected_sql_never_runs(seed_db):
+    log = QueryLog()
+    assert run_guarded("DELETE FROM orders", get_pool(seed_db), query_log=log).startswith("ERROR")
+    assert log.entries() == []
+
+
+def test_limit_cache_and_log(seed_db):
+    pool, cache, log = get_pool(seed_db), ResultCache(seed_db), QueryLog()
+    first = run_guarded("SELECT id FROM order_items", pool, cache, log, max_rows=5)
+    assert len(first["rows"]) == 5
+    assert run_guarded("SELECT id FROM order_items", pool, cache, log, max_rows=5) == first
+    (entry,) = log.entries()
+    assert entry["sql"].endswith("LIMIT 5") and entry["count"] == 1  # The repeat was a cache hit
+    assert cache.stats()["hits"] == 1
+
+
+def test_errors_come_back_as_text(seed_db):
+    budget = dataclasses.replace(DEFAULT_BUDGET, max_vm_steps=50_000, check_every=1_000)
+    assert run_guarded("SELECT nope FROM orders", get_pool(seed_db)).startswith("ERROR: no such column")
+    assert run_guarded(SLOW, get_pool(seed_db), budget=budget).startswith("ERROR: budget exceeded (vm_steps)")
+
+
+def test_async_results_match_the_sync_path(seed_db):
+    pool = get_pool(seed_db)
+    executor = AsyncGuardedExecutor(pool)
+
+    async def ask():
+        return await asyncio.gather(*(executor.run(f"SELECT name FROM customers WHERE id = {i}") for i in (1, 2, 3)))
+
+    try:
+        results = asyncio.run(ask())
+    finally:
+        executor.close()
+    assert results == [run_guarded(f"SELECT name FROM customers WHERE id = {i}", pool) for i in (1, 2, 3)]
+    assert executor.stats()["completed"] == 3
+
+
+def test_timeout_interrupts_the_statement(seed_db):
+    executor = AsyncGuardedExecutor(get_pool(seed_db), budget=UNBOUNDED)
+    try:
+        result = asyncio.run(executor.run(SLOW, timeout=0.2))
+        assert result.startswith("ERROR: query timed out")
+        # The worker got its connection back: the next query runs
+        assert asyncio.run(executor.run("SELECT 1 AS one"))["rows"] == [[1]]
+    finally:
+        executor.close()
+    stats = executor.stats()
+    assert (stats["timeouts"], stats["cancelled"], stats["running"]) == (1, 1, 0)
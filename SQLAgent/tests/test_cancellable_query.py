@@ -0,0 +1,77 @@
+"""Worker-thread queries with timeout and Ctrl-C cancellation (cancellable_query)."""
+
+import _thread  # Simulating Ctrl-C on the input thread
+import sqlite3  # Connections for the worker
+import threading  # Delayed Ctrl-C
+
+import pytest  # Fixtures, raises
+
+import cancellable_query
+from cancellable_query import QueryCancelled, fetch_all, run_on, run_query
+from query_budget import BudgetExceeded
+
+# Counts forever unless something stops it
+SLOW = ("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) "
+        "SELECT COUNT(*) FROM n WHERE i < 0")
+CUSTOMERS = "SELECT id, name FROM customers ORDER BY id"
+
+
+@pytest.fixture
+def connect(seed_db):
+    """Opens worker connections to the seed database and remembers them."""
+    def connect():
+        connect.opened.append(sqlite3.connect(seed_db, check_same_thread=False))
+        return connect.opened[-1]
+
+    connect.opened = []
+    return connect
+
+
+def test_rows_description_and_progress(connect, seed_db):
+    rows, description, progress = run_query(
+        connect, CUSTOMERS, work=lambda conn, cursor, progress: fetch_all(conn, cursor, progress, chunk_size=3))
+    assert rows == sqlite3.connect(seed_db).execute(CUSTOMERS).fetchall()
+    assert [column[0] for column in description] == ["id", "name"]
+    assert progress.rows == len(rows)
+    with pytest.raises(sqlite3.ProgrammingError):  # run_query closed its connection
+        connect.opened[0].execute("SELECT 1")
+
+
+def test_work_can_write_and_commit(connect, seed_db):
+    def commit(conn, cursor, progress):
+        conn.commit()
+        return cursor.rowcount
+
+    deleted, _, _ = run_query(connect, "DELETE FROM refunds", work=commit)
+    assert deleted > 0
+    assert sqlite3.connect(seed_db).execute("SELECT COUNT(*) FROM refunds").fetchone()[0] == 0
+
+
+def test_timeout_stops_the_statement(connect):
+    with pytest.raises(BudgetExceeded) as caught:
+        run_query(connect, SLOW, timeout=0.2, show_progress=False)
+    assert caught.value.budget == "timeout"
+
+
+def test_sql_errors_are_raised_as_is(connect):
+    with pytest.raises(sqlite3.OperationalError, match="no such table"):
+        run_query(connect, "SELECT * FROM nope")
+
+
+def test_ctrl_c_interrupts_the_statement(monkeypatch, connect, capsys):
+    monkeypatch.setattr(cancellable_query, "PROGRESS_AFTER", 0.0)
+    monkeypatch.setattr(cancellable_query, "PROGRESS_EVERY", 0.02)
+    threading.Timer(0.3, _thread.interrupt_main).start()
+    with pytest.raises(QueryCancelled) as caught:
+        run_query(connect, SLOW)
+    assert caught.value.elapsed >= 0.3
+    assert "VM steps" in capsys.readouterr().out  # The progress line was shown, then cleared
+
+
+def test_run_on_keeps_the_connection_open(connect):
+    conn = connect()
+    cursor = conn.execute(CUSTOMERS)
+    first, _ = run_on(conn, lambda progress: cursor.fetchmany(2))
+    rest, _ = run_on(conn, lambda progress: cursor.fetchall())
+    assert [row[0] for row in first + rest] == [row[0] for row in conn.execute(CUSTOMERS)]
+    conn.close()
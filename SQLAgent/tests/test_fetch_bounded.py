@@ -0,0 +1,47 @@
+"""Row, byte and token truncation in sql_executor.fetch_bounded."""
+
+import sqlite3  # In-memory source table
+
+import pytest  # Fixtures
+
+from sql_executor import fetch_bounded
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (id INTEGER, label TEXT)")
+    conn.executemany("INSERT INTO t VALUES (?, ?)", [(i, "x" * 40) for i in range(1000)])
+    return conn
+
+
+def test_small_result_is_complete(conn):
+    result = fetch_bounded(conn.execute("SELECT id FROM t WHERE id < 5"))
+    assert result == {"columns": ["id"], "rows": [[0], [1], [2], [3], [4]]}
+
+
+def test_row_cap(conn):
+    result = fetch_bounded(conn.execute("SELECT * FROM t"), max_rows=10, chunk_size=64)
+    assert len(result["rows"]) == 10
+    assert result["truncated"]
+    assert 10 < result["rows_seen"] < 1000  # Only a lower bound: the rest is never read
+    assert result["note"] == f"10 rows shown of at least {result['rows_seen']}"
+
+
+def test_byte_cap(conn):
+    result = fetch_bounded(conn.execute("SELECT * FROM t"), max_rows=1000, max_bytes=500)
+    assert result["truncated"]
+    assert sum(2 + 8 + 44 for _ in result["rows"]) <= 500
+    assert len(result["rows"]) == 500 // 54
+
+
+def test_token_cap_tightens_byte_cap(conn):
+    by_tokens = fetch_bounded(conn.execute("SELECT * FROM t"), max_tokens=100)
+    by_bytes = fetch_bounded(conn.execute("SELECT * FROM t"), max_bytes=400)
+    assert by_tokens["rows"] == by_bytes["rows"]
+
+
+def test_exact_fit_is_not_truncated(conn):
+    result = fetch_bounded(conn.execute("SELECT id FROM t WHERE id < 64"), max_rows=64, chunk_size=16)
+    assert "truncated" not in result
+    assert len(result["rows"]) == 64
@@ -0,0 +1,54 @@
+"""Compact encoding and token-budget truncation in observation_encoder."""
+
+from observation_encoder import Observation, encode_observation, estimate_tokens
+
+
+def payload(rows: int) -> dict:
+    return {"columns": ["name", "category", "total_cents"],
+            "rows": [[f"Product {i}", "Home & Kitchen", i * 100] for i in range(rows)]}
+
+
+def test_small_result_is_shown_in_full():
+    observation = encode_observation(payload(3))
+    assert isinstance(observation, Observation)
+    lines = str(observation).splitlines()
+    assert lines[0].startswith("[rows: 3 of 3")
+    assert "name\tcategory\ttotal_cents" in lines
+    assert observation.shown == 3
+    assert "truncated" not in str(observation)
+
+
+def test_repeated_values_are_dictionary_coded():
+    text = str(encode_observation(payload(20)))
+    assert "@ category: @1=Home & Kitchen" in text
+    assert text.count("Home & Kitchen") == 1
+
+
+def test_token_budget_truncates_rows():
+    observation = encode_observation(payload(2_000), max_tokens=200)
+    assert observation.shown < 2_000
+    assert observation.tokens_after <= 200
+    assert observation.tokens_after < observation.tokens_before
+    assert f"{2_000 - observation.shown} more rows not shown (token budget 200)" in str(observation)
+
+
+def test_fetch_truncation_is_reported():
+    truncated = dict(payload(5), truncated=True, rows_seen=70, note="5 rows shown of at least 70")
+    text = str(encode_observation(truncated))
+    assert text.startswith("[rows: 5 of at least 70")
+    assert "5 rows shown of at least 70" in text
+
+
+def test_cells_cannot_break_the_layout():
+    text = str(encode_observation({"columns": ["note"], "rows": [["a\tb\nc"], [None], ["y" * 500]]}))
+    assert "a\\tb\\nc" in text
+    assert "NULL" in text
+    assert max(len(line) for line in text.splitlines()) < 300
+
+
+def test_other_payloads_pass_through():
+    assert encode_observation("ERROR: only SELECT statements are allowed.") == \
+        "ERROR: only SELECT statements are allowed."
+    report = {"path": "out.csv", "rows": 3}
+    assert encode_observation(report) is report
+    assert estimate_tokens("abcde") == 2
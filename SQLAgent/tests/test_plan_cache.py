@@ -0,0 +1,76 @@
+"""Plan extraction from agent runs (plan_cache.plan_from_steps) and what PlanCache stores."""
+
+import json  # Plan files written before relative-time plans were refused
+from types import SimpleNamespace  # Stand-in for LangChain's AgentAction
+
+import pytest  # Fixtures, parametrization
+
+from plan_cache import PlanCache, pins_relative_time, plan_from_steps
+from sql_executor import get_pool
+
+TOP = "SELECT name FROM products ORDER BY price_cents DESC LIMIT 5"
+ROWS = {"columns": ["name"], "rows": [["Nimbus Headphones"]]}
+
+
+def step(tool, tool_input, observation=ROWS):
+    return SimpleNamespace(tool=tool, tool_input=tool_input), observation
+
+
+def test_final_select_is_the_plan():
+    assert plan_from_steps([step("execute_sql", TOP)]) == (TOP, 1.0)
+    assert plan_from_steps([step("sql_db_query", {"query": TOP + ";"})]) == (TOP, 1.0)
+
+
+def test_earlier_queries_lower_confidence():
+    sql, confidence = plan_from_steps([
+        step("execute_sql", "SELECT nme FROM products", "ERROR: no such column: nme"),
+        step("execute_sql", TOP),
+    ])
+    assert sql == TOP
+    assert confidence < 1.0
+
+
+def test_failed_or_unsafe_final_query_is_not_a_plan():
+    assert plan_from_steps([step("execute_sql", TOP, "ERROR: database is locked")]) is None
+    assert plan_from_steps([step("execute_sql", "DELETE FROM products")]) is None
+    assert plan_from_steps([step("sql_db_schema", "products")]) is None
+
+
+def test_export_and_summarize_runs_are_not_recorded():
+    exported = {"path": "exports/top.csv", "rows": 5}
+    assert plan_from_steps([step("export_sql", f"csv {TOP}", exported)]) is None
+    assert plan_from_steps([step("summarize_sql", TOP, {"profile": True}), step("execute_sql", TOP)]) is None
+    assert plan_from_steps([step("execute_sql", {"sql": TOP, "export": "csv"}, exported)]) is None
+    assert plan_from_steps([step("execute_sql", {"sql": TOP, "summarize": True})]) is None
+    assert plan_from_steps([step("execute_sql", {"sql": TOP, "summarize": False})]) == (TOP, 1.0)
+
+
+PINNED = "SELECT SUM(amount_cents) FROM payments WHERE paid_at >= '2024-05-01'"
+ROLLING = "SELECT SUM(amount_cents) FROM payments WHERE paid_at >= date('now', '-30 days')"
+
+
+@pytest.mark.parametrize("question, sql, pinned", [
+    ("Revenue for the last 30 days", PINNED, True),
+    ("Sales this month?", "SELECT COUNT(*) FROM orders WHERE strftime('%Y-%m', order_date) = '2024-06'", True),
+    ("Orders placed today", "SELECT COUNT(*) FROM orders WHERE order_date = '2024-06-01 00:00:00'", True),
+    ("Most recent refunds", "SELECT * FROM refunds WHERE refunded_at > '2024'", True),
+    ("Revenue for the last 30 days", ROLLING, False),
+    ("Revenue since May 2024", PINNED, False),
+    ("Top 5 products by gross revenue", TOP, False),
+])
+def test_relative_time_with_date_literals(question, sql, pinned):
+    assert pins_relative_time(question, sql) is pinned
+
+
+def test_pinned_relative_time_plans_are_not_stored_or_loaded(seed_db, tmp_path):
+    plans = PlanCache(get_pool(seed_db))
+    assert plans.store("Revenue for the last 30 days", PINNED, 1.0) is None
+    assert plans.lookup("Revenue for the last 30 days") is None
+    assert plans.store("Revenue for the last 30 days", ROLLING, 1.0) is not None
+    assert plans.lookup("revenue for the LAST 30 days?").sql == ROLLING
+
+    path = tmp_path / "plans.json"
+    old = {"question": "Payments this week", "sql": PINNED, "confidence": 1.0, "created_at": 0.0,
+           "schema_version": 0, "scope": "default"}
+    path.write_text(json.dumps({"plans": [old]}))
+    assert PlanCache(get_pool(seed_db), path=path).stats()["plans"] == 0
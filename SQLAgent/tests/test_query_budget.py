@@ -0,0 +1,63 @@
+"""Budget trips in query_budget.QueryBudget."""
+
+import sqlite3  # Connection the budget is applied to
+
+import pytest  # Fixtures and raises
+
+from query_budget import BudgetExceeded, QueryBudget
+
+# Counts forever unless something stops it
+ENDLESS = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT max(i) FROM n"
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE a (x)")
+    conn.executemany("INSERT INTO a VALUES (?)", [(i,) for i in range(200)])
+    return conn
+
+
+def run(conn, budget, sql):
+    with budget.limit(conn, sql):
+        return conn.execute(sql).fetchall()
+
+
+def test_vm_steps(conn):
+    budget = QueryBudget(max_vm_steps=50_000, check_every=1_000, max_heap_bytes=None)
+    with pytest.raises(BudgetExceeded) as caught:
+        run(conn, budget, ENDLESS)
+    assert caught.value.budget == "vm_steps"
+    assert caught.value.used > 50_000
+    assert caught.value.to_dict()["error"] == "budget_exceeded"
+
+
+def test_timeout(conn):
+    budget = QueryBudget(max_vm_steps=None, timeout=0.05, max_heap_bytes=None)
+    with pytest.raises(BudgetExceeded) as caught:
+        run(conn, budget, ENDLESS)
+    assert caught.value.budget == "timeout"
+    assert caught.value.elapsed >= 0.05
+
+
+def test_length(conn):
+    budget = QueryBudget(max_length=1_000, max_heap_bytes=None)
+    with pytest.raises(BudgetExceeded) as caught:
+        run(conn, budget, "SELECT zeroblob(5000)")
+    assert caught.value.budget == "length"
+
+
+def test_cross_join_plan_is_rejected_before_running(conn):
+    budget = QueryBudget(max_cross_join_rows=1_000, max_heap_bytes=None)
+    with pytest.raises(BudgetExceeded) as caught:
+        run(conn, budget, "SELECT COUNT(*) FROM a x, a y")
+    assert caught.value.budget == "cross_join"
+    assert caught.value.used == 200 * 200
+
+
+def test_within_budget_runs_and_restores_connection(conn):
+    budget = QueryBudget(max_vm_steps=1_000_000, max_length=1_000, max_cross_join_rows=1_000, max_heap_bytes=None)
+    previous = conn.getlimit(sqlite3.SQLITE_LIMIT_LENGTH)
+    assert run(conn, budget, "SELECT COUNT(*) FROM a") == [(200,)]
+    assert conn.getlimit(sqlite3.SQLITE_LIMIT_LENGTH) == previous
+    assert conn.execute("SELECT zeroblob(5000) IS NOT NULL").fetchone() == (1,)
@@ -0,0 +1,44 @@
+"""Workload recording in query_log.QueryLog."""
+
+import sqlite3  # Running the logged statement
+
+from query_log import QueryLog
+
+COMMENTED = "SELECT id FROM customers -- c\nWHERE id < 3\nLIMIT 200"
+
+
+def test_statement_is_kept_as_executed(seed_db):
+    log = QueryLog()
+    log.record(COMMENTED, 0.01)
+    (entry,) = log.entries()
+    assert entry["sql"] == COMMENTED
+    with sqlite3.connect(seed_db) as conn:
+        assert len(conn.execute(entry["sql"]).fetchall()) == 2
+
+
+def test_spacing_variants_share_an_entry():
+    log = QueryLog()
+    log.record("SELECT 1", 0.001)
+    log.record("SELECT   1;", 0.003)
+    (entry,) = log.entries()
+    assert entry["count"] == 2
+    assert entry["sql"] == "SELECT 1"
+    assert entry["max_ms"] == 3.0
+
+
+def test_log_survives_a_reload(tmp_path):
+    path = tmp_path / "queries.json"
+    log = QueryLog(path, save_every=1)
+    log.record(COMMENTED, 0.01)
+    reloaded = QueryLog(path)
+    reloaded.record(COMMENTED.replace("\n", "\n  "), 0.01)
+    (entry,) = reloaded.entries()
+    assert entry["count"] == 2
+    assert entry["sql"] == COMMENTED
+
+
+def test_least_run_statements_are_dropped():
+    log = QueryLog(max_entries=2)
+    for sql in ("SELECT 1", "SELECT 1", "SELECT 2", "SELECT 3"):
+        log.record(sql, 0.001)
+    assert {e["sql"] for e in log.entries()} == {"SELECT 1", "SELECT 3"}
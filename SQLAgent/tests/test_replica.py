@@ -0,0 +1,96 @@
+"""In-memory hot replica (replica.HotReplica) behind a ReadOnlyPool."""
+
+import sqlite3  # Writes to the file the replica follows
+import time  # Waiting for the background refresh
+
+import pytest  # Fixtures
+
+import replica as replica_module
+from replica import HotReplica, get_replica, sync_replica
+from sql_executor import ReadOnlyPool
+
+NAME = "SELECT name FROM customers WHERE id = 1"
+
+
+def write(db_path, sql: str, *params):
+    conn = sqlite3.connect(db_path)
+    conn.execute(sql, params)
+    conn.commit()
+    conn.close()
+
+
+def read(pool, sql: str = NAME):
+    with pool.connection() as conn:
+        return conn.execute(sql).fetchone()[0]
+
+
+@pytest.fixture
+def replicated(seed_db):
+    """A pool reading from a replica that only refreshes when asked."""
+    pool = ReadOnlyPool(seed_db, size=2)
+    replica = HotReplica(seed_db, follow=False)
+    pool.use_replica(replica)
+    yield pool, replica
+    replica.close()
+    pool.close()
+
+
+def test_reads_come_from_the_copy_until_it_is_refreshed(seed_db, replicated):
+    pool, replica = replicated
+    before = read(pool)
+    write(seed_db, "UPDATE customers SET name = 'Renamed' WHERE id = 1")
+    assert read(pool) == before
+    stats = replica.stats()
+    assert stats["stale"] and stats["generation"] == 1
+
+    assert replica.sync() is True
+    assert read(pool) == "Renamed"
+    assert replica.sync() is False  # Nothing new since the copy
+    stats = replica.stats()
+    assert (stats["stale"], stats["generation"], stats["refreshes"]) == (False, 2, 2)
+    assert stats["bytes"] > 0
+    assert pool.stats()["source"] == "replica"
+
+
+def test_running_statement_finishes_on_the_old_copy(seed_db, replicated):
+    pool, replica = replicated
+    items = read(pool, "SELECT COUNT(*) FROM order_items")
+    with pool.connection() as conn:
+        cursor = conn.execute("SELECT id FROM order_items")
+        rows = [cursor.fetchone()]
+        write(seed_db, "DELETE FROM order_items")
+        replica.refresh()
+        rows += cursor.fetchall()
+    assert len(rows) == items
+    assert read(pool, "SELECT COUNT(*) FROM order_items") == 0  # New checkouts read the new copy
+
+
+def test_background_refresh_follows_commits(seed_db):
+    pool = ReadOnlyPool(seed_db, size=1)
+    replica = HotReplica(seed_db, interval=0, poll=0.01)
+    pool.use_replica(replica)
+    try:
+        write(seed_db, "UPDATE customers SET name = 'Followed' WHERE id = 1")
+        deadline = time.time() + 5
+        while read(pool) != "Followed" and time.time() < deadline:
+            time.sleep(0.01)
+        assert read(pool) == "Followed"
+        assert replica.stats()["max_lag_ms"] > 0
+    finally:
+        replica.close()
+        pool.close()
+
+
+def test_registry_switches_the_pool_and_syncs_writes(monkeypatch, seed_db):
+    monkeypatch.setattr(replica_module, "_replicas", {})
+    pool = ReadOnlyPool(seed_db, size=1)
+    replica = get_replica(pool, follow=False)
+    try:
+        assert pool.replica is replica and get_replica(pool) is replica
+        write(seed_db, "UPDATE customers SET name = 'Synced' WHERE id = 1")
+        assert sync_replica(seed_db) is True
+        assert read(pool) == "Synced"
+        assert sync_replica(seed_db.with_name("other.db")) is False  # No replica for that file
+    finally:
+        replica.close()
+        pool.close()
@@ -0,0 +1,137 @@
+"""Invalidation, epochs and size bounds of result_cache.ResultCache."""
+
+import sqlite3  # Writers committing to the cached database
+
+import pytest  # Fixtures
+
+from result_cache import ResultCache, normalize_sql
+
+ORDERS = "SELECT * FROM orders"
+PRODUCTS = "SELECT * FROM products"
+RESULT = {"columns": ["x"], "rows": [[1]]}
+
+# Always changes a row (an UPDATE that changes nothing doesn't move data_version)
+WRITE = "UPDATE orders SET order_date = order_date || ' ' WHERE id = 101"
+
+
+@pytest.fixture
+def cache(seed_db):
+    return ResultCache(seed_db)
+
+
+def prime(cache, *queries):
+    for sql in queries:
+        assert cache.get(sql) is None
+        cache.put(sql, RESULT)
+
+
+def test_hit_after_put_ignores_whitespace(cache):
+    prime(cache, ORDERS)
+    assert cache.get("SELECT *\n  FROM orders ;") == RESULT
+    assert normalize_sql("SELECT  'a  b'   FROM t;") == "SELECT 'a  b' FROM t"
+    assert cache.stats()["hits"] == 1
+
+
+def test_comments_are_not_joined_to_the_next_line(cache):
+    two_rows = "SELECT 1 AS v -- x\nUNION ALL SELECT 2"
+    prime(cache, two_rows)
+    assert cache.get("SELECT 1 AS v -- x UNION ALL SELECT 2") is None
+    assert normalize_sql("SELECT /* a\n b */ 1 -- c") == "SELECT 1"
+    assert normalize_sql("SELECT '-- kept' FROM [a--b]") == "SELECT '-- kept' FROM [a--b]"
+
+
+def test_callers_cannot_change_cached_results(cache):
+    result = {"columns": ["x"], "rows": [[1]]}
+    assert cache.get(ORDERS) is None
+    cache.put(ORDERS, result)
+    result["rows"].append([2])
+    cache.get(ORDERS)["rows"][0][0] = 99
+    assert cache.get(ORDERS) == RESULT
+
+
+def test_foreign_commit_flushes_everything(cache, seed_db):
+    prime(cache, ORDERS, PRODUCTS)
+    with sqlite3.connect(seed_db) as other:
+        other.execute("UPDATE customers SET region = 'XX' WHERE id = 1")
+    assert cache.get(PRODUCTS) is None
+    assert cache.get(ORDERS) is None
+
+
+def test_own_write_only_drops_written_tables(cache, seed_db):
+    prime(cache, ORDERS, PRODUCTS)
+    writer = sqlite3.connect(seed_db)
+    writer.execute(WRITE)
+    token = cache.begin_write(writer)
+    writer.commit()
+    assert cache.note_write(WRITE, writer, token) == 1
+    assert cache.get(ORDERS) is None
+    assert cache.get(PRODUCTS) == RESULT
+
+
+def test_foreign_commit_after_ours_is_not_absorbed(cache, seed_db):
+    prime(cache, ORDERS, PRODUCTS)
+    writer = sqlite3.connect(seed_db)
+    writer.execute(WRITE)
+    token = cache.begin_write(writer)
+    writer.commit()
+    with sqlite3.connect(seed_db) as other:  # Lands before note_write re-reads the version
+        other.execute("UPDATE products SET price_cents = price_cents + 1")
+    cache.note_write(WRITE, writer, token)
+    assert cache.get(PRODUCTS) is None
+
+
+def test_foreign_commit_before_ours_is_flushed(cache, seed_db):
+    prime(cache, PRODUCTS)
+    with sqlite3.connect(seed_db) as other:
+        other.execute("UPDATE products SET price_cents = price_cents + 1")
+    writer = sqlite3.connect(seed_db)
+    writer.execute(WRITE)
+    token = cache.begin_write(writer)
+    writer.commit()
+    cache.note_write(WRITE, writer, token)
+    assert cache.get(PRODUCTS) is None
+
+
+def test_write_without_token_falls_back_to_full_flush(cache, seed_db):
+    prime(cache, PRODUCTS)
+    with sqlite3.connect(seed_db) as writer:
+        writer.execute(WRITE)
+    cache.note_write(WRITE)
+    assert cache.get(PRODUCTS) is None
+
+
+def test_result_from_before_an_invalidation_is_not_stored(cache):
+    assert cache.get(ORDERS) is None  # Miss: the query starts running
+    cache.invalidate_tables(["orders"])  # A write lands while it runs
+    cache.put(ORDERS, RESULT)
+    assert cache.get(ORDERS) is None
+
+
+def test_views_invalidate_through_their_tables(seed_db):
+    with sqlite3.connect(seed_db) as conn:
+        conn.execute("CREATE VIEW paid AS SELECT * FROM orders WHERE status = 'paid'")
+    cache = ResultCache(seed_db)
+    prime(cache, "SELECT * FROM paid")
+    cache.invalidate_tables(["orders"])
+    assert cache.get("SELECT * FROM paid") is None
+
+
+def test_lru_eviction_and_oversized_results(seed_db):
+    cache = ResultCache(seed_db, max_bytes=10_000, max_entries=2)
+    prime(cache, "SELECT 1", "SELECT 2", "SELECT 3")
+    assert cache.get("SELECT 1") is None
+    assert cache.get("SELECT 3") == RESULT
+    cache.put("SELECT 4", {"columns": ["x"], "rows": [["y" * 5_000]]})
+    stats = cache.stats()
+    assert stats["evictions"] >= 1
+    assert stats["rejected"] == 1
+    assert stats["bytes"] <= stats["max_bytes"]
+
+
+def test_external_version_flushes_on_change(seed_db):
+    generation = [1]
+    cache = ResultCache(seed_db, version=lambda: generation[0])
+    prime(cache, ORDERS)
+    assert cache.get(ORDERS) == RESULT
+    generation[0] += 1  # The replica was swapped
+    assert cache.get(ORDERS) is None
@@ -0,0 +1,66 @@
+"""Streaming export in result_export."""
+
+import csv  # Reading CSV exports back
+import json  # Reading JSONL exports back
+import sqlite3  # Source cursors
+
+import pytest  # Fixtures, raises
+
+from result_export import export_cursor, export_query, format_for
+from sql_executor import get_pool
+
+SQL = "SELECT id, name, region FROM customers ORDER BY id"
+
+
+@pytest.fixture
+def conn(seed_db):
+    conn = sqlite3.connect(seed_db)
+    yield conn
+    conn.close()
+
+
+def test_csv_round_trip_in_small_batches(conn, tmp_path):
+    expected = conn.execute(SQL).fetchall()
+    stats = export_cursor(conn.execute(SQL), tmp_path / "customers.csv", batch_rows=3)
+    with open(tmp_path / "customers.csv", newline="", encoding="utf-8") as f:
+        header, *rows = list(csv.reader(f))
+    assert header == ["id", "name", "region"]
+    assert rows == [[str(v) if v is not None else "" for v in row] for row in expected]
+    assert stats.rows == len(expected)
+    assert stats.bytes == (tmp_path / "customers.csv").stat().st_size
+
+
+def test_jsonl_writes_one_object_per_row(conn, tmp_path):
+    export_cursor(conn.execute("SELECT id, x'00ff' AS blob, NULL AS missing FROM customers WHERE id = 1"),
+                  tmp_path / "one.jsonl")
+    lines = (tmp_path / "one.jsonl").read_text().splitlines()
+    assert [json.loads(line) for line in lines] == [{"id": 1, "blob": "00ff", "missing": None}]
+
+
+def test_failed_export_leaves_no_file(conn, tmp_path):
+    # Row 5 overflows, after the first batches were written
+    cursor = conn.execute("SELECT id, abs(-9223372036854775807 - (id = 5)) FROM customers ORDER BY id")
+    out = tmp_path / "out"
+    out.mkdir()
+    with pytest.raises(sqlite3.Error):
+        export_cursor(cursor, out / "bad.csv", batch_rows=2)
+    assert list(out.iterdir()) == []
+
+
+def test_parquet_keeps_types(conn, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    export_cursor(conn.execute(SQL), tmp_path / "customers.parquet", batch_rows=4)
+    table = pq.read_table(tmp_path / "customers.parquet")
+    assert table.column("id").to_pylist() == [row[0] for row in conn.execute(SQL)]
+
+
+def test_export_query_names_the_file(seed_db, tmp_path):
+    stats = export_query(get_pool(seed_db), SQL, "jsonl", tmp_path / "exports")
+    assert stats.path.endswith(".jsonl")
+    assert stats.rows == len((tmp_path / "exports" / stats.path.rsplit("/", 1)[-1]).read_text().splitlines())
+
+
+def test_unknown_format_is_rejected():
+    assert format_for("out.ndjson") == "jsonl"
+    with pytest.raises(ValueError):
+        format_for("out.xlsx")
@@ -0,0 +1,72 @@
+"""Lazy paging in result_pager.ResultPager."""
+
+import sqlite3  # Connections for the pager and reference results
+
+import pytest  # Fixtures
+
+from result_pager import ResultPager
+
+
+@pytest.fixture
+def connect(seed_db):
+    return lambda: sqlite3.connect(seed_db, check_same_thread=False)
+
+
+def all_rows(connect, sql: str) -> list:
+    conn = connect()
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def test_pages_match_the_full_result(connect):
+    sql = "SELECT id, order_id, quantity FROM order_items ORDER BY id"
+    expected = all_rows(connect, sql)
+    pager = ResultPager(connect, sql, page_size=7)
+    try:
+        pages = []
+        index = 0
+        while True:
+            pages.extend(pager.page(index))
+            if not pager.has_next(index):
+                break
+            index += 1
+        assert pages == expected
+        assert pager.total == len(expected)
+        assert pager.columns == ["id", "order_id", "quantity"]
+    finally:
+        pager.close()
+
+
+def test_going_back_past_kept_pages_reruns_the_query(connect):
+    sql = "SELECT id FROM order_items ORDER BY id"
+    expected = all_rows(connect, sql)
+    pager = ResultPager(connect, sql, page_size=5, keep_pages=2)
+    try:
+        pager.page(4)
+        assert pager.page(0) == expected[:5]
+        assert pager.reruns == 1
+        assert pager.page(1) == expected[5:10]
+    finally:
+        pager.close()
+
+
+def test_count_without_reading_to_the_end(connect):
+    sql = "SELECT id FROM order_items -- every item"
+    pager = ResultPager(connect, sql, page_size=5)
+    try:
+        pager.page(0)
+        assert pager.count() == len(all_rows(connect, sql))
+        assert pager.last_page == (pager.total - 1) // 5
+    finally:
+        pager.close()
+
+
+def test_page_past_the_end_is_clamped(connect):
+    pager = ResultPager(connect, "SELECT id FROM customers WHERE id <= 3", page_size=2)
+    try:
+        assert pager.page(9) == [(3,)]
+        assert pager.status(1) == "page 2 of 2 (rows 3-3 of 3)"
+    finally:
+        pager.close()
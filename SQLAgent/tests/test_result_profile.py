@@ -0,0 +1,62 @@
+"""One-pass result profiles (result_profile)."""
+
+import sqlite3  # Results to profile
+import statistics  # Reference statistics
+
+import pytest  # Fixtures
+
+from result_profile import profile_cursor, render_profile
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (n INTEGER, day TEXT, status TEXT)")
+    conn.executemany("INSERT INTO t VALUES (?, ?, ?)",
+                     [(i, f"2024-01-{i % 28 + 1:02d}", "paid" if i % 4 else "refunded") for i in range(1, 1001)]
+                     + [(None, None, None)])
+    yield conn
+    conn.close()
+
+
+def columns(profile: dict) -> dict:
+    return {column["name"]: column for column in profile["columns"]}
+
+
+def test_batches_cover_every_row(conn):
+    profile = profile_cursor(conn.execute("SELECT * FROM t"), batch_rows=64)
+    assert profile["row_count"] == 1001
+    n, day, status = (columns(profile)[name] for name in ("n", "day", "status"))
+
+    assert (n["type"], n["count"], n["nulls"], n["min"], n["max"]) == ("numeric", 1000, 1, 1, 1000)
+    assert n["mean"] == statistics.mean(range(1, 1001))
+    assert n["quantiles"]["p50"] == statistics.median(range(1, 1001))
+
+    assert (day["type"], day["first"], day["last"], day["days"]) == ("date", "2024-01-01", "2024-01-28", 28)
+    assert status["top"] == [["paid", 750], ["refunded", 250]]
+
+
+def test_batch_size_does_not_change_the_profile(conn):
+    sql = "SELECT * FROM t"
+    assert profile_cursor(conn.execute(sql), batch_rows=7) == profile_cursor(conn.execute(sql), batch_rows=5000)
+
+
+def test_large_columns_fall_back_to_samples(monkeypatch, conn):
+    monkeypatch.setattr("result_profile.SAMPLE_SIZE", 100)
+    n = columns(profile_cursor(conn.execute("SELECT n FROM t")))["n"]
+    assert n["quantiles_sampled"] == 100
+    assert 300 < n["quantiles"]["p50"] < 700  # From the reservoir, close to the true 500.5
+
+
+def test_render_is_a_few_lines_per_column(conn):
+    text = render_profile(profile_cursor(conn.execute("SELECT * FROM t")))
+    lines = text.splitlines()
+    assert lines[0] == "[summary of 1,001 rows, 3 columns; computed locally over all rows]"
+    assert lines[1].startswith("n (numeric): 1,000 values, 1 nulls")
+    assert "top: paid 750 | refunded 250" in lines[3]
+
+
+def test_empty_result(conn):
+    profile = profile_cursor(conn.execute("SELECT n FROM t WHERE 0"))
+    assert profile["row_count"] == 0
+    assert columns(profile)["n"]["type"] == "empty"
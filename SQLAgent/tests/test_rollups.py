@@ -0,0 +1,74 @@
+"""Trigger-maintained revenue rollups (rollups) stay in sync with the raw tables."""
+
+import sqlite3  # Writable connection for install and the mutations
+
+import pytest  # Fixtures, parametrization
+
+from rollups import ROLLUP_TABLES, drop, install, installed_rollups, status, verify
+from sql_executor import get_pool
+
+
+@pytest.fixture
+def conn(seed_db):
+    conn = sqlite3.connect(seed_db)  # Foreign keys off, as by default: rows can arrive in any order
+    install(conn)
+    yield conn
+    conn.close()
+
+
+def assert_in_sync(conn):
+    drift = verify(conn, deep=True)
+    assert drift == {table: dict.fromkeys(columns, 0) for table, columns in drift.items()}
+
+
+MUTATIONS = {
+    "item insert": ["INSERT INTO order_items (order_id, product_id, quantity, unit_price_cents) VALUES (101, 2, 3, 999)"],
+    "item update": ["UPDATE order_items SET quantity = quantity + 1, product_id = 3 WHERE id = 3001"],
+    "item delete": ["DELETE FROM order_items WHERE order_id = 102"],
+    "refund insert": ["INSERT INTO refunds (order_id, amount_cents, refunded_at, reason) VALUES (101, 500, '2024-06-01', 'x')"],
+    "refund update": ["UPDATE refunds SET order_id = 103, amount_cents = amount_cents * 2"],
+    "refund delete": ["DELETE FROM refunds"],
+    "order date and customer": ["UPDATE orders SET order_date = '2023-01-15', customer_id = 2 WHERE id = 101"],
+    "order delete": ["DELETE FROM orders WHERE id = 101"],
+    "order delete, then its items": ["DELETE FROM orders WHERE id = 101", "DELETE FROM order_items WHERE order_id = 101"],
+    "items before their order": [
+        "INSERT INTO order_items (order_id, product_id, quantity, unit_price_cents) VALUES (900, 1, 2, 1000)",
+        "INSERT INTO refunds (order_id, amount_cents, refunded_at, reason) VALUES (900, 300, '2024-06-01', 'x')",
+        "INSERT INTO orders (id, customer_id, order_date, status) VALUES (900, 1, '2024-06-01', 'paid')"],
+    "customer region": ["UPDATE customers SET region = 'LATAM' WHERE id = 1", "UPDATE customers SET region = NULL WHERE id = 2"],
+    "customer delete": ["DELETE FROM customers WHERE id = 1"],
+    "order before its customer": [
+        "INSERT INTO orders (id, customer_id, order_date, status) VALUES (901, 99, '2024-06-02', 'paid')",
+        "INSERT INTO order_items (order_id, product_id, quantity, unit_price_cents) VALUES (901, 1, 1, 1500)",
+        "INSERT INTO customers (id, name, email, created_at, region) VALUES (99, 'Late', 'late@example.com', '2024-06-01', 'EMEA')"],
+    "product category": ["UPDATE products SET category = 'Other' WHERE id = 1", "UPDATE products SET category = NULL WHERE id = 2"],
+    "product delete": ["DELETE FROM products WHERE id = 1"],
+    "item before its product": [
+        "INSERT INTO order_items (order_id, product_id, quantity, unit_price_cents) VALUES (101, 77, 4, 250)",
+        "INSERT INTO products (id, name, category, price_cents) VALUES (77, 'Late', 'Books', 250)"],
+}
+
+
+@pytest.mark.parametrize("statements", MUTATIONS.values(), ids=MUTATIONS.keys())
+def test_every_source_change_keeps_the_rollups_in_sync(conn, statements):
+    for sql in statements:
+        conn.execute(sql)
+    conn.commit()
+    assert_in_sync(conn)
+    assert status(conn)["changes"] > 0
+
+
+def test_install_backfills_in_sync(conn):
+    assert_in_sync(conn)
+    info = status(conn)
+    assert info["fresh"] and info["missing_triggers"] == [] and info["changes"] == 0
+
+
+def test_missing_trigger_means_not_offered(conn, seed_db):
+    assert installed_rollups(get_pool(seed_db)) == list(ROLLUP_TABLES)
+    conn.execute("DROP TRIGGER rollup_orders_insert")
+    conn.commit()
+    assert status(conn)["missing_triggers"] == ["rollup_orders_insert"]
+    assert installed_rollups(get_pool(seed_db)) == []
+    drop(conn)
+    assert not status(conn)["installed"]
@@ -0,0 +1,59 @@
+"""Question-to-table linking and pruning in schema_linker.SchemaLinker."""
+
+import pytest  # Fixtures, parametrization
+
+from analytics_context import SYNONYMS, TABLES
+from schema_linker import SchemaLinker
+from sql_executor import get_pool
+
+
+@pytest.fixture
+def linker(seed_db):
+    return SchemaLinker(get_pool(seed_db), synonyms=SYNONYMS)
+
+
+@pytest.mark.parametrize("question, needed", [
+    ("Which products were never ordered?", {"products", "order_items"}),
+    ("Which customers spent the most?", {"customers", "orders", "order_items"}),
+    ("Average order value by month", {"orders", "order_items"}),
+    ("Biggest orders this year", {"orders", "order_items"}),
+    ("Top 5 products by gross revenue", {"products", "order_items", "refunds"}),
+    ("How many customers are in APAC?", {"customers"}),
+])
+def test_questions_link_to_the_tables_that_answer_them(linker, question, needed):
+    tables, _, _ = linker.link(question, TABLES)
+    assert needed <= set(tables)
+
+
+def test_value_and_column_hits(linker):
+    tables, columns, reasons = linker.link("Revenue from Electronics products", TABLES)
+    assert tables[0] in ("products", "order_items")
+    assert "category" in columns["products"]
+    assert any("value 'electronics'" in reason for reason in reasons)
+
+
+def test_allowed_tables_are_respected(linker):
+    tables, _, _ = linker.link("Which products were never ordered?", ["products"])
+    assert tables == ("products",)
+
+
+def test_no_match_means_full_schema(linker):
+    assert linker.link("hello there", TABLES)[0] == ()
+
+
+class FakeDatabase:
+    """The two SQLDatabase calls prune() makes, rendering table names only."""
+
+    def get_usable_table_names(self):
+        return TABLES
+
+    def get_table_info(self, tables=None):
+        return "\n".join(f"CREATE TABLE {t} (...)" for t in (tables or TABLES))
+
+
+def test_pruned_schema_names_the_tables_it_leaves_out(linker):
+    pruned = linker.prune("Which payment methods are most used?", FakeDatabase())
+    assert "CREATE TABLE payments" in pruned.text
+    assert "CREATE TABLE products" not in pruned.text
+    assert "Other tables (not shown): customers" in pruned.text and "products" in pruned.text.splitlines()[-1]
+    assert pruned.pruned_tokens < pruned.full_tokens
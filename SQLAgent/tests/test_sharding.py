@@ -0,0 +1,83 @@
+"""Shard sets (sharding.py) against the single database they were split from."""
+
+import sqlite3  # Single-database reference results
+
+import pytest  # Fixtures, parametrization, raises
+
+from sharding import BENCH_QUERIES, ShardingError, ShardSet, build_shards, plan_query
+from sql_guard import inspect_sql
+
+# Valid shapes beyond the workload: aliases after literal keywords and joins on customer/order keys
+EXTRA_QUERIES = [
+    "SELECT o.id, CASE WHEN o.status = 'paid' THEN 'yes' ELSE 'no' END paid FROM orders o ORDER BY o.id",
+    "SELECT c.region, COUNT(*) n FROM customers c JOIN orders o ON o.customer_id = c.id GROUP BY c.region",
+    "SELECT r.order_id, SUM(p.amount_cents) AS paid FROM refunds r JOIN payments p USING (order_id) "
+    "GROUP BY r.order_id",
+    "SELECT COUNT(*) FROM orders o, order_items oi, payments p WHERE oi.order_id = o.id AND p.order_id = o.id",
+    "SELECT c.name FROM customers c WHERE EXISTS (SELECT 1 FROM orders o JOIN refunds r ON r.order_id = o.id "
+    "WHERE o.customer_id = c.id) ORDER BY c.name",
+    "SELECT c.id, COUNT(r.id) AS refunds FROM customers c LEFT JOIN orders o ON o.customer_id = c.id "
+    "LEFT JOIN refunds r ON r.order_id = o.id GROUP BY c.id",
+]
+
+# Joins that could pair rows from different shards
+REJECTED = [
+    "SELECT COUNT(*) FROM orders o JOIN customers c ON o.id = c.id",
+    "SELECT COUNT(*) FROM orders a, orders b WHERE a.order_date = b.order_date",
+    "SELECT COUNT(*) FROM customers c JOIN payments p ON p.amount_cents > 100",
+    "SELECT COUNT(*) FROM orders o CROSS JOIN refunds r",
+    "SELECT COUNT(*) FROM order_items oi JOIN orders o ON oi.order_id = o.customer_id",
+    "SELECT COUNT(*) FROM orders o JOIN payments p USING (id)",
+    "SELECT COUNT(*) FROM orders o JOIN order_items oi ON oi.order_id = o.id OR oi.product_id = o.id",
+    "WITH x AS (SELECT o.id FROM orders o JOIN customers c ON c.name = o.status) SELECT COUNT(*) FROM x",
+    "SELECT COUNT(*) FROM orders o JOIN (SELECT order_id, amount_cents FROM refunds) r "
+    "ON r.amount_cents = o.customer_id",
+]
+
+
+def single(db, sql: str) -> list:
+    conn = sqlite3.connect(db)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def comparable(rows) -> list:
+    """Rows as a sorted multiset (shards may return ties in another order)."""
+    return sorted((tuple(round(v, 6) if isinstance(v, float) else v for v in row) for row in rows), key=repr)
+
+
+@pytest.fixture(params=[("hash", 2), ("hash", 3), ("region", 2)], ids=lambda p: f"{p[0]}-{p[1]}")
+def shards(request, seed_db, tmp_path):
+    by, n = request.param
+    build_shards(seed_db, tmp_path / "shards", by, n)
+    shard_set = ShardSet(tmp_path / "shards" / "shards.json")
+    yield shard_set
+    shard_set.close()
+
+
+@pytest.mark.parametrize("sql", BENCH_QUERIES + EXTRA_QUERIES)
+def test_shards_match_single_database(shards, seed_db, sql):
+    sql = inspect_sql(sql).bounded_sql(200)
+    result = shards.execute(sql, max_rows=200)
+    assert comparable(result["rows"]) == comparable(single(seed_db, sql))
+
+
+def test_alias_after_end_keeps_its_name(shards):
+    result = shards.execute(EXTRA_QUERIES[0])
+    assert result["columns"] == ["id", "paid"]
+
+
+@pytest.mark.parametrize("by", ["hash", "region"])
+@pytest.mark.parametrize("sql", REJECTED)
+def test_cross_shard_joins_are_rejected(sql, by):
+    with pytest.raises(ShardingError):
+        plan_query(sql, by)
+
+
+def test_region_self_join_depends_on_the_split():
+    sql = "SELECT a.name, b.name FROM customers a JOIN customers b ON a.region = b.region AND a.id < b.id"
+    plan_query(sql, "region")  # Same region means same shard
+    with pytest.raises(ShardingError):
+        plan_query(sql, "hash")
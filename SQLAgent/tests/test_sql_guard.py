@@ -0,0 +1,81 @@
+"""Guardrail verdicts for adversarial SQL (sql_guard.inspect_sql)."""
+
+import sqlite3  # Running bounded_sql for real
+
+import pytest  # Parametrized cases
+
+from sql_guard import MULTI_ERROR, SELECT_ERROR, SYNTAX_ERROR, WRITE_ERROR, inspect_sql
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM customers",
+    "  \n select 1",
+    "select * from orders; ",
+    "SELECT 1;  -- bye\n;",
+    "/* DELETE */ SELECT 1",
+    "SELECT '; DROP TABLE x' AS s",
+    'SELECT * FROM "delete"',
+    "WITH x AS (SELECT 1) SELECT * FROM x",
+])
+def test_reads_are_allowed(sql):
+    verdict = inspect_sql(sql)
+    assert verdict.allowed, verdict.error
+    assert verdict.error is None
+
+
+@pytest.mark.parametrize("sql, error, keyword", [
+    ("SELECT 1; DROP TABLE customers", WRITE_ERROR, "DROP"),
+    ("dElEtE FROM orders", WRITE_ERROR, "DELETE"),
+    ("WITH d AS (DELETE FROM orders RETURNING *) SELECT * FROM d", WRITE_ERROR, "DELETE"),
+    ("EXPLAIN DELETE FROM orders", WRITE_ERROR, "DELETE"),
+    ("REPLACE INTO orders VALUES (1)", WRITE_ERROR, "REPLACE"),
+    ("SELECT 1 UNION SELECT 2 ; VACUUM", WRITE_ERROR, "VACUUM"),
+    ("PRAGMA writable_schema=1", WRITE_ERROR, "PRAGMA"),
+    ("ATTACH DATABASE 'x.db' AS x", WRITE_ERROR, "ATTACH"),
+    ("SELECT 1; SELECT 2", MULTI_ERROR, None),
+    ("EXPLAIN SELECT 1", SELECT_ERROR, None),
+    ("SELECT 'abc", SYNTAX_ERROR, None),
+    ("SELECT 1 /* open", SYNTAX_ERROR, None),
+    ('SELECT "abc FROM orders', SYNTAX_ERROR, None),
+])
+def test_unsafe_statements_are_rejected(sql, error, keyword):
+    verdict = inspect_sql(sql)
+    assert not verdict.allowed
+    assert verdict.error == error
+    assert verdict.write_keyword == keyword
+
+
+def test_tables_exclude_cte_names_and_literals():
+    verdict = inspect_sql("WITH recent AS (SELECT * FROM orders) "
+                          "SELECT * FROM recent r, customers c WHERE c.name = 'FROM products'")
+    assert verdict.tables == frozenset({"orders", "customers"})
+
+
+def test_trailing_terminator_is_stripped():
+    assert inspect_sql("SELECT 1 ;;  -- done").sql == "SELECT 1"
+
+
+@pytest.mark.parametrize("sql, bounded", [
+    ("SELECT name FROM customers LIMIT 5", False),
+    ("SELECT COUNT(*) FROM orders", False),
+    ("SELECT status FROM orders GROUP BY status", False),
+    ("SELECT * FROM (SELECT * FROM orders LIMIT 3)", True),  # Inner LIMIT doesn't bound the outer query
+    ("SELECT * FROM orders", True),
+])
+def test_limit_injection(sql, bounded):
+    verdict = inspect_sql(sql)
+    assert (verdict.bounded_sql(7) != verdict.sql) is bounded
+
+
+def test_limit_survives_trailing_line_comment():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (x)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(50)])
+    sql = inspect_sql("SELECT x FROM t -- every row please").bounded_sql(7)
+    assert len(conn.execute(sql).fetchall()) == 7
+
+
+def test_verdicts_are_memoized():
+    sql = "SELECT id FROM products WHERE id = 42"
+    assert inspect_sql(sql) is inspect_sql(sql)
+    assert inspect_sql.__wrapped__(sql) == inspect_sql(sql)
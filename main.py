@@ -19,7 +19,7 @@ Technology: LangChain + Google Gemini AI + SQLite
 
 import os
 import sys
-from sql_agent_cli import SQLAgentCLI
+import importlib.util
 
 def print_welcome():
     """Display welcome message and project information"""
@@ -67,15 +67,14 @@ def check_environment():
         print(f"❌ Database not found: {db_path}")
         return False
     
-    # Check imports
-    try:
-        import langchain
-        from langchain_google_genai import ChatGoogleGenerativeAI
-        print("✅ LangChain and Google GenAI imports successful")
-    except ImportError as e:
-        print(f"❌ Import error: {e}")
+    # Check packages (located, not imported: LangChain loads when a chat mode needs it,
+    # or in the background once the menu is shown)
+    missing = [name for name in ("langchain", "langchain_google_genai") if importlib.util.find_spec(name) is None]
+    if missing:
+        print(f"❌ Missing packages: {', '.join(missing)}")
         print("   Please install requirements: pip install -r requirements.txt")
         return False
+    print("✅ LangChain and Google GenAI installed (loaded on first use)")
     
     print("✅ Environment check passed!")
     print()
@@ -95,6 +94,7 @@ def main():
     
     # Launch the main CLI
     try:
+        from sql_agent_cli import SQLAgentCLI
         cli = SQLAgentCLI()
         cli.run()
     except KeyboardInterrupt:
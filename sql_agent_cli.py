@@ -8,19 +8,204 @@ setup verification, and interactive script execution.
 
 import os
 import sys
-import subprocess
 from pathlib import Path
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Shared execution layer modules live next to the educational scripts
+sys.path.insert(0, str(Path(__file__).parent / "SQLAgent" / "scripts"))
+
 class SQLAgentCLI:
     def __init__(self):
         self.project_root = Path(__file__).parent
         self.sql_agent_dir = self.project_root / "SQLAgent"
         self.scripts_dir = self.sql_agent_dir / "scripts"
+        # Chat modes that may answer repeat questions from the plan cache (no LLM call)
+        self.plan_cache_modes = {"secure": True, "simple": False, "analytics": True}
+        # One event loop for every agent turn (async LLM clients bind to the loop they start on)
+        self._loop = None
+        # Seconds before a typed SQL query is interrupted (0 = no limit; '.timeout N' changes it)
+        self.query_timeout = float(os.getenv("SQL_AGENT_QUERY_TIMEOUT", "30"))
         
+    def get_pool(self):
+        """Shared pool of read-only connections used by every agent chat mode"""
+        from sql_executor import get_pool
+        return get_pool(self.sql_agent_dir / "sql_agent_class.db")
+
+    def get_agent_registry(self):
+        """Shared LLM clients, database handle, toolkit and per-mode agents"""
+        from agent_registry import get_agent_registry
+        return get_agent_registry(self.get_pool())
+
+    def start_warmup(self):
+        """
+        Build the agent components in the background so the first chat starts instantly.
+
+        Nothing on the way to the menu imports LangChain; this preload thread
+        does, after the menu is on screen. SQL_AGENT_PRELOAD=0 turns it off
+        (LangChain then loads when a chat mode is entered).
+        """
+        if os.getenv("SQL_AGENT_PRELOAD", "1") == "0":
+            return
+        api_key = os.getenv('GOOGLE_API_KEY')
+        if api_key and api_key != 'your-gemini-api-key-here':
+            self.get_agent_registry().warm()
+
+    def invoke_agent(self, agent, payload):
+        """
+        Run one agent turn with ainvoke(); Ctrl-C cancels the turn.
+
+        Cancelling interrupts the SQLite statement the agent is waiting on, so
+        a slow query stops instead of finishing in the background.
+
+        Returns:
+            dict | None: The agent response, or None if the turn was cancelled
+        """
+        import asyncio
+        from async_executor import run_cancellable
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        try:
+            return run_cancellable(self._loop, agent.ainvoke(payload), on_cancel=self.get_pool().interrupt)
+        except KeyboardInterrupt:
+            print("\n⏹️  Cancelled - the running query was interrupted.")
+            return None
+
+    def execute_query(self, query, write=False):
+        """
+        Run a typed SQL query off the input thread with live progress.
+
+        Ctrl-C interrupts the statement (raising QueryCancelled) instead of
+        leaving the menu, and the statement is stopped after query_timeout
+        seconds (raising BudgetExceeded).
+
+        Returns:
+            tuple: (rows, or the affected row count for writes; cursor.description)
+        """
+        from cancellable_query import fetch_all, run_query
+        from result_cache import begin_write, notify_write
+        db_path = self.sql_agent_dir / "sql_agent_class.db"
+
+        def work(conn, cursor, progress):
+            if not write:
+                return fetch_all(conn, cursor, progress)
+            # Synced while this connection still holds the write lock, so the
+            # result cache can tell our commit apart from anyone else's
+            token = begin_write(db_path, conn)
+            conn.commit()
+            # Drop cached agent results that read the tables just written
+            notify_write(db_path, query, conn, token)
+            return cursor.rowcount
+
+        result, description, _ = run_query(self.query_connection, query, work, timeout=self.query_timeout or None)
+        return result, description
+
+    def query_connection(self):
+        """Connection for typed SQL (used from the query worker thread)"""
+        import sqlite3
+        return sqlite3.connect(self.sql_agent_dir / "sql_agent_class.db", check_same_thread=False)
+
+    def export_results(self, path, query):
+        """
+        Stream a SELECT's result to a CSV/JSONL/Parquet/Arrow file in batches.
+
+        Exports are expected to run long, so the query timeout doesn't apply;
+        Ctrl-C cancels them and no partial file is left behind.
+        """
+        from cancellable_query import run_query
+        from result_export import export_cursor, format_for
+        format_for(path)  # Reject unknown extensions before running anything
+
+        def work(conn, cursor, progress):
+            return export_cursor(cursor, path, progress=progress)
+
+        stats, _, _ = run_query(self.query_connection, query, work)
+        print(f"✅ Exported {stats.line()}")
+
+    def page_results(self, query, page_size=20):
+        """
+        Show a SELECT's result page by page, fetching rows lazily.
+
+        Only the pages being viewed are fetched (memory stays flat for any
+        result size); the total row count is computed only when asked for.
+
+        Raises:
+            QueryCancelled, BudgetExceeded, sqlite3.Error: If the first page fails
+        """
+        import sqlite3
+        from cancellable_query import QueryCancelled
+        from query_budget import BudgetExceeded
+        from result_pager import ResultPager
+        pager = ResultPager(self.query_connection, query, page_size=page_size, timeout=self.query_timeout or None)
+        try:
+            index = 0
+            rows = pager.page(index)
+            if not rows:
+                print("📭 No results found.")
+                return
+            while True:
+                print(f"\n📊 Results - {pager.status(index)}:")
+                print(pager.render(rows))
+                if pager.last_page == 0:
+                    return
+                command = input("\n   [Enter] next  [p] prev  [<n>] go to page  [c] count rows  [q] done: ").strip().lower()
+                if command in ["q", "quit", "exit", "back"]:
+                    return
+                if command == "" and not pager.has_next(index):
+                    return
+                try:
+                    if command == "c":
+                        print(f"🔢 {pager.count():,} rows in total")
+                        continue
+                    if command == "":
+                        target = index + 1
+                    elif command == "p":
+                        target = index - 1
+                    elif command.isdigit():
+                        target = int(command) - 1
+                    else:
+                        print("❌ Invalid choice. Please try again.")
+                        continue
+                    rows = pager.page(target)
+                    index = min(max(target, 0), pager.last_page if pager.last_page is not None else target)
+                except QueryCancelled as e:
+                    print(f"⏹️  Fetch cancelled after {e.elapsed:.1f}s.")
+                except BudgetExceeded as e:
+                    print(f"⏱️  {e}")
+                except sqlite3.Error as e:
+                    print(f"❌ SQL Error: {e}")
+        finally:
+            pager.close()
+
+    def get_plan_cache(self):
+        """Shared question-to-SQL plan cache for the chat modes"""
+        from plan_cache import get_plan_cache
+        return get_plan_cache(self.get_pool())
+
+    def answer_from_plan(self, mode, question):
+        """Answer a repeat question by re-running its cached SQL; returns True if answered"""
+        if not self.plan_cache_modes.get(mode):
+            return False
+        from plan_cache import render_result
+        plans = self.get_plan_cache()
+        plan = plans.lookup(question, scope=mode)
+        if plan is None:
+            return False
+        result = plans.replay(plan)
+        if result is None:
+            return False
+        print(f"⚡ Plan cache (no LLM call, confidence {plan.confidence:.2f}):")
+        print(f"   {plan.sql}")
+        print(render_result(result))
+        return True
+
+    def remember_plan(self, mode, question, response):
+        """Learn the final SQL an agent ran for a question"""
+        if self.plan_cache_modes.get(mode):
+            self.get_plan_cache().record(question, response.get("intermediate_steps"), scope=mode)
+
     def clear_screen(self):
         """Clear the terminal screen"""
         os.system('clear' if os.name == 'posix' else 'cls')
@@ -126,10 +311,11 @@ class SQLAgentCLI:
             print("3. 📈 Show Sample Data")
             print("4. 🔍 Run Custom SQL Query")
             print("5. 📝 Show Database Statistics")
-            print("6. ⬅️  Back to Main Menu")
+            print("6. 📈 Show Performance Metrics")
+            print("7. ⬅️  Back to Main Menu")
             print("-" * 50)
             
-            choice = input("Enter your choice (1-6): ").strip()
+            choice = input("Enter your choice (1-7): ").strip()
             
             if choice == "1":
                 self.reset_database()
@@ -142,6 +328,8 @@ class SQLAgentCLI:
             elif choice == "5":
                 self.show_database_stats()
             elif choice == "6":
+                self.show_performance_metrics()
+            elif choice == "7":
                 break
             else:
                 print("❌ Invalid choice. Please try again.")
@@ -215,6 +403,7 @@ class SQLAgentCLI:
         print("\n🔧 Running Environment Check...")
         print("-" * 40)
         try:
+            import subprocess
             result = subprocess.run([sys.executable, "test_setup.py"], 
                                   capture_output=True, text=True, cwd=self.project_root)
             print(result.stdout)
@@ -250,6 +439,7 @@ class SQLAgentCLI:
         print("\n📦 Installing/Updating Dependencies...")
         print("-" * 40)
         try:
+            import subprocess
             result = subprocess.run([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"], 
                                   cwd=self.project_root)
             if result.returncode == 0:
@@ -296,6 +486,7 @@ class SQLAgentCLI:
         print("\n🧪 Testing Basic LLM Functionality...")
         print("-" * 40)
         try:
+            import subprocess
             result = subprocess.run([sys.executable, "quick_test.py"], 
                                   capture_output=True, text=True, cwd=self.project_root)
             print(result.stdout)
@@ -308,7 +499,7 @@ class SQLAgentCLI:
         input("\nPress Enter to continue...")
         
     def run_educational_script(self, filename, title, description):
-        """Run an educational script with user confirmation"""
+        """Run an educational script in this process (02 asks for confirmation first)"""
         self.clear_screen()
         self.print_header()
         print(f"🚀 Running: {title}")
@@ -330,16 +521,16 @@ class SQLAgentCLI:
         print("=" * 50)
         
         try:
-            # Change to SQLAgent directory and run script
-            script_path = self.scripts_dir / filename
-            result = subprocess.run([sys.executable, f"scripts/{filename}"], 
-                                  cwd=self.sql_agent_dir)
+            # Run the script's main() in this process: LangChain is already imported, the
+            # pool is warm, and the script's agent and schema are built on its first run only
+            from script_runner import run_script
+            run_script(filename)
             print("=" * 50)
-            if result.returncode == 0:
-                print("✅ Script completed successfully!")
-            else:
-                print("⚠️ Script completed with warnings or errors.")
+            print("✅ Script completed successfully!")
+        except KeyboardInterrupt:
+            print("\n⏹️  Script interrupted.")
         except Exception as e:
+            print("=" * 50)
             print(f"❌ Error running script: {e}")
             
         input("\nPress Enter to continue...")
@@ -356,6 +547,7 @@ class SQLAgentCLI:
             return
             
         try:
+            import subprocess
             result = subprocess.run([sys.executable, "scripts/reset_db.py"], 
                                   cwd=self.sql_agent_dir)
             if result.returncode == 0:
@@ -448,29 +640,29 @@ class SQLAgentCLI:
         
         query = input("\nEnter your SQL query: ").strip()
         
-        if not query.upper().startswith('SELECT'):
+        from sql_guard import inspect_sql
+        verdict = inspect_sql(query)
+        if not verdict.allowed:
+            print(f"⚠️  {verdict.error}")
             confirm = input("⚠️  Non-SELECT query detected. Continue? (y/N): ").strip().lower()
             if confirm not in ['y', 'yes']:
                 return
                 
+        from cancellable_query import QueryCancelled
+        from query_budget import BudgetExceeded
         try:
-            import sqlite3
-            db_path = self.sql_agent_dir / "sql_agent_class.db"
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute(query)
-            results = cursor.fetchall()
-            
-            print(f"\n📊 Results ({len(results)} rows):")
-            print("-" * 30)
-            for i, row in enumerate(results[:10]):  # Limit to 10 rows
-                print(f"   {i+1}: {row}")
-                
-            if len(results) > 10:
-                print(f"   ... and {len(results) - 10} more rows")
-                
-            conn.close()
+            if verdict.allowed:
+                self.page_results(query, page_size=10)  # Fetches only the pages viewed
+            else:
+                results, _ = self.execute_query(query)
+                print(f"\n📊 Results ({len(results)} rows):")
+                print("-" * 30)
+                for i, row in enumerate(results[:10]):  # Limit to 10 rows
+                    print(f"   {i+1}: {row}")
+        except QueryCancelled as e:
+            print(f"⏹️  Query cancelled after {e.elapsed:.1f}s.")
+        except BudgetExceeded as e:
+            print(f"⏱️  {e}")
         except Exception as e:
             print(f"❌ Error executing query: {e}")
             
@@ -514,14 +706,149 @@ class SQLAgentCLI:
             
         input("\nPress Enter to continue...")
         
+    def show_performance_metrics(self):
+        """Show execution layer counters (connection pool and result cache usage)"""
+        print("\n📈 Performance Metrics")
+        print("-" * 40)
+        
+        from sql_executor import pool_stats
+        from result_cache import cache_stats
+        
+        pools = pool_stats()
+        if not pools:
+            print("   No connection pool opened yet - start an agent chat first.")
+        for db_path, stats in pools.items():
+            print(f"🔌 Connection pool: {db_path}")
+            print(f"   Connections: {stats['open']}/{stats['size']} open, "
+                  f"{stats['in_use']} in use, {stats['idle']} idle")
+            print(f"   Checkouts: {stats['checkouts']} "
+                  f"(hits {stats['hits']}, misses {stats['misses']}, waits {stats['waits']})")
+            print(f"   Hit rate: {stats['hit_rate']:.1%}")
+            print(f"   Wait time: {stats['wait_ms_total']} ms total, {stats['wait_ms_max']} ms max")
+            if stats['source'] == "replica":
+                print(f"   Reads from: in-memory replica ({stats['recycled']} connections reopened after refreshes)")
+            
+        for db_path, stats in cache_stats().items():
+            print(f"🗃️  Result cache: {db_path}")
+            print(f"   Entries: {stats['entries']} "
+                  f"({stats['bytes'] / 1024:.1f} KiB of {stats['max_bytes'] / 1024 / 1024:.0f} MiB)")
+            print(f"   Lookups: hits {stats['hits']}, misses {stats['misses']} "
+                  f"(hit rate {stats['hit_rate']:.1%})")
+            print(f"   Evictions: {stats['evictions']}, invalidations: {stats['invalidations']}, "
+                  f"oversized: {stats['rejected']}")
+            
+        try:
+            from schema_cache import schema_cache_stats
+            schema_caches = schema_cache_stats()
+        except ImportError:
+            schema_caches = {}  # LangChain not installed: no schema cache in use
+        for db_path, stats in schema_caches.items():
+            print(f"📐 Schema cache: {db_path}")
+            print(f"   Entries: {stats['entries']}, hits {stats['hits']}, misses {stats['misses']} "
+                  f"(hit rate {stats['hit_rate']:.1%})")
+            print(f"   Render time on misses: {stats['render_ms_total']} ms")
+            
+        from schema_linker import schema_linker_stats
+        for db_path, stats in schema_linker_stats().items():
+            print(f"🔗 Schema linker: {db_path}")
+            print(f"   Questions: {stats['questions']} ({stats['fallbacks']} fell back to the full schema)")
+            print(f"   Schema tokens: ~{stats['pruned_tokens']} sent of ~{stats['full_tokens']} "
+                  f"({stats['saved_pct']:.0f}% saved)")
+            
+        from agent_registry import agent_registry_stats
+        for db_path, stats in agent_registry_stats().items():
+            print(f"🤖 Agent registry: {db_path}")
+            warm_ms = f" in {stats['warm_ms']} ms" if stats['warm_ms'] is not None else ""
+            print(f"   Warm-up: {stats['warm']}{warm_ms}")
+            if stats['warm_error']:
+                print(f"   Warm-up error: {stats['warm_error']}")
+            print(f"   Built: {stats['llms']} LLM client(s), database {'yes' if stats['database'] else 'no'}, "
+                  f"toolkit {'yes' if stats['toolkit'] else 'no'}, agents {', '.join(stats['executors']) or 'none'}")
+            print(f"   Reused {stats['reuses']} times; build time: "
+                  + (", ".join(f"{name} {ms} ms" for name, ms in stats['build_ms'].items()) or "none"))
+            
+        from async_executor import async_executor_stats
+        for db_path, stats in async_executor_stats().items():
+            print(f"⏩ Async SQL executor: {db_path}")
+            print(f"   Running: {stats['running']}/{stats['max_concurrency']}, queued: {stats['queued']}")
+            print(f"   Completed: {stats['completed']}, cancelled: {stats['cancelled']}, "
+                  f"timed out: {stats['timeouts']}, errors: {stats['errors']}")
+            
+        from plan_cache import plan_cache_stats
+        for db_path, stats in plan_cache_stats().items():
+            print(f"⚡ Plan cache: {db_path}")
+            print(f"   Plans: {stats['plans']} (stored {stats['stored']}, expired {stats['expired']})")
+            print(f"   Questions: {stats['hits']} answered without the LLM, {stats['misses']} sent to the agent "
+                  f"(hit rate {stats['hit_rate']:.1%})")
+            print(f"   Failed replays: {stats['replay_failures']}")
+
+        from query_log import query_log_stats
+        for db_path, stats in query_log_stats().items():
+            print(f"📒 Query log: {db_path}")
+            print(f"   Statements: {stats['statements']}, executions this session: {stats['recorded']}, "
+                  f"logged time: {stats['total_ms']:.0f} ms")
+            print("   Run scripts/index_advisor.py to get index suggestions for this workload")
+
+        from query_budget import DEFAULT_BUDGET, budget_stats
+        stats = budget_stats()
+        exceeded = ", ".join(f"{kind} {count}" for kind, count in stats["exceeded"].items()) or "none"
+        print(f"🚦 Query budget: {DEFAULT_BUDGET.max_vm_steps:,} VM steps, {DEFAULT_BUDGET.timeout}s, "
+              f"{DEFAULT_BUDGET.max_heap_bytes // (1024 * 1024)} MiB heap")
+        print(f"   Statements: {stats['statements']}, plans rejected: {stats['rejected_plans']}, "
+              f"budgets exceeded: {exceeded}")
+
+        from observation_encoder import DEFAULT_MAX_TOKENS, encoder_stats
+        stats = encoder_stats()
+        print(f"🗜️  Observation encoding (budget {DEFAULT_MAX_TOKENS} tokens): {stats['calls']} observations, "
+              f"~{stats['tokens_before']:,} -> ~{stats['tokens_after']:,} tokens ({stats['saved_pct']}% saved), "
+              f"{stats['truncated']} cut by the budget")
+
+        from script_runner import runner_stats
+        for name, stats in runner_stats().items():
+            average = stats["run_seconds"] / stats["runs"] if stats["runs"] else 0.0
+            print(f"📜 Script {name}: loaded in {stats['load_seconds'] * 1000:.0f} ms, {stats['runs']} runs "
+                  f"(last {stats['last_run_seconds']:.1f}s, average {average:.1f}s)")
+
+        from sharding import shard_stats
+        for manifest, stats in shard_stats().items():
+            print(f"🧩 Shards: {stats['shards']} by {stats['by']} ({manifest})")
+            print(f"   Queries: {stats['queries']} (fanned out {stats['scatter']}, single shard {stats['single']}, "
+                  f"subqueries inlined {stats['inlined']}), rejected: {stats['rejected']}, errors: {stats['errors']}")
+            print(f"   Partial rows merged: {stats['partial_rows']:,}, shard time {stats['shard_ms']:.0f} ms "
+                  f"(slowest shard per query), merge time {stats['merge_ms']:.0f} ms")
+
+        from replica import replica_stats
+        for db_path, stats in replica_stats().items():
+            print(f"🪞 In-memory replica: {db_path} (copy {stats['generation']}, "
+                  f"{stats['bytes'] / 1024 / 1024:.1f} MiB, {stats['age_s']}s old)")
+            print(f"   Lag: {stats['lag_ms']:.0f} ms" + (" (changes pending)" if stats['stale'] else " (up to date)")
+                  + f", max {stats['max_lag_ms']:.0f} ms; refresh interval {stats['interval']:g}s")
+            print(f"   Refreshes: {stats['refreshes']} (last {stats['refresh_ms_last']} ms, "
+                  f"total {stats['refresh_ms_total']} ms), failures: {stats['failures']}")
+            if stats['last_error']:
+                print(f"   Last error: {stats['last_error']}")
+
+        from rollups import rollup_status
+        rollups = rollup_status(self.get_pool())
+        if rollups["installed"]:
+            print("🧮 Revenue rollups: " + ("fresh (all triggers present)" if rollups["fresh"]
+                                           else "STALE - missing " + ", ".join(rollups["missing_triggers"])))
+            print(f"   Built: {rollups['built_at']}, last change: {rollups['updated_at']}, "
+                  f"changes since build: {rollups['changes']}")
+            print("   Rows: " + ", ".join(f"{table} {count}" for table, count in rollups["rows"].items()))
+        else:
+            print("🧮 Revenue rollups: not installed (python scripts/rollups.py install)")
+
+        input("\nPress Enter to continue...")
+        
     def quick_llm_test(self):
         """Quick LLM test"""
         print("\n⚡ Quick LLM Test")
         print("-" * 40)
         
         try:
-            from langchain_google_genai import ChatGoogleGenerativeAI
-            llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0)
+            from agent_registry import CHAT_TEMPERATURE
+            llm = self.get_agent_registry().llm(CHAT_TEMPERATURE)  # Same client as Basic Chat
             response = llm.invoke("Say 'Hello from Gemini!' and explain what you are in one sentence.")
             print("🤖 Gemini Response:")
             print(f"   {response.content}")
@@ -561,22 +888,48 @@ class SQLAgentCLI:
         print("\n🛡️ Testing Security Guardrails")
         print("-" * 40)
         
+        from sql_guard import inspect_sql
+        
         dangerous_queries = [
             "DELETE FROM customers",
             "DROP TABLE orders",
-            "UPDATE products SET price_cents = 0"
+            "UPDATE products SET price_cents = 0",
+            "SELECT * FROM customers; DROP TABLE customers",
+            "WITH old AS (SELECT id FROM orders) DELETE FROM orders",
+            "PRAGMA writable_schema = ON"
+        ]
+        safe_queries = [
+            "SELECT name, created_at FROM customers",
+            "SELECT replace(name, ' ', '_') FROM products",
+            "SELECT * FROM refunds WHERE reason = 'please delete my account'",
+            "WITH paid AS (SELECT * FROM orders WHERE status = 'paid') SELECT COUNT(*) FROM paid"
         ]
         
+        failures = 0
         print("🧪 Testing dangerous query patterns:")
         for query in dangerous_queries:
             print(f"   Testing: {query}")
-            # In practice, this would test the guardrails in the secure agent
-            if any(word in query.upper() for word in ['DELETE', 'DROP', 'UPDATE']):
-                print("   ✅ BLOCKED - Security guardrail working")
+            verdict = inspect_sql(query)
+            if not verdict.allowed:
+                print(f"   ✅ BLOCKED - {verdict.error}")
             else:
+                failures += 1
                 print("   ❌ ALLOWED - This would be dangerous!")
                 
-        print("\n✅ Security tests completed!")
+        print("\n🧪 Testing safe queries (must not be blocked):")
+        for query in safe_queries:
+            print(f"   Testing: {query}")
+            verdict = inspect_sql(query)
+            if verdict.allowed:
+                print(f"   ✅ ALLOWED - tables: {', '.join(sorted(verdict.tables))}")
+            else:
+                failures += 1
+                print(f"   ❌ BLOCKED - False positive: {verdict.error}")
+                
+        if failures:
+            print(f"\n❌ Security tests completed with {failures} failure(s)!")
+        else:
+            print("\n✅ Security tests completed!")
         input("\nPress Enter to continue...")
         
     def test_analytics_query(self):
@@ -831,10 +1184,11 @@ class SQLAgentCLI:
             print("3. 🔓 Simple SQL Agent (Educational)")
             print("4. 📊 Business Analytics Chat")
             print("5. 💾 Direct SQL Query")
-            print("6. ⬅️  Back to Main Menu")
+            print("6. ⚡ Plan Cache Settings")
+            print("7. ⬅️  Back to Main Menu")
             print("-" * 50)
             
-            choice = input("Enter your choice (1-6): ").strip()
+            choice = input("Enter your choice (1-7): ").strip()
             
             if choice == "1":
                 self.basic_chat_interface()
@@ -847,6 +1201,8 @@ class SQLAgentCLI:
             elif choice == "5":
                 self.direct_sql_interface()
             elif choice == "6":
+                self.plan_cache_settings()
+            elif choice == "7":
                 break
             else:
                 print("❌ Invalid choice. Please try again.")
@@ -865,8 +1221,8 @@ class SQLAgentCLI:
         print("=" * 50)
         
         try:
-            from langchain_google_genai import ChatGoogleGenerativeAI
-            llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0.7)
+            from agent_registry import CHAT_TEMPERATURE
+            llm = self.get_agent_registry().llm(CHAT_TEMPERATURE)  # Shared, warmed at startup
             
             while True:
                 user_input = input("\n💬 You: ").strip()
@@ -879,7 +1235,9 @@ class SQLAgentCLI:
                     
                 try:
                     print("🤖 Gemini: ", end="", flush=True)
-                    response = llm.invoke(user_input)
+                    response = self.invoke_agent(llm, user_input)
+                    if response is None:
+                        continue
                     print(response.content)
                 except Exception as e:
                     print(f"❌ Error: {e}")
@@ -904,30 +1262,14 @@ class SQLAgentCLI:
         print("   • What products sell best?")
         print("   • Which region has most orders?")
         print("⚠️  Type 'exit' to return to menu")
+        print("⏹️  Press Ctrl-C to cancel a question that is taking too long")
         print("=" * 50)
         
         try:
-            from langchain_google_genai import ChatGoogleGenerativeAI
-            from langchain.agents import create_sql_agent
-            from langchain_community.agent_toolkits import SQLDatabaseToolkit
-            from langchain_community.utilities import SQLDatabase
-            
-            # Initialize components
-            llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0)
-            db_path = self.sql_agent_dir / "sql_agent_class.db"
-            db = SQLDatabase.from_uri(f"sqlite:///{db_path}")
-            toolkit = SQLDatabaseToolkit(db=db, llm=llm)
-            
-            # Create secure agent
-            agent = create_sql_agent(
-                llm=llm,
-                toolkit=toolkit,
-                agent_type="zero-shot-react-description",
-                verbose=False,
-                handle_parsing_errors=True,
-                max_iterations=3,
-                max_execution_time=30
-            )
+            # Secure agent on the shared LLM, database and toolkit (built once per session;
+            # the query service builds the same one from SECURE_AGENT_OPTIONS)
+            from agent_registry import SECURE_AGENT_OPTIONS, SECURE_PREFIX
+            agent = self.get_agent_registry().executor("secure", **SECURE_AGENT_OPTIONS)
             
             while True:
                 user_input = input("\n📊 Ask about the database: ").strip()
@@ -938,13 +1280,20 @@ class SQLAgentCLI:
                 if not user_input:
                     continue
                     
+                # Repeat question: re-run the SQL that answered it last time
+                if self.answer_from_plan("secure", user_input):
+                    continue
+                    
                 # Add safety prefix to encourage safe queries
-                safe_input = f"Please answer this question using only SELECT queries and limit results to 10 rows maximum: {user_input}"
+                safe_input = SECURE_PREFIX + user_input
                 
                 try:
                     print("🛡️ Secure Agent: ", end="", flush=True)
-                    response = agent.invoke({"input": safe_input})
+                    response = self.invoke_agent(agent, {"input": safe_input})
+                    if response is None:
+                        continue
                     print(response["output"])
+                    self.remember_plan("secure", user_input, response)
                 except Exception as e:
                     print(f"❌ Error: {e}")
                     print("💡 Try rephrasing your question or ask about basic database information.")
@@ -970,6 +1319,7 @@ class SQLAgentCLI:
         print("   • Show product categories")
         print("   • Count total orders")
         print("🔒 Type 'exit' to return to menu")
+        print("⏹️  Press Ctrl-C to cancel a question that is taking too long")
         print("=" * 50)
         
         confirm = input("⚠️  Continue with less secure agent? (y/N): ").strip().lower()
@@ -977,24 +1327,11 @@ class SQLAgentCLI:
             return
             
         try:
-            from langchain_google_genai import ChatGoogleGenerativeAI
-            from langchain.agents import create_sql_agent
-            from langchain_community.agent_toolkits import SQLDatabaseToolkit
-            from langchain_community.utilities import SQLDatabase
-            
-            # Initialize components
-            llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0)
-            db_path = self.sql_agent_dir / "sql_agent_class.db"
-            db = SQLDatabase.from_uri(f"sqlite:///{db_path}")
-            toolkit = SQLDatabaseToolkit(db=db, llm=llm)
-            
-            # Create simple agent
-            agent = create_sql_agent(
-                llm=llm,
-                toolkit=toolkit,
-                agent_type="zero-shot-react-description",
+            # Simple agent on the shared LLM, database and toolkit
+            agent = self.get_agent_registry().executor(
+                "simple",
                 verbose=True,  # Show reasoning for educational purposes
-                handle_parsing_errors=True
+                agent_executor_kwargs={"return_intermediate_steps": True}  # For the plan cache
             )
             
             while True:
@@ -1006,10 +1343,16 @@ class SQLAgentCLI:
                 if not user_input:
                     continue
                     
+                if self.answer_from_plan("simple", user_input):
+                    continue
+                    
                 try:
                     print("🔓 Simple Agent working...")
-                    response = agent.invoke({"input": user_input})
+                    response = self.invoke_agent(agent, {"input": user_input})
+                    if response is None:
+                        continue
                     print(f"📊 Result: {response['output']}")
+                    self.remember_plan("simple", user_input, response)
                 except Exception as e:
                     print(f"❌ Error: {e}")
                     
@@ -1034,28 +1377,16 @@ class SQLAgentCLI:
         print("   • Customer acquisition analysis")
         print("   • Regional performance comparison")
         print("🔒 Type 'exit' to return to menu")
+        print("⏹️  Press Ctrl-C to cancel a question that is taking too long")
         print("=" * 50)
         
         try:
-            from langchain_google_genai import ChatGoogleGenerativeAI
-            from langchain.agents import create_sql_agent
-            from langchain_community.agent_toolkits import SQLDatabaseToolkit
-            from langchain_community.utilities import SQLDatabase
-            
-            # Initialize with business-focused prompt
-            llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0)
-            db_path = self.sql_agent_dir / "sql_agent_class.db"
-            db = SQLDatabase.from_uri(f"sqlite:///{db_path}")
-            toolkit = SQLDatabaseToolkit(db=db, llm=llm)
-            
-            agent = create_sql_agent(
-                llm=llm,
-                toolkit=toolkit,
-                agent_type="zero-shot-react-description",
+            # Analytics agent on the shared LLM, database and toolkit
+            agent = self.get_agent_registry().executor(
+                "analytics",
                 verbose=False,
-                handle_parsing_errors=True,
                 agent_executor_kwargs={
-                    "return_intermediate_steps": False
+                    "return_intermediate_steps": True  # For the plan cache
                 }
             )
             
@@ -1071,6 +1402,9 @@ class SQLAgentCLI:
                 if not user_input:
                     continue
                     
+                if self.answer_from_plan("analytics", user_input):
+                    continue
+                    
                 # Enhance input with business context
                 business_context = f"""
                 As a business analyst, provide insights for this question about our e-commerce business: {user_input}
@@ -1081,8 +1415,11 @@ class SQLAgentCLI:
                 
                 try:
                     print("📊 Analyzing business data...")
-                    response = agent.invoke({"input": business_context})
+                    response = self.invoke_agent(agent, {"input": business_context})
+                    if response is None:
+                        continue
                     print(f"💼 Business Insight: {response['output']}")
+                    self.remember_plan("analytics", user_input, response)
                 except Exception as e:
                     print(f"❌ Error: {e}")
                     
@@ -1093,6 +1430,52 @@ class SQLAgentCLI:
             
         input("\nPress Enter to continue...")
         
+    def plan_cache_settings(self):
+        """Per-chat-mode plan cache opt-out, confidence/TTL controls and reset"""
+        labels = {"secure": "🛡️  Secure SQL Agent", "simple": "🔓 Simple SQL Agent",
+                  "analytics": "📊 Business Analytics Chat"}
+        modes = list(labels)
+        
+        while True:
+            self.clear_screen()
+            self.print_header()
+            plans = self.get_plan_cache()
+            print("⚡ Plan Cache Settings")
+            print("-" * 50)
+            print("💡 Repeat questions re-run the SQL the agent used last time, skipping the LLM")
+            for i, mode in enumerate(modes, 1):
+                state = "ON" if self.plan_cache_modes[mode] else "OFF"
+                print(f"{i}. {labels[mode]}: {state}")
+            print(f"4. 🎯 Minimum confidence: {plans.min_confidence:.2f}")
+            print(f"5. ⏳ Plan lifetime (TTL): {plans.ttl / 3600:.0f} hours")
+            print(f"6. 🗑️  Clear all plans ({plans.stats()['plans']} stored)")
+            print("7. ⬅️  Back")
+            print("-" * 50)
+            
+            choice = input("Enter your choice (1-7): ").strip()
+            
+            if choice in ["1", "2", "3"]:
+                mode = modes[int(choice) - 1]
+                self.plan_cache_modes[mode] = not self.plan_cache_modes[mode]
+            elif choice == "4":
+                try:
+                    plans.min_confidence = min(1.0, max(0.0, float(input("Minimum confidence (0-1): ").strip())))
+                except ValueError:
+                    print("❌ Please enter a number between 0 and 1.")
+                    input("\nPress Enter to continue...")
+            elif choice == "5":
+                try:
+                    plans.ttl = max(0.0, float(input("Plan lifetime in hours: ").strip())) * 3600
+                except ValueError:
+                    print("❌ Please enter a number of hours.")
+                    input("\nPress Enter to continue...")
+            elif choice == "6":
+                plans.clear()
+            elif choice == "7":
+                break
+            else:
+                print("❌ Invalid choice. Please try again.")
+        
     def direct_sql_interface(self):
         """Direct SQL query interface with safety warnings"""
         self.clear_screen()
@@ -1105,11 +1488,16 @@ class SQLAgentCLI:
         print("💡 Example queries:")
         print("   SELECT name, region FROM customers LIMIT 5;")
         print("   SELECT * FROM products WHERE category = 'Electronics';")
+        print("⏹️  Ctrl-C cancels a running query; '.timeout N' sets the per-query timeout (0 = none)")
+        print("📤 '.export <file> <SELECT ...>' streams a result to .csv, .jsonl, .parquet or .arrow")
         print("🔒 Type 'exit' to return to menu")
         print("=" * 50)
         
         try:
             import sqlite3
+            from sql_guard import inspect_sql
+            from cancellable_query import QueryCancelled
+            from query_budget import BudgetExceeded
             db_path = self.sql_agent_dir / "sql_agent_class.db"
             
             while True:
@@ -1121,51 +1509,59 @@ class SQLAgentCLI:
                 if not query:
                     continue
                     
+                if query.lower().startswith(".timeout"):
+                    try:
+                        self.query_timeout = float(query.split()[1])
+                    except (IndexError, ValueError):
+                        pass
+                    print(f"⏱️  Query timeout: {f'{self.query_timeout:g}s' if self.query_timeout else 'none'}")
+                    continue
+                    
+                if query.lower().startswith(".export"):
+                    parts = query.split(None, 2)
+                    if len(parts) < 3:
+                        print("📤 Usage: .export <file.csv|.jsonl|.parquet|.arrow> <SELECT ...>")
+                        continue
+                    verdict = inspect_sql(parts[2])
+                    if not verdict.allowed:
+                        print(f"⚠️  Only SELECT results can be exported. {verdict.error}")
+                        continue
+                    try:
+                        self.export_results(parts[1], parts[2])
+                    except QueryCancelled as e:
+                        print(f"⏹️  Export cancelled after {e.elapsed:.1f}s (no file written).")
+                    except BudgetExceeded as e:
+                        print(f"⏱️  {e}")
+                    except (sqlite3.Error, ValueError, ImportError, OSError) as e:
+                        print(f"❌ Export failed: {e}")
+                    continue
+                    
                 # Safety check
-                query_upper = query.upper()
-                dangerous_keywords = ['DELETE', 'DROP', 'UPDATE', 'INSERT', 'ALTER', 'CREATE']
+                verdict = inspect_sql(query)
                 
-                if any(keyword in query_upper for keyword in dangerous_keywords):
-                    print("⚠️  Dangerous query detected!")
+                if not verdict.allowed:
+                    print(f"⚠️  Dangerous query detected! {verdict.error}")
                     confirm = input(f"   Execute '{query}'? (type 'YES' to confirm): ").strip()
                     if confirm != 'YES':
                         print("❌ Query cancelled for safety.")
                         continue
                         
                 try:
-                    conn = sqlite3.connect(db_path)
-                    cursor = conn.cursor()
-                    
-                    cursor.execute(query)
-                    
-                    if query_upper.startswith('SELECT'):
-                        results = cursor.fetchall()
-                        
-                        if results:
-                            # Get column names
-                            columns = [description[0] for description in cursor.description]
-                            
-                            print(f"\n📊 Results ({len(results)} rows):")
-                            print("-" * 40)
-                            
-                            # Print header
-                            print(" | ".join(columns))
-                            print("-" * 40)
-                            
-                            # Print rows (limit to 20 for readability)
-                            for i, row in enumerate(results[:20]):
-                                print(" | ".join(str(cell) for cell in row))
-                                
-                            if len(results) > 20:
-                                print(f"... and {len(results) - 20} more rows")
-                        else:
-                            print("📭 No results found.")
+                    # Runs on a worker thread: live progress, Ctrl-C interrupts it, timeout applies
+                    if verdict.allowed:
+                        # Streams 20-row pages with fetchmany() instead of fetching the whole result
+                        self.page_results(query, page_size=20)
                     else:
-                        conn.commit()
+                        self.execute_query(query, write=True)
+                        # Agents reading an in-memory replica see the write right away
+                        from replica import sync_replica
+                        sync_replica(db_path)
                         print("✅ Query executed successfully.")
-                        
-                    conn.close()
                     
+                except QueryCancelled as e:
+                    print(f"⏹️  Query cancelled after {e.elapsed:.1f}s.")
+                except BudgetExceeded as e:
+                    print(f"⏱️  {e}")
                 except sqlite3.Error as e:
                     print(f"❌ SQL Error: {e}")
                 except Exception as e:
@@ -1178,6 +1574,7 @@ class SQLAgentCLI:
         
     def run(self):
         """Main CLI loop"""
+        preload = True
         while True:
             self.clear_screen()
             self.print_header()
@@ -1191,6 +1588,11 @@ class SQLAgentCLI:
             print()
             
             self.print_menu()
+            if preload:
+                # LangChain imports and clients load while the menu is shown (started only
+                # now, so the preload thread doesn't compete with drawing the first menu)
+                self.start_warmup()
+                preload = False
             
             choice = input("Enter your choice (1-7): ").strip()
             